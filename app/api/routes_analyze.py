@@ -8,9 +8,12 @@ from typing import Optional
 
 from ..config import settings
 from ..core.job_store import JobStore
-from ..tools.asr_whisper import transcribe_audio
+from ..core.offload import run_blocking, run_llm
+from ..tools.asr_parallel import transcribe_audio_parallel
+from ..tools.media_probe import get_media_probe
 from ..tools.scene_from_edl import parse_edl_to_scenes
 from ..tools.scene_from_xml import parse_xml_to_scenes
+from ..tools.transcript_stream import TranscriptStreamWriter, read_partial_transcript
 
 router = APIRouter()
 job_store = JobStore()
@@ -58,7 +61,7 @@ async def analyze_story(
         
         # 1. 创建任务
         job_id = job_store.create_job()
-        job_dir = settings.JOBS_DIR / job_id
+        job_dir = job_store.job_dir(job_id)
         
         # 2. 保存视频
         video_path = job_dir / video_file.filename
@@ -73,20 +76,12 @@ async def analyze_story(
         # 暂时使用模拟数据
         from ..models.schemas import ScenesJSON, ScenesMeta, ScenesMedia, Scene
         
-        # 获取视频信息
-        import subprocess
-        result = subprocess.run(
-            ["ffprobe", "-v", "error", "-select_streams", "v:0",
-             "-show_entries", "stream=duration,r_frame_rate",
-             "-of", "json", str(video_path)],
-            capture_output=True,
-            text=True
-        )
-        
-        video_info = json.loads(result.stdout)
-        duration = float(video_info["streams"][0]["duration"])
-        fps_str = video_info["streams"][0]["r_frame_rate"]
-        fps = eval(fps_str)  # "30/1" -> 30.0
+        # 获取视频信息（MediaProbe 缓存，后续步骤不再重复探测）
+        video_info = await run_blocking(get_media_probe().probe, str(video_path))
+        if not video_info.ok or not video_info.has_video:
+            raise RuntimeError(f"无法读取视频信息: {video_info.error or '没有视频流'}")
+        duration = video_info.duration
+        fps = video_info.fps or 30.0
         
         # 简单分段：每 5 秒一个场景
         scenes = []
@@ -117,7 +112,8 @@ async def analyze_story(
         
         # 4. 视觉分析
         print("\n[2/5] 视觉分析（AI 眼睛）...")
-        scenes_with_visual = analyze_scenes_auto(
+        scenes_with_visual = await run_llm(
+            analyze_scenes_auto,
             scenes_data,
             str(video_path),
             max_scenes=min(10, len(scenes))  # 限制数量以控制成本
@@ -131,7 +127,8 @@ async def analyze_story(
         # 5. 故事构思
         print("\n[3/5] 故事构思（AI 大脑）...")
         storyteller = VisualStoryteller()
-        story_result = storyteller.generate_story_from_visuals(
+        story_result = await run_llm(
+            storyteller.generate_story_from_visuals,
             scenes_with_visual,
             duration_target=duration_target,
             style_preference=style_preference
@@ -154,7 +151,8 @@ async def analyze_story(
         
         # 6. 生成 DSL
         print("\n[4/5] 生成剪辑方案（AI 导演）...")
-        dsl = storyteller.generate_dsl_from_story(
+        dsl = await run_llm(
+            storyteller.generate_dsl_from_story,
             scenes_with_visual,
             story_result,
             platform=platform
@@ -215,7 +213,7 @@ async def analyze(
     """
     # 创建新任务
     job_id = job_store.create_job()
-    job_dir = settings.JOBS_DIR / job_id
+    job_dir = job_store.job_dir(job_id)
     
     result = {
         "job_id": job_id,
@@ -262,11 +260,35 @@ async def analyze(
                 shutil.copyfileobj(audio_file.file, f)
             
             job_store.update_job(job_id, status="transcribing", progress=50)
-            transcript = transcribe_audio(str(audio_path))
             
+            # 边转录边写 transcript.json，下游可通过 /job/{job_id}/transcript 提前读取前 N 分钟
             transcript_path = job_dir / "transcript.json"
-            with open(transcript_path, "w", encoding="utf-8") as f:
-                json.dump(transcript, f, indent=2, ensure_ascii=False)
+            writer = TranscriptStreamWriter(
+                transcript_path,
+                source=str(audio_path),
+                on_progress=lambda progress: job_store.update_job(
+                    job_id, status="transcribing", progress=progress
+                ),
+                progress_range=(50, 80)
+            )
+            
+            try:
+                # 长录音按静音切块多进程转录（短音频 / GPU 自动走单模型路径）
+                # 在有界线程池中运行，转录期间事件循环仍可响应进度 / 部分结果查询
+                transcript = await run_blocking(
+                    transcribe_audio_parallel,
+                    str(audio_path),
+                    model_size=settings.WHISPER_MODEL,
+                    device=settings.WHISPER_DEVICE,
+                    compute_type=settings.WHISPER_COMPUTE_TYPE,
+                    on_segment=writer.on_segment,
+                    on_info=writer.on_info
+                )
+            except Exception:
+                writer.abort()
+                raise
+            
+            writer.finish(transcript)
             
             result["artifacts"]["transcript"] = "transcript.json"
             job_store.update_job(job_id, status="analyzing", progress=80)
@@ -307,10 +329,27 @@ async def get_job_status(job_id: str):
     return job
 
 
+@router.get("/job/{job_id}/transcript")
+async def get_transcript(job_id: str, until_sec: Optional[float] = None):
+    """
+    获取转录结果（转录进行中时返回已完成的部分）
+    
+    Args:
+        until_sec: 只返回前 N 秒内的段落
+    
+    Returns:
+        {"segments", "language", "source", "partial", "transcribed_until"}
+    """
+    transcript = read_partial_transcript(job_store.job_dir(job_id) / "transcript.json", until_sec)
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="转录结果不存在")
+    return transcript
+
+
 @router.get("/job/{job_id}/artifact/{artifact_name}")
 async def get_artifact(job_id: str, artifact_name: str):
     """下载任务产物"""
-    job_dir = settings.JOBS_DIR / job_id
+    job_dir = job_store.job_dir(job_id)
     artifact_path = job_dir / artifact_name
     
     if not artifact_path.exists():
@@ -1,15 +1,21 @@
 """
 Script Assembly API - 零散镜头组装工作流
 """
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
 from fastapi.responses import JSONResponse
 from pathlib import Path
 from typing import Optional
 import json
 from datetime import datetime
 
+from ..core.job_paths import new_job_id, resolve_job_dir
+from ..core.job_queue import get_job_queue, will_retry
+from ..core.orchestrator import JobState
+from ..core.progress_bus import get_progress_bus, sse_response
+from ..core.status_store import get_status_store
 from ..core.ui_translator import get_translator
 from ..core.llm_engine import LLMDirector
+from ..core.offload import run_llm
 from ..tools.bgm_library import BGMLibrary
 
 router = APIRouter(prefix="/api/assembly", tags=["assembly"])
@@ -21,7 +27,6 @@ bgm_library = BGMLibrary()
 
 @router.post("/create")
 async def create_assembly_project(
-    background_tasks: BackgroundTasks,
     assets_manifest: UploadFile = File(...),
     script_outline: Optional[UploadFile] = File(None),
     platform: str = Form(...),
@@ -51,10 +56,10 @@ async def create_assembly_project(
     """
     try:
         # 1. 生成项目 ID
-        project_id = f"asm_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        project_id = new_job_id("asm")
         
         # 2. 创建项目目录
-        project_path = Path("jobs") / project_id
+        project_path = resolve_job_dir(project_id)
         project_path.mkdir(parents=True, exist_ok=True)
         (project_path / "input").mkdir(exist_ok=True)
         (project_path / "temp").mkdir(exist_ok=True)
@@ -114,19 +119,25 @@ async def create_assembly_project(
         meta_path = project_path / "project_meta.json"
         with meta_path.open("w", encoding="utf-8") as f:
             json.dump(project_meta, f, indent=2, ensure_ascii=False)
-        
-        # 8. 启动后台处理任务
-        background_tasks.add_task(
-            process_assembly_project,
-            project_id,
-            manifest_data,
-            script_data,
-            initial_prompt,
-            music_preference
+        update_assembly_status(project_id, "asset_validation", 0, "排队等待处理...")
+        
+        # 8. 提交到任务队列（Resolve 空闲时执行，服务重启后继续）
+        task_id = get_job_queue().enqueue(
+            "assembly.process",
+            {
+                "project_id": project_id,
+                "manifest_data": manifest_data,
+                "script_data": script_data,
+                "prompt": initial_prompt,
+                "music_preference": music_preference
+            },
+            state=JobState.EXECUTING,
+            job_id=project_id
         )
         
         return JSONResponse(content={
             "project_id": project_id,
+            "task_id": task_id,
             "status": "processing",
             "workflow": "script_assembly",
             "message": "项目创建成功，正在处理中..."
@@ -146,7 +157,7 @@ async def process_assembly_project(
     """
     后台处理零散镜头组装项目
     """
-    project_path = Path("jobs") / project_id
+    project_path = resolve_job_dir(project_id)
     
     try:
         # 步骤 1: 验证素材
@@ -160,7 +171,7 @@ async def process_assembly_project(
                 missing_assets.append(asset.get("asset_id"))
         
         if missing_assets:
-            raise RuntimeError(f"缺少素材文件: {', '.join(missing_assets)}")
+            raise FileNotFoundError(f"缺少素材文件: {', '.join(missing_assets)}")
         
         # 步骤 2: 导入素材到 Resolve
         update_assembly_status(project_id, "resolve_import", 30, "正在导入素材到剪辑引擎...")
@@ -214,7 +225,7 @@ async def process_assembly_project(
         # 创建空的 transcript（零散镜头可能没有语音）
         transcript = TranscriptJSON(segments=[])
         
-        dsl = director.generate_editing_dsl(scenes, transcript, prompt, bgm_library=bgm_lib)
+        dsl = await run_llm(director.generate_editing_dsl, scenes, transcript, prompt, bgm_library=bgm_lib)
         
         # 保存 DSL
         dsl_path = project_path / "temp" / "assembly_dsl.json"
@@ -250,6 +261,11 @@ async def process_assembly_project(
             json.dump(project_meta, f, indent=2, ensure_ascii=False)
         
     except Exception as e:
+        if will_retry(e):
+            # 任务队列会重跑：只发布非终态，SSE 流和前端继续等待
+            update_assembly_status(project_id, "retrying", 0, f"处理失败，稍后重试: {str(e)}")
+            raise
+        
         # 错误处理
         update_assembly_status(project_id, "error", 0, f"处理失败: {str(e)}")
         
@@ -262,6 +278,9 @@ async def process_assembly_project(
             project_meta["error"] = str(e)
             with meta_path.open("w", encoding="utf-8") as f:
                 json.dump(project_meta, f, indent=2, ensure_ascii=False)
+        
+        # 交给任务队列记录失败
+        raise
 
 
 def update_assembly_status(
@@ -270,10 +289,64 @@ def update_assembly_status(
     progress: int,
     message: str
 ):
-    """更新组装项目状态"""
-    # 这里应该更新全局状态存储
-    # 暂时只打印日志
+    """更新组装项目状态（写入共享状态存储并推送给 SSE 订阅者）"""
     print(f"[{project_id}] {step}: {progress}% - {message}")
+    
+    # completed / error 是终态；retrying 表示任务队列稍后重跑
+    status = step if step in ("completed", "error", "retrying") else "processing"
+    data = {
+        "project_id": project_id,
+        "workflow": "script_assembly",
+        "status": status,
+        "progress": progress,
+        "current_step": step,
+        "message": message,
+        "error": message if status in ("error", "retrying") else None
+    }
+    get_status_store().put("assembly", project_id, data)
+    get_progress_bus().publish(project_id, "status", data)
+
+
+def _meta_status(project_id: str) -> dict:
+    """状态已过期清理时，从 project_meta.json 读取持久化状态"""
+    meta_path = resolve_job_dir(project_id) / "project_meta.json"
+    if not meta_path.exists():
+        raise HTTPException(status_code=404, detail="项目不存在")
+    
+    with meta_path.open("r", encoding="utf-8") as f:
+        project_meta = json.load(f)
+    
+    return {
+        "project_id": project_id,
+        "workflow": "script_assembly",
+        "status": project_meta.get("status", "unknown"),
+        "progress": 100 if project_meta.get("status") == "completed" else 0,
+        "current_step": project_meta.get("current_step", "unknown")
+    }
+
+
+@router.get("/{project_id}/events")
+async def stream_assembly_events(
+    project_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID")
+):
+    """
+    组装项目进度事件流（Server-Sent Events，取代轮询 /status）
+    
+    事件: status；状态为 completed / error 时流结束。
+    """
+    bus = get_progress_bus()
+    status = get_status_store().get("assembly", project_id)
+    if status is not None:
+        # 状态可能由其它 worker 更新，以共享存储为准
+        bus.sync_snapshot(project_id, status)
+    elif bus.get_snapshot(project_id) is None:
+        bus.publish(project_id, "status", _meta_status(project_id))
+    
+    return sse_response(
+        project_id, last_event_id,
+        loader=lambda: get_status_store().get("assembly", project_id)
+    )
 
 
 @router.get("/{project_id}/status")
@@ -287,19 +360,12 @@ async def get_assembly_status(project_id: str):
     Returns:
         项目状态信息
     """
-    project_path = Path("jobs") / project_id
-    meta_path = project_path / "project_meta.json"
-    
-    if not meta_path.exists():
-        raise HTTPException(status_code=404, detail="项目不存在")
+    status = get_status_store().get("assembly", project_id)
+    if status is not None:
+        return JSONResponse(content=status)
     
-    with meta_path.open("r", encoding="utf-8") as f:
-        project_meta = json.load(f)
-    
-    return JSONResponse(content={
-        "project_id": project_id,
-        "workflow": "script_assembly",
-        "status": project_meta.get("status", "unknown"),
-        "progress": 100 if project_meta.get("status") == "completed" else 0,
-        "current_step": project_meta.get("current_step", "unknown")
-    })
+    return JSONResponse(content=_meta_status(project_id))
+
+
+# 注册队列任务处理函数
+get_job_queue().register("assembly.process", process_assembly_project)
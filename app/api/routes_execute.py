@@ -6,7 +6,6 @@ import json
 import shutil
 from typing import Dict
 
-from ..config import settings
 from ..core.job_store import JobStore
 from ..models.schemas import EditingDSL, ScenesJSON, DSLValidator
 from ..executor.runner import Runner
@@ -36,7 +35,7 @@ async def execute(
     """
     # 创建执行任务
     job_id = job_store.create_job()
-    job_dir = settings.JOBS_DIR / job_id
+    job_dir = job_store.job_dir(job_id)
     
     try:
         # 保存 DSL
@@ -1,23 +1,26 @@
 """
 产品级 API - 导出管理
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Header, HTTPException
 from fastapi.responses import JSONResponse, FileResponse
 from pathlib import Path
 from typing import Optional
 import json
-import subprocess
+import shutil
 from datetime import datetime
 
-router = APIRouter(prefix="/api/exports", tags=["exports"])
+from ..core.job_paths import InvalidJobId, new_job_id, resolve_job_dir
+from ..core.job_queue import get_job_queue, will_retry
+from ..core.offload import run_blocking, run_subprocess
+from ..core.progress_bus import get_progress_bus, sse_response
+from ..core.status_store import get_status_store
+from ..tools.media_probe import get_media_probe
 
-# 导出任务状态
-export_tasks = {}
+router = APIRouter(prefix="/api/exports", tags=["exports"])
 
 
 @router.post("/")
 async def create_export(
-    background_tasks: BackgroundTasks,
     project_id: str,
     version: Optional[int] = None,
     quality: str = "1080p"
@@ -39,12 +42,12 @@ async def create_export(
     """
     try:
         # 1. 生成导出 ID
-        export_id = f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        export_id = new_job_id("export")
         
         # 2. 确定项目路径
-        project_path = Path("jobs") / project_id
+        project_path = resolve_job_dir(project_id)
         if version:
-            project_path = Path("jobs") / f"{project_id}_v{version}"
+            project_path = resolve_job_dir(f"{project_id}_v{version}")
         
         if not project_path.exists():
             raise HTTPException(status_code=404, detail="项目不存在")
@@ -55,7 +58,7 @@ async def create_export(
             raise HTTPException(status_code=404, detail="输出文件不存在，请先完成剪辑")
         
         # 4. 创建导出任务
-        export_tasks[export_id] = {
+        get_status_store().put("export", export_id, {
             "export_id": export_id,
             "project_id": project_id,
             "version": version,
@@ -65,22 +68,30 @@ async def create_export(
             "created_at": datetime.now().isoformat(),
             "source_path": str(output_path),
             "output_path": None
-        }
+        })
         
-        # 5. 启动后台导出
-        background_tasks.add_task(
-            export_video,
-            export_id,
-            str(output_path),
-            quality
+        # 5. 提交到任务队列（ffmpeg 转码，不需要 Resolve，但与其它 GPU 重任务互斥）
+        task_id = get_job_queue().enqueue(
+            "exports.export_video",
+            {
+                "export_id": export_id,
+                "source_path": str(output_path),
+                "quality": quality
+            },
+            resources=["CPU", "GPU_HEAVY"],
+            job_id=project_id
         )
+        update_export_task(export_id, task_id=task_id)
         
         return JSONResponse(content={
             "export_id": export_id,
+            "task_id": task_id,
             "status": "exporting",
             "message": "正在导出..."
         })
         
+    except (HTTPException, InvalidJobId):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建导出任务失败: {str(e)}")
 
@@ -94,10 +105,27 @@ async def export_video(export_id: str, source_path: str, quality: str):
         source_path: 源视频路径
         quality: 导出质量
     """
+    # 状态已过期清理后由队列重跑时补建
+    if get_status_store().get("export", export_id) is None:
+        get_status_store().put("export", export_id, {
+            "export_id": export_id,
+            "quality": quality,
+            "source_path": source_path,
+            "output_path": None
+        })
+    
     try:
-        # 更新状态
-        export_tasks[export_id]["status"] = "exporting"
-        export_tasks[export_id]["progress"] = 10
+        # 更新状态（重跑时清除上一次的失败）
+        update_export_task(export_id, status="exporting", progress=10, error=None)
+        
+        # 源文件信息（MediaProbe 缓存，同一成片多次导出只探测一次）
+        source_info = await run_blocking(get_media_probe().probe, source_path)
+        update_export_task(export_id, source_media={
+            "duration": source_info.duration,
+            "width": source_info.width,
+            "height": source_info.height,
+            "fps": source_info.fps
+        })
         
         # 确定输出路径
         exports_dir = Path("exports")
@@ -109,7 +137,7 @@ async def export_video(export_id: str, source_path: str, quality: str):
         # 根据质量设置参数
         if quality == "4k":
             # 4K 导出
-            export_tasks[export_id]["progress"] = 30
+            update_export_task(export_id, progress=30)
             cmd = [
                 "ffmpeg",
                 "-i", source_path,
@@ -125,34 +153,68 @@ async def export_video(export_id: str, source_path: str, quality: str):
             ]
         else:
             # 1080p 导出（默认）
-            export_tasks[export_id]["progress"] = 30
+            update_export_task(export_id, progress=30)
             # 如果源文件已经是 1080p，直接复制
-            import shutil
-            shutil.copy(source_path, output_path)
-            export_tasks[export_id]["progress"] = 90
+            await run_blocking(shutil.copy, source_path, output_path)
+            update_export_task(export_id, progress=90)
+            cmd = None
         
-        # 执行 ffmpeg（如果需要）
-        if quality == "4k":
-            process = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True
-            )
+        # 执行 ffmpeg（如果需要，异步子进程不阻塞事件循环）
+        if cmd:
+            process = await run_subprocess(cmd)
             
             if process.returncode != 0:
                 raise RuntimeError(f"导出失败: {process.stderr}")
             
-            export_tasks[export_id]["progress"] = 90
+            update_export_task(export_id, progress=90)
         
         # 完成
-        export_tasks[export_id]["status"] = "completed"
-        export_tasks[export_id]["progress"] = 100
-        export_tasks[export_id]["output_path"] = str(output_path)
-        export_tasks[export_id]["download_url"] = f"/api/exports/{export_id}/download"
+        update_export_task(
+            export_id,
+            status="completed",
+            progress=100,
+            output_path=str(output_path),
+            download_url=f"/api/exports/{export_id}/download"
+        )
         
     except Exception as e:
-        export_tasks[export_id]["status"] = "error"
-        export_tasks[export_id]["error"] = str(e)
+        # 任务队列还会重跑时只发布非终态 retrying
+        update_export_task(export_id, status="retrying" if will_retry(e) else "error", error=str(e))
+        raise
+
+
+def update_export_task(export_id: str, **fields):
+    """更新导出任务状态（共享状态存储）并推送给 SSE 订阅者"""
+    task = get_status_store().update("export", export_id, lambda current: current.update(fields))
+    if task is not None:
+        get_progress_bus().publish(export_id, "status", task)
+
+
+def get_export_task(export_id: str) -> dict:
+    """读取导出任务状态，不存在时 404"""
+    task = get_status_store().get("export", export_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    return task
+
+
+@router.get("/{export_id}/events")
+async def stream_export_events(
+    export_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID")
+):
+    """
+    导出进度事件流（Server-Sent Events，取代轮询 /status）
+    
+    事件: status（与 /status 返回内容相同）；状态为 completed / error 时流结束。
+    """
+    # 状态可能由其它 worker 更新，以共享存储为准
+    get_progress_bus().sync_snapshot(export_id, get_export_task(export_id))
+    
+    return sse_response(
+        export_id, last_event_id,
+        loader=lambda: get_status_store().get("export", export_id)
+    )
 
 
 @router.get("/{export_id}/status")
@@ -166,10 +228,7 @@ async def get_export_status(export_id: str):
     Returns:
         导出状态信息
     """
-    if export_id not in export_tasks:
-        raise HTTPException(status_code=404, detail="导出任务不存在")
-    
-    return JSONResponse(content=export_tasks[export_id])
+    return JSONResponse(content=get_export_task(export_id))
 
 
 @router.get("/{export_id}/download")
@@ -183,10 +242,7 @@ async def download_export(export_id: str):
     Returns:
         视频文件流
     """
-    if export_id not in export_tasks:
-        raise HTTPException(status_code=404, detail="导出任务不存在")
-    
-    task = export_tasks[export_id]
+    task = get_export_task(export_id)
     
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail="导出尚未完成")
@@ -214,10 +270,7 @@ async def delete_export(export_id: str):
     Returns:
         删除结果
     """
-    if export_id not in export_tasks:
-        raise HTTPException(status_code=404, detail="导出任务不存在")
-    
-    task = export_tasks[export_id]
+    task = get_export_task(export_id)
     
     # 删除文件
     if task.get("output_path"):
@@ -226,9 +279,14 @@ async def delete_export(export_id: str):
             output_path.unlink()
     
     # 删除任务
-    del export_tasks[export_id]
+    get_status_store().delete("export", export_id)
+    get_progress_bus().clear(export_id)
     
     return JSONResponse(content={
         "export_id": export_id,
         "message": "导出已删除"
     })
+
+
+# 注册队列任务处理函数
+get_job_queue().register("exports.export_video", export_video)
@@ -4,11 +4,11 @@ Ingest API 路由 - 素材预处理接口
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from pathlib import Path
 import shutil
-from datetime import datetime
 from typing import Optional
 
 from ..tools.media_ingest import MediaIngest
 from ..core.job_store import JobStore
+from ..core.offload import run_blocking
 
 router = APIRouter(prefix="/api/ingest", tags=["ingest"])
 
@@ -37,24 +37,26 @@ async def upload_video(
             "message": "..."
         }
     """
-    # 生成 job_id
-    if not job_id:
-        job_id = f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # 创建 job（未指定时生成时间有序的唯一 ID；指定的 ID 已存在时拒绝，避免两次上传共用目录）
+    try:
+        job_id = job_store.create_job(job_id)
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail=f"Job 已存在: {job_id}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # 创建 job 目录
-    job_path = ingest_manager.create_job(job_id)
+    job_path = job_store.job_dir(job_id)
     
     # 保存视频文件
-    video_path = job_path / "input" / video.filename
+    video_path = job_path / "input" / Path(video.filename).name
     
     try:
         with video_path.open("wb") as f:
             shutil.copyfileobj(video.file, f)
         
         # 记录 job
-        job_store.create_job(job_id, {
-            "video_path": str(video_path),
-            "status": "uploaded"
+        job_store.update_job(job_id, status="uploaded", extra={
+            "video_path": str(video_path)
         })
         
         return {
@@ -99,11 +101,13 @@ async def extract_audio(
         raise HTTPException(status_code=404, detail="视频文件不存在")
     
     # 提取音频
-    job_path = Path("jobs") / job_id
+    job_path = job_store.job_dir(job_id)
     audio_path = job_path / "temp" / f"{Path(video_path).stem}.{format}"
     
     try:
-        audio_output = ingest_manager.extract_audio(
+        # ffmpeg 解码 + 分析在线程池中执行，不阻塞事件循环
+        audio_output = await run_blocking(
+            ingest_manager.extract_audio,
             video_path,
             str(audio_path),
             format=format,
@@ -111,9 +115,8 @@ async def extract_audio(
         )
         
         # 更新 job
-        job_store.update_job(job_id, {
-            "audio_path": audio_output,
-            "status": "audio_extracted"
+        job_store.update_job(job_id, status="audio_extracted", extra={
+            "audio_path": audio_output
         })
         
         return {
@@ -152,7 +155,7 @@ async def get_scene_detection_info(job_id: str = Form(...)):
     return {
         "job_id": job_id,
         "scene_detection_info": info,
-        "edl_save_path": str(Path("jobs") / job_id / "input"),
+        "edl_save_path": str(job_store.job_dir(job_id) / "input"),
         "message": "请在 DaVinci Resolve 中完成场景切点检测"
     }
 
@@ -182,7 +185,7 @@ async def upload_edl(
         raise HTTPException(status_code=404, detail=f"Job 不存在: {job_id}")
     
     # 保存 EDL 文件
-    job_path = Path("jobs") / job_id
+    job_path = job_store.job_dir(job_id)
     edl_path = job_path / "input" / edl_file.filename
     
     try:
@@ -190,9 +193,8 @@ async def upload_edl(
             shutil.copyfileobj(edl_file.file, f)
         
         # 更新 job
-        job_store.update_job(job_id, {
-            "edl_path": str(edl_path),
-            "status": "edl_uploaded"
+        job_store.update_job(job_id, status="edl_uploaded", extra={
+            "edl_path": str(edl_path)
         })
         
         return {
@@ -1,13 +1,14 @@
 """
 Job 管理 API 路由
 """
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
-import subprocess
 from typing import Optional
 
 from ..core.job_store import JobStore
+from ..core.offload import run_subprocess
+from ..core.progress_bus import get_progress_bus, sse_response
 
 router = APIRouter(prefix="/api/jobs", tags=["jobs"])
 
@@ -75,13 +76,34 @@ async def get_job_status(job_id: str):
     }
 
 
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID")
+):
+    """
+    job 进度事件流（Server-Sent Events，取代轮询 GET /{job_id}）
+    
+    事件:
+        status  JobStore.update_job / transition_state 写入后的状态快照
+        state   Orchestrator 状态机切换
+    状态为 completed / failed 时流结束。
+    Last-Event-ID 只能在同一进程内补发事件，重连到其它 worker 或服务重启后改发最新快照。
+    """
+    if get_progress_bus().get_snapshot(job_id) is None and not job_store.publish_status(job_id):
+        raise HTTPException(status_code=404, detail=f"Job 不存在: {job_id}")
+    
+    return sse_response(job_id, last_event_id)
+
+
 @router.get("/{job_id}/artifacts")
-async def get_job_artifacts(job_id: str):
+async def get_job_artifacts(job_id: str, refresh: bool = False):
     """
     获取 job 的所有产物文件列表
     
     Args:
         job_id: job 标识
+        refresh: 忽略索引，强制重新扫描目录
     
     Returns:
         {
@@ -96,7 +118,7 @@ async def get_job_artifacts(job_id: str):
         raise HTTPException(status_code=404, detail=f"Job 不存在: {job_id}")
     
     # 获取 artifacts
-    artifacts = job_store.get_job_artifacts(job_id)
+    artifacts = job_store.get_job_artifacts(job_id, refresh=refresh)
     
     return artifacts
 
@@ -153,7 +175,7 @@ async def get_job_preview(
         raise HTTPException(status_code=404, detail=f"Job 不存在: {job_id}")
     
     # 查找输出视频
-    job_dir = Path("jobs") / job_id
+    job_dir = job_store.job_dir(job_id)
     output_dir = job_dir / "output"
     
     # 查找 final.mp4 或其他视频文件
@@ -226,7 +248,7 @@ async def download_artifact(
         raise HTTPException(status_code=400, detail="无效的类别")
     
     # 构建文件路径
-    file_path = Path("jobs") / job_id / category / filename
+    file_path = job_store.job_dir(job_id) / category / Path(filename).name
     
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="文件不存在")
@@ -280,12 +302,8 @@ async def generate_preview(
         output_path
     ]
     
-    # 执行 ffmpeg
-    process = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True
-    )
+    # 执行 ffmpeg（异步子进程，转码期间事件循环照常响应其它请求）
+    process = await run_subprocess(cmd)
     
     if process.returncode != 0:
         raise RuntimeError(f"ffmpeg 执行失败: {process.stderr}")
@@ -324,19 +342,58 @@ async def delete_job(job_id: str):
 
 
 @router.get("/")
-async def list_jobs(limit: int = 50):
+async def list_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    state: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None
+):
     """
-    列出所有 jobs
+    分页列出 jobs（走任务索引，按创建时间倒序）
     
     Args:
-        limit: 返回数量限制
+        limit: 每页数量
+        offset: 偏移量
+        state: 按当前状态过滤（如 COMPLETED）
+        status: 按 status 过滤
+        created_after: 创建时间下限（ISO 时间或日期，含）
+        created_before: 创建时间上限（ISO 时间或日期，不含）
     
     Returns:
-        jobs 列表
+        {"total": 符合条件的总数, "limit": ..., "offset": ..., "jobs": [...]}
     """
-    jobs = job_store.list_jobs(limit=limit)
+    filters = {
+        "state": state,
+        "status": status,
+        "created_after": created_after,
+        "created_before": created_before
+    }
+    jobs = job_store.list_jobs(limit=limit, offset=offset, **filters)
     
     return {
-        "total": len(jobs),
+        "total": job_store.count_jobs(**filters),
+        "limit": limit,
+        "offset": offset,
         "jobs": jobs
     }
+
+
+@router.get("/index/stats")
+async def get_job_index_stats():
+    """任务索引统计（各状态数量、命中情况）"""
+    return {
+        **job_store.index.get_stats(),
+        "by_state": job_store.index.count_by_state()
+    }
+
+
+@router.post("/index/rebuild")
+async def rebuild_job_index():
+    """从磁盘上的 job 目录重建任务索引"""
+    count = job_store.rebuild_index()
+    return {
+        "jobs": count,
+        "message": "任务索引已重建"
+    }
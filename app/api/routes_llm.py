@@ -1,14 +1,75 @@
 """LLM 相关 API 路由 - AI 生成剪辑脚本"""
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
 import json
+import time
 from pathlib import Path
+from typing import AsyncIterator, Tuple
+from ..config import settings
 from ..core.llm_engine import LLMDirector
+from ..core.offload import run_blocking, run_llm
 from ..models.schemas import ScenesJSON, TranscriptJSON, DSLValidator
 
 
 router = APIRouter()
 
+# 预设的剪辑风格（/style-presets 返回，/batch-generate 按 key 引用）
+STYLE_PRESETS = {
+    "douyin": {
+        "name": "抖音爆款",
+        "description": "节奏快、文字多、强调关键词",
+        "prompt": """
+抖音爆款风格：
+1. 开头 3 秒必须有强烈的 Hook（钩子）
+2. 节奏快，每 3-5 秒切换画面或文字
+3. 删除所有废话、停顿、重复内容
+4. 文字叠加要简短有力（5-8 字）
+5. 强调数字和对比
+6. 总时长 30-60 秒
+"""
+    },
+    "bilibili": {
+        "name": "B站知识区",
+        "description": "节奏适中、字幕完整、强调知识点",
+        "prompt": """
+B站知识区风格：
+1. 开头简短介绍主题
+2. 节奏适中，每 5-10 秒切换画面
+3. 保留完整的讲解内容
+4. 字幕完整，突出关键知识点
+5. 适当添加图表和示例
+6. 总时长 3-10 分钟
+"""
+    },
+    "youtube": {
+        "name": "YouTube Vlog",
+        "description": "自然流畅、保留情感、适度剪辑",
+        "prompt": """
+YouTube Vlog 风格：
+1. 保持自然的节奏和情感
+2. 删除明显的废话和停顿
+3. 保留有趣的瞬间和反应
+4. 字幕简洁，不遮挡画面
+5. 适当添加转场和音乐
+6. 总时长 5-15 分钟
+"""
+    },
+    "kuaishou": {
+        "name": "快手热门",
+        "description": "接地气、情感强、节奏紧凑",
+        "prompt": """
+快手热门风格：
+1. 开头直接切入主题
+2. 节奏紧凑，保持高能
+3. 强调情感和共鸣
+4. 文字大而醒目
+5. 多用对比和反转
+6. 总时长 15-60 秒
+"""
+    }
+}
+
 
 @router.post("/generate-dsl")
 async def generate_dsl(
@@ -17,7 +78,8 @@ async def generate_dsl(
     style_prompt: str = Form(
         default="抖音爆款风格：节奏快、文字多、强调关键词",
         description="剪辑风格描述"
-    )
+    ),
+    no_cache: bool = Form(False, description="跳过 LLM 回复缓存重新生成（输入不变时默认返回上次的结果）")
 ):
     """
     AI 生成剪辑脚本
@@ -51,8 +113,8 @@ async def generate_dsl(
         transcript = TranscriptJSON(**transcript_data)
         
         # 3. 调用 LLM 生成 DSL
-        director = LLMDirector()
-        dsl = director.generate_editing_dsl(scenes, transcript, style_prompt)
+        director = LLMDirector(use_cache=not no_cache)
+        dsl = await run_llm(director.generate_editing_dsl, scenes, transcript, style_prompt)
         
         # 4. 验证生成的 DSL
         errors = DSLValidator.validate_dsl_against_scenes(dsl, scenes_data)
@@ -76,7 +138,9 @@ async def generate_dsl(
                     "scenes_count": len(scenes.scenes),
                     "transcript_segments": len(transcript.segments),
                     "timeline_items": len(dsl["editing_plan"]["timeline"]),
-                    "style": style_prompt
+                    "style": style_prompt,
+                    "prompt": director.last_prompt_stats.to_dict(),
+                    "plan": director.last_plan_stats.to_dict() if director.last_plan_stats else None
                 }
             }
         )
@@ -153,74 +217,23 @@ async def get_style_presets():
     
     返回常用的风格描述模板
     """
-    presets = {
-        "douyin": {
-            "name": "抖音爆款",
-            "description": "节奏快、文字多、强调关键词",
-            "prompt": """
-抖音爆款风格：
-1. 开头 3 秒必须有强烈的 Hook（钩子）
-2. 节奏快，每 3-5 秒切换画面或文字
-3. 删除所有废话、停顿、重复内容
-4. 文字叠加要简短有力（5-8 字）
-5. 强调数字和对比
-6. 总时长 30-60 秒
-"""
-        },
-        "bilibili": {
-            "name": "B站知识区",
-            "description": "节奏适中、字幕完整、强调知识点",
-            "prompt": """
-B站知识区风格：
-1. 开头简短介绍主题
-2. 节奏适中，每 5-10 秒切换画面
-3. 保留完整的讲解内容
-4. 字幕完整，突出关键知识点
-5. 适当添加图表和示例
-6. 总时长 3-10 分钟
-"""
-        },
-        "youtube": {
-            "name": "YouTube Vlog",
-            "description": "自然流畅、保留情感、适度剪辑",
-            "prompt": """
-YouTube Vlog 风格：
-1. 保持自然的节奏和情感
-2. 删除明显的废话和停顿
-3. 保留有趣的瞬间和反应
-4. 字幕简洁，不遮挡画面
-5. 适当添加转场和音乐
-6. 总时长 5-15 分钟
-"""
-        },
-        "kuaishou": {
-            "name": "快手热门",
-            "description": "接地气、情感强、节奏紧凑",
-            "prompt": """
-快手热门风格：
-1. 开头直接切入主题
-2. 节奏紧凑，保持高能
-3. 强调情感和共鸣
-4. 文字大而醒目
-5. 多用对比和反转
-6. 总时长 15-60 秒
-"""
-        }
-    }
-    
-    return JSONResponse(content={"presets": presets})
+    return JSONResponse(content={"presets": STYLE_PRESETS})
 
 
 @router.post("/batch-generate")
 async def batch_generate_dsl(
     scenes_file: UploadFile = File(...),
     transcript_file: UploadFile = File(...),
-    styles: str = Form(..., description="风格列表，逗号分隔，如: douyin,bilibili,youtube")
+    styles: str = Form(..., description="风格列表，逗号分隔，如: douyin,bilibili,youtube"),
+    stream: bool = Form(False, description="以 SSE 返回：每个风格完成时推送一条 result 事件，最后推送 done")
 ):
     """
     批量生成多个风格的 DSL
     
-    一次性生成多个平台的剪辑脚本
+    一次性生成多个平台的剪辑脚本：
+    - 各风格并发生成（LLM_BATCH_CONCURRENCY），单个风格超时（LLM_BATCH_STYLE_TIMEOUT_SEC）只影响该风格
+    - 素材只编码一次，各风格共享系统提示词和用户消息前缀（只有末尾的风格要求不同），
+      支持 prompt 缓存的服务可以复用这部分
     
     示例：
     ```bash
@@ -228,6 +241,13 @@ async def batch_generate_dsl(
       -F "scenes_file=@examples/scenes.v1.json" \
       -F "transcript_file=@examples/transcript.v1.json" \
       -F "styles=douyin,bilibili,youtube"
+    
+    # 每个风格完成时立即返回
+    curl -N -X POST http://localhost:8000/api/llm/batch-generate \
+      -F "scenes_file=@examples/scenes.v1.json" \
+      -F "transcript_file=@examples/transcript.v1.json" \
+      -F "styles=douyin,bilibili,youtube" \
+      -F "stream=true"
     ```
     """
     try:
@@ -241,41 +261,123 @@ async def batch_generate_dsl(
         scenes = ScenesJSON(**scenes_data)
         transcript = TranscriptJSON(**transcript_data)
         
-        # 获取风格预设
-        presets_response = await get_style_presets()
-        presets = json.loads(presets_response.body)["presets"]
+        style_keys = list(dict.fromkeys(key.strip() for key in styles.split(",") if key.strip()))
+        style_prompts = {key: STYLE_PRESETS[key]["prompt"] for key in style_keys if key in STYLE_PRESETS}
+        unknown = {key: {"error": f"未知风格: {key}"} for key in style_keys if key not in STYLE_PRESETS}
         
-        # 批量生成
+        # 素材只编码一次
         director = LLMDirector()
-        results = {}
-        
-        for style_key in styles.split(","):
-            style_key = style_key.strip()
-            
-            if style_key not in presets:
-                results[style_key] = {"error": f"未知风格: {style_key}"}
-                continue
-            
-            try:
-                style_prompt = presets[style_key]["prompt"]
-                dsl = director.generate_editing_dsl(scenes, transcript, style_prompt)
-                
-                # 验证
-                errors = DSLValidator.validate_dsl_against_scenes(dsl, scenes_data)
-                
-                results[style_key] = {
-                    "success": len(errors) == 0,
-                    "dsl": dsl,
-                    "validation_errors": errors if errors else None
-                }
-                
-            except Exception as e:
-                results[style_key] = {"error": str(e)}
-        
-        return JSONResponse(content={"results": results})
+        prompts = await run_blocking(director.build_prompts, scenes, transcript, style_prompts)
         
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"批量生成失败: {str(e)}"
         )
+    
+    t0 = time.perf_counter()
+    results = _generate_styles(scenes, transcript, scenes_data, style_prompts, prompts)
+    
+    def batch_meta() -> dict:
+        shared = next(iter(prompts.values()), None)
+        return {
+            "styles": len(style_keys),
+            "concurrency": settings.LLM_BATCH_CONCURRENCY,
+            "elapsed_sec": round(time.perf_counter() - t0, 2),
+            "prompt": shared.stats.to_dict() if shared else None
+        }
+    
+    if stream:
+        async def events():
+            try:
+                for key, result in unknown.items():
+                    yield _sse("result", {"style": key, **result})
+                async for key, result in results:
+                    yield _sse("result", {"style": key, **result})
+                yield _sse("done", batch_meta())
+            finally:
+                await results.aclose()
+        
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    completed = dict(unknown)
+    async for key, result in results:
+        completed[key] = result
+    
+    return JSONResponse(content={
+        "results": {key: completed[key] for key in style_keys},
+        "meta": batch_meta()
+    })
+
+
+async def _generate_styles(
+    scenes: ScenesJSON,
+    transcript: TranscriptJSON,
+    scenes_data: dict,
+    style_prompts: dict,
+    prompts: dict
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    并发生成各风格的 DSL，按完成顺序产出 (风格, 结果)；提前关闭时取消未完成的风格
+    
+    每个风格用自己的 LLMDirector（last_prompt_stats / last_plan_stats 不在线程间共享）。
+    单风格超时同时作为截止时间传给 LLM 线程：过期后不再发起初筛 / 成片请求和重试，
+    进行中的请求也以剩余时间为超时。超时的风格立即返回结果，但并发名额在 LLM 线程真正
+    返回后才释放，同时在跑的 LLM 调用不超过 LLM_BATCH_CONCURRENCY 个风格。
+    """
+    semaphore = asyncio.Semaphore(settings.LLM_BATCH_CONCURRENCY)
+    timeout = settings.LLM_BATCH_STYLE_TIMEOUT_SEC
+    
+    def release_slot(work: asyncio.Future):
+        semaphore.release()
+        if not work.cancelled():
+            work.exception()  # 超时后才结束的调用，结果已不需要
+    
+    async def run_style(key: str) -> Tuple[str, dict]:
+        await semaphore.acquire()
+        t0 = time.perf_counter()
+        work = None
+        try:
+            director = LLMDirector()
+            work = asyncio.ensure_future(run_llm(
+                director.generate_editing_dsl,
+                scenes,
+                transcript,
+                style_prompts[key],
+                prompt=prompts[key],
+                timeout=timeout,
+                deadline=time.monotonic() + timeout
+            ))
+            work.add_done_callback(release_slot)
+            dsl = await asyncio.wait_for(asyncio.shield(work), timeout)
+            errors = DSLValidator.validate_dsl_against_scenes(dsl, scenes_data)
+            result = {
+                "success": len(errors) == 0,
+                "dsl": dsl,
+                "validation_errors": errors if errors else None
+            }
+        except asyncio.TimeoutError:
+            result = {"error": f"生成超时（{timeout:g}s）", "timeout": True}
+        except Exception as e:
+            result = {"error": str(e)}
+        finally:
+            if work is None:
+                semaphore.release()
+        result["elapsed_sec"] = round(time.perf_counter() - t0, 2)
+        return key, result
+    
+    tasks = [asyncio.create_task(run_style(key)) for key in style_prompts]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
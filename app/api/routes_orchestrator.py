@@ -7,6 +7,7 @@ from typing import Optional
 
 from ..core.orchestrator import get_orchestrator, JobState
 from ..core.job_store import JobStore
+from ..core.job_queue import get_job_queue
 
 router = APIRouter(prefix="/api/orchestrator", tags=["orchestrator"])
 job_store = JobStore()
@@ -20,6 +21,8 @@ async def get_system_status():
     Returns:
         {
             "resource_locks": {...},
+            "resource_stats": {"GPU_HEAVY": {"capacity": 1, "in_use": 0, "waiting": 0,
+                                             "wait_ms": {...}, "hold_ms": {...}}, ...},
             "active_jobs": {...},
             "system": {...}
         }
@@ -120,16 +123,19 @@ async def release_resource_locks(resource: Optional[str] = None):
     orchestrator = get_orchestrator()
     
     if resource:
-        orchestrator.resource_lock.release(resource)
+        try:
+            orchestrator.resource_lock.reset(resource)
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"未知资源: {resource}")
         released = [resource]
     else:
-        # 释放所有锁
+        # 释放所有持有者（排队中的请求随后获得资源）
         for res in ["GPU_HEAVY", "RESOLVE_BUSY"]:
-            orchestrator.resource_lock.release(res)
+            orchestrator.resource_lock.reset(res)
         
         # 重新启用 Vision 和 AI
-        orchestrator.resource_lock.acquire("VISION_ALLOWED")
-        orchestrator.resource_lock.acquire("AI_ALLOWED")
+        orchestrator.resource_lock.enable("VISION_ALLOWED")
+        orchestrator.resource_lock.enable("AI_ALLOWED")
         
         released = ["GPU_HEAVY", "RESOLVE_BUSY"]
     
@@ -140,6 +146,42 @@ async def release_resource_locks(resource: Optional[str] = None):
     })
 
 
+@router.get("/queue")
+async def get_queue_status(status: Optional[str] = None, limit: int = 50):
+    """
+    任务队列状态
+    
+    Args:
+        status: 按任务状态过滤（queued, running, done, failed, cancelled）
+        limit: 返回任务数上限
+    
+    Returns:
+        {
+            "stats": {"slots": {...}, "tasks": {"queued": 2, ...}},
+            "tasks": [...]
+        }
+    """
+    job_queue = get_job_queue()
+    return JSONResponse(content={
+        "stats": job_queue.get_stats(),
+        "tasks": [task.to_dict() for task in job_queue.list_tasks(status=status, limit=limit)]
+    })
+
+
+@router.delete("/queue/{task_id}")
+async def cancel_queued_task(task_id: str):
+    """取消排队中的任务（执行中的任务不能取消）"""
+    job_queue = get_job_queue()
+    task = job_queue.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    if not job_queue.cancel(task_id):
+        raise HTTPException(status_code=409, detail=f"任务状态为 {task.status}，无法取消")
+    
+    return JSONResponse(content={"success": True, "task_id": task_id})
+
+
 @router.get("/health")
 async def health_check():
     """
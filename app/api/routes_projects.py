@@ -2,17 +2,23 @@
 产品级 API - 项目管理
 用户友好的 API，隐藏所有技术细节
 """
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
 from fastapi.responses import JSONResponse, FileResponse
-from pathlib import Path
 from typing import Optional, Dict, Any
 import json
 import shutil
 from datetime import datetime
 import asyncio
 
+from ..config import settings
+from ..core.job_paths import InvalidJobId, find_job_dirs, new_job_id, resolve_job_dir
+from ..core.job_queue import get_job_queue, will_retry
+from ..core.orchestrator import JobState
+from ..core.progress_bus import get_progress_bus, sse_response
+from ..core.status_store import get_status_store
 from ..core.ui_translator import get_translator
 from ..core.llm_engine import LLMDirector
+from ..core.offload import run_llm
 from ..core.job_store import JobStore
 from ..tools.media_ingest import MediaIngest
 from ..tools.bgm_library import BGMLibrary
@@ -30,13 +36,8 @@ bgm_library = BGMLibrary()
 resolve_importer = get_importer()
 
 
-# 全局项目状态存储（生产环境应使用 Redis）
-project_status = {}
-
-
 @router.post("/create")
 async def create_project(
-    background_tasks: BackgroundTasks,
     video: UploadFile = File(...),
     platform: str = Form(...),
     style: str = Form(...),
@@ -90,10 +91,10 @@ async def create_project(
         
         print("✅ 达芬奇状态检查通过")
         # 1. 生成项目 ID
-        project_id = f"proj_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        project_id = new_job_id("proj")
         
         # 2. 创建项目目录
-        project_path = Path("jobs") / project_id
+        project_path = resolve_job_dir(project_id)
         project_path.mkdir(parents=True, exist_ok=True)
         (project_path / "input").mkdir(exist_ok=True)
         (project_path / "temp").mkdir(exist_ok=True)
@@ -140,7 +141,7 @@ async def create_project(
             json.dump(project_meta, f, indent=2, ensure_ascii=False)
         
         # 7. 初始化项目状态 (配合 7-Stage Workflow)
-        project_status[project_id] = {
+        get_status_store().put("project", project_id, {
             "status": "processing",
             "progress": 5,
             "current_step": "setup",
@@ -154,19 +155,25 @@ async def create_project(
                 {"name": "export", "status": "pending", "message": "最终导出"}       # Stage 6
             ],
             "estimated_remaining": 180
-        }
-        
-        # 8. 启动后台处理任务
-        background_tasks.add_task(
-            process_project,
-            project_id,
-            str(video_path),
-            initial_prompt,
-            music_preference
+        })
+        publish_project_status(project_id)
+        
+        # 8. 提交到任务队列（Resolve 空闲时执行，服务重启后继续）
+        task_id = get_job_queue().enqueue(
+            "projects.process",
+            {
+                "project_id": project_id,
+                "video_path": str(video_path),
+                "prompt": initial_prompt,
+                "music_preference": music_preference
+            },
+            state=JobState.EXECUTING,
+            job_id=project_id
         )
         
         return JSONResponse(content={
             "project_id": project_id,
+            "task_id": task_id,
             "status": "processing",
             "message": "项目创建成功，正在处理中..."
         })
@@ -188,18 +195,19 @@ async def process_project(
     """
     from ..core.workflow_orchestrator import WorkflowOrchestrator, WorkflowStage
     
-    project_path = Path("jobs") / project_id
-    orchestrator = WorkflowOrchestrator(project_id, Path("jobs"))
+    project_path = resolve_job_dir(project_id)
+    orchestrator = WorkflowOrchestrator(project_id, project_path.parent)
     
     # 状态映射辅助函数
     def update_stage_status(stage_name, progress, message):
         update_project_status(project_id, stage_name, progress, message)
 
     # Debug Log Setup
-    debug_log = Path("jobs") / "backend_debug.log"
+    debug_log = settings.JOBS_DIR / "backend_debug.log"
     def log(msg):
         with open(debug_log, "a", encoding="utf-8") as f:
             f.write(f"[{datetime.now().isoformat()}] {msg}\n")
+        get_progress_bus().publish(project_id, "log", {"message": msg})
 
     try:
         log(f"START process_project: {project_id}")
@@ -293,6 +301,10 @@ async def process_project(
     except Exception as e:
         import traceback
         traceback.print_exc()
+        if will_retry(e):
+            # 任务队列会重跑：只发布非终态，SSE 流和前端继续等待
+            update_project_status(project_id, "retrying", 0, f"处理失败，稍后重试: {str(e)}")
+            raise
         update_project_status(project_id, "error", 0, f"处理失败: {str(e)}")
         
         meta_path = project_path / "project_meta.json"
@@ -303,6 +315,8 @@ async def process_project(
                 project_meta["error"] = str(e)
             with meta_path.open("w", encoding="utf-8") as f:
                 json.dump(project_meta, f, indent=2, ensure_ascii=False)
+        # 交给任务队列记录失败
+        raise
 
 
 def update_project_status(
@@ -311,14 +325,32 @@ def update_project_status(
     progress: int,
     message: str
 ):
-    """更新项目状态"""
-    if project_id not in project_status:
-        return
-    
-    status = project_status[project_id]
+    """更新项目状态（写入共享状态存储，多个 worker 看到同一份）"""
+    status = get_status_store().update(
+        "project", project_id,
+        lambda current: _apply_step(current, step, progress, message)
+    )
+    if status is not None:
+        publish_project_status(project_id, status)
+
+
+def _apply_step(status: Dict[str, Any], step: str, progress: int, message: str):
+    """把当前步骤写入状态字典（原地修改）"""
     status["progress"] = progress
     status["current_step"] = step
     
+    # completed / error 是终态；retrying 表示任务队列稍后重跑
+    if step in ("completed", "error", "retrying"):
+        status["status"] = step
+        status["error"] = None if step == "completed" else message
+        if step == "completed":
+            for s in status["steps"]:
+                s["status"] = "completed"
+    else:
+        # 重跑开始后不再显示上一次的失败
+        status["status"] = "processing"
+        status["error"] = None
+    
     # 更新步骤状态
     steps = status["steps"]
     try:
@@ -341,6 +373,57 @@ def update_project_status(
     status["estimated_remaining"] = remaining
 
 
+def load_project_status(project_id: str) -> Optional[Dict[str, Any]]:
+    """从共享状态存储读取项目状态（带 project_id，与 /status 返回一致）"""
+    status = get_status_store().get("project", project_id)
+    if status is None:
+        return None
+    return {"project_id": project_id, **status}
+
+
+def publish_project_status(project_id: str, status: Optional[Dict[str, Any]] = None):
+    """把项目状态推送给 SSE 订阅者"""
+    if status is None:
+        status = get_status_store().get("project", project_id)
+        if status is None:
+            return
+    get_progress_bus().publish(project_id, "status", {"project_id": project_id, **status})
+
+
+@router.get("/{project_id}/events")
+async def stream_project_events(
+    project_id: str,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID")
+):
+    """
+    项目进度事件流（Server-Sent Events，取代轮询 /status）
+    
+    事件: status（状态快照，含 steps）、log（处理日志）；状态为 completed / error 时流结束。
+    断线后浏览器会带 Last-Event-ID 自动重连，补发错过的事件。
+    """
+    bus = get_progress_bus()
+    status = load_project_status(project_id)
+    if status is not None:
+        # 状态可能由其它 worker 更新，以共享存储为准
+        bus.sync_snapshot(project_id, status)
+    elif bus.get_snapshot(project_id) is None:
+        # 状态已过期清理：用 project_meta.json 发一条快照，终态时流立即结束
+        meta_path = resolve_job_dir(project_id) / "project_meta.json"
+        if not meta_path.exists():
+            raise HTTPException(status_code=404, detail="项目不存在")
+        with meta_path.open("r", encoding="utf-8") as f:
+            project_meta = json.load(f)
+        bus.publish(project_id, "status", {
+            "project_id": project_id,
+            "status": project_meta.get("status", "unknown"),
+            "progress": 100 if project_meta.get("status") == "completed" else 0,
+            "current_step": project_meta.get("current_step", "unknown"),
+            "error": project_meta.get("error")
+        })
+    
+    return sse_response(project_id, last_event_id, loader=lambda: load_project_status(project_id))
+
+
 @router.get("/{project_id}/status")
 async def get_project_status(project_id: str):
     """
@@ -352,15 +435,13 @@ async def get_project_status(project_id: str):
     Returns:
         项目状态信息
     """
-    # 从内存获取实时状态
-    if project_id in project_status:
-        return JSONResponse(content={
-            "project_id": project_id,
-            **project_status[project_id]
-        })
+    # 从共享状态存储获取实时状态
+    status = load_project_status(project_id)
+    if status is not None:
+        return JSONResponse(content=status)
     
     # 从文件获取持久化状态
-    project_path = Path("jobs") / project_id
+    project_path = resolve_job_dir(project_id)
     meta_path = project_path / "project_meta.json"
     
     if not meta_path.exists():
@@ -389,11 +470,11 @@ async def get_project(project_id: str, version: Optional[int] = None):
     Returns:
         项目详细信息
     """
-    project_path = Path("jobs") / project_id
+    project_path = resolve_job_dir(project_id)
     
     # 如果指定了版本，使用版本路径
     if version:
-        project_path = Path("jobs") / f"{project_id}_v{version}"
+        project_path = resolve_job_dir(f"{project_id}_v{version}")
     
     meta_path = project_path / "project_meta.json"
     
@@ -429,10 +510,10 @@ async def get_project_preview(
     Returns:
         视频文件流
     """
-    project_path = Path("jobs") / project_id
+    project_path = resolve_job_dir(project_id)
     
     if version:
-        project_path = Path("jobs") / f"{project_id}_v{version}"
+        project_path = resolve_job_dir(f"{project_id}_v{version}")
     
     preview_path = project_path / "temp" / f"preview_{quality}.mp4"
     
@@ -450,7 +531,6 @@ async def get_project_preview(
 @router.post("/{project_id}/adjust")
 async def adjust_project(
     project_id: str,
-    background_tasks: BackgroundTasks,
     adjustments: Dict[str, str]
 ):
     """
@@ -472,7 +552,7 @@ async def adjust_project(
     """
     try:
         # 1. 获取原项目信息
-        project_path = Path("jobs") / project_id
+        project_path = resolve_job_dir(project_id)
         meta_path = project_path / "project_meta.json"
         
         if not meta_path.exists():
@@ -486,7 +566,7 @@ async def adjust_project(
         new_version = current_version + 1
         
         # 3. 创建新版本目录
-        new_project_path = Path("jobs") / f"{project_id}_v{new_version}"
+        new_project_path = resolve_job_dir(f"{project_id}_v{new_version}")
         new_project_path.mkdir(parents=True, exist_ok=True)
         (new_project_path / "temp").mkdir(exist_ok=True)
         (new_project_path / "output").mkdir(exist_ok=True)
@@ -514,7 +594,7 @@ async def adjust_project(
         
         # 7. 初始化新版本状态
         new_project_id = f"{project_id}_v{new_version}"
-        project_status[new_project_id] = {
+        get_status_store().put("project", new_project_id, {
             "status": "processing",
             "progress": 10,
             "current_step": "dsl_generation",
@@ -524,23 +604,31 @@ async def adjust_project(
                 {"name": "preview_generation", "status": "pending", "message": "等待中"}
             ],
             "estimated_remaining": 60
-        }
-        
-        # 8. 启动后台处理
-        background_tasks.add_task(
-            reprocess_project,
-            new_project_id,
-            new_prompt,
-            project_meta.get("user_preferences", {}).get("music_preference", "emotional")
+        })
+        publish_project_status(new_project_id)
+        
+        # 8. 提交到任务队列（只重新生成 DSL，按规划阶段分配资源）
+        task_id = get_job_queue().enqueue(
+            "projects.reprocess",
+            {
+                "project_id": new_project_id,
+                "prompt": new_prompt,
+                "music_preference": project_meta.get("user_preferences", {}).get("music_preference", "emotional")
+            },
+            state=JobState.PLANNING,
+            job_id=new_project_id
         )
         
         return JSONResponse(content={
             "project_id": project_id,
             "new_version": new_version,
+            "task_id": task_id,
             "status": "processing",
             "message": "正在重新生成..."
         })
         
+    except (HTTPException, InvalidJobId):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"调整失败: {str(e)}")
 
@@ -551,7 +639,7 @@ async def reprocess_project(
     music_preference: str
 ):
     """重新处理项目（仅重新生成 DSL 和执行）"""
-    project_path = Path("jobs") / project_id
+    project_path = resolve_job_dir(project_id)
     
     try:
         # 读取 scenes 和 transcript
@@ -575,7 +663,7 @@ async def reprocess_project(
             )
         
         director = LLMDirector()
-        dsl = director.generate_editing_dsl(scenes, transcript, prompt, bgm_library=bgm_lib)
+        dsl = await run_llm(director.generate_editing_dsl, scenes, transcript, prompt, bgm_library=bgm_lib)
         
         dsl_path = project_path / "temp" / "editing_dsl.json"
         with dsl_path.open("w", encoding="utf-8") as f:
@@ -603,7 +691,11 @@ async def reprocess_project(
             json.dump(project_meta, f, indent=2, ensure_ascii=False)
         
     except Exception as e:
-        update_project_status(project_id, "error", 0, f"处理失败: {str(e)}")
+        if will_retry(e):
+            update_project_status(project_id, "retrying", 0, f"处理失败，稍后重试: {str(e)}")
+        else:
+            update_project_status(project_id, "error", 0, f"处理失败: {str(e)}")
+        raise
 
 
 @router.get("/{project_id}/versions")
@@ -618,10 +710,9 @@ async def get_project_versions(project_id: str):
         版本列表
     """
     versions = []
-    jobs_dir = Path("jobs")
     
     # 查找所有版本
-    for path in jobs_dir.glob(f"{project_id}*"):
+    for path in find_job_dirs(project_id):
         if path.is_dir():
             meta_path = path / "project_meta.json"
             if meta_path.exists():
@@ -661,19 +752,16 @@ async def delete_project(project_id: str):
         删除结果
     """
     try:
-        jobs_dir = Path("jobs")
         deleted_count = 0
         
         # 删除所有版本
-        for path in jobs_dir.glob(f"{project_id}*"):
+        for path in find_job_dirs(project_id):
             if path.is_dir():
                 shutil.rmtree(path)
                 deleted_count += 1
         
-        # 清理内存状态
-        keys_to_remove = [k for k in project_status.keys() if k.startswith(project_id)]
-        for key in keys_to_remove:
-            del project_status[key]
+        # 清理状态（含各版本）
+        get_status_store().delete_prefix("project", project_id)
         
         return JSONResponse(content={
             "project_id": project_id,
@@ -681,5 +769,12 @@ async def delete_project(project_id: str):
             "message": "项目已删除"
         })
         
+    except InvalidJobId:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
+
+
+# 注册队列任务处理函数
+get_job_queue().register("projects.process", process_project)
+get_job_queue().register("projects.reprocess", reprocess_project)
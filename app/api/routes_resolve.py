@@ -6,8 +6,8 @@ from fastapi.responses import JSONResponse
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 import shutil
-from datetime import datetime
 
+from ..core.job_paths import new_job_id, resolve_job_dir
 from ..tools.resolve_importer import get_importer
 
 router = APIRouter(prefix="/api/resolve", tags=["resolve"])
@@ -161,11 +161,11 @@ async def upload_and_detect(
     try:
         # 1. 确定保存路径
         if project_id:
-            save_dir = Path("jobs") / project_id / "input"
+            save_dir = resolve_job_dir(project_id) / "input"
         else:
             # 创建临时目录
-            temp_id = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            save_dir = Path("jobs") / temp_id / "input"
+            temp_id = new_job_id("temp")
+            save_dir = resolve_job_dir(temp_id) / "input"
         
         save_dir.mkdir(parents=True, exist_ok=True)
         
@@ -20,6 +20,10 @@ from ..core.execution_policy import (
     degrade_execution_policy
 )
 from ..core.runtime_monitor import get_runtime_monitor
+from ..core.llm_cache import get_llm_cache
+from ..core.llm_client import get_llm_pool
+from ..tools.media_probe import get_media_probe
+from ..tools.whisper_pool import get_whisper_pool
 from ..config import settings
 
 router = APIRouter(prefix="/runtime", tags=["runtime"])
@@ -154,6 +158,53 @@ def get_metrics_history(minutes: int = 5) -> Dict[str, Any]:
     }
 
 
+@router.get("/whisper")
+def get_whisper_pool_status() -> Dict[str, Any]:
+    """
+    获取 Whisper 模型池状态
+    
+    Returns:
+        已加载模型、内存占用、加载耗时与转录耗时统计
+    """
+    return get_whisper_pool().get_stats()
+
+
+@router.get("/media-probe")
+def get_media_probe_status() -> Dict[str, Any]:
+    """
+    获取媒体探测缓存状态
+    
+    Returns:
+        缓存条目数、命中次数、实际 ffprobe 次数
+    """
+    return get_media_probe().get_stats()
+
+
+@router.get("/llm-cache")
+def get_llm_cache_status() -> Dict[str, Any]:
+    """
+    获取 LLM 回复缓存状态
+    
+    Returns:
+        命中 / 未命中 / 跳过次数、命中率、命中节省的调用耗时、条目数与占用空间
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.get_stats()}
+
+
+@router.get("/llm-clients")
+def get_llm_clients_status() -> Dict[str, Any]:
+    """
+    获取共享 LLM 客户端状态
+    
+    Returns:
+        按服务商统计的请求数、重试数、429 / 5xx 次数、限流等待与退避时间、平均调用耗时
+    """
+    return get_llm_pool().get_stats()
+
+
 @router.get("/status")
 def get_runtime_status() -> Dict[str, Any]:
     """
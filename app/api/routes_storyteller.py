@@ -10,6 +10,8 @@ import shutil
 from typing import Optional
 
 from ..config import settings
+from ..core.job_paths import InvalidJobId, resolve_job_dir
+from ..core.offload import run_llm
 from ..core.visual_storyteller import VisualStoryteller
 from ..models.schemas import ScenesJSON
 
@@ -20,7 +22,8 @@ router = APIRouter(prefix="/api/storyteller", tags=["storyteller"])
 async def create_story(
     scenes_file: UploadFile = File(...),
     duration_target: int = Form(30),
-    style_preference: Optional[str] = Form(None)
+    style_preference: Optional[str] = Form(None),
+    no_cache: bool = Form(False)
 ):
     """
     从视觉素材创作故事（无脚本模式）
@@ -29,6 +32,7 @@ async def create_story(
         scenes_file: scenes.json 文件（必须包含 visual 字段）
         duration_target: 目标时长（秒）
         style_preference: 风格偏好（可选，如 "高燃踩点"、"情感叙事"）
+        no_cache: 跳过 LLM 回复缓存重新构思（输入不变时默认返回上次的结果）
     
     Returns:
         {
@@ -68,10 +72,11 @@ async def create_story(
             )
         
         # 4. 初始化 Visual Storyteller
-        storyteller = VisualStoryteller()
+        storyteller = VisualStoryteller(use_cache=not no_cache)
         
         # 5. 生成故事
-        story_result = storyteller.generate_story_from_visuals(
+        story_result = await run_llm(
+            storyteller.generate_story_from_visuals,
             scenes_data,
             duration_target=duration_target,
             style_preference=style_preference
@@ -129,7 +134,7 @@ async def create_story_from_job(
     """
     try:
         # 1. 检查任务目录
-        job_dir = settings.JOBS_DIR / job_id
+        job_dir = resolve_job_dir(job_id)
         
         if not job_dir.exists():
             raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
@@ -160,7 +165,8 @@ async def create_story_from_job(
         
         # 5. 生成故事
         storyteller = VisualStoryteller()
-        story_result = storyteller.generate_story_from_visuals(
+        story_result = await run_llm(
+            storyteller.generate_story_from_visuals,
             scenes_data,
             duration_target=duration_target,
             style_preference=style_preference
@@ -201,7 +207,7 @@ async def create_story_from_job(
             "message": f"成功生成故事：{story_result['theme']}"
         })
         
-    except HTTPException:
+    except (HTTPException, InvalidJobId):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"故事生成失败: {str(e)}")
@@ -229,7 +235,7 @@ async def generate_dsl_from_story(
     """
     try:
         # 1. 检查任务目录
-        job_dir = settings.JOBS_DIR / job_id
+        job_dir = resolve_job_dir(job_id)
         
         if not job_dir.exists():
             raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
@@ -261,7 +267,8 @@ async def generate_dsl_from_story(
         
         # 5. 生成 DSL
         storyteller = VisualStoryteller()
-        dsl = storyteller.generate_dsl_from_story(
+        dsl = await run_llm(
+            storyteller.generate_dsl_from_story,
             scenes_data,
             story_result,
             platform=platform
@@ -284,7 +291,7 @@ async def generate_dsl_from_story(
             "message": f"成功生成 DSL（{len(timeline)} 个片段）"
         })
         
-    except HTTPException:
+    except (HTTPException, InvalidJobId):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DSL 生成失败: {str(e)}")
@@ -302,7 +309,7 @@ async def get_story(job_id: str):
         故事结果
     """
     try:
-        job_dir = settings.JOBS_DIR / job_id
+        job_dir = resolve_job_dir(job_id)
         story_path = job_dir / "story_result.json"
         
         if not story_path.exists():
@@ -317,7 +324,7 @@ async def get_story(job_id: str):
             **story_result
         })
         
-    except HTTPException:
+    except (HTTPException, InvalidJobId):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取故事失败: {str(e)}")
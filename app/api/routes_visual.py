@@ -8,15 +8,38 @@ from fastapi.responses import JSONResponse
 from pathlib import Path
 import json
 import shutil
-from typing import Optional
+from typing import List, Optional
 
 from ..config import settings
-from ..tools.visual_analyzer_factory import analyze_scenes_auto
+from ..core.job_paths import InvalidJobId, resolve_job_dir
+from ..core.offload import run_llm
+from ..tools.visual_analyzer_factory import analyze_scenes_auto, get_visual_analyzer
 from ..models.schemas import ScenesJSON
 
 router = APIRouter(prefix="/api/visual", tags=["visual"])
 
 
+def _quality_scores(scenes_data: ScenesJSON) -> List[int]:
+    """
+    收集已分析场景的质量评分
+    
+    LM Studio 分析器写回的是 dict（只有 summary，没有 quality_score），
+    云端 / Ollama 分析器写回的是 VisualMetadata，两种形态都要能读
+    """
+    scores = []
+    for scene in scenes_data.scenes:
+        visual = scene.visual
+        if not visual:
+            continue
+        if isinstance(visual, dict):
+            score = visual.get("quality_score")
+        else:
+            score = getattr(visual, "quality_score", None)
+        if isinstance(score, (int, float)):
+            scores.append(score)
+    return scores
+
+
 @router.post("/analyze")
 async def analyze_visual(
     scenes_file: UploadFile = File(...),
@@ -70,7 +93,8 @@ async def analyze_visual(
         force_local = use_local if use_local is not None else None
         force_cloud = (not use_local) if use_local is not None else None
         
-        updated_scenes = analyze_scenes_auto(
+        updated_scenes = await run_llm(
+            analyze_scenes_auto,
             scenes_data,
             str(video_path),
             max_scenes=max_scenes,
@@ -86,11 +110,7 @@ async def analyze_visual(
         total_scenes = len(updated_scenes.scenes)
         analyzed_scenes = sum(1 for scene in updated_scenes.scenes if scene.visual)
         
-        quality_scores = [
-            scene.visual.quality_score
-            for scene in updated_scenes.scenes
-            if scene.visual
-        ]
+        quality_scores = _quality_scores(updated_scenes)
         
         avg_quality = sum(quality_scores) / len(quality_scores) if quality_scores else 0
         
@@ -146,7 +166,7 @@ async def analyze_visual_from_job(
     """
     try:
         # 1. 检查任务目录
-        job_dir = settings.JOBS_DIR / job_id
+        job_dir = resolve_job_dir(job_id)
         
         if not job_dir.exists():
             raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
@@ -174,9 +194,10 @@ async def analyze_visual_from_job(
         
         scenes_data = ScenesJSON(**scenes_dict)
         
-        # 4. 分析视觉
-        analyzer = VisualAnalyzer()
-        updated_scenes = analyzer.analyze_scene_visuals(
+        # 4. 分析视觉（经工厂创建，命中视觉结果缓存的场景不再调用模型）
+        analyzer = get_visual_analyzer()
+        updated_scenes = await run_llm(
+            analyzer.analyze_scene_visuals,
             scenes_data,
             str(video_path),
             max_scenes=max_scenes
@@ -191,11 +212,7 @@ async def analyze_visual_from_job(
         total_scenes = len(updated_scenes.scenes)
         analyzed_scenes = sum(1 for scene in updated_scenes.scenes if scene.visual)
         
-        quality_scores = [
-            scene.visual.quality_score
-            for scene in updated_scenes.scenes
-            if scene.visual
-        ]
+        quality_scores = _quality_scores(updated_scenes)
         
         avg_quality = sum(quality_scores) / len(quality_scores) if quality_scores else 0
         
@@ -213,7 +230,7 @@ async def analyze_visual_from_job(
             "message": f"成功分析 {analyzed_scenes}/{total_scenes} 个场景"
         })
         
-    except HTTPException:
+    except (HTTPException, InvalidJobId):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"视觉分析失败: {str(e)}")
@@ -232,7 +249,7 @@ async def get_visual_stats(job_id: str):
     """
     try:
         # 查找 scenes_with_visual.json
-        job_dir = settings.JOBS_DIR / job_id
+        job_dir = resolve_job_dir(job_id)
         scenes_path = job_dir / "scenes_with_visual.json"
         
         if not scenes_path.exists():
@@ -289,7 +306,7 @@ async def get_visual_stats(job_id: str):
             }
         })
         
-    except HTTPException:
+    except (HTTPException, InvalidJobId):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
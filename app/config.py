@@ -13,10 +13,15 @@ class Settings(BaseSettings):
     BASE_DIR: Path = Path(__file__).parent.parent
     JOBS_DIR: Path = BASE_DIR / "jobs"
     UPLOADS_DIR: Path = BASE_DIR / "uploads"
+    CACHE_DIR: Path = BASE_DIR / "cache"
     
     # Whisper 配置
     WHISPER_MODEL: str = "base"  # tiny, base, small, medium, large
     WHISPER_DEVICE: str = "cpu"  # cpu, cuda
+    WHISPER_COMPUTE_TYPE: str = "int8"  # int8, float16, float32
+    WHISPER_WARMUP: bool = True  # 启动时后台预加载 WHISPER_MODEL
+    WHISPER_POOL_IDLE_SEC: int = 900  # 模型空闲多久后释放（0 表示不释放）
+    WHISPER_POOL_MAX_GB: float = 0  # 模型池内存上限，0 表示按物理内存自动计算
     
     # Resolve 配置
     RESOLVE_SCRIPT_PATH: str = ""  # 自动检测或手动设置
@@ -25,6 +30,23 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""  # OpenAI API Key
     OPENAI_MODEL: str = "gpt-4o"  # 推荐使用长窗口模型
     OPENAI_BASE_URL: str = ""  # 可选：自定义 API 端点（如 Azure）
+    LLM_PROMPT_TOKEN_BUDGET: int = 16000  # 生成 DSL 的输入 token 预算（超出时省略低价值镜头 / 抽样字幕）
+    LLM_MAP_CHUNK_SECONDS: float = 300.0  # 分层规划：每个初筛窗口的时长（秒）
+    LLM_MAP_CONCURRENCY: int = 4  # 分层规划：初筛并发调用数
+    LLM_MAP_SHORTLIST: int = 12  # 分层规划：每个窗口最多保留的候选镜头数
+    LLM_BATCH_CONCURRENCY: int = 3  # 批量生成：同时生成的风格数
+    LLM_BATCH_STYLE_TIMEOUT_SEC: float = 180.0  # 批量生成：单个风格的超时（秒）
+    
+    # 共享 LLM 客户端（LLMDirector / VisualStoryteller / VisualAnalyzer 按服务商复用连接）
+    LLM_POOL_MAX_CONNECTIONS: int = 20  # 每个客户端的最大连接数
+    LLM_POOL_KEEPALIVE: int = 10  # 保持的空闲长连接数
+    LLM_REQUEST_TIMEOUT_SEC: float = 120.0  # 默认请求超时（秒，调用方传入 timeout 时以调用方为准）
+    LLM_RATE_LIMIT_RPM: int = 60  # 每个服务商每分钟请求数上限（令牌桶），0 表示不限流
+    LLM_RATE_LIMIT_BURST: int = 10  # 令牌桶容量（允许的突发请求数）
+    LLM_MAX_RETRIES: int = 4  # 429 / 5xx / 连接错误的最大重试次数
+    LLM_RETRY_BASE_SEC: float = 1.0  # 退避基数：第 n 次重试随机等待 0 ~ base * 2^n 秒
+    LLM_RETRY_MAX_SEC: float = 30.0  # 单次退避上限（秒）
+    LLM_MAX_THREADS: int = 16  # LLM 调用专用线程数（限流等待 / 重试退避不占用 OFFLOAD_MAX_THREADS）
     
     # 本地视觉模型配置（Ollama / LM Studio）
     USE_LOCAL_VISION: bool = True  # 是否使用本地视觉模型（推荐）
@@ -36,6 +58,51 @@ class Settings(BaseSettings):
     LMSTUDIO_HOST: str = "http://localhost:1234/v1"  # LM Studio API 地址
     LMSTUDIO_MODEL: str = "auto"  # auto 表示使用当前加载的模型
     
+    # 视觉结果缓存（按 帧哈希 + 模型 + prompt 版本 寻址）
+    VISION_CACHE_ENABLED: bool = True
+    VISION_CACHE_DIR: Path = CACHE_DIR / "vision"
+    VISION_CACHE_MAX_MB: int = 512
+    
+    # LLM 回复缓存（按 模型 + 消息 + 温度 寻址，素材不变时重跑直接命中）
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_DIR: Path = CACHE_DIR / "llm"
+    LLM_CACHE_MAX_MB: int = 256
+    LLM_CACHE_TTL_SEC: int = 604800  # 条目有效期（7 天），0 表示不过期
+    
+    # 任务索引（SQLite，位于 JOBS_DIR 下，可用 python -m app.core.job_index rebuild 重建）
+    JOB_INDEX_FILE: str = ".job_index.sqlite3"
+    JOB_DIR_SHARDING: bool = False  # 新任务按日期分片存放（jobs/YYYY/MM/DD/<job_id>）
+    JOB_PROGRESS_COALESCE_MS: int = 500  # 仅更新进度时合并落盘的窗口，0 表示每次都写
+    
+    # 持久化任务队列（CPU worker 槽位，0 表示按核数自动计算；VISION / RESOLVE / GPU_HEAVY 取资源锁容量）
+    JOB_QUEUE_FILE: str = ".job_queue.sqlite3"
+    QUEUE_SLOTS_CPU: int = 0
+    QUEUE_MAX_ATTEMPTS: int = 3  # 含失败重试和服务重启后的重跑
+    
+    # 项目 / 组装 / 导出状态存储（memory / sqlite / redis，多 worker 部署不要用 memory）
+    STATUS_STORE_BACKEND: str = "sqlite"
+    STATUS_STORE_FILE: str = ".status_store.sqlite3"  # 位于 JOBS_DIR 下
+    STATUS_STORE_REDIS_URL: str = "redis://localhost:6379/0"
+    STATUS_STORE_FINISHED_TTL_SEC: int = 86400  # 完成 / 失败的状态保留时长，0 表示不过期
+    
+    # Orchestrator 资源锁容量（同时持有的 job 数）
+    RESOURCE_GPU_HEAVY_SLOTS: int = 1
+    RESOURCE_RESOLVE_SLOTS: int = 1
+    RESOURCE_VISION_SLOTS: int = 3
+    RESOURCE_AI_SLOTS: int = 4
+    
+    # 移出事件循环的阻塞工作（同时运行的 ffmpeg 子进程数 / 阻塞调用线程数）
+    OFFLOAD_MAX_SUBPROCESSES: int = 2
+    OFFLOAD_MAX_THREADS: int = 4
+    
+    # 模态分析并发（ffmpeg 解码，0 表示按 CPU 核数自动计算）
+    MODALITY_WORKERS: int = 0
+    
+    # SmartPipeline 按素材调度：同时运行的 ASR 任务数（Whisper 模型占用大量内存 / 显存）
+    PIPELINE_ASR_WORKERS: int = 1
+    # Vision / AI 节点等待开关（VISION_ALLOWED / AI_ALLOWED）与全局槽位的最长时间（秒），超时按节点失败处理
+    PIPELINE_RESOURCE_TIMEOUT_SEC: float = 3600.0
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
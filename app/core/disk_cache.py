@@ -0,0 +1,187 @@
+"""
+磁盘 LRU 缓存基类 - 视觉结果缓存（app/tools/vision_cache.py）与 LLM 回复缓存（app/core/llm_cache.py）共用
+
+- 每个条目一个 JSON 文件，两级目录，避免单目录文件过多：
+    cache_dir/ab/ab12...ef.json
+- 原子写：临时文件 + rename，不会读到写了一半的条目
+- 索引（key → [字节数, 最近访问时间]）首次使用时扫描磁盘建立；命中会刷新文件 mtime，重启后依然有效
+- 超过容量上限时按最近访问时间淘汰；is_expired 返回 True 的条目在读取时删除
+
+子类负责计算键、决定条目内容，并在 get / put 中调用 _read_entry / _write_entry。
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class DiskLRUCache:
+    """按键寻址的 JSON 磁盘缓存（线程安全）"""
+
+    # 写入失败提示中的缓存名称
+    label = "磁盘缓存"
+
+    def __init__(self, cache_dir: Path, max_mb: int):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_mb: 容量上限（MB）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_mb * 1024 * 1024
+
+        # key -> [字节数, 最近访问时间]，首次使用时扫描磁盘建立
+        self._index: Optional[Dict[str, list]] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self._stats: Dict[str, Any] = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "expired": 0,
+            "evictions": 0
+        }
+
+    def is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        """条目是否已过期（默认不过期）"""
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        with self._lock:
+            self._ensure_index()
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._index),
+                "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2)
+            }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._ensure_index()
+            for key in list(self._index):
+                self._remove_file(key)
+            self._index.clear()
+            self._total_bytes = 0
+
+    def _read_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取条目（命中时刷新最近访问时间），未命中 / 损坏 / 过期返回 None"""
+        path = self._path(key)
+
+        with self._lock:
+            self._ensure_index()
+            if key not in self._index:
+                self._stats["misses"] += 1
+                return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # 文件被外部删除或损坏，视为未命中
+            with self._lock:
+                self._drop(key)
+                self._stats["misses"] += 1
+            return None
+
+        now = time.time()
+        if self.is_expired(entry, now):
+            with self._lock:
+                self._remove_file(key)
+                self._drop(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+            return None
+
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+        with self._lock:
+            if key in self._index:
+                self._index[key][1] = now
+            self._stats["hits"] += 1
+
+        return entry
+
+    def _write_entry(self, key: str, entry: Dict[str, Any]):
+        """写入条目（原子写：临时文件 + rename），超出容量时淘汰最久未访问的条目"""
+        path = self._path(key)
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+
+        if len(data) > self.max_bytes:
+            return
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"  ⚠️ {self.label}写入失败: {e}")
+            return
+
+        with self._lock:
+            self._ensure_index()
+            self._drop(key)
+            self._index[key] = [len(data), time.time()]
+            self._total_bytes += len(data)
+            self._stats["writes"] += 1
+            self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _ensure_index(self):
+        """扫描磁盘建立索引（调用方持有锁）"""
+        if self._index is not None:
+            return
+
+        self._index = {}
+        self._total_bytes = 0
+
+        if not self.cache_dir.exists():
+            return
+
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            self._index[path.stem] = [stat.st_size, stat.st_mtime]
+            self._total_bytes += stat.st_size
+
+        self._evict()
+
+    def _drop(self, key: str):
+        """从索引中移除（调用方持有锁）"""
+        entry = self._index.pop(key, None) if self._index is not None else None
+        if entry:
+            self._total_bytes -= entry[0]
+
+    def _evict(self):
+        """超出容量时按最近访问时间淘汰（调用方持有锁）"""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove_file(key)
+            self._drop(key)
+            self._stats["evictions"] += 1
+
+    def _remove_file(self, key: str):
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
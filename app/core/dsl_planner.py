@@ -0,0 +1,405 @@
+"""
+分层 DSL 规划（map-reduce）- 长素材生成剪辑指令
+
+LLMDirector.generate_editing_dsl 原来对全部镜头做一次对话补全：一小时的素材放不进上下文，
+PromptCompiler 只能大量省略镜头，成片质量随之下降。这里分两层：
+
+1. 初筛（map）：按时间把素材切成窗口（LLM_MAP_CHUNK_SECONDS），每个窗口一次调用，
+   从该窗口的镜头 / 字幕中挑出候选镜头和关键语句；窗口之间并发调用（LLM_MAP_CONCURRENCY）
+2. 成片（reduce）：只把候选镜头、关键语句和与候选镜头重叠的字幕交给一次调用，生成 editing_dsl.v1 时间线
+
+某个窗口的初筛调用失败或返回无效 JSON 时，该窗口按镜头价值（PromptCompiler.rank_scenes）取候选，
+不影响其它窗口。最终 DSL 对原始全部镜头执行 DSLValidator.validate_dsl_against_scenes：
+trim_frames 越界的片段裁回镜头范围、不存在的 scene_id 丢弃、broll 清空，仍不通过时抛出 ValueError。
+
+用法:
+    planner = HierarchicalPlanner(director)
+    dsl = planner.generate(scenes, transcript, style_prompt, bgm_library)
+    planner.last_stats
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..models.dsl_validator import DSLValidator
+from ..models.schemas import Scene, ScenesJSON, TranscriptJSON, TranscriptSegment
+from .llm_client import remaining_seconds
+from .prompt_compiler import TABLE_FORMAT_GUIDE
+
+# 初筛返回的 purpose
+PURPOSES = ("hook", "body", "cta")
+
+# 匹配关键语句 start 的容差（秒，表格中时间保留两位小数）
+QUOTE_TOLERANCE_SEC = 0.05
+
+SHORTLIST_SYSTEM_PROMPT = f"""你是一名专业的短视频剪辑导演，正在为一段长素材做分块初筛。
+你只看到素材中的一个时间窗口，任务是从这个窗口里挑出最值得进入成片的镜头和语句，交给后续的成片环节。
+
+{TABLE_FORMAT_GUIDE}
+
+挑选标准：
+1. 画面质量高（q 高、光线正常）、信息量大的镜头
+2. 与关键语句（观点、数字、金句、转折）同时出现的镜头
+3. 适合做开场 Hook 的冲击力画面（特写 / 近景）
+4. 避免重复：相似的镜头只保留最好的一个
+5. 符合【风格要求】
+
+只输出 JSON，不要输出任何多余文字：
+{{
+  "candidates": [
+    {{"scene_id": "S0001", "score": 8, "purpose": "hook", "reason": "产品特写，对应价格金句"}}
+  ],
+  "quotes": [12.5, 40.0]  // 关键语句的 start（秒），来自 #T 表
+}}
+
+规则：
+- scene_id 必须来自本窗口的 #S 表，按 score 从高到低，数量不超过用户消息中的上限
+- score 为 1-10，purpose 为 hook/body/cta
+- reason 不超过 20 字"""
+
+
+@dataclass
+class Chunk:
+    """一个初筛窗口"""
+    index: int
+    start_sec: float
+    end_sec: float
+    scenes: List[Scene]
+    segments: List[TranscriptSegment]
+
+
+@dataclass
+class Shortlist:
+    """一个窗口的初筛结果"""
+    chunk: int
+    candidates: List[Dict[str, Any]]  # scene_id / score / purpose / reason
+    quotes: List[TranscriptSegment]
+    fallback: bool = False
+    elapsed_ms: float = 0.0
+    error: str = ""
+
+
+@dataclass
+class PlanStats:
+    """一次分层规划的统计"""
+    chunks: int
+    concurrency: int
+    map_ms: float
+    map_calls_ms: float
+    fallback_chunks: List[int]
+    scenes_total: int
+    shortlisted_scenes: int
+    shortlisted_segments: int
+    reduce_ms: float = 0.0
+    repairs: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class HierarchicalPlanner:
+    """两层（初筛 + 成片）生成剪辑指令"""
+
+    def __init__(
+        self,
+        director: Any,
+        chunk_seconds: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        shortlist_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ):
+        """
+        Args:
+            director: LLMDirector（提供 client / prompt_compiler / build_prompt）
+            chunk_seconds: 初筛窗口时长（None 表示 LLM_MAP_CHUNK_SECONDS）
+            concurrency: 初筛并发调用数（None 表示 LLM_MAP_CONCURRENCY）
+            shortlist_size: 每个窗口最多保留的候选镜头（None 表示 LLM_MAP_SHORTLIST）
+            timeout: 初筛 / 成片每次 LLM 请求的超时（秒，None 表示客户端默认）
+            deadline: 截止时间（time.monotonic()）；每次初筛 / 成片调用前检查，过期抛出 LLMDeadlineExceeded
+        """
+        self.director = director
+        self.chunk_seconds = chunk_seconds or settings.LLM_MAP_CHUNK_SECONDS
+        self.concurrency = max(1, concurrency or settings.LLM_MAP_CONCURRENCY)
+        self.shortlist_size = max(1, shortlist_size or settings.LLM_MAP_SHORTLIST)
+        self.timeout = timeout
+        self.deadline = deadline
+        self.last_stats: Optional[PlanStats] = None
+
+    def generate(
+        self,
+        scenes: ScenesJSON,
+        transcript: TranscriptJSON,
+        style_prompt: str,
+        bgm_library: Optional[list] = None
+    ) -> dict:
+        """初筛 → 成片 → 验证，返回 editing_dsl.v1"""
+        chunks = self.split(scenes, transcript)
+        workers = min(self.concurrency, len(chunks)) or 1
+        print(f"📚 分层规划: {len(scenes.scenes)} 个镜头 → {len(chunks)} 个窗口（{self.chunk_seconds:g}s），并发 {workers}")
+
+        # 1. 初筛（并发）
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dsl-map") as executor:
+            shortlists = list(executor.map(
+                lambda chunk: self.shortlist(chunk, scenes, transcript, style_prompt), chunks
+            ))
+        map_ms = (time.perf_counter() - t0) * 1000
+
+        # 2. 成片
+        reduced_scenes, reduced_transcript = self.reduce_materials(scenes, transcript, shortlists)
+        stats = PlanStats(
+            chunks=len(chunks),
+            concurrency=workers,
+            map_ms=round(map_ms, 1),
+            map_calls_ms=round(sum(s.elapsed_ms for s in shortlists), 1),
+            fallback_chunks=[s.chunk for s in shortlists if s.fallback],
+            scenes_total=len(scenes.scenes),
+            shortlisted_scenes=len(reduced_scenes.scenes),
+            shortlisted_segments=len(reduced_transcript.segments)
+        )
+        self.last_stats = stats
+        print(f"  ✅ 初筛完成: 候选镜头 {stats.shortlisted_scenes}/{stats.scenes_total}，"
+              f"语句 {stats.shortlisted_segments}/{len(transcript.segments)}，"
+              f"耗时 {stats.map_ms:.0f}ms（调用合计 {stats.map_calls_ms:.0f}ms）")
+        if stats.fallback_chunks:
+            print(f"  ⚠️  窗口 {stats.fallback_chunks} 初筛失败，已按镜头价值选取候选")
+
+        # 调用方已放弃等待时不再发起成片请求
+        remaining_seconds(self.deadline)
+        t1 = time.perf_counter()
+        prompt = self.director.build_prompt(
+            reduced_scenes,
+            reduced_transcript,
+            style_prompt.strip() + "\n\n" + self._candidates_note(shortlists, len(chunks)),
+            bgm_library
+        )
+        dsl = self.director._chat_json(prompt, temperature=0.7, timeout=self.timeout, deadline=self.deadline)
+        stats.reduce_ms = round((time.perf_counter() - t1) * 1000, 1)
+
+        # 3. 对原始全部镜头验证
+        scenes_data = scenes.model_dump(by_alias=True)
+        errors = DSLValidator.validate_dsl_against_scenes(dsl, scenes_data)
+        if errors:
+            stats.repairs = self.repair_timeline(dsl, scenes)
+            for repair in stats.repairs:
+                print(f"  🔧 {repair}")
+            errors = DSLValidator.validate_dsl_against_scenes(dsl, scenes_data)
+        if errors:
+            raise ValueError(f"分层规划生成的 DSL 未通过验证: {'; '.join(errors[:5])}")
+
+        return dsl
+
+    # ==================== 初筛 ====================
+
+    def split(self, scenes: ScenesJSON, transcript: TranscriptJSON) -> List[Chunk]:
+        """按镜头 / 字幕的开始时间切成固定时长的窗口（没有镜头的窗口不参与初筛）"""
+        fps = scenes.meta.fps or 30.0
+        ends = [scene.end_frame / fps for scene in scenes.scenes] + [seg.end for seg in transcript.segments]
+        count = max(1, math.ceil(max(ends, default=0) / self.chunk_seconds))
+
+        scene_buckets: List[List[Scene]] = [[] for _ in range(count)]
+        segment_buckets: List[List[TranscriptSegment]] = [[] for _ in range(count)]
+        for scene in scenes.scenes:
+            scene_buckets[min(int(scene.start_frame / fps // self.chunk_seconds), count - 1)].append(scene)
+        for seg in transcript.segments:
+            segment_buckets[min(int(seg.start // self.chunk_seconds), count - 1)].append(seg)
+
+        return [
+            Chunk(
+                index=i,
+                start_sec=i * self.chunk_seconds,
+                end_sec=(i + 1) * self.chunk_seconds,
+                scenes=scene_buckets[i],
+                segments=segment_buckets[i]
+            )
+            for i in range(count)
+            if scene_buckets[i]
+        ]
+
+    def shortlist(
+        self,
+        chunk: Chunk,
+        scenes: ScenesJSON,
+        transcript: TranscriptJSON,
+        style_prompt: str
+    ) -> Shortlist:
+        """一个窗口的初筛调用（失败时按镜头价值选取；已过截止时间时抛出 LLMDeadlineExceeded）"""
+        remaining_seconds(self.deadline)
+        t0 = time.perf_counter()
+        chunk_scenes = scenes.model_copy(update={"scenes": chunk.scenes})
+        chunk_transcript = transcript.model_copy(update={"segments": chunk.segments})
+        limit = min(self.shortlist_size, len(chunk.scenes))
+
+        try:
+            prompt = self.director.prompt_compiler.compile(
+                SHORTLIST_SYSTEM_PROMPT,
+                chunk_scenes,
+                chunk_transcript,
+                style_prompt,
+                instruction=(
+                    f"这是第 {chunk.index + 1} 个窗口（{chunk.start_sec:g}-{chunk.end_sec:g} 秒）。"
+                    f"请挑出最多 {limit} 个候选镜头和关键语句，输出 JSON。"
+                )
+            )
+            response = self.director._chat_json(
+                prompt, temperature=0.3, timeout=self.timeout, deadline=self.deadline
+            )
+            candidates, quotes = self._parse_shortlist(response, chunk, limit)
+            if not candidates:
+                raise ValueError("没有有效的候选镜头")
+            return Shortlist(
+                chunk=chunk.index,
+                candidates=candidates,
+                quotes=quotes,
+                elapsed_ms=(time.perf_counter() - t0) * 1000
+            )
+        except Exception as e:
+            print(f"  ⚠️  窗口 {chunk.index + 1} 初筛失败: {e}")
+            return Shortlist(
+                chunk=chunk.index,
+                candidates=self._fallback_candidates(chunk, chunk_transcript, scenes.meta.fps or 30.0, limit),
+                quotes=[],
+                fallback=True,
+                elapsed_ms=(time.perf_counter() - t0) * 1000,
+                error=str(e)
+            )
+
+    def _parse_shortlist(
+        self,
+        data: Dict[str, Any],
+        chunk: Chunk,
+        limit: int
+    ) -> Tuple[List[Dict[str, Any]], List[TranscriptSegment]]:
+        """只保留本窗口内的镜头 / 语句，去重并按 score 排序"""
+        chunk_ids = {scene.scene_id for scene in chunk.scenes}
+        candidates = []
+        seen = set()
+        for item in data.get("candidates") or []:
+            if not isinstance(item, dict):
+                continue
+            scene_id = item.get("scene_id")
+            if scene_id not in chunk_ids or scene_id in seen:
+                continue
+            seen.add(scene_id)
+            try:
+                score = min(10.0, max(0.0, float(item.get("score", 5))))
+            except (TypeError, ValueError):
+                score = 5.0
+            purpose = item.get("purpose") if item.get("purpose") in PURPOSES else "body"
+            reason = " ".join(str(item.get("reason") or "").replace("|", "/").split())[:30]
+            candidates.append({"scene_id": scene_id, "score": score, "purpose": purpose, "reason": reason})
+        candidates.sort(key=lambda c: -c["score"])
+
+        quotes = []
+        for value in data.get("quotes") or []:
+            try:
+                start = float(value)
+            except (TypeError, ValueError):
+                continue
+            quotes.extend(
+                seg for seg in chunk.segments
+                if abs(seg.start - start) <= QUOTE_TOLERANCE_SEC and seg not in quotes
+            )
+        return candidates[:limit], quotes
+
+    def _fallback_candidates(
+        self,
+        chunk: Chunk,
+        chunk_transcript: TranscriptJSON,
+        fps: float,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        ranked = self.director.prompt_compiler.rank_scenes(chunk.scenes, chunk_transcript, fps)
+        return [
+            {
+                "scene_id": chunk.scenes[i].scene_id,
+                "score": float(chunk.scenes[i].visual.quality_score) if chunk.scenes[i].visual else 5.0,
+                "purpose": "body",
+                "reason": "按画面价值自动选取"
+            }
+            for i in ranked[:limit]
+        ]
+
+    # ==================== 成片 ====================
+
+    @staticmethod
+    def reduce_materials(
+        scenes: ScenesJSON,
+        transcript: TranscriptJSON,
+        shortlists: List[Shortlist]
+    ) -> Tuple[ScenesJSON, TranscriptJSON]:
+        """候选镜头（原顺序）+ 关键语句与候选镜头时间重叠的字幕"""
+        fps = scenes.meta.fps or 30.0
+        ids = {c["scene_id"] for shortlist in shortlists for c in shortlist.candidates}
+        kept_scenes = [scene for scene in scenes.scenes if scene.scene_id in ids]
+        spans = [(scene.start_frame / fps, scene.end_frame / fps) for scene in kept_scenes]
+        quoted = {id(seg) for shortlist in shortlists for seg in shortlist.quotes}
+
+        kept_segments = [
+            seg for seg in transcript.segments
+            if id(seg) in quoted or any(seg.start < end and start < seg.end for start, end in spans)
+        ]
+        return (
+            scenes.model_copy(update={"scenes": kept_scenes}),
+            transcript.model_copy(update={"segments": kept_segments})
+        )
+
+    @staticmethod
+    def _candidates_note(shortlists: List[Shortlist], chunk_count: int) -> str:
+        """成片调用附带的初筛结论（#C 表）"""
+        lines = [
+            f"【分块初筛】以下镜头是从 {chunk_count} 个时间窗口中初筛出的候选，score 越高越推荐：",
+            "#C 列=id|score|purpose|reason"
+        ]
+        for shortlist in shortlists:
+            for c in shortlist.candidates:
+                lines.append(f"{c['scene_id']}|{c['score']:g}|{c['purpose']}|{c['reason']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def repair_timeline(dsl: Dict[str, Any], scenes: ScenesJSON) -> List[str]:
+        """
+        修复成片调用的常见幻觉，返回修复记录：
+        不存在的 scene_id 丢弃，trim_frames 裁回镜头范围，broll 清空（没有素材库），order 重新编号
+        """
+        plan = dsl.get("editing_plan")
+        timeline = plan.get("timeline") if isinstance(plan, dict) else None
+        if not isinstance(timeline, list):
+            return []
+
+        scene_map = {scene.scene_id: scene for scene in scenes.scenes}
+        repairs = []
+        kept = []
+        for item in timeline:
+            if not isinstance(item, dict):
+                continue
+            scene = scene_map.get(item.get("scene_id"))
+            if scene is None:
+                repairs.append(f"丢弃不存在的镜头 {item.get('scene_id')}")
+                continue
+
+            trim = item.get("trim_frames")
+            try:
+                start, end = (int(round(float(v))) for v in trim)
+            except (TypeError, ValueError):
+                start, end = scene.start_frame, scene.end_frame
+            start = min(max(start, scene.start_frame), scene.end_frame - 1)
+            end = max(min(end, scene.end_frame), start + 1)
+            if trim != [start, end]:
+                repairs.append(f"{scene.scene_id} trim_frames {trim} → {[start, end]}")
+                item["trim_frames"] = [start, end]
+
+            if item.get("broll"):
+                repairs.append(f"{scene.scene_id} 清空 broll {item['broll']}（未提供素材库）")
+                dsl.setdefault("assumptions", []).append(f"建议为 {scene.scene_id} 添加 B-roll: {', '.join(map(str, item['broll']))}")
+                item["broll"] = []
+            kept.append(item)
+
+        for order, item in enumerate(kept, 1):
+            item["order"] = order
+        timeline[:] = kept
+        return repairs
@@ -24,6 +24,7 @@ class VisionPolicy:
     device: Literal["cpu", "gpu", "auto"] = "auto"
     max_scenes: int = 10
     timeout: int = 30
+    concurrency: int = 1  # 同时在途的推理请求数（截帧/推理/解析流水线）
     
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
@@ -136,7 +137,8 @@ class ExecutionPolicyResolver:
                 local_backend=local_backend,
                 model=vision_model,
                 device="gpu",
-                max_scenes=20
+                max_scenes=20,
+                concurrency=3
             ),
             planning=PlanningPolicy(
                 provider=planning_provider,
@@ -181,7 +183,8 @@ class ExecutionPolicyResolver:
                 local_backend=local_backend,
                 model=vision_model,
                 device="auto",  # 自动选择
-                max_scenes=10
+                max_scenes=10,
+                concurrency=2
             ),
             planning=PlanningPolicy(
                 provider="cloud",
@@ -224,7 +227,8 @@ class ExecutionPolicyResolver:
                 local_backend=local_backend,
                 model=vision_model,
                 device="cpu",  # 强制 CPU
-                max_scenes=5
+                max_scenes=5,
+                concurrency=1
             ),
             planning=PlanningPolicy(
                 provider="cloud",
@@ -258,7 +262,8 @@ class ExecutionPolicyResolver:
                     local_backend="lmstudio",
                     model=profile.ai_runtime.lmstudio_model or "auto",
                     device="cpu",
-                    max_scenes=10
+                    max_scenes=10,
+                    concurrency=1
                 ),
                 planning=PlanningPolicy(
                     provider="cloud",
@@ -280,7 +285,8 @@ class ExecutionPolicyResolver:
                     local_backend="ollama",
                     model="moondream",
                     device="cpu",
-                    max_scenes=10
+                    max_scenes=10,
+                    concurrency=1
                 ),
                 planning=PlanningPolicy(
                     provider="cloud",
@@ -302,7 +308,8 @@ class ExecutionPolicyResolver:
                     local_backend=None,
                     model="gpt-4o",
                     device="cpu",
-                    max_scenes=10
+                    max_scenes=10,
+                    concurrency=4
                 ),
                 planning=PlanningPolicy(
                     provider="cloud",
@@ -332,7 +339,8 @@ class ExecutionPolicyResolver:
                 provider="cloud",
                 model="gpt-4o",
                 device="cpu",
-                max_scenes=10
+                max_scenes=10,
+                concurrency=4
             ),
             planning=PlanningPolicy(
                 provider="cloud",
@@ -367,6 +375,7 @@ class ExecutionPolicyResolver:
             policy.vision.provider = "cloud"
             policy.vision.model = "gpt-4o"
             policy.vision.device = "cpu"
+            policy.vision.concurrency = max(policy.vision.concurrency, 4)
             policy.explanation = f"已降级: {reason} → 切换到云端视觉分析"
         
         # 减少场景数
@@ -0,0 +1,480 @@
+"""
+任务索引 - 基于 SQLite（WAL 模式）的 job 元数据 / 状态历史 / 产物清单索引
+
+metadata.json 仍是唯一的真实来源，索引只是它的派生副本：
+- JobStore 每次写 metadata.json 后同步 upsert 到索引
+- list_jobs 走索引分页查询（按状态 / 创建时间过滤），不再逐个打开 metadata.json
+- 产物清单按目录 mtime 校验，目录未变化时直接返回索引中的结果
+- 索引损坏或丢失时，可以从磁盘上的 job 目录重建：
+
+    python -m app.core.job_index rebuild [jobs_dir]
+    python -m app.core.job_index stats [jobs_dir]
+
+存储位置：jobs/.job_index.sqlite3（随 jobs 目录一起迁移）
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from .job_paths import iter_job_dirs, resolve_job_dir
+
+
+SCHEMA_VERSION = 1
+
+ARTIFACT_CATEGORIES = ("input", "temp", "output")
+
+# 目录 mtime 距今小于该值时不信任缓存（同一时间片内的后续修改无法从 mtime 看出）
+RACY_WINDOW_NS = 2_000_000_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    state TEXT,
+    status TEXT,
+    progress INTEGER,
+    created_at TEXT,
+    updated_at TEXT,
+    error TEXT,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at DESC, job_id DESC);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_created ON jobs (state, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at DESC);
+CREATE TABLE IF NOT EXISTS state_history (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    state TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE TABLE IF NOT EXISTS artifact_dirs (
+    job_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (job_id, category)
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    job_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER,
+    modified TEXT,
+    PRIMARY KEY (job_id, category, name)
+);
+"""
+
+
+class JobIndex:
+    """job 目录的 SQLite 索引"""
+
+    def __init__(self, db_path: Path, jobs_dir: Optional[Path] = None):
+        """
+        Args:
+            db_path: 索引数据库路径
+            jobs_dir: 对应的 jobs 目录（重建 / 产物路径用，默认为数据库所在目录）
+        """
+        self.db_path = Path(db_path)
+        self.jobs_dir = Path(jobs_dir) if jobs_dir else self.db_path.parent
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 单连接 + 锁：API 线程池与后台任务共用
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+        self._stats = {
+            "upserts": 0,
+            "queries": 0,
+            "artifact_hits": 0,
+            "artifact_scans": 0,
+            "rebuilds": 0
+        }
+
+    # ==================== 元数据 ====================
+
+    def upsert_job(self, metadata: Dict[str, Any]):
+        """写入 / 更新一个 job 的元数据与状态历史"""
+        with self._lock, self._transaction():
+            self._upsert(metadata)
+            self._stats["upserts"] += 1
+
+    def delete_job(self, job_id: str):
+        """从索引中删除 job（元数据、状态历史、产物）"""
+        with self._lock, self._transaction():
+            for table in ("jobs", "state_history", "artifact_dirs", "artifacts"):
+                self._conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+
+    def query_jobs(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        state: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        分页查询 job 元数据（按创建时间倒序）
+
+        Args:
+            limit / offset: 分页
+            state: 按当前状态过滤（JobState 值）
+            status: 按 status 过滤
+            created_after / created_before: ISO 时间或日期，区间 [after, before)
+
+        Returns:
+            metadata 字典列表
+        """
+        where, params = self._filters(state, status, created_after, created_before)
+        sql = (
+            f"SELECT metadata FROM jobs{where} "
+            "ORDER BY created_at DESC, job_id DESC LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+            self._stats["queries"] += 1
+        return [json.loads(row["metadata"]) for row in rows]
+
+    def count_jobs(
+        self,
+        state: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None
+    ) -> int:
+        """符合过滤条件的 job 总数"""
+        where, params = self._filters(state, status, created_after, created_before)
+        with self._lock:
+            row = self._conn.execute(f"SELECT COUNT(*) FROM jobs{where}", params).fetchone()
+        return row[0]
+
+    def count_by_state(self) -> Dict[str, int]:
+        """各状态的 job 数量"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"
+            ).fetchall()
+        return {row["state"]: row["n"] for row in rows}
+
+    def get_state_history(self, job_id: str) -> List[Dict[str, Any]]:
+        """job 的状态历史（按顺序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, timestamp FROM state_history WHERE job_id = ? ORDER BY seq",
+                (job_id,)
+            ).fetchall()
+        return [{"state": row["state"], "timestamp": row["timestamp"]} for row in rows]
+
+    # ==================== 产物清单 ====================
+
+    def get_artifacts(
+        self,
+        job_id: str,
+        refresh: bool = False,
+        job_dir: Optional[Path] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        获取 job 的产物清单
+
+        每个类别目录只 stat 一次：目录 mtime 与索引记录一致时直接返回索引结果，
+        否则用 scandir 重新扫描（每个文件一次 stat）并写回索引。
+
+        注意：原地追加写入的文件不会改变目录 mtime，其大小可能滞后，
+        需要精确值时传 refresh=True。
+        """
+        job_dir = Path(job_dir) if job_dir else resolve_job_dir(job_id, self.jobs_dir)
+        artifacts = {category: [] for category in ARTIFACT_CATEGORIES}
+        now_ns = time.time_ns()
+
+        with self._lock:
+            cached = {
+                row["category"]: row["mtime_ns"]
+                for row in self._conn.execute(
+                    "SELECT category, mtime_ns FROM artifact_dirs WHERE job_id = ?",
+                    (job_id,)
+                )
+            }
+
+            for category in ARTIFACT_CATEGORIES:
+                category_dir = job_dir / category
+                try:
+                    mtime_ns = os.stat(category_dir).st_mtime_ns
+                except OSError:
+                    if category in cached:
+                        self._replace_artifacts(job_id, category, None, [])
+                    continue
+
+                fresh = (
+                    not refresh
+                    and cached.get(category) == mtime_ns
+                    and now_ns - mtime_ns > RACY_WINDOW_NS
+                )
+                if fresh:
+                    artifacts[category] = self._cached_artifacts(job_id, category)
+                    self._stats["artifact_hits"] += 1
+                else:
+                    entries = self._scan_category(category_dir)
+                    self._replace_artifacts(job_id, category, mtime_ns, entries)
+                    artifacts[category] = entries
+                    self._stats["artifact_scans"] += 1
+
+        return artifacts
+
+    # ==================== 重建 ====================
+
+    def is_built(self) -> bool:
+        """索引是否已从磁盘构建过"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM index_meta WHERE key = 'built_at'"
+            ).fetchone()
+        return row is not None
+
+    def mark_stale(self):
+        """标记索引需要重建（同步失败时调用）"""
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM index_meta WHERE key = 'built_at'")
+        except sqlite3.Error:
+            pass
+
+    def ensure_built(self):
+        """索引从未构建（新建 / 被标记失效）时从磁盘重建"""
+        if not self.is_built():
+            self.rebuild()
+
+    def rebuild(self) -> int:
+        """
+        从磁盘上的 job 目录（平铺 + 日期分片）重建元数据与状态历史
+
+        Returns:
+            索引中的 job 数量
+        """
+        metadata_list = []
+        for job_dir in iter_job_dirs(self.jobs_dir):
+            try:
+                with open(job_dir / "metadata.json", "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            metadata.setdefault("job_id", job_dir.name)
+            metadata_list.append(metadata)
+
+        with self._lock, self._transaction():
+            for table in ("jobs", "state_history", "artifact_dirs", "artifacts"):
+                self._conn.execute(f"DELETE FROM {table}")
+            for metadata in metadata_list:
+                self._upsert(metadata)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('built_at', ?)",
+                (datetime.now().isoformat(),)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),)
+            )
+            self._stats["rebuilds"] += 1
+
+        return len(metadata_list)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """索引统计"""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            built = self._conn.execute(
+                "SELECT value FROM index_meta WHERE key = 'built_at'"
+            ).fetchone()
+        return {
+            "db_path": str(self.db_path),
+            "jobs": total,
+            "built_at": built[0] if built else None,
+            **self._stats
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ==================== 内部方法 ====================
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def _upsert(self, metadata: Dict[str, Any]):
+        job_id = metadata["job_id"]
+        error = metadata.get("error")
+        if error is not None and not isinstance(error, str):
+            error = json.dumps(error, ensure_ascii=False)
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs "
+            "(job_id, state, status, progress, created_at, updated_at, error, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id,
+                metadata.get("state"),
+                metadata.get("status"),
+                metadata.get("progress"),
+                metadata.get("created_at"),
+                metadata.get("updated_at"),
+                error,
+                json.dumps(metadata, ensure_ascii=False)
+            )
+        )
+        self._conn.execute("DELETE FROM state_history WHERE job_id = ?", (job_id,))
+        self._conn.executemany(
+            "INSERT INTO state_history (job_id, seq, state, timestamp) VALUES (?, ?, ?, ?)",
+            [
+                (job_id, seq, item.get("state"), item.get("timestamp"))
+                for seq, item in enumerate(metadata.get("state_history") or [])
+            ]
+        )
+
+    @staticmethod
+    def _filters(state, status, created_after, created_before):
+        clauses = []
+        params: List[Any] = []
+        if state:
+            clauses.append("state = ?")
+            params.append(state)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if created_after:
+            clauses.append("created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return where, params
+
+    def _scan_category(self, category_dir: Path) -> List[Dict[str, Any]]:
+        entries = []
+        try:
+            with os.scandir(category_dir) as it:
+                for entry in it:
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append({
+                        "name": entry.name,
+                        "path": str(Path(entry.path).relative_to(self.jobs_dir)),
+                        "size": stat.st_size,
+                        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
+                    })
+        except OSError:
+            pass
+        entries.sort(key=lambda item: item["name"])
+        return entries
+
+    def _cached_artifacts(self, job_id: str, category: str) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT name, path, size, modified FROM artifacts "
+            "WHERE job_id = ? AND category = ? ORDER BY name",
+            (job_id, category)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _replace_artifacts(self, job_id: str, category: str, mtime_ns: Optional[int], entries: list):
+        with self._transaction():
+            self._conn.execute(
+                "DELETE FROM artifacts WHERE job_id = ? AND category = ?", (job_id, category)
+            )
+            if mtime_ns is None:
+                self._conn.execute(
+                    "DELETE FROM artifact_dirs WHERE job_id = ? AND category = ?", (job_id, category)
+                )
+                return
+            self._conn.executemany(
+                "INSERT INTO artifacts (job_id, category, name, path, size, modified) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, category, e["name"], e["path"], e["size"], e["modified"])
+                    for e in entries
+                ]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifact_dirs (job_id, category, mtime_ns) VALUES (?, ?, ?)",
+                (job_id, category, mtime_ns)
+            )
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT / ROLLBACK（autocommit 连接上的显式事务，可嵌套）"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.owner = False
+
+    def __enter__(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.owner = True
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.owner:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# 全局实例（按 jobs 目录区分）
+_job_indexes: Dict[str, JobIndex] = {}
+_job_indexes_lock = threading.Lock()
+
+
+def get_job_index(jobs_dir: Optional[Path] = None) -> JobIndex:
+    """获取 jobs 目录对应的索引（同一目录共用一个实例）"""
+    jobs_dir = Path(jobs_dir or settings.JOBS_DIR).absolute()
+    key = str(jobs_dir)
+    with _job_indexes_lock:
+        index = _job_indexes.get(key)
+        if index is None:
+            index = JobIndex(jobs_dir / settings.JOB_INDEX_FILE, jobs_dir)
+            _job_indexes[key] = index
+        return index
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "stats"):
+        print("用法: python -m app.core.job_index rebuild|stats [jobs_dir]")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    index = get_job_index(Path(sys.argv[2]) if len(sys.argv) > 2 else None)
+
+    if command == "rebuild":
+        start = time.time()
+        count = index.rebuild()
+        print(f"✅ 索引已重建: {count} 个 job ({time.time() - start:.2f}s)")
+        print(f"   {index.db_path}")
+    else:
+        for key, value in index.get_stats().items():
+            print(f"   {key}: {value}")
+        for state, count in sorted(index.count_by_state().items()):
+            print(f"   [{state}] {count}")
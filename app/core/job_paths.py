@@ -0,0 +1,241 @@
+"""
+Job ID 生成与目录定位
+
+ID 格式（按时间单调递增、字典序即时间序、跨进程不冲突）：
+
+    {prefix}_{YYYYmmdd}_{HHMMSS}_{微秒}{随机后缀}
+    job_20261016_153012_482913_a7f3c2
+
+- 同一进程内严格递增（同一微秒或时钟回拨时顺延 1 微秒）
+- 随机后缀区分同一微秒内不同进程生成的 ID
+- 旧格式 job_YYYYmmdd_HHMMSS 仍然有效，排序在同一秒的新 ID 之前
+
+目录布局：
+- 平铺（默认）：jobs/<job_id>
+- 按日期分片（JOB_DIR_SHARDING=True）：jobs/YYYY/MM/DD/<job_id>，日期取自 ID 本身，
+  因此定位不需要额外查询；同一项目的各版本（<id>_v2 ...）落在同一分片内
+
+所有 "jobs 目录 / job_id" 的拼接都应通过 resolve_job_dir，它会同时查找两种布局，
+迁移前后的旧目录都能找到。迁移工具：
+
+    python -m app.core.job_paths migrate [--flat] [--dry-run] [jobs_dir]
+
+迁移会移动目录，应在服务停止时执行。
+"""
+import os
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from ..config import settings
+
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.\-]*$")
+_ID_DATE = re.compile(r"_(\d{4})(\d{2})(\d{2})_\d{6}")
+_SHARD_PART = re.compile(r"^\d+$")
+
+_id_lock = threading.Lock()
+_last_us = 0
+
+
+def new_job_id(prefix: str = "job") -> str:
+    """生成单调递增、全局唯一的 job ID"""
+    global _last_us
+    with _id_lock:
+        now_us = time.time_ns() // 1000
+        if now_us <= _last_us:
+            now_us = _last_us + 1
+        _last_us = now_us
+
+    moment = datetime.fromtimestamp(now_us / 1_000_000)
+    return (
+        f"{prefix}_{moment.strftime('%Y%m%d_%H%M%S')}_"
+        f"{now_us % 1_000_000:06d}_{secrets.token_hex(3)}"
+    )
+
+
+class InvalidJobId(ValueError):
+    """job ID 含有非法字符（API 层返回 400）"""
+
+
+def validate_job_id(job_id: str) -> str:
+    """检查 job ID 只包含安全字符（防止路径穿越），返回原值"""
+    if not job_id or not _VALID_ID.match(job_id):
+        raise InvalidJobId(f"无效的 job ID: {job_id!r}")
+    return job_id
+
+
+def shard_parts(job_id: str) -> Optional[tuple]:
+    """从 ID 中解析日期分片 (YYYY, MM, DD)，没有日期时返回 None"""
+    match = _ID_DATE.search(job_id)
+    return match.groups() if match else None
+
+
+def sharded_job_dir(job_id: str, jobs_dir: Optional[Path] = None) -> Optional[Path]:
+    """分片布局下的路径（ID 不含日期时为 None）"""
+    parts = shard_parts(job_id)
+    if not parts:
+        return None
+    return Path(jobs_dir or settings.JOBS_DIR).joinpath(*parts, job_id)
+
+
+def resolve_job_dir(
+    job_id: str,
+    jobs_dir: Optional[Path] = None,
+    sharded: Optional[bool] = None
+) -> Path:
+    """
+    定位 job 目录
+
+    已存在的目录（无论哪种布局）优先；都不存在时返回当前布局下应创建的位置。
+
+    Args:
+        job_id: job / 项目 ID
+        jobs_dir: jobs 根目录（默认 settings.JOBS_DIR）
+        sharded: 是否按日期分片（默认读取 JOB_DIR_SHARDING）
+
+    Raises:
+        ValueError: ID 含有非法字符
+    """
+    validate_job_id(job_id)
+    root = Path(jobs_dir or settings.JOBS_DIR)
+    if sharded is None:
+        sharded = settings.JOB_DIR_SHARDING
+
+    flat = root / job_id
+    shard = sharded_job_dir(job_id, root)
+    preferred, other = (shard, flat) if sharded and shard else (flat, shard)
+
+    if preferred.exists():
+        return preferred
+    if other is not None and other.exists():
+        return other
+    return preferred
+
+
+def find_job_dirs(prefix: str, jobs_dir: Optional[Path] = None) -> List[Path]:
+    """查找以 prefix 开头的 job 目录（如项目的所有版本 proj_xxx*），两种布局都查"""
+    validate_job_id(prefix)
+    root = Path(jobs_dir or settings.JOBS_DIR)
+    found = {}
+    search_dirs = [root]
+    shard = sharded_job_dir(prefix, root)
+    if shard is not None:
+        search_dirs.append(shard.parent)
+    for directory in search_dirs:
+        for path in directory.glob(f"{prefix}*"):
+            if path.is_dir():
+                found.setdefault(path.name, path)
+    return sorted(found.values(), key=lambda p: p.name)
+
+
+def iter_job_dirs(jobs_dir: Optional[Path] = None) -> Iterator[Path]:
+    """遍历所有 job 目录（平铺 + 分片），跳过隐藏文件与分片目录本身"""
+    root = Path(jobs_dir or settings.JOBS_DIR)
+    if not root.exists():
+        return
+
+    def walk(directory: Path, depth: int):
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            # YYYY / MM / DD 分片目录（纯数字）继续向下
+            if depth < 3 and _SHARD_PART.match(entry.name):
+                yield from walk(Path(entry.path), depth + 1)
+            else:
+                yield Path(entry.path)
+
+    yield from walk(root, 0)
+
+
+def migrate_job_dirs(
+    jobs_dir: Optional[Path] = None,
+    sharded: bool = True,
+    dry_run: bool = False
+) -> Dict[str, list]:
+    """
+    把已有 job 目录迁移到目标布局（同一文件系统内 rename，不复制数据）
+
+    Args:
+        jobs_dir: jobs 根目录
+        sharded: True 迁移到日期分片，False 迁回平铺
+        dry_run: 只返回计划，不移动
+
+    Returns:
+        {"moved": [(旧, 新)], "skipped": [...], "conflicts": [...]}
+    """
+    root = Path(jobs_dir or settings.JOBS_DIR)
+    report = {"moved": [], "skipped": [], "conflicts": []}
+
+    for current in list(iter_job_dirs(root)):
+        job_id = current.name
+        shard = sharded_job_dir(job_id, root)
+        if shard is None:
+            # ID 不含日期（手动指定的 ID），保持平铺
+            report["skipped"].append(str(current))
+            continue
+
+        target = shard if sharded else root / job_id
+        if current == target:
+            continue
+        if target.exists():
+            report["conflicts"].append(str(current))
+            continue
+
+        report["moved"].append((str(current), str(target)))
+        if not dry_run:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(current, target)
+
+    if not dry_run and not sharded:
+        _remove_empty_shards(root)
+
+    return report
+
+
+def _remove_empty_shards(root: Path):
+    for year in root.iterdir():
+        if not (year.is_dir() and _SHARD_PART.match(year.name)):
+            continue
+        for dirpath, _, _ in sorted(os.walk(year), key=lambda item: -len(item[0])):
+            try:
+                os.rmdir(dirpath)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    flags = {a for a in sys.argv[1:] if a.startswith("--")}
+
+    if not args or args[0] != "migrate":
+        print("用法: python -m app.core.job_paths migrate [--flat] [--dry-run] [jobs_dir]")
+        print("  默认迁移到日期分片布局（jobs/YYYY/MM/DD/<job_id>），--flat 迁回平铺")
+        sys.exit(1)
+
+    jobs_dir = Path(args[1]) if len(args) > 1 else settings.JOBS_DIR
+    dry_run = "--dry-run" in flags
+    report = migrate_job_dirs(jobs_dir, sharded="--flat" not in flags, dry_run=dry_run)
+
+    for old, new in report["moved"]:
+        print(f"   {'[计划] ' if dry_run else ''}{old} → {new}")
+    for path in report["conflicts"]:
+        print(f"   ⚠️  目标已存在，跳过: {path}")
+    print(f"\n{'🔍 预演' if dry_run else '✅ 迁移完成'}: 移动 {len(report['moved'])} 个，"
+          f"保持不变 {len(report['skipped'])} 个，冲突 {len(report['conflicts'])} 个")
+
+    if not dry_run and report["moved"]:
+        from .job_index import get_job_index
+        count = get_job_index(jobs_dir).rebuild()
+        print(f"✅ 任务索引已重建: {count} 个 job")
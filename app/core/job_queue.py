@@ -0,0 +1,533 @@
+"""
+持久化任务队列 - 按资源类别分配 worker 槽位
+
+取代 FastAPI BackgroundTasks 执行长任务：
+- 任务写入 SQLite（jobs/.job_queue.sqlite3），服务重启后继续执行排队中 / 被中断的任务
+- 每个任务声明它运行时所处的 JobState，资源类别由 StateTransition.STATE_RESOURCES 推导：
+    CPU        所有任务都占一个（即通用 worker 槽位）
+    VISION     vision=True
+    RESOLVE    resolve=True
+    GPU_HEAVY  gpu 为 high / critical
+- VISION / RESOLVE / GPU_HEAVY 对应 Orchestrator 资源锁的 VISION / RESOLVE_BUSY / GPU_HEAVY，
+  槽位数取资源锁的容量（RESOURCE_*_SLOTS）。任务启动时以 task_id 为持有者一次性获取全部对应信号量
+  （拿不全就全部退还，任务留在队列里），执行结束后释放；Orchestrator.enter_state 等队列外的调度
+  因此能看到队列任务的占用。CPU 槽位数为 QUEUE_SLOTS_CPU，只在队列内计数
+- 资源不足时任务留在队列里等待，而不是失败
+- 优先级高的先执行，同优先级按入队顺序；被资源挡住的任务会为已满的资源类别占位，
+  后面的低优先级任务不能插队占用这些资源（避免大任务饿死），不冲突的任务照常执行
+
+处理函数按任务类型注册（register），以 payload 作为关键字参数调用；
+协程函数直接在事件循环中执行，普通函数放到线程池。处理函数抛出异常即任务失败，
+失败或被中断的任务会重新执行（共 QUEUE_MAX_ATTEMPTS 次），处理函数需要能从头安全重跑。
+输入错误等确定性失败（NON_RETRYABLE_ERRORS）不重试；处理函数用 will_retry(e) 判断这次失败之后
+是否还会重跑，重跑前只发布非终态的 retrying，最后一次才发布 error。
+
+多个 worker 进程（uvicorn --workers N）共用同一个队列文件：任务由 UPDATE ... WHERE status='queued'
+原子领取，并记录领取进程的 pid；启动时只恢复领取进程已不存在的任务，不会重跑其它 worker 正在执行的任务。
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psutil
+
+from ..config import settings
+from .job_paths import new_job_id
+from .orchestrator import JobState, ResourceLock, StateTransition, default_capacities, get_orchestrator
+
+
+RESOURCE_CLASSES = ("CPU", "VISION", "RESOLVE", "GPU_HEAVY")
+
+# 资源类别 → Orchestrator 资源锁中的信号量（CPU 只在队列内计数）
+LOCK_RESOURCES = {
+    "VISION": "VISION",
+    "RESOLVE": "RESOLVE_BUSY",
+    "GPU_HEAVY": "GPU_HEAVY"
+}
+
+# 没有注册处理函数 / 没有可执行任务时的轮询间隔
+POLL_INTERVAL_SEC = 1.0
+
+# 确定性的失败（输入错误、DSL 校验失败、文件缺失等），重跑结果相同，不重试
+NON_RETRYABLE_ERRORS = (ValueError, TypeError, KeyError, FileNotFoundError, PermissionError, NotImplementedError)
+
+# 当前执行的队列任务：(第几次执行, 最多执行次数)；asyncio.to_thread 会带到线程里
+_current_attempt: ContextVar[Optional[Tuple[int, int]]] = ContextVar("job_queue_attempt", default=None)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    resources TEXT NOT NULL,
+    status TEXT NOT NULL,
+    job_id TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    error TEXT,
+    worker_pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_pending ON tasks (status, priority DESC, created_at);
+"""
+
+
+def resource_classes_for_state(state: JobState) -> List[str]:
+    """由状态的资源需求推导资源类别"""
+    requirements = StateTransition.get_resource_requirements(state)
+    classes = ["CPU"]
+    if requirements.get("vision"):
+        classes.append("VISION")
+    if requirements.get("resolve"):
+        classes.append("RESOLVE")
+    if requirements.get("gpu") in ("high", "critical"):
+        classes.append("GPU_HEAVY")
+    return classes
+
+
+def is_retryable(error: BaseException) -> bool:
+    """失败后重跑是否可能成功"""
+    return not isinstance(error, NON_RETRYABLE_ERRORS)
+
+
+def will_retry(error: BaseException) -> bool:
+    """
+    当前队列任务因 error 失败后是否还会重新执行
+
+    处理函数据此决定发布 retrying（还会重跑）还是 error 终态；不在队列任务中调用时返回 False。
+    """
+    attempt = _current_attempt.get()
+    return attempt is not None and attempt[0] < attempt[1] and is_retryable(error)
+
+
+def default_slots(resource_lock: Optional[ResourceLock] = None) -> Dict[str, int]:
+    """各资源类别的槽位数：CPU 读取配置，其它取资源锁的容量"""
+    capacities = resource_lock.capacities() if resource_lock is not None else default_capacities()
+    slots = {"CPU": settings.QUEUE_SLOTS_CPU or max(1, (os.cpu_count() or 2) // 2)}
+    for name, semaphore in LOCK_RESOURCES.items():
+        slots[name] = capacities[semaphore]
+    return slots
+
+
+@dataclass
+class QueuedTask:
+    """队列中的任务"""
+    task_id: str
+    kind: str
+    payload: Dict[str, Any]
+    priority: int = 0
+    resources: List[str] = field(default_factory=lambda: ["CPU"])
+    status: str = "queued"  # queued, running, done, failed, cancelled
+    job_id: Optional[str] = None
+    attempts: int = 0
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+    worker_pid: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "QueuedTask":
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        data["resources"] = json.loads(data["resources"])
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobQueue:
+    """持久化优先级队列 + 按资源类别的 worker 调度"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        slots: Optional[Dict[str, int]] = None,
+        max_attempts: int = 3,
+        resource_lock: Optional[ResourceLock] = None
+    ):
+        """
+        Args:
+            db_path: 队列数据库路径
+            slots: 各资源类别的槽位数（默认由配置和资源锁容量计算）
+            max_attempts: 任务最多执行次数（含失败重试和重启后的重跑）
+            resource_lock: Orchestrator 的资源锁（None 表示只按队列内的槽位调度）
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.resource_lock = resource_lock
+        self.slots = dict(slots or default_slots(resource_lock))
+        self.max_attempts = max_attempts
+
+        self._handlers: Dict[str, Callable] = {}
+        self._in_use = {name: 0 for name in self.slots}
+        self._running: Dict[str, asyncio.Task] = {}
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "worker_pid" not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN worker_pid INTEGER")
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._scheduler: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    # ==================== 注册 / 入队 ====================
+
+    def register(self, kind: str, handler: Callable):
+        """注册任务类型的处理函数（以 payload 作为关键字参数调用）"""
+        self._handlers[kind] = handler
+        self._notify()
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        state: Optional[JobState] = None,
+        resources: Optional[List[str]] = None,
+        priority: int = 0,
+        job_id: Optional[str] = None
+    ) -> str:
+        """
+        入队
+
+        Args:
+            kind: 任务类型（需已注册处理函数才会被执行）
+            payload: 处理函数的关键字参数（必须可 JSON 序列化）
+            state: 任务运行时所处的状态，用于推导资源类别
+            resources: 直接指定资源类别（优先于 state）
+            priority: 优先级，越大越先执行
+            job_id: 关联的 job / 项目 ID
+
+        Returns:
+            task_id
+        """
+        if resources is None:
+            resources = resource_classes_for_state(state) if state else ["CPU"]
+        unknown = [r for r in resources if r not in self.slots]
+        if unknown:
+            raise ValueError(f"未知的资源类别: {unknown}")
+
+        task_id = new_job_id("task")
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tasks (task_id, kind, payload, priority, resources, status, job_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (
+                    task_id,
+                    kind,
+                    json.dumps(payload, ensure_ascii=False),
+                    priority,
+                    json.dumps(sorted(set(resources))),
+                    job_id,
+                    datetime.now().isoformat()
+                )
+            )
+        self._notify()
+        return task_id
+
+    def cancel(self, task_id: str) -> bool:
+        """取消排队中的任务（执行中的任务不能取消）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET status = 'cancelled', finished_at = ? "
+                "WHERE task_id = ? AND status = 'queued'",
+                (datetime.now().isoformat(), task_id)
+            )
+        return cursor.rowcount > 0
+
+    # ==================== 查询 ====================
+
+    def get_task(self, task_id: str) -> Optional[QueuedTask]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return QueuedTask.from_row(row) if row else None
+
+    def list_tasks(self, status: Optional[str] = None, limit: int = 100) -> List[QueuedTask]:
+        """任务列表（排队中的按执行顺序，其余按创建时间倒序）"""
+        with self._lock:
+            if status == "queued":
+                rows = self._conn.execute(
+                    "SELECT * FROM tasks WHERE status = 'queued' "
+                    "ORDER BY priority DESC, created_at, task_id LIMIT ?",
+                    (limit,)
+                ).fetchall()
+            elif status:
+                rows = self._conn.execute(
+                    "SELECT * FROM tasks WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                    (status, limit)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM tasks ORDER BY created_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+        return [QueuedTask.from_row(row) for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """槽位占用与各状态任务数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM tasks GROUP BY status"
+            ).fetchall()
+        slots = {
+            name: {"capacity": capacity, "in_use": self._in_use.get(name, 0)}
+            for name, capacity in self.slots.items()
+        }
+        if self.resource_lock is not None:
+            for name, semaphore in LOCK_RESOURCES.items():
+                if name in slots:
+                    # 资源锁的剩余容量（包括队列外的 job 占用）
+                    slots[name]["lock_available"] = self.resource_lock.available(semaphore)
+        return {
+            "running": self._scheduler is not None and not self._scheduler.done(),
+            "slots": slots,
+            "tasks": {row["status"]: row["n"] for row in rows},
+            "active": sorted(self._running)
+        }
+
+    # ==================== 调度 ====================
+
+    async def start(self):
+        """恢复中断的任务并启动调度循环（在事件循环中调用）"""
+        if self._scheduler is not None and not self._scheduler.done():
+            return
+
+        recovered = self._recover_interrupted()
+        if recovered:
+            print(f"🔁 任务队列: 恢复 {recovered} 个被中断的任务")
+
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._scheduler = asyncio.create_task(self._run_scheduler(), name="job-queue")
+
+    async def stop(self):
+        """停止调度（执行中的任务保持 running，下次启动时重新执行）"""
+        if self._scheduler is not None:
+            # Python 3.11 的 wait_for 可能吞掉 cancel，额外用标志位退出循环
+            self._stopping = True
+            self._wake.set()
+            self._scheduler.cancel()
+            try:
+                await self._scheduler
+            except asyncio.CancelledError:
+                pass
+            self._scheduler = None
+        self._loop = None
+
+    async def wait_idle(self, timeout: Optional[float] = None):
+        """等待当前没有执行中 / 可执行的任务（测试用）"""
+        async def idle():
+            while True:
+                if not self._running and not self._runnable_exists():
+                    return
+                await asyncio.sleep(0.02)
+        await asyncio.wait_for(idle(), timeout)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _notify(self):
+        """唤醒调度循环（可在任意线程调用）"""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass
+
+    async def _run_scheduler(self):
+        while not self._stopping:
+            self._wake.clear()
+            self._dispatch()
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL_SEC)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self):
+        """按优先级启动资源允许的任务"""
+        reserved = set()
+        for task in self.list_tasks(status="queued", limit=1000):
+            if task.kind not in self._handlers:
+                continue
+            needed = set(task.resources)
+            if needed & reserved:
+                continue
+            exhausted = {
+                r for r in needed
+                if self._in_use[r] >= self.slots[r] or self._lock_full(r)
+            }
+            if not exhausted:
+                exhausted = self._acquire_locks(task)
+                if not exhausted:
+                    self._start_task(task)
+                    continue
+            # 为被挡住的任务占住已满的资源类别，后面的任务不能抢先占用
+            reserved |= exhausted
+
+    def _lock_full(self, resource: str) -> bool:
+        """资源锁中对应的信号量是否已被占满（如其它 job 正在 Resolve 导出）"""
+        semaphore = LOCK_RESOURCES.get(resource)
+        if self.resource_lock is None or semaphore is None:
+            return False
+        return self.resource_lock.available(semaphore) <= 0
+
+    def _acquire_locks(self, task: QueuedTask) -> set:
+        """
+        以 task_id 为持有者获取任务资源类别对应的全部信号量（不阻塞，全有或全无）
+
+        Returns:
+            没能获取的资源类别（空集合表示全部获取成功）
+        """
+        if self.resource_lock is None:
+            return set()
+        taken = []
+        for resource in task.resources:
+            semaphore = LOCK_RESOURCES.get(resource)
+            if semaphore is None:
+                continue
+            if not self.resource_lock.acquire(semaphore, task.task_id):
+                for held in taken:
+                    self.resource_lock.release(held, task.task_id)
+                return {resource}
+            taken.append(semaphore)
+        return set()
+
+    def _release_locks(self, task: QueuedTask):
+        if self.resource_lock is None:
+            return
+        for resource in task.resources:
+            semaphore = LOCK_RESOURCES.get(resource)
+            if semaphore is not None:
+                self.resource_lock.release(semaphore, task.task_id)
+
+    def _start_task(self, task: QueuedTask):
+        """领取任务并开始执行（调用前已获取资源锁；被其它 worker 抢先领取时退还）"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET status = 'running', started_at = ?, attempts = attempts + 1, worker_pid = ? "
+                "WHERE task_id = ? AND status = 'queued'",
+                (datetime.now().isoformat(), os.getpid(), task.task_id)
+            )
+        if cursor.rowcount == 0:
+            self._release_locks(task)
+            return
+
+        for resource in task.resources:
+            self._in_use[resource] += 1
+        self._running[task.task_id] = asyncio.create_task(
+            self._execute(task), name=f"job-queue:{task.task_id}"
+        )
+
+    async def _execute(self, task: QueuedTask):
+        handler = self._handlers[task.kind]
+        status, error, retryable = "done", None, False
+        _current_attempt.set((task.attempts + 1, self.max_attempts))
+        try:
+            if asyncio.iscoroutinefunction(handler):
+                await handler(**task.payload)
+            else:
+                await asyncio.to_thread(handler, **task.payload)
+        except asyncio.CancelledError:
+            # 服务关闭：保持 running，下次启动时重跑
+            raise
+        except Exception as e:
+            status, error, retryable = "failed", f"{type(e).__name__}: {e}", is_retryable(e)
+            print(f"❌ 队列任务失败 [{task.kind}] {task.task_id}: {error}" + ("" if retryable else "（不重试）"))
+        finally:
+            for resource in task.resources:
+                self._in_use[resource] -= 1
+            self._release_locks(task)
+            self._running.pop(task.task_id, None)
+            if self._wake is not None:
+                self._wake.set()
+
+        finished_at = datetime.now().isoformat()
+        if status == "failed" and retryable and task.attempts + 1 < self.max_attempts:
+            # 还有剩余次数：重新排队（保留本次错误）
+            status, finished_at = "queued", None
+            print(f"🔁 队列任务重试 [{task.kind}] {task.task_id}: 第 {task.attempts + 2}/{self.max_attempts} 次")
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, finished_at = ?, error = ? WHERE task_id = ?",
+                (status, finished_at, error, task.task_id)
+            )
+        if status == "queued":
+            self._notify()
+
+    def _recover_interrupted(self) -> int:
+        """
+        上次退出时仍在执行的任务重新入队（超过最大次数则标记失败）
+        
+        只处理领取进程已退出的任务（或本进程之前的实例）；其它存活 worker 的任务保持 running。
+        """
+        now = datetime.now().isoformat()
+        pid = os.getpid()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, worker_pid FROM tasks WHERE status = 'running'"
+            ).fetchall()
+            orphaned = [
+                row["task_id"] for row in rows
+                if row["worker_pid"] in (None, pid) or not psutil.pid_exists(row["worker_pid"])
+            ]
+            recovered = 0
+            for task_id in orphaned:
+                self._conn.execute(
+                    "UPDATE tasks SET status = 'failed', finished_at = ?, error = '重启后重试次数超过上限' "
+                    "WHERE task_id = ? AND status = 'running' AND attempts >= ?",
+                    (now, task_id, self.max_attempts)
+                )
+                cursor = self._conn.execute(
+                    "UPDATE tasks SET status = 'queued' WHERE task_id = ? AND status = 'running'",
+                    (task_id,)
+                )
+                recovered += cursor.rowcount
+        return recovered
+
+    def _runnable_exists(self) -> bool:
+        for task in self.list_tasks(status="queued", limit=1000):
+            if task.kind in self._handlers:
+                return True
+        return False
+
+
+# 全局单例
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """获取全局任务队列单例"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            settings.JOBS_DIR / settings.JOB_QUEUE_FILE,
+            max_attempts=settings.QUEUE_MAX_ATTEMPTS,
+            resource_lock=get_orchestrator().resource_lock
+        )
+    return _job_queue
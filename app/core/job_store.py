@@ -1,26 +1,99 @@
-"""任务存储管理 - 管理 job 目录和状态（集成状态机）"""
+"""任务存储管理 - 管理 job 目录和状态（集成状态机）
+
+并发写入：
+- 每个 job 一把进程内可重入锁，读-改-写 metadata.json 全程持锁
+- 写入走临时文件 + os.replace，读者永远看不到写了一半的 JSON
+- 只更新 status / progress 的高频调用可以合并：先改内存中的待写副本，
+  每 JOB_PROGRESS_COALESCE_MS 毫秒最多落盘一次；状态转换、错误、结果立即落盘
+"""
 from pathlib import Path
 from datetime import datetime
+import copy
 import json
+import os
+import sqlite3
+import threading
 import uuid
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any
 
 from ..config import settings
+from .job_index import get_job_index
+from .job_paths import new_job_id, resolve_job_dir, validate_job_id
 from .orchestrator import get_orchestrator, JobState
+from .progress_bus import get_progress_bus
+
+
+class _JobSlot:
+    """单个 job 的写入状态（锁 + 待合并写入），同一 metadata.json 的所有 JobStore 共用"""
+    
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.pending: Optional[Dict[str, Any]] = None
+        self.timer: Optional[threading.Timer] = None
+        self.flush: Optional[Callable[[], None]] = None
+
+
+_slots: Dict[str, _JobSlot] = {}
+_slots_lock = threading.Lock()
+
+
+def flush_pending_writes():
+    """立即落盘所有合并中的进度更新（关闭服务时调用）"""
+    with _slots_lock:
+        slots = list(_slots.values())
+    for slot in slots:
+        flush = slot.flush
+        if flush:
+            flush()
 
 
 class JobStore:
     """任务存储管理器"""
     
-    def __init__(self):
-        self.jobs_dir = settings.JOBS_DIR
+    def __init__(self, jobs_dir: Optional[Path] = None, coalesce_ms: Optional[int] = None):
+        """
+        Args:
+            jobs_dir: job 根目录（默认 settings.JOBS_DIR）
+            coalesce_ms: 进度更新合并窗口（毫秒），0 表示每次都落盘，默认读取配置
+        """
+        self.jobs_dir = Path(jobs_dir) if jobs_dir else settings.JOBS_DIR
         self.jobs_dir.mkdir(exist_ok=True)
+        self.index = get_job_index(self.jobs_dir)
+        self.coalesce_ms = settings.JOB_PROGRESS_COALESCE_MS if coalesce_ms is None else coalesce_ms
+    
+    def job_dir(self, job_id: str) -> Path:
+        """job 目录（兼容平铺 / 日期分片两种布局）"""
+        return resolve_job_dir(job_id, self.jobs_dir)
     
-    def create_job(self) -> str:
-        """创建新任务，返回 job_id"""
-        job_id = f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        job_dir = self.jobs_dir / job_id
-        job_dir.mkdir(exist_ok=True)
+    def create_job(
+        self,
+        job_id: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        创建新任务，返回 job_id
+        
+        Args:
+            job_id: 指定 ID（可选，默认生成时间有序的唯一 ID）
+            extra: 额外写入元数据的字段（如 video_path）
+        
+        Raises:
+            FileExistsError: 指定的 job_id 已存在
+        """
+        if job_id:
+            validate_job_id(job_id)
+            job_dir = self.job_dir(job_id)
+            # 目录创建即占用，已存在说明 ID 冲突
+            job_dir.mkdir(parents=True)
+        else:
+            while True:
+                job_id = new_job_id()
+                job_dir = self.job_dir(job_id)
+                try:
+                    job_dir.mkdir(parents=True)
+                    break
+                except FileExistsError:
+                    continue
         
         # 创建子目录
         (job_dir / "input").mkdir(exist_ok=True)
@@ -44,6 +117,8 @@ class JobStore:
                 }
             ]
         }
+        if extra:
+            metadata.update(extra)
         
         self._save_metadata(job_id, metadata)
         
@@ -54,18 +129,19 @@ class JobStore:
         return job_id
     
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
-        """获取任务信息"""
-        metadata_path = self.jobs_dir / job_id / "metadata.json"
-        
-        if not metadata_path.exists():
-            return None
-        
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        """获取任务信息（包含尚未落盘的合并更新）"""
+        slot = self._slot(job_id)
+        with slot.lock:
+            metadata = self._read_metadata(job_id, slot)
+            return copy.deepcopy(metadata) if metadata is slot.pending else metadata
     
-    def get_job_artifacts(self, job_id: str) -> Dict[str, Any]:
+    def get_job_artifacts(self, job_id: str, refresh: bool = False) -> Dict[str, Any]:
         """
-        获取任务的所有产物文件
+        获取任务的所有产物文件（目录未变化时直接读索引）
+        
+        Args:
+            job_id: 任务 ID
+            refresh: 忽略索引，强制重新扫描
         
         Returns:
             {
@@ -74,34 +150,15 @@ class JobStore:
                 "output": [...]
             }
         """
-        job_dir = self.jobs_dir / job_id
+        try:
+            job_dir = self.job_dir(job_id)
+        except ValueError:
+            return {}
         
         if not job_dir.exists():
             return {}
         
-        artifacts = {
-            "input": [],
-            "temp": [],
-            "output": []
-        }
-        
-        # 扫描各个目录
-        for category in ["input", "temp", "output"]:
-            category_dir = job_dir / category
-            if category_dir.exists():
-                for file_path in category_dir.iterdir():
-                    if file_path.is_file():
-                        file_info = {
-                            "name": file_path.name,
-                            "path": str(file_path.relative_to(self.jobs_dir)),
-                            "size": file_path.stat().st_size,
-                            "modified": datetime.fromtimestamp(
-                                file_path.stat().st_mtime
-                            ).isoformat()
-                        }
-                        artifacts[category].append(file_info)
-        
-        return artifacts
+        return self.index.get_artifacts(job_id, refresh=refresh, job_dir=job_dir)
     
     def get_job_trace(self, job_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -116,7 +173,7 @@ class JobStore:
                 "actions": [...]
             }
         """
-        trace_path = self.jobs_dir / job_id / "output" / "trace.json"
+        trace_path = self.job_dir(job_id) / "output" / "trace.json"
         
         if not trace_path.exists():
             return None
@@ -158,43 +215,20 @@ class JobStore:
         Returns:
             (是否成功, 消息)
         """
-        orchestrator = get_orchestrator()
-        
-        # 检查是否可以转换
-        if not force:
-            can_enter, reason = orchestrator.can_enter_state(job_id, target_state)
-            if not can_enter:
-                return False, reason
-        
-        # 获取当前状态
-        metadata = self.get_job(job_id)
-        if not metadata:
-            return False, f"任务不存在: {job_id}"
-        
-        current_state_str = metadata.get("state", JobState.CREATED.value)
-        current_state = JobState(current_state_str)
-        
-        # 退出旧状态
-        orchestrator.exit_state(job_id, current_state)
-        
-        # 进入新状态
-        orchestrator.enter_state(job_id, target_state)
-        
-        # 更新元数据
-        metadata["state"] = target_state.value
-        metadata["status"] = target_state.value
-        metadata["updated_at"] = datetime.now().isoformat()
-        
-        # 记录状态历史
-        if "state_history" not in metadata:
-            metadata["state_history"] = []
-        
-        metadata["state_history"].append({
-            "state": target_state.value,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        self._save_metadata(job_id, metadata)
+        slot = self._slot(job_id)
+        with slot.lock:
+            if not force:
+                can_enter, reason = get_orchestrator().can_enter_state(job_id, target_state)
+                if not can_enter:
+                    return False, reason
+            
+            metadata = self._read_metadata(job_id, slot)
+            if not metadata:
+                return False, f"任务不存在: {job_id}"
+            
+            self._apply_transition(job_id, metadata, target_state)
+            self._save_metadata(job_id, metadata)
+            self._publish(job_id, metadata)
         
         return True, f"已转换到 {target_state.value}"
     
@@ -205,59 +239,241 @@ class JobStore:
         progress: Optional[int] = None,
         error: Optional[Any] = None,
         result: Optional[Any] = None,
-        state: Optional[JobState] = None
+        state: Optional[JobState] = None,
+        extra: Optional[Dict[str, Any]] = None
     ):
-        """更新任务状态"""
-        metadata = self.get_job(job_id)
-        if not metadata:
-            raise ValueError(f"任务不存在: {job_id}")
-        
-        # 如果指定了新状态，使用状态机转换
-        if state:
-            success, message = self.transition_state(job_id, state)
-            if not success:
-                raise RuntimeError(f"状态转换失败: {message}")
-        
-        if status:
-            metadata["status"] = status
-        if progress is not None:
-            metadata["progress"] = progress
-        if error is not None:
-            metadata["error"] = error
-            # 错误时自动转换到 FAILED 状态
-            if not state:
-                self.transition_state(job_id, JobState.FAILED, force=True)
-        if result is not None:
-            metadata["result"] = result
+        """
+        更新任务状态
         
-        metadata["updated_at"] = datetime.now().isoformat()
+        整个读-改-写在 job 锁内完成，状态转换直接作用在同一份元数据上，
+        不会被随后的写入覆盖。只更新 status / progress 时按 coalesce_ms 合并落盘。
         
-        self._save_metadata(job_id, metadata)
+        Args:
+            extra: 额外写入元数据的字段（如 audio_path）
+        """
+        slot = self._slot(job_id)
+        with slot.lock:
+            metadata = self._read_metadata(job_id, slot)
+            if not metadata:
+                raise ValueError(f"任务不存在: {job_id}")
+            
+            # 如果指定了新状态，使用状态机转换
+            if state:
+                can_enter, reason = get_orchestrator().can_enter_state(job_id, state)
+                if not can_enter:
+                    raise RuntimeError(f"状态转换失败: {reason}")
+                self._apply_transition(job_id, metadata, state)
+            
+            if status:
+                metadata["status"] = status
+            if progress is not None:
+                metadata["progress"] = progress
+            if error is not None:
+                metadata["error"] = error
+                # 错误时自动转换到 FAILED 状态
+                if not state:
+                    self._apply_transition(job_id, metadata, JobState.FAILED)
+            if result is not None:
+                metadata["result"] = result
+            if extra:
+                metadata.update(extra)
+            
+            metadata["updated_at"] = datetime.now().isoformat()
+            
+            only_progress = state is None and error is None and result is None and not extra
+            if only_progress and self.coalesce_ms > 0:
+                self._defer_save(job_id, slot, metadata)
+            else:
+                self._save_metadata(job_id, metadata)
+            
+            # 推送给 SSE 订阅者（不等合并落盘）
+            self._publish(job_id, metadata)
     
-    def list_jobs(self, limit: int = 50) -> list:
-        """列出所有任务"""
-        jobs = []
-        
-        for job_dir in sorted(self.jobs_dir.iterdir(), reverse=True):
-            if job_dir.is_dir():
-                metadata = self.get_job(job_dir.name)
-                if metadata:
-                    jobs.append(metadata)
-                
-                if len(jobs) >= limit:
-                    break
+    def flush(self, job_id: Optional[str] = None):
+        """立即落盘合并中的更新（不指定 job_id 时落盘全部）"""
+        if job_id is None:
+            flush_pending_writes()
+            return
+        self._flush_slot(job_id, self._slot(job_id))
+    
+    def list_jobs(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        state: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None
+    ) -> list:
+        """
+        列出任务（走索引，按创建时间倒序）
         
-        return jobs
+        Args:
+            limit / offset: 分页
+            state: 按当前状态过滤
+            status: 按 status 过滤
+            created_after / created_before: ISO 时间或日期，区间 [after, before)
+        """
+        self.index.ensure_built()
+        return self.index.query_jobs(
+            limit=limit,
+            offset=offset,
+            state=state,
+            status=status,
+            created_after=created_after,
+            created_before=created_before
+        )
+    
+    def count_jobs(
+        self,
+        state: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None
+    ) -> int:
+        """符合过滤条件的任务总数"""
+        self.index.ensure_built()
+        return self.index.count_jobs(
+            state=state,
+            status=status,
+            created_after=created_after,
+            created_before=created_before
+        )
+    
+    def rebuild_index(self) -> int:
+        """从磁盘上的 job 目录重建索引，返回 job 数量"""
+        return self.index.rebuild()
     
     def delete_job(self, job_id: str):
         """删除任务"""
-        job_dir = self.jobs_dir / job_id
-        if job_dir.exists():
-            import shutil
-            shutil.rmtree(job_dir)
+        slot = self._slot(job_id)
+        with slot.lock:
+            self._cancel_pending(slot)
+            job_dir = self.job_dir(job_id)
+            if job_dir.exists():
+                import shutil
+                shutil.rmtree(job_dir)
+        
+        with _slots_lock:
+            _slots.pop(self._slot_key(job_id), None)
+        get_progress_bus().clear(job_id)
+        
+        try:
+            self.index.delete_job(job_id)
+        except sqlite3.Error as e:
+            print(f"⚠️  任务索引同步失败，下次查询时重建: {e}")
+            self.index.mark_stale()
+    
+    def publish_status(self, job_id: str) -> bool:
+        """把当前状态快照推送到进度事件总线（订阅 SSE 前补齐快照），任务不存在时返回 False"""
+        slot = self._slot(job_id)
+        with slot.lock:
+            metadata = self._read_metadata(job_id, slot)
+            if not metadata:
+                return False
+            self._publish(job_id, metadata)
+        return True
+    
+    @staticmethod
+    def _publish(job_id: str, metadata: dict):
+        """发布状态快照到进度事件总线"""
+        get_progress_bus().publish(job_id, "status", {
+            "job_id": job_id,
+            "state": metadata.get("state"),
+            "status": metadata.get("status"),
+            "progress": metadata.get("progress", 0),
+            "error": metadata.get("error"),
+            "updated_at": metadata.get("updated_at")
+        })
     
     def _save_metadata(self, job_id: str, metadata: dict):
-        """保存任务元数据"""
-        metadata_path = self.jobs_dir / job_id / "metadata.json"
-        with open(metadata_path, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        """保存任务元数据（原子写入，并取消该 job 待合并的写入）"""
+        slot = self._slot(job_id)
+        with slot.lock:
+            self._cancel_pending(slot)
+            self._write_metadata(job_id, metadata)
+    
+    def _write_metadata(self, job_id: str, metadata: dict):
+        """临时文件 + os.replace 写入 metadata.json，然后同步索引"""
+        metadata_path = self.job_dir(job_id) / "metadata.json"
+        tmp_path = metadata_path.with_name(
+            f".metadata.json.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, metadata_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        
+        # 同步索引（metadata.json 是真实来源，索引失败只标记重建）
+        try:
+            self.index.upsert_job(metadata)
+        except sqlite3.Error as e:
+            print(f"⚠️  任务索引同步失败，下次查询时重建: {e}")
+            self.index.mark_stale()
+    
+    def _slot_key(self, job_id: str) -> str:
+        return str((self.jobs_dir / job_id).absolute())
+    
+    def _slot(self, job_id: str) -> _JobSlot:
+        key = self._slot_key(job_id)
+        with _slots_lock:
+            slot = _slots.get(key)
+            if slot is None:
+                slot = _slots[key] = _JobSlot()
+            return slot
+    
+    def _read_metadata(self, job_id: str, slot: _JobSlot) -> Optional[Dict[str, Any]]:
+        """读取元数据（调用方持有 slot.lock）：优先返回待写副本"""
+        if slot.pending is not None:
+            return slot.pending
+        
+        try:
+            metadata_path = self.job_dir(job_id) / "metadata.json"
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def _apply_transition(self, job_id: str, metadata: dict, target_state: JobState):
+        """在元数据上执行状态转换（调用方持有 slot.lock）"""
+        orchestrator = get_orchestrator()
+        
+        current_state = JobState(metadata.get("state", JobState.CREATED.value))
+        orchestrator.exit_state(job_id, current_state)
+        orchestrator.enter_state(job_id, target_state)
+        
+        now = datetime.now().isoformat()
+        metadata["state"] = target_state.value
+        metadata["status"] = target_state.value
+        metadata["updated_at"] = now
+        metadata.setdefault("state_history", []).append({
+            "state": target_state.value,
+            "timestamp": now
+        })
+    
+    def _defer_save(self, job_id: str, slot: _JobSlot, metadata: dict):
+        """记录待写副本，窗口结束时统一落盘"""
+        slot.pending = metadata
+        slot.flush = lambda: self._flush_slot(job_id, slot)
+        if slot.timer is None:
+            slot.timer = threading.Timer(self.coalesce_ms / 1000, slot.flush)
+            slot.timer.daemon = True
+            slot.timer.start()
+    
+    def _flush_slot(self, job_id: str, slot: _JobSlot):
+        with slot.lock:
+            metadata = slot.pending
+            self._cancel_pending(slot)
+            if metadata is not None and self.job_dir(job_id).exists():
+                self._write_metadata(job_id, metadata)
+    
+    @staticmethod
+    def _cancel_pending(slot: _JobSlot):
+        if slot.timer is not None:
+            slot.timer.cancel()
+            slot.timer = None
+        slot.pending = None
+        slot.flush = None
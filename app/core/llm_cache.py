@@ -0,0 +1,177 @@
+"""
+LLM 回复缓存 - 按请求内容寻址的磁盘缓存
+
+键：(model, messages（系统提示词 + 用户消息）, temperature, response_format) 的 sha256
+值：回复文本（只缓存能解析为 JSON 的回复）+ 原始调用耗时
+
+素材不变时重新运行 /api/llm/generate-dsl、/api/storyteller/create-story 或项目重新处理，
+编译出的请求完全相同，直接返回上次的回复，不再调用服务商。
+需要重新生成（同样的输入换一个结果）时传 use_cache=False：跳过读取，新的回复仍写回缓存。
+
+存储布局、原子写与 LRU 淘汰见 DiskLRUCache（与视觉缓存共用）：
+    cache/llm/ab/ab12...ef.json
+- 条目超过 LLM_CACHE_TTL_SEC 视为过期，读取时删除
+- 超过容量上限时按最近访问时间淘汰
+
+统计：命中率、命中节省的调用耗时（命中条目记录的原始耗时之和），见 /api/runtime/llm-cache
+"""
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from .disk_cache import DiskLRUCache
+
+
+class LLMResponseCache(DiskLRUCache):
+    """LLM 回复磁盘缓存"""
+
+    label = "LLM 缓存"
+
+    def __init__(self, cache_dir: Path, max_mb: int = 256, ttl_sec: float = 0):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_mb: 容量上限（MB）
+            ttl_sec: 条目有效期（秒，0 表示不过期）
+        """
+        super().__init__(cache_dir, max_mb)
+        self.ttl_sec = ttl_sec
+        self._stats.update({
+            "bypassed": 0,
+            "saved_ms": 0.0,
+            "miss_latency_ms": 0.0
+        })
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """缓存键：模型 + 消息 + 温度 + 输出格式"""
+        raw = json.dumps(
+            [model, messages, temperature, response_format],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        """超过 ttl_sec 的条目过期"""
+        return bool(self.ttl_sec) and now - entry.get("created_at", 0) > self.ttl_sec
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存的回复文本，未命中或已过期返回 None"""
+        entry = self._read_entry(key)
+        if entry is None:
+            return None
+
+        with self._lock:
+            self._stats["saved_ms"] += entry.get("latency_ms", 0.0)
+        return entry.get("content")
+
+    def put(self, key: str, content: str, model: str = "", latency_ms: float = 0.0):
+        """写入缓存"""
+        self._write_entry(key, {
+            "model": model,
+            "created_at": time.time(),
+            "latency_ms": round(latency_ms, 1),
+            "content": content
+        })
+
+    def record_call(self, latency_ms: float, bypassed: bool = False):
+        """记录一次实际调用（未命中或跳过缓存）的耗时"""
+        with self._lock:
+            self._stats["miss_latency_ms"] += latency_ms
+            if bypassed:
+                self._stats["bypassed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息（另含命中节省的耗时与实际调用的平均耗时）"""
+        stats = super().get_stats()
+        calls = stats["misses"] + stats["bypassed"]
+        stats.update({
+            "saved_ms": round(stats["saved_ms"], 1),
+            "miss_latency_ms": round(stats["miss_latency_ms"], 1),
+            "avg_call_ms": round(stats["miss_latency_ms"] / calls, 1) if calls else 0.0,
+            "ttl_sec": self.ttl_sec
+        })
+        return stats
+
+
+def chat_json(
+    client: Any,
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: Optional[float] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    use_cache: bool = True,
+    **options
+) -> Any:
+    """
+    发送 chat.completions 请求并把回复解析为 JSON，相同请求命中缓存时不再调用
+
+    Args:
+        client: OpenAI 客户端
+        model / messages / temperature / response_format: 请求参数（参与计算缓存键）
+        use_cache: False 表示跳过缓存读取（重新生成），新回复仍写回缓存
+        **options: 其它请求参数（如 timeout，不参与计算缓存键）
+
+    Raises:
+        json.JSONDecodeError: 回复不是有效 JSON（不会写入缓存）
+    """
+    cache = get_llm_cache()
+    key = None
+    if cache is not None:
+        key = cache.make_key(model, messages, temperature, response_format)
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                try:
+                    return json.loads(cached)
+                except json.JSONDecodeError:
+                    pass  # 损坏的条目，重新请求后覆盖
+
+    request = {"model": model, "messages": messages}
+    if temperature is not None:
+        request["temperature"] = temperature
+    if response_format is not None:
+        request["response_format"] = response_format
+
+    t0 = time.perf_counter()
+    response = client.chat.completions.create(**request, **options)
+    latency_ms = (time.perf_counter() - t0) * 1000
+    content = response.choices[0].message.content
+    if cache is not None:
+        cache.record_call(latency_ms, bypassed=not use_cache)
+
+    data = json.loads(content)
+    if cache is not None:
+        cache.put(key, content, model=model, latency_ms=latency_ms)
+    return data
+
+
+# 全局单例
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """获取全局 LLM 回复缓存（单例），配置关闭时返回 None"""
+    global _llm_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache(
+                settings.LLM_CACHE_DIR,
+                max_mb=settings.LLM_CACHE_MAX_MB,
+                ttl_sec=settings.LLM_CACHE_TTL_SEC
+            )
+        return _llm_cache
@@ -0,0 +1,371 @@
+"""
+共享 LLM 客户端池 - 按服务商复用连接，令牌桶限流，429 / 5xx 抖动重试
+
+旧路径：LLMDirector / VisualStoryteller / VisualAnalyzer 每个实例 new 一个 OpenAI 客户端，
+generate_dsl_from_materials 每次调用都 new 一个 LLMDirector。每个客户端各自一套 httpx 连接池，
+并发项目之间不复用长连接，也没有人统计发给同一服务商的请求速率，429 直接变成任务失败。
+
+客户端池：
+1. 按 (base_url, api_key) 缓存一个 OpenAI 客户端（线程安全），底层 httpx 连接池保持长连接
+2. 每个服务商一个令牌桶（LLM_RATE_LIMIT_RPM / LLM_RATE_LIMIT_BURST），所有调用方共享
+3. 429 / 5xx / 连接错误按指数退避 + 随机抖动重试，优先遵循 Retry-After；
+   429 时整个服务商暂停到退避结束，避免其它线程继续撞限流
+4. 统计请求数、重试数、限流等待与调用耗时，见 /runtime/llm-clients
+5. 调用方可以传截止时间 deadline（time.monotonic()）：过期后不再发起请求或重试，
+   每次请求的超时也不超过剩余时间（调用方放弃等待后，线程不会继续占用服务商配额）
+
+调用方都是同步代码（在 run_llm 线程池、分层规划初筛线程、视觉流水线线程中运行），
+返回的 PooledClient 提供与 OpenAI 客户端相同的 client.chat.completions.create 接口。
+限流等待和重试退避会阻塞调用线程，async 路由必须通过 run_llm（LLM_MAX_THREADS 个专用线程）调用，
+不要用 run_blocking，以免占满 ASR / 导出共用的线程池。
+
+用法:
+    client = get_llm_client()
+    response = client.chat.completions.create(model=..., messages=...)
+"""
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import openai
+from openai import OpenAI
+
+from ..config import settings
+
+
+class TokenBucket:
+    """令牌桶限流（线程安全）"""
+
+    def __init__(self, rate_per_min: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            rate_per_min: 每分钟补充的令牌数（0 表示不限流）
+            burst: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate_per_min / 60.0
+        self.capacity = max(1, burst)
+        self.clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预定一个令牌，返回需要等待的秒数（0 表示立即可用）"""
+        if self.rate <= 0:
+            with self._lock:
+                return max(0.0, self._paused_until - self.clock())
+
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 允许令牌为负：等待时间由欠下的令牌数决定，后来者排在后面
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self) -> float:
+        """阻塞直到拿到令牌，返回等待的秒数"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        """暂停发放令牌（服务商返回 429 时，所有调用方一起退避）"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """调用方的截止时间已到，不再发起新的 LLM 请求"""
+
+
+def remaining_seconds(deadline: Optional[float]) -> Optional[float]:
+    """
+    距截止时间（time.monotonic()）的剩余秒数，None 表示不限
+
+    Raises:
+        LLMDeadlineExceeded: 已过截止时间
+    """
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LLMDeadlineExceeded("已超过 LLM 调用的截止时间")
+    return remaining
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """从 429 / 503 响应的 Retry-After 头读取等待秒数"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """429、5xx、超时和连接错误可以重试；其它 4xx（参数错误、鉴权失败）重试也没用"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def backoff_seconds(attempt: int, base: float, cap: float) -> float:
+    """第 attempt 次重试的等待时间：指数退避 + 完全抖动"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+@dataclass
+class ProviderStats:
+    """单个服务商的统计"""
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    server_errors: int = 0
+    throttled_seconds: float = 0.0
+    backoff_seconds: float = 0.0
+    call_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for name in ("throttled_seconds", "backoff_seconds", "call_seconds"):
+            data[name] = round(data[name], 3)
+        data["avg_call_ms"] = round(self.call_seconds * 1000 / self.successes, 1) if self.successes else 0.0
+        return data
+
+
+class _Completions:
+    """client.chat.completions 的替身：限流 + 重试后转发给共享客户端"""
+
+    def __init__(self, pooled: "PooledClient"):
+        self._pooled = pooled
+
+    def create(self, deadline: Optional[float] = None, **kwargs):
+        """
+        Args:
+            deadline: 截止时间（time.monotonic()），每次请求的超时不超过剩余时间
+            **kwargs: 转发给 OpenAI chat.completions.create
+        """
+        def request(client):
+            options = kwargs
+            if deadline is not None:
+                remaining = remaining_seconds(deadline)
+                options = {**kwargs, "timeout": min(kwargs.get("timeout") or remaining, remaining)}
+            return client.chat.completions.create(**options)
+
+        return self._pooled.call(request, deadline)
+
+
+class PooledClient:
+    """某个服务商的共享客户端（所有 LLMDirector / VisualStoryteller / VisualAnalyzer 实例共用）"""
+
+    def __init__(self, provider: str, client: Any, bucket: TokenBucket):
+        self.provider = provider
+        self.client = client
+        self.bucket = bucket
+        self.max_retries = settings.LLM_MAX_RETRIES
+        self.retry_base_sec = settings.LLM_RETRY_BASE_SEC
+        self.retry_max_sec = settings.LLM_RETRY_MAX_SEC
+        self.stats = ProviderStats()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self._lock = threading.Lock()
+
+    def call(self, request: Callable[[Any], Any], deadline: Optional[float] = None) -> Any:
+        """
+        限流后发送请求，可重试的错误按退避重试，重试用尽后抛出最后一次错误
+
+        Args:
+            deadline: 截止时间（time.monotonic()）；每次请求前检查，截止前等不到下一次重试时直接抛出
+
+        Raises:
+            LLMDeadlineExceeded: 发起请求前已过截止时间
+        """
+        attempt = 0
+        while True:
+            remaining_seconds(deadline)
+            throttled = self.bucket.acquire()
+            t0 = time.perf_counter()
+            try:
+                response = request(self.client)
+            except Exception as e:
+                retryable = is_retryable(e)
+                status = getattr(e, "status_code", None)
+                give_up = not retryable or attempt >= self.max_retries
+                delay = 0.0
+                if not give_up:
+                    delay = backoff_seconds(attempt, self.retry_base_sec, self.retry_max_sec)
+                    retry_after = retry_after_seconds(e)
+                    if retry_after is not None:
+                        delay = max(delay, min(retry_after, self.retry_max_sec))
+                    give_up = deadline is not None and time.monotonic() + delay >= deadline
+                with self._lock:
+                    self.stats.requests += 1
+                    self.stats.throttled_seconds += throttled
+                    if status == 429:
+                        self.stats.rate_limited += 1
+                    elif status and status >= 500:
+                        self.stats.server_errors += 1
+                    if give_up:
+                        self.stats.failures += 1
+                if give_up:
+                    raise
+
+                if status == 429:
+                    self.bucket.pause(delay)
+                attempt += 1
+                with self._lock:
+                    self.stats.retries += 1
+                    self.stats.backoff_seconds += delay
+                print(f"  ⚠️ LLM 请求失败（{self.provider}，{type(e).__name__}），"
+                      f"{delay:.1f}s 后第 {attempt}/{self.max_retries} 次重试")
+                time.sleep(delay)
+                continue
+
+            with self._lock:
+                self.stats.requests += 1
+                self.stats.successes += 1
+                self.stats.throttled_seconds += throttled
+                self.stats.call_seconds += time.perf_counter() - t0
+            return response
+
+
+def provider_name(base_url: str) -> str:
+    """服务商名称（统计与限流按此分组）：默认端点为 openai，自定义端点取主机名"""
+    if not base_url:
+        return "openai"
+    return urlparse(base_url).netloc or base_url
+
+
+class LLMClientPool:
+    """LLM 客户端池（进程内单例）"""
+
+    def __init__(self, client_factory: Optional[Callable[..., Any]] = None):
+        """
+        Args:
+            client_factory: 创建底层客户端的函数（默认 OpenAI + 共享 httpx 连接池）
+        """
+        self.client_factory = client_factory or self._create_openai
+        self._clients: Dict[Tuple[str, str], PooledClient] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: Optional[str] = None, base_url: Optional[str] = None) -> PooledClient:
+        """获取 (base_url, api_key) 对应的共享客户端，首次使用时创建"""
+        api_key = api_key if api_key is not None else settings.OPENAI_API_KEY
+        base_url = base_url if base_url is not None else settings.OPENAI_BASE_URL
+        key = (base_url, api_key)
+
+        with self._lock:
+            pooled = self._clients.get(key)
+            if pooled is None:
+                provider = provider_name(base_url)
+                # 同一服务商的多个 API Key 共享限流（服务商通常按组织限流）
+                bucket = self._buckets.get(provider)
+                if bucket is None:
+                    bucket = self._buckets[provider] = TokenBucket(
+                        settings.LLM_RATE_LIMIT_RPM,
+                        settings.LLM_RATE_LIMIT_BURST
+                    )
+                pooled = PooledClient(provider, self.client_factory(api_key=api_key, base_url=base_url), bucket)
+                self._clients[key] = pooled
+            return pooled
+
+    def get_stats(self) -> Dict[str, Any]:
+        """按服务商汇总统计"""
+        with self._lock:
+            clients = list(self._clients.values())
+
+        providers: Dict[str, Dict[str, Any]] = {}
+        for pooled in clients:
+            with pooled._lock:
+                data = pooled.stats.to_dict()
+            if pooled.provider in providers:
+                merged = providers[pooled.provider]
+                for name, value in data.items():
+                    if name != "avg_call_ms":
+                        merged[name] = round(merged[name] + value, 3)
+                merged["clients"] += 1
+            else:
+                providers[pooled.provider] = {**data, "clients": 1}
+
+        for data in providers.values():
+            data["avg_call_ms"] = (
+                round(data["call_seconds"] * 1000 / data["successes"], 1) if data["successes"] else 0.0
+            )
+
+        return {
+            "providers": providers,
+            "rate_limit_rpm": settings.LLM_RATE_LIMIT_RPM,
+            "rate_limit_burst": settings.LLM_RATE_LIMIT_BURST,
+            "max_retries": settings.LLM_MAX_RETRIES,
+            "max_connections": settings.LLM_POOL_MAX_CONNECTIONS
+        }
+
+    def close(self):
+        """关闭所有客户端（释放连接）"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._buckets.clear()
+        for pooled in clients:
+            close = getattr(pooled.client, "close", None)
+            if close:
+                close()
+
+    @staticmethod
+    def _create_openai(api_key: str, base_url: str) -> OpenAI:
+        """OpenAI 客户端：自带 httpx 连接池（长连接），重试由 PooledClient 负责"""
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_POOL_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(settings.LLM_REQUEST_TIMEOUT_SEC, connect=10.0),
+            follow_redirects=True
+        )
+        client_kwargs = {"api_key": api_key, "http_client": http_client, "max_retries": 0}
+        if base_url:
+            client_kwargs["base_url"] = base_url
+        return OpenAI(**client_kwargs)
+
+
+# 全局单例
+_llm_pool: Optional[LLMClientPool] = None
+_llm_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMClientPool:
+    """获取全局 LLM 客户端池（单例）"""
+    global _llm_pool
+    with _llm_pool_lock:
+        if _llm_pool is None:
+            _llm_pool = LLMClientPool()
+        return _llm_pool
+
+
+def get_llm_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> PooledClient:
+    """获取共享 LLM 客户端（默认使用配置中的 OPENAI_API_KEY / OPENAI_BASE_URL）"""
+    return get_llm_pool().get(api_key=api_key, base_url=base_url)
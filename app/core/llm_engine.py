@@ -1,41 +1,62 @@
 """LLM DSL 生成引擎 - 让 AI 真正成为剪辑导演"""
 import json
-from openai import OpenAI
 from ..config import settings
 from ..models.schemas import ScenesJSON, TranscriptJSON
+from .dsl_planner import HierarchicalPlanner
+from .llm_cache import chat_json
+from .llm_client import get_llm_client
+from .prompt_compiler import TABLE_FORMAT_GUIDE, CompiledPrompt, PromptCompiler
 
 
 class LLMDirector:
     """AI 剪辑导演 - 根据素材生成剪辑脚本"""
     
-    def __init__(self):
-        """初始化 LLM 客户端"""
+    def __init__(self, use_cache: bool = True):
+        """
+        初始化 LLM 客户端
+        
+        Args:
+            use_cache: 是否读取 LLM 回复缓存（False 表示重新生成，新结果仍写回缓存）
+        """
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY not configured in .env")
         
-        # 支持自定义 base_url（如 Azure OpenAI）
-        client_kwargs = {"api_key": settings.OPENAI_API_KEY}
-        if settings.OPENAI_BASE_URL:
-            client_kwargs["base_url"] = settings.OPENAI_BASE_URL
-        
-        self.client = OpenAI(**client_kwargs)
+        # 进程内共享的客户端（支持自定义 base_url，如 Azure OpenAI；限流与重试见 llm_client）
+        self.client = get_llm_client()
         self.model = settings.OPENAI_MODEL
+        self.use_cache = use_cache
+        
+        # 素材编码为紧凑表格并控制 token 预算
+        self.prompt_compiler = PromptCompiler(model=self.model)
+        self.last_prompt_stats = None  # 最近一次请求的 PromptStats
+        self.last_plan_stats = None  # 最近一次分层规划的 PlanStats（单次调用时为 None）
     
     def generate_editing_dsl(
         self, 
         scenes: ScenesJSON, 
         transcript: TranscriptJSON, 
         style_prompt: str,
-        bgm_library: list = None
+        bgm_library: list = None,
+        hierarchical: bool = None,
+        prompt: CompiledPrompt = None,
+        timeout: float = None,
+        deadline: float = None
     ) -> dict:
         """
         将场景和字幕喂给 AI，生成剪辑 DSL
         
+        素材放不进一次 prompt（PromptCompiler 需要省略镜头）时改用分层规划：
+        先按时间窗口并发初筛候选镜头，再对候选生成时间线（见 dsl_planner）
+        
         Args:
             scenes: 视觉素材（场景切分）
             transcript: 听觉素材（语音转录）
             style_prompt: 风格要求（如"抖音爆款风格"）
             bgm_library: BGM 素材库列表（可选）
+            hierarchical: 是否分层规划（None 表示超出预算时自动启用）
+            prompt: 已编译的 prompt（build_prompts 的结果，批量生成时共享素材编码）
+            timeout: 单次 LLM 请求超时（秒，None 表示客户端默认；分层规划的每次初筛 / 成片请求都适用）
+            deadline: 整次生成的截止时间（time.monotonic()）；过期后不再发起请求或重试，抛出 LLMDeadlineExceeded
         
         Returns:
             dict: editing_dsl.v1.json 格式的剪辑指令
@@ -43,37 +64,116 @@ class LLMDirector:
         Raises:
             ValueError: AI 生成了无效的 JSON
         """
-        system_prompt = self._build_system_prompt(bgm_library)
-        user_content = self._build_user_content(scenes, transcript, style_prompt, bgm_library)
+        if hierarchical is None:
+            if prompt is None:
+                prompt = self.build_prompt(scenes, transcript, style_prompt, bgm_library)
+            hierarchical = prompt.stats.scenes_kept < prompt.stats.scenes_total
         
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.7  # 适度创造性
-        )
+        if hierarchical:
+            planner = HierarchicalPlanner(self, timeout=timeout, deadline=deadline)
+            dsl = planner.generate(scenes, transcript, style_prompt, bgm_library)
+            self.last_plan_stats = planner.last_stats
+            return dsl
+        
+        self.last_plan_stats = None
+        if prompt is None:
+            prompt = self.build_prompt(scenes, transcript, style_prompt, bgm_library)
+        return self._chat_json(prompt, temperature=0.7, timeout=timeout, deadline=deadline)  # 适度创造性
+    
+    def _chat_json(
+        self,
+        prompt: CompiledPrompt,
+        temperature: float,
+        timeout: float = None,
+        deadline: float = None
+    ) -> dict:
+        """发送编译好的消息，解析 JSON 回复（相同请求命中 LLM 回复缓存）"""
+        request = {}
+        if timeout:
+            request["timeout"] = timeout
+        if deadline is not None:
+            request["deadline"] = deadline
         
         try:
-            dsl = json.loads(response.choices[0].message.content)
-            return dsl
+            return chat_json(
+                self.client,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": prompt.system},
+                    {"role": "user", "content": prompt.user}
+                ],
+                temperature=temperature,
+                response_format={"type": "json_object"},
+                use_cache=self.use_cache,
+                **request
+            )
         except json.JSONDecodeError as e:
             raise ValueError(f"AI 生成了无效的 JSON: {e}")
     
+    def build_prompt(
+        self,
+        scenes: ScenesJSON,
+        transcript: TranscriptJSON,
+        style_prompt: str,
+        bgm_library: list = None
+    ) -> CompiledPrompt:
+        """
+        编译系统提示词和用户消息（紧凑表格 + token 预算），统计记录在 last_prompt_stats
+        """
+        prompt = self.prompt_compiler.compile(
+            self._build_system_prompt(bgm_library),
+            scenes,
+            transcript,
+            style_prompt,
+            bgm_library
+        )
+        stats = prompt.stats
+        self.last_prompt_stats = stats
+        
+        print(f"📝 Prompt: {stats.total_tokens} tokens（系统 {stats.system_tokens} + 素材 {stats.user_tokens}，"
+              f"预算 {stats.budget}），镜头 {stats.scenes_kept}/{stats.scenes_total}，"
+              f"字幕 {stats.segments_kept}/{stats.segments_total}，编码 {stats.encode_ms:.1f}ms")
+        if stats.over_budget:
+            print("⚠️  系统提示词与必需内容已超出 token 预算")
+        
+        return prompt
+    
+    def build_prompts(
+        self,
+        scenes: ScenesJSON,
+        transcript: TranscriptJSON,
+        style_prompts: dict,
+        bgm_library: list = None
+    ) -> dict:
+        """
+        为多个风格编译 prompt：素材只编码一次（按最长的风格要求计算预算），
+        各风格的系统提示词和用户消息前缀完全相同，只有末尾的风格要求不同
+        
+        Args:
+            style_prompts: 风格 key → 风格要求
+        
+        Returns:
+            dict: 风格 key → CompiledPrompt
+        """
+        if not style_prompts:
+            return {}
+        longest = max(style_prompts.values(), key=len)
+        shared = self.build_prompt(scenes, transcript, longest, bgm_library)
+        return {
+            key: self.prompt_compiler.restyle(shared, style_prompt)
+            for key, style_prompt in style_prompts.items()
+        }
+    
     def _build_system_prompt(self, bgm_library: list = None) -> str:
-        """构建系统提示词 - 增强视觉理解能力"""
+        """构建系统提示词 - 增强视觉理解能力（BGM 列表只在用户消息中发送一次）"""
         bgm_section = ""
         if bgm_library:
-            bgm_section = f"""
+            bgm_section = """
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 BGM 素材库（可选）
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-你可以从以下 BGM 库中选择合适的背景音乐：
-
-{json.dumps(bgm_library, indent=2, ensure_ascii=False)}
+你可以从用户消息【BGM 素材库】（#B 表）中选择合适的背景音乐。
 
 选择 BGM 时考虑：
 1. **mood**: 情绪是否匹配视频内容（calm, emotional, fast, suspense）
@@ -82,20 +182,20 @@ BGM 素材库（可选）
 4. **usage**: 用途是否匹配（story, teaching, vlog, product）
 
 在 music 字段中填入选中的 BGM ID：
-{{
-  "music": {{
+{
+  "music": {
     "bgm_id": "calm_090_01",  // 从 BGM 库中选择
     "volume_db": -18          // 音量（dB），建议 -18 到 -24
-  }}
-}}
+  }
+}
 
 如果没有合适的 BGM，可以留空：
-{{
-  "music": {{
+{
+  "music": {
     "bgm_id": "",
     "volume_db": -18
-  }}
-}}
+  }
+}
 """
         
         return f"""你是一名专业的短视频剪辑导演。你的任务是根据提供的【视觉素材】和【听觉素材】，生成一个符合 'editing_dsl.v1' 格式的 JSON 剪辑指令。
@@ -107,6 +207,8 @@ BGM 素材库（可选）
 Scenes 数据中包含了 `visual` 字段（景别、内容描述、情绪、主体）。
 请充分利用这些信息来匹配剪辑逻辑，而不仅仅依赖时间顺序或随机选择。
 
+{TABLE_FORMAT_GUIDE}
+
 剪辑逻辑指南：
 
 1. **画面匹配内容**
@@ -229,36 +331,6 @@ JSON 格式规范：
 {{
   "trim_frames": ["00:00:01:00", "00:00:04:00"]  // ❌ 不要用 timecode
 }}{bgm_section}"""
-    
-    def _build_user_content(
-        self, 
-        scenes: ScenesJSON, 
-        transcript: TranscriptJSON, 
-        style_prompt: str,
-        bgm_library: list = None
-    ) -> str:
-        """构建用户输入内容"""
-        scenes_json = json.dumps(scenes.model_dump(), ensure_ascii=False, indent=2)
-        transcript_json = json.dumps(transcript.model_dump(), ensure_ascii=False, indent=2)
-        
-        content = f"""【视觉素材 (Scenes)】
-{scenes_json}
-
-【听觉素材 (Transcript)】
-{transcript_json}
-
-【风格要求】
-{style_prompt}"""
-        
-        if bgm_library:
-            content += f"""
-
-【BGM 素材库】
-{json.dumps(bgm_library, indent=2, ensure_ascii=False)}"""
-        
-        content += "\n\n请根据以上素材，生成符合 editing_dsl.v1 格式的剪辑指令 JSON。"
-        
-        return content
 
 
 # 便捷函数
@@ -266,7 +338,8 @@ def generate_dsl_from_materials(
     scenes: ScenesJSON,
     transcript: TranscriptJSON,
     style: str = "抖音爆款风格：节奏快、文字多、强调关键词",
-    bgm_library: list = None
+    bgm_library: list = None,
+    use_cache: bool = True
 ) -> dict:
     """
     便捷函数：从素材生成 DSL
@@ -276,9 +349,10 @@ def generate_dsl_from_materials(
         transcript: 转录数据
         style: 风格描述
         bgm_library: BGM 素材库列表（可选）
+        use_cache: 是否读取 LLM 回复缓存
     
     Returns:
         dict: editing_dsl.v1.json
     """
-    director = LLMDirector()
+    director = LLMDirector(use_cache=use_cache)
     return director.generate_editing_dsl(scenes, transcript, style, bgm_library)
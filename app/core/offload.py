@@ -0,0 +1,132 @@
+"""
+把阻塞工作移出事件循环
+
+async 路由里直接调用 subprocess.run / 长时间的同步函数会卡住整个事件循环，
+一个 4K 导出期间 /health 等所有请求都得不到响应。这里提供两种方式：
+
+- run_subprocess: asyncio 子进程（ffmpeg 等），同时运行的数量受 OFFLOAD_MAX_SUBPROCESSES 限制，
+  超时或调用方被取消时终止子进程
+- run_blocking: 同步函数放进有界线程池（OFFLOAD_MAX_THREADS），不占用默认线程池
+- run_llm: LLM / VLM 调用放进单独的线程池（LLM_MAX_THREADS）。限流排队和重试退避会让线程
+  等待几十秒，不能占用 ASR、媒体探测、导出复制共用的 run_blocking 线程
+
+用法:
+    result = await run_subprocess(["ffmpeg", ...], timeout=3600)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    audio = await run_blocking(ingest.extract_audio, video_path, output_path)
+    dsl = await run_llm(director.generate_editing_dsl, scenes, transcript, style)
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+from ..config import settings
+
+
+@dataclass
+class SubprocessResult:
+    """子进程执行结果"""
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_llm_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_subprocess_slots: dict = {}  # 事件循环 -> Semaphore（Semaphore 绑定创建它的事件循环）
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """阻塞调用使用的有界线程池（全局单例）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.OFFLOAD_MAX_THREADS,
+                thread_name_prefix="offload"
+            )
+        return _executor
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """LLM 调用使用的线程池（全局单例，与 get_executor 分开）"""
+    global _llm_executor
+    with _executor_lock:
+        if _llm_executor is None:
+            _llm_executor = ThreadPoolExecutor(
+                max_workers=settings.LLM_MAX_THREADS,
+                thread_name_prefix="llm"
+            )
+        return _llm_executor
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """在有界线程池中执行同步函数，返回其结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def run_llm(func: Callable, *args, **kwargs) -> Any:
+    """在 LLM 线程池中执行同步的 LLM 调用（LLMDirector / VisualStoryteller / 视觉分析器）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_llm_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _subprocess_slot() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slot = _subprocess_slots.get(loop)
+    if slot is None:
+        # 清理已关闭事件循环留下的信号量
+        for stale in [l for l in _subprocess_slots if l.is_closed()]:
+            del _subprocess_slots[stale]
+        slot = _subprocess_slots[loop] = asyncio.Semaphore(settings.OFFLOAD_MAX_SUBPROCESSES)
+    return slot
+
+
+async def run_subprocess(
+    cmd: List[str],
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None
+) -> SubprocessResult:
+    """
+    异步执行子进程并收集输出
+
+    Args:
+        cmd: 命令及参数
+        timeout: 超时秒数（不含排队等待时间）
+        cwd: 工作目录
+
+    Returns:
+        SubprocessResult（非零返回码不抛异常，由调用方判断）
+
+    Raises:
+        asyncio.TimeoutError: 超时（子进程已被终止）
+    """
+    async with _subprocess_slot():
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except BaseException:
+            # 超时 / 请求被取消：不留下孤儿 ffmpeg
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+    return SubprocessResult(
+        returncode=process.returncode,
+        stdout=stdout.decode("utf-8", errors="replace"),
+        stderr=stderr.decode("utf-8", errors="replace")
+    )
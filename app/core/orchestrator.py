@@ -12,12 +12,21 @@ Orchestrator - 全局调度器（状态机 + 资源锁）
 - Resolve = 工人（执行）
 - Orchestrator = 调度员（协调）
 """
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
+import asyncio
+import heapq
+import itertools
 import threading
+import time
 import psutil
 
+from ..config import settings
+from .progress_bus import get_progress_bus
+
 
 class JobState(Enum):
     """Job 状态枚举"""
@@ -35,48 +44,370 @@ class JobState(Enum):
     PAUSED = "paused"
 
 
+class ResourceKind(Enum):
+    """资源类型"""
+    SEMAPHORE = "semaphore"  # 计数信号量：最多 capacity 个持有者
+    GATE = "gate"            # 开关：True 表示允许（VISION_ALLOWED / AI_ALLOWED）
+
+
+class ResourceTimeout(TimeoutError):
+    """等待资源超时"""
+
+
+def default_capacities() -> Dict[str, int]:
+    """各信号量资源的容量（读取配置）"""
+    return {
+        "GPU_HEAVY": settings.RESOURCE_GPU_HEAVY_SLOTS,    # Resolve Export/Render
+        "RESOLVE_BUSY": settings.RESOURCE_RESOLVE_SLOTS,   # Resolve 是否繁忙
+        "VISION": settings.RESOURCE_VISION_SLOTS,          # 同时运行的 Vision worker
+        "AI": settings.RESOURCE_AI_SLOTS                   # 同时进行的 AI 调用
+    }
+
+
+@dataclass
+class _Waiter:
+    """排队等待资源的请求（同步用 Event，异步用 Future）"""
+    owner: Any
+    enqueued_at: float
+    event: Optional[threading.Event] = None
+    future: Optional[asyncio.Future] = None
+    granted: bool = False
+    abandoned: bool = False
+
+
+@dataclass
+class _Semaphore:
+    """计数信号量状态与统计"""
+    capacity: int
+    holders: List[tuple] = field(default_factory=list)  # [(owner, acquired_at)]
+    waiters: List[tuple] = field(default_factory=list)  # 堆: (-priority, seq, _Waiter)
+    acquisitions: int = 0
+    rejections: int = 0
+    timeouts: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    hold_total: float = 0.0
+    hold_max: float = 0.0
+    releases: int = 0
+
+    def waiting(self) -> int:
+        return sum(1 for _, _, w in self.waiters if not w.abandoned)
+
+
 class ResourceLock:
-    """全局资源锁"""
+    """
+    全局资源锁
     
-    def __init__(self):
+    - 信号量资源（GPU_HEAVY / RESOLVE_BUSY / VISION / AI）有容量，持有者可带 owner（通常是 job_id）
+    - 开关资源（VISION_ALLOWED / AI_ALLOWED）只有开 / 关，acquire 打开、release 关闭（兼容旧接口）
+    - acquire 默认不等待；blocking=True 或 acquire_async 按优先级排队、同优先级先来先得，
+      有人排队时新请求不能插队
+    - hold / hold_async 是上下文管理器，超时抛出 ResourceTimeout
+    """
+    
+    def __init__(self, capacities: Optional[Dict[str, int]] = None):
         self._lock = threading.Lock()
-        self._locks = {
-            "GPU_HEAVY": False,      # Resolve Export/Render
+        self._seq = itertools.count()
+        self._semaphores = {
+            name: _Semaphore(capacity=max(1, capacity))
+            for name, capacity in (capacities or default_capacities()).items()
+        }
+        self._gates = {
             "VISION_ALLOWED": True,  # 是否允许跑 VLM
-            "RESOLVE_BUSY": False,   # Resolve 是否繁忙
             "AI_ALLOWED": True       # 是否允许 AI 调用
         }
     
-    def acquire(self, resource: str) -> bool:
+    # ==================== 获取 / 释放 ====================
+    
+    def acquire(
+        self,
+        resource: str,
+        owner: Any = None,
+        blocking: bool = False,
+        timeout: Optional[float] = None,
+        priority: int = 0
+    ) -> bool:
         """
         尝试获取资源锁
         
         Args:
             resource: 资源名称
+            owner: 持有者（通常是 job_id），释放时按它匹配
+            blocking: 资源已满时是否排队等待
+            timeout: 最长等待秒数（None 表示一直等）
+            priority: 优先级，越大越先获得
         
         Returns:
             是否成功获取
         """
+        if resource in self._gates:
+            return self.enable(resource)
+        
         with self._lock:
-            if self._locks.get(resource, False):
+            sem = self._semaphore(resource)
+            if self._try_take(sem, owner):
+                return True
+            if not blocking:
+                sem.rejections += 1
                 return False
-            self._locks[resource] = True
+            waiter = _Waiter(owner=owner, enqueued_at=time.monotonic(), event=threading.Event())
+            heapq.heappush(sem.waiters, (-priority, next(self._seq), waiter))
+        
+        waiter.event.wait(timeout)
+        
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.abandoned = True
+            sem.timeouts += 1
+            return False
+    
+    async def acquire_async(
+        self,
+        resource: str,
+        owner: Any = None,
+        timeout: Optional[float] = None,
+        priority: int = 0
+    ) -> bool:
+        """异步获取资源（不阻塞事件循环），参数同 acquire(blocking=True)"""
+        if resource in self._gates:
+            return self.enable(resource)
+        
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            sem = self._semaphore(resource)
+            if self._try_take(sem, owner):
+                return True
+            waiter = _Waiter(owner=owner, enqueued_at=time.monotonic(), future=loop.create_future())
+            heapq.heappush(sem.waiters, (-priority, next(self._seq), waiter))
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
             return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    waiter.abandoned = True
+                    if isinstance(e, asyncio.TimeoutError):
+                        sem.timeouts += 1
+            if isinstance(e, asyncio.CancelledError):
+                # 已分配但调用方被取消：归还，避免泄漏
+                if granted:
+                    self.release(resource, owner)
+                raise
+            return granted
+    
+    def release(self, resource: str, owner: Any = None):
+        """
+        释放资源锁
+        
+        指定 owner 时只释放它持有的那一份（没有则忽略）；不指定时释放最早的一份。
+        """
+        if resource in self._gates:
+            self.disable(resource)
+            return
+        
+        with self._lock:
+            sem = self._semaphore(resource)
+            index = self._holder_index(sem, owner)
+            if index is None:
+                return
+            _, acquired_at = sem.holders.pop(index)
+            self._record_hold(sem, time.monotonic() - acquired_at)
+            self._grant_waiters(sem)
     
-    def release(self, resource: str):
-        """释放资源锁"""
+    def reset(self, resource: str):
+        """强制释放资源的所有持有者（紧急用），排队中的请求随后获得资源"""
+        if resource in self._gates:
+            self.enable(resource)
+            return
+        
         with self._lock:
-            self._locks[resource] = False
+            sem = self._semaphore(resource)
+            now = time.monotonic()
+            for _, acquired_at in sem.holders:
+                self._record_hold(sem, now - acquired_at)
+            sem.holders.clear()
+            self._grant_waiters(sem)
+    
+    @contextmanager
+    def hold(
+        self,
+        resource: str,
+        owner: Any = None,
+        timeout: Optional[float] = None,
+        priority: int = 0
+    ):
+        """同步上下文管理器：with resource_lock.hold("RESOLVE_BUSY", timeout=30): ..."""
+        owner = self._owner_token(owner)
+        if not self.acquire(resource, owner, blocking=True, timeout=timeout, priority=priority):
+            raise ResourceTimeout(f"等待资源 {resource} 超时 ({timeout}s)")
+        try:
+            yield
+        finally:
+            self.release(resource, owner)
+    
+    @asynccontextmanager
+    async def hold_async(
+        self,
+        resource: str,
+        owner: Any = None,
+        timeout: Optional[float] = None,
+        priority: int = 0
+    ):
+        """异步上下文管理器：async with resource_lock.hold_async("VISION"): ..."""
+        owner = self._owner_token(owner)
+        if not await self.acquire_async(resource, owner, timeout=timeout, priority=priority):
+            raise ResourceTimeout(f"等待资源 {resource} 超时 ({timeout}s)")
+        try:
+            yield
+        finally:
+            self.release(resource, owner)
+    
+    # ==================== 开关 ====================
+    
+    def enable(self, gate: str) -> bool:
+        """打开开关，返回是否发生了变化"""
+        with self._lock:
+            changed = not self._gates[gate]
+            self._gates[gate] = True
+            return changed
+    
+    def disable(self, gate: str):
+        """关闭开关"""
+        with self._lock:
+            self._gates[gate] = False
+    
+    # ==================== 查询 ====================
     
     def is_locked(self, resource: str) -> bool:
-        """检查资源是否被锁定"""
+        """检查资源是否被占用（开关资源返回是否打开）"""
+        with self._lock:
+            if resource in self._gates:
+                return self._gates[resource]
+            sem = self._semaphores.get(resource)
+            return bool(sem and sem.holders)
+    
+    def available(self, resource: str) -> int:
+        """剩余容量"""
+        with self._lock:
+            sem = self._semaphore(resource)
+            return sem.capacity - len(sem.holders)
+    
+    def capacities(self) -> Dict[str, int]:
+        """各信号量资源的容量"""
         with self._lock:
-            return self._locks.get(resource, False)
+            return {name: sem.capacity for name, sem in self._semaphores.items()}
+    
+    def held_by(self, resource: str, owner: Any) -> bool:
+        """owner 是否持有该资源"""
+        with self._lock:
+            sem = self._semaphores.get(resource)
+            return bool(sem) and any(h == owner for h, _ in sem.holders)
+    
+    def held_by_others(self, resource: str, owner: Any) -> bool:
+        """资源是否被 owner 以外的持有者占用"""
+        with self._lock:
+            sem = self._semaphores.get(resource)
+            return bool(sem) and any(h != owner for h, _ in sem.holders)
     
     def get_status(self) -> Dict[str, bool]:
-        """获取所有锁状态"""
+        """获取所有锁状态（信号量：是否被占用；开关：是否打开）"""
         with self._lock:
-            return self._locks.copy()
+            status = {name: bool(sem.holders) for name, sem in self._semaphores.items()}
+            status.update(self._gates)
+            return status
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各资源的容量、占用、排队数与等待 / 持有时间统计（毫秒）"""
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for name, sem in self._semaphores.items():
+                stats[name] = {
+                    "kind": ResourceKind.SEMAPHORE.value,
+                    "capacity": sem.capacity,
+                    "in_use": len(sem.holders),
+                    "holders": [str(owner) for owner, _ in sem.holders],
+                    "waiting": sem.waiting(),
+                    "acquisitions": sem.acquisitions,
+                    "rejections": sem.rejections,
+                    "timeouts": sem.timeouts,
+                    "wait_ms": {
+                        "avg": round(sem.wait_total / sem.acquisitions * 1000, 2) if sem.acquisitions else 0.0,
+                        "max": round(sem.wait_max * 1000, 2)
+                    },
+                    "hold_ms": {
+                        "avg": round(sem.hold_total / sem.releases * 1000, 2) if sem.releases else 0.0,
+                        "max": round(sem.hold_max * 1000, 2),
+                        "current_max": round(
+                            max((now - t for _, t in sem.holders), default=0.0) * 1000, 2
+                        )
+                    }
+                }
+            for name, is_open in self._gates.items():
+                stats[name] = {"kind": ResourceKind.GATE.value, "open": is_open}
+            return stats
+    
+    # ==================== 内部（调用方持有 self._lock） ====================
+    
+    def _semaphore(self, resource: str) -> _Semaphore:
+        sem = self._semaphores.get(resource)
+        if sem is None:
+            raise KeyError(f"未知资源: {resource}")
+        return sem
+    
+    def _try_take(self, sem: _Semaphore, owner: Any) -> bool:
+        # 有人排队时不允许插队
+        if sem.waiting() or len(sem.holders) >= sem.capacity:
+            return False
+        sem.holders.append((owner, time.monotonic()))
+        sem.acquisitions += 1
+        return True
+    
+    def _grant_waiters(self, sem: _Semaphore):
+        while sem.waiters and len(sem.holders) < sem.capacity:
+            _, _, waiter = heapq.heappop(sem.waiters)
+            if waiter.abandoned:
+                continue
+            now = time.monotonic()
+            waited = now - waiter.enqueued_at
+            sem.holders.append((waiter.owner, now))
+            sem.acquisitions += 1
+            sem.wait_total += waited
+            sem.wait_max = max(sem.wait_max, waited)
+            waiter.granted = True
+            if waiter.event is not None:
+                waiter.event.set()
+            else:
+                future = waiter.future
+                future.get_loop().call_soon_threadsafe(
+                    lambda: future.done() or future.set_result(True)
+                )
+        # 清理已放弃的请求
+        while sem.waiters and sem.waiters[0][2].abandoned:
+            heapq.heappop(sem.waiters)
+    
+    def _holder_index(self, sem: _Semaphore, owner: Any) -> Optional[int]:
+        if not sem.holders:
+            return None
+        if owner is None:
+            return 0
+        for index, (holder, _) in enumerate(sem.holders):
+            if holder == owner:
+                return index
+        return None
+    
+    @staticmethod
+    def _record_hold(sem: _Semaphore, held: float):
+        sem.releases += 1
+        sem.hold_total += held
+        sem.hold_max = max(sem.hold_max, held)
+    
+    def _owner_token(self, owner: Any) -> Any:
+        # 上下文管理器需要唯一的 owner，才能准确释放自己那一份
+        return owner if owner is not None else f"anonymous-{next(self._seq)}"
 
 
 class StateTransition:
@@ -184,6 +515,8 @@ class Orchestrator:
         self.resource_lock = ResourceLock()
         self.current_jobs = {}  # job_id -> JobState
         self._lock = threading.Lock()
+        # 预热 CPU 采样：之后的 cpu_percent(interval=None) 返回距上次调用的平均值，不再阻塞
+        psutil.cpu_percent(interval=None)
     
     def can_enter_state(self, job_id: str, target_state: JobState) -> tuple[bool, str]:
         """
@@ -200,18 +533,22 @@ class Orchestrator:
         # 2. 检查资源是否可用
         requirements = StateTransition.get_resource_requirements(target_state)
         
+        lock = self.resource_lock
+        
         # ANALYZING: 不能在 Resolve 繁忙时运行
         if target_state == JobState.ANALYZING:
-            if self.resource_lock.is_locked("RESOLVE_BUSY"):
+            if lock.held_by_others("RESOLVE_BUSY", job_id):
                 return False, "Resolve 正在繁忙，等待完成"
-            if not self.resource_lock.is_locked("VISION_ALLOWED"):
+            if not lock.is_locked("VISION_ALLOWED"):
                 return False, "Vision 当前不允许运行"
+            if not lock.held_by("VISION", job_id) and lock.available("VISION") <= 0:
+                return False, "Vision worker 已满，等待其它任务完成"
         
-        # EXECUTING/EXPORTING: 需要独占资源
+        # EXECUTING/EXPORTING: 需要独占资源（本 job 自己持有的不算冲突，如 EXECUTING → EXPORTING）
         if target_state in [JobState.EXECUTING, JobState.EXPORTING]:
-            if self.resource_lock.is_locked("GPU_HEAVY"):
+            if lock.held_by_others("GPU_HEAVY", job_id):
                 return False, "GPU 资源被占用"
-            if self.resource_lock.is_locked("VISION_ALLOWED"):
+            if lock.held_by_others("VISION", job_id):
                 # 需要先停止 Vision
                 return False, "需要先停止 Vision 任务"
         
@@ -235,22 +572,21 @@ class Orchestrator:
             
             # 根据状态更新资源锁
             if state == JobState.ANALYZING:
-                # Vision 阶段：允许 Vision，禁止 Resolve
-                assert not self.resource_lock.is_locked("RESOLVE_BUSY"), "Resolve 必须空闲"
-                self.resource_lock.acquire("VISION_ALLOWED")
+                # Vision 阶段：占用一个 Vision worker（Resolve 必须空闲，由 can_enter_state 检查）
+                self._take(job_id, "VISION")
                 print("  ✓ Vision 已启用")
             
             elif state == JobState.PLANNING:
                 # Planning 阶段：最安全，只用云端 AI
-                self.resource_lock.acquire("AI_ALLOWED")
+                self._take(job_id, "AI")
                 print("  ✓ AI 规划已启用（云端）")
             
             elif state in [JobState.EXECUTING, JobState.EXPORTING]:
                 # 执行/导出阶段：Resolve 全权，禁止一切 AI
-                self.resource_lock.release("VISION_ALLOWED")
-                self.resource_lock.release("AI_ALLOWED")
-                self.resource_lock.acquire("GPU_HEAVY")
-                self.resource_lock.acquire("RESOLVE_BUSY")
+                self.resource_lock.disable("VISION_ALLOWED")
+                self.resource_lock.disable("AI_ALLOWED")
+                self._take(job_id, "GPU_HEAVY")
+                self._take(job_id, "RESOLVE_BUSY")
                 
                 print("  🔥 GPU 高负载模式")
                 print("  🚫 Vision 已禁用")
@@ -260,6 +596,14 @@ class Orchestrator:
             # 显示资源状态
             status = self.resource_lock.get_status()
             print(f"  资源状态: {status}")
+            
+            # 推送状态机切换（SSE）
+            get_progress_bus().publish(job_id, "state", {
+                "job_id": job_id,
+                "state": state.value,
+                "previous": old_state.value if old_state else None,
+                "resource_locks": status
+            })
     
     def exit_state(self, job_id: str, state: JobState):
         """退出状态（释放资源锁）"""
@@ -268,29 +612,41 @@ class Orchestrator:
             
             # 根据状态释放资源锁
             if state == JobState.ANALYZING:
-                self.resource_lock.release("VISION_ALLOWED")
+                self.resource_lock.release("VISION", job_id)
                 print("  ✓ Vision 已释放")
             
             elif state == JobState.PLANNING:
-                self.resource_lock.release("AI_ALLOWED")
+                self.resource_lock.release("AI", job_id)
                 print("  ✓ AI 已释放")
             
             elif state in [JobState.EXECUTING, JobState.EXPORTING]:
-                self.resource_lock.release("GPU_HEAVY")
-                self.resource_lock.release("RESOLVE_BUSY")
-                self.resource_lock.acquire("VISION_ALLOWED")  # 重新允许 Vision
+                self.resource_lock.release("GPU_HEAVY", job_id)
+                self.resource_lock.release("RESOLVE_BUSY", job_id)
+                if not self.resource_lock.is_locked("GPU_HEAVY"):
+                    # 没有其它 GPU 重任务时重新允许 Vision / AI
+                    self.resource_lock.enable("VISION_ALLOWED")
+                    self.resource_lock.enable("AI_ALLOWED")
                 
                 print("  ✓ GPU 已释放")
                 print("  ✓ Resolve 已释放")
                 print("  ✓ Vision 重新启用")
     
+    def _take(self, job_id: str, resource: str):
+        """进入状态时为 job 占用资源（已持有则跳过；强制转换时资源可能已满）"""
+        if self.resource_lock.held_by(resource, job_id):
+            return
+        if not self.resource_lock.acquire(resource, job_id):
+            print(f"  ⚠️  {resource} 已满，未占用（强制转换）")
+    
     def get_system_status(self) -> Dict[str, Any]:
-        """获取系统状态"""
-        cpu_percent = psutil.cpu_percent(interval=0.1)
+        """获取系统状态（不阻塞：async 路由直接调用）"""
+        cpu_percent = psutil.cpu_percent(interval=None)
         memory = psutil.virtual_memory()
         
         return {
             "resource_locks": self.resource_lock.get_status(),
+            "resource_stats": self.resource_lock.get_stats(),
+            "progress_bus": get_progress_bus().get_stats(),
             "active_jobs": {
                 job_id: state.value
                 for job_id, state in self.current_jobs.items()
@@ -0,0 +1,289 @@
+"""
+进度事件总线 - 把阶段切换 / 进度 / 日志实时推送给前端（SSE）
+
+取代前端每 2 秒轮询 status 接口：
+- 生产者（update_project_status、JobStore.update_job、Orchestrator.enter_state、导出任务）
+  调用 publish()，可在任意线程调用，不阻塞
+- 每个频道（job_id / project_id / export_id）保存最新状态快照和最近的事件，
+  新订阅者先收到快照，断线重连时按 Last-Event-ID 补发错过的事件
+- 事件 ID 为 "<总线 epoch>.<序号>"：序号只在本进程内有效，重连到其它 worker 或服务重启后
+  epoch 不匹配，改为发送最新快照（不补发日志事件）
+- 订阅者各有一个有界队列，消费太慢时丢弃最旧的事件（快照始终是最新的）
+- 总线只在进程内；多 worker 部署时 SSE 流每秒从共享状态存储（status_store）同步一次快照，
+  其它进程写入的状态也能推送到这里的订阅者
+
+事件类型：
+    status  状态快照（progress / status / current_step / steps ...）
+    state   Orchestrator 状态机切换
+    log     日志行
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+# 每个频道保留的最近事件数（断线重连补发用）
+HISTORY_SIZE = 200
+# 最多保留的频道数（超出时淘汰最久未更新且无订阅者的频道）
+MAX_CHANNELS = 1000
+# 每个订阅者的队列上限
+SUBSCRIBER_QUEUE_SIZE = 500
+# 没有事件时发送心跳注释的间隔（防止代理断开空闲连接）
+HEARTBEAT_SEC = 15.0
+# 从共享状态存储同步快照的间隔（多 worker 时其它进程的更新最多延迟这么久）
+STORE_SYNC_SEC = 1.0
+# 状态为这些值时流结束
+TERMINAL_STATUSES = {"completed", "error", "failed", "cancelled"}
+
+
+@dataclass
+class ProgressEvent:
+    """一条进度事件"""
+    id: int
+    channel: str
+    type: str
+    data: Dict[str, Any]
+    timestamp: float = field(default_factory=time.time)
+
+    def to_sse(self, epoch: str) -> str:
+        payload = json.dumps({**self.data, "timestamp": self.timestamp}, ensure_ascii=False)
+        return f"id: {epoch}.{self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.type == "status" and self.data.get("status") in TERMINAL_STATUSES
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def push(self, event: ProgressEvent):
+        """在订阅者的事件循环中入队（满了丢弃最旧的）"""
+        def put():
+            if self.queue.qsize() >= SUBSCRIBER_QUEUE_SIZE:
+                self.queue.get_nowait()
+            self.queue.put_nowait(event)
+        try:
+            self.loop.call_soon_threadsafe(put)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+
+class _Channel:
+    def __init__(self):
+        self.snapshot: Optional[ProgressEvent] = None
+        self.history: Deque[ProgressEvent] = deque(maxlen=HISTORY_SIZE)
+        self.subscribers: List[_Subscriber] = []
+
+
+class ProgressBus:
+    """进程内发布 / 订阅"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 区分进程 / 重启：其它总线发出的 Last-Event-ID 序号在这里没有意义
+        self.epoch = uuid.uuid4().hex[:12]
+        self._ids = itertools.count(1)
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self._published = 0
+
+    def publish(self, channel: str, event_type: str, data: Dict[str, Any]) -> ProgressEvent:
+        """
+        发布事件
+
+        Args:
+            channel: 频道（job_id / project_id / export_id）
+            event_type: status / state / log
+            data: 事件内容（必须可 JSON 序列化）
+        """
+        with self._lock:
+            event = ProgressEvent(id=next(self._ids), channel=channel, type=event_type, data=dict(data))
+            ch = self._channels.setdefault(channel, _Channel())
+            self._channels.move_to_end(channel)
+            ch.history.append(event)
+            if event_type == "status":
+                ch.snapshot = event
+            subscribers = list(ch.subscribers)
+            self._published += 1
+            self._evict()
+
+        for subscriber in subscribers:
+            subscriber.push(event)
+        return event
+
+    def get_snapshot(self, channel: str) -> Optional[Dict[str, Any]]:
+        """频道最新的状态快照"""
+        with self._lock:
+            ch = self._channels.get(channel)
+            return dict(ch.snapshot.data) if ch and ch.snapshot else None
+
+    def sync_snapshot(self, channel: str, data: Optional[Dict[str, Any]]) -> bool:
+        """用共享存储中的状态更新快照（与当前快照相同时不发布），返回是否发布"""
+        if data is None:
+            return False
+        with self._lock:
+            ch = self._channels.get(channel)
+            current = ch.snapshot.data if ch and ch.snapshot else None
+        if current == data:
+            return False
+        self.publish(channel, "status", data)
+        return True
+
+    def parse_event_id(self, value: Optional[str]) -> Optional[int]:
+        """
+        解析 SSE 的 Last-Event-ID，返回本总线的事件序号
+
+        不是本总线发出的 ID（其它 worker / 重启前 / 格式错误）返回 None，订阅时改发最新快照。
+        """
+        if not value:
+            return None
+        epoch, _, seq = value.partition(".")
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(seq)
+        except ValueError:
+            return None
+
+    def has_channel(self, channel: str) -> bool:
+        with self._lock:
+            return channel in self._channels
+
+    async def subscribe(
+        self,
+        channel: str,
+        last_event_id: Optional[int] = None,
+        heartbeat: Optional[float] = None
+    ) -> AsyncIterator[Optional[ProgressEvent]]:
+        """
+        订阅频道（异步迭代器）
+
+        首先补发：Last-Event-ID 之后的历史事件；没有 Last-Event-ID 时只发最新快照。
+        快照是终态时补发后立即结束，否则收到终态事件后结束。
+        指定 heartbeat 时，超过该秒数没有事件会产出 None（用于发送心跳）。
+        """
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            ch = self._channels.setdefault(channel, _Channel())
+            if last_event_id is not None:
+                backlog = [e for e in ch.history if e.id > last_event_id]
+            else:
+                backlog = [ch.snapshot] if ch.snapshot else []
+            ch.subscribers.append(subscriber)
+
+        try:
+            last_sent = 0
+            for event in backlog:
+                last_sent = event.id
+                yield event
+                if event.is_terminal:
+                    return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event.id <= last_sent:
+                    continue
+                last_sent = event.id
+                yield event
+                if event.is_terminal:
+                    return
+        finally:
+            with self._lock:
+                if subscriber in ch.subscribers:
+                    ch.subscribers.remove(subscriber)
+
+    async def stream_sse(
+        self,
+        channel: str,
+        last_event_id: Optional[int] = None,
+        heartbeat: float = HEARTBEAT_SEC,
+        loader: Optional[Callable[[], Optional[Dict[str, Any]]]] = None
+    ) -> AsyncIterator[str]:
+        """
+        SSE 文本流（带心跳），用于 StreamingResponse
+
+        Args:
+            loader: 从共享状态存储读取最新状态；没有本地事件时每 STORE_SYNC_SEC 秒调用一次
+        """
+        # 告诉浏览器断线后 1 秒重连
+        yield "retry: 1000\n\n"
+        tick = min(heartbeat, STORE_SYNC_SEC) if loader else heartbeat
+        idle = 0.0
+        async for event in self.subscribe(channel, last_event_id, tick):
+            if event is not None:
+                idle = 0.0
+                yield event.to_sse(self.epoch)
+                continue
+            idle += tick
+            if loader and self.sync_snapshot(channel, loader()):
+                continue
+            if idle >= heartbeat:
+                idle = 0.0
+                yield ": ping\n\n"
+
+    def _evict(self):
+        """调用方持有 self._lock"""
+        if len(self._channels) <= MAX_CHANNELS:
+            return
+        for name in [n for n, ch in self._channels.items() if not ch.subscribers]:
+            del self._channels[name]
+            if len(self._channels) <= MAX_CHANNELS:
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "subscribers": sum(len(ch.subscribers) for ch in self._channels.values()),
+                "published": self._published
+            }
+
+    def clear(self, channel: str):
+        """删除频道（任务删除时调用）"""
+        with self._lock:
+            self._channels.pop(channel, None)
+
+
+def sse_response(
+    channel: str,
+    last_event_id: Optional[str] = None,
+    loader: Optional[Callable[[], Optional[Dict[str, Any]]]] = None
+):
+    """构建 SSE StreamingResponse（供各路由的 /events 端点使用，loader 见 stream_sse）"""
+    from fastapi.responses import StreamingResponse
+
+    bus = get_progress_bus()
+    return StreamingResponse(
+        bus.stream_sse(channel, bus.parse_event_id(last_event_id), loader=loader),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭 nginx 缓冲
+        }
+    )
+
+
+# 全局单例
+_progress_bus: Optional[ProgressBus] = None
+_progress_bus_lock = threading.Lock()
+
+
+def get_progress_bus() -> ProgressBus:
+    """获取全局进度事件总线"""
+    global _progress_bus
+    with _progress_bus_lock:
+        if _progress_bus is None:
+            _progress_bus = ProgressBus()
+        return _progress_bus
@@ -0,0 +1,446 @@
+"""
+Prompt 编译器 - 把 ScenesJSON / TranscriptJSON / BGM 库编码成紧凑表格，并控制在 token 预算内
+
+原来 LLMDirector 把 scenes / transcript 整体 json.dumps(indent=2) 放进用户消息，BGM 库在系统提示词和
+用户消息里各发一次：300 个镜头的素材就会超出上下文窗口，每次调用又慢又贵。
+
+编码格式（每个镜头 / 字幕段 / BGM 一行，列用 | 分隔，不含缩进和键名，列名只在每节的 # 行出现一次）：
+
+    #S fps=30 列=id|in|out|shot|q|mood|subj|act|light|sum
+    S0001|0|120|特写|9|开心|人,咖啡|喝|自然光|女生端起咖啡微笑
+    ~S0002..S0014|省略13个|q≈5|中景×9
+    #T 秒 列=start|end|text
+    0|2.5|大家好
+    #B 列=id|mood|bpm|energy|usage|tags
+    calm_090_01|calm|90|low|story,vlog|
+
+超出预算时依次降级：
+1. 字幕最多占可用预算的一半（镜头放得下时不限），超出时均匀抽样
+2. 按价值（quality_score、与语音重叠、特写 / 近景、光线）从低到高省略镜头，连续省略的镜头合并为一行摘要
+
+用法:
+    compiled = PromptCompiler().compile(system_prompt, scenes, transcript, style_prompt, bgm_library)
+    compiled.system, compiled.user, compiled.stats.to_dict()
+"""
+import bisect
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, replace
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..models.schemas import Scene, ScenesJSON, TranscriptJSON
+
+# 镜头描述最多保留的字数
+SUMMARY_MAX_CHARS = 60
+
+# 超出预算时字幕最多占用的比例
+TRANSCRIPT_SHARE = 0.5
+
+# BGM 发给 LLM 的字段（路径 / 版权等对选曲无用）
+BGM_FIELDS = ("id", "mood", "bpm", "energy", "usage", "tags")
+
+# 质量差的光线
+POOR_LIGHTING = ("过曝", "暗调")
+
+# 用户消息最后一行的默认任务说明
+DSL_INSTRUCTION = "请根据以上素材，生成符合 editing_dsl.v1 格式的剪辑指令 JSON。"
+
+# 系统提示词中对表格格式的说明
+TABLE_FORMAT_GUIDE = """素材以紧凑表格给出：每行一条记录，列用 | 分隔，列名见每节开头的 # 行：
+- #S 镜头：id=scene_id，in/out=start_frame/end_frame，shot=景别(shot_type)，q=quality_score，
+  mood=情绪，subj=主体(subjects，逗号分隔)，act=动作，light=光线(lighting)，sum=画面描述(visual.summary)；
+  没有视觉信息的镜头只有 id|in|out
+- 以 ~ 开头的行是因篇幅省略的镜头摘要，不要使用其中的镜头
+- #T 字幕：start|end|text（秒），"抽样" 表示只列出了部分字幕段
+- #B BGM：id|mood|bpm|energy|usage|tags"""
+
+
+@dataclass
+class PromptStats:
+    """一次编译的 token 统计"""
+    system_tokens: int
+    user_tokens: int
+    budget: int
+    scenes_total: int
+    scenes_kept: int
+    segments_total: int
+    segments_kept: int
+    bgm_total: int
+    bgm_kept: int
+    encode_ms: float
+    tokenizer: str
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.user_tokens
+
+    @property
+    def over_budget(self) -> bool:
+        return self.total_tokens > self.budget
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["total_tokens"] = self.total_tokens
+        data["over_budget"] = self.over_budget
+        return data
+
+
+@dataclass
+class CompiledPrompt:
+    """编译结果（user = prefix + 风格要求 + instruction，prefix 为素材编码，不含风格）"""
+    system: str
+    user: str
+    stats: PromptStats
+    prefix: str = ""
+    instruction: str = DSL_INSTRUCTION
+
+
+@lru_cache(maxsize=4)
+def _get_encoder(model: str):
+    """tiktoken 编码器（未安装或无法加载时返回 None，使用估算）"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    token 数：安装了 tiktoken 时精确计算，否则估算
+    （中日韩字符按 1 个 token，其余按 4 个字符 1 个 token）
+    """
+    encoder = _get_encoder(model or settings.OPENAI_MODEL)
+    if encoder is not None:
+        return len(encoder.encode(text))
+    wide = sum(1 for ch in text if ch >= "⺀")
+    return wide + (len(text) - wide + 3) // 4
+
+
+def tokenizer_name(model: Optional[str] = None) -> str:
+    return "tiktoken" if _get_encoder(model or settings.OPENAI_MODEL) is not None else "estimate"
+
+
+def _cell(value: Any, max_chars: Optional[int] = None) -> str:
+    """表格单元：去掉分隔符和换行"""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        text = ",".join(_cell(v) for v in value)
+    elif isinstance(value, float):
+        text = f"{round(value, 2):g}"
+    else:
+        text = str(value)
+    text = " ".join(text.replace("|", "/").split())
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars - 1] + "…"
+    return text
+
+
+def _row(values: List[Any]) -> str:
+    cells = [_cell(v) for v in values]
+    while cells and cells[-1] == "":
+        cells.pop()
+    return "|".join(cells)
+
+
+class PromptCompiler:
+    """把素材编码成紧凑表格并控制 token 预算"""
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        summary_max_chars: int = SUMMARY_MAX_CHARS,
+        model: Optional[str] = None
+    ):
+        """
+        Args:
+            token_budget: 输入 token 预算（系统提示词 + 用户消息，None 表示使用 LLM_PROMPT_TOKEN_BUDGET）
+            summary_max_chars: 镜头描述最多保留的字数
+            model: 计算 token 所用的模型（None 表示 OPENAI_MODEL）
+        """
+        self.token_budget = token_budget or settings.LLM_PROMPT_TOKEN_BUDGET
+        self.summary_max_chars = summary_max_chars
+        self.model = model
+
+    def compile(
+        self,
+        system_prompt: str,
+        scenes: ScenesJSON,
+        transcript: TranscriptJSON,
+        style_prompt: str,
+        bgm_library: Optional[list] = None,
+        instruction: str = DSL_INSTRUCTION
+    ) -> CompiledPrompt:
+        """编译一次请求的系统提示词和用户消息（instruction 为用户消息最后一行的任务说明）"""
+        t0 = time.perf_counter()
+        fps = scenes.meta.fps if scenes.meta else 30.0
+        bgm_raw = list(bgm_library or [])
+        bgm = self.dedupe_bgm(bgm_raw)
+
+        scene_lines = [self.encode_scene(scene) for scene in scenes.scenes]
+        segment_lines = [
+            _row([seg.start, seg.end, seg.text]) for seg in transcript.segments
+        ]
+
+        def render(scene_block: List[str], segment_block: List[str], sampled: bool) -> Tuple[str, str]:
+            prefix = self._render_prefix(scenes, transcript, bgm, scene_block, segment_block, sampled)
+            return prefix, self._compose(prefix, style_prompt, instruction)
+
+        system_tokens = self._count(system_prompt)
+        prefix, user = render(scene_lines, segment_lines, False)
+        kept_scenes = len(scene_lines)
+        kept_segments = len(segment_lines)
+
+        if system_tokens + self._count(user) > self.token_budget:
+            fixed = system_tokens + self._count(render([], [], True)[1])
+            available = max(0, self.token_budget - fixed)
+            scene_costs = [self._count(line) + 1 for line in scene_lines]
+            segment_costs = [self._count(line) + 1 for line in segment_lines]
+
+            # 1. 字幕：镜头放得下时不限，否则最多占一半
+            segment_budget = max(int(available * TRANSCRIPT_SHARE), available - sum(scene_costs))
+            kept_indices = self._sample_segments(segment_costs, segment_budget)
+            segment_block = [segment_lines[i] for i in kept_indices]
+            kept_segments = len(segment_block)
+
+            # 2. 镜头：按价值保留，剩余的合并为摘要
+            scene_budget = available - sum(segment_costs[i] for i in kept_indices)
+            scene_block, kept_scenes = self._fit_scenes(
+                scenes.scenes, scene_lines, scene_costs, transcript, fps, scene_budget
+            )
+            prefix, user = render(scene_block, segment_block, kept_segments < len(segment_lines))
+
+        stats = PromptStats(
+            system_tokens=system_tokens,
+            user_tokens=self._count(user),
+            budget=self.token_budget,
+            scenes_total=len(scenes.scenes),
+            scenes_kept=kept_scenes,
+            segments_total=len(transcript.segments),
+            segments_kept=kept_segments,
+            bgm_total=len(bgm_raw),
+            bgm_kept=len(bgm),
+            encode_ms=round((time.perf_counter() - t0) * 1000, 2),
+            tokenizer=tokenizer_name(self.model)
+        )
+        return CompiledPrompt(system=system_prompt, user=user, stats=stats, prefix=prefix, instruction=instruction)
+
+    def restyle(self, compiled: CompiledPrompt, style_prompt: str) -> CompiledPrompt:
+        """
+        换一个风格要求，复用已编码的素材（批量生成多个风格时共享系统提示词和用户消息前缀，
+        支持 prompt 缓存的服务可以复用这部分；compiled 应按最长的风格要求编译，保证都在预算内）
+        """
+        t0 = time.perf_counter()
+        user = self._compose(compiled.prefix, style_prompt, compiled.instruction)
+        stats = replace(
+            compiled.stats,
+            user_tokens=self._count(user),
+            encode_ms=round((time.perf_counter() - t0) * 1000, 2)
+        )
+        return replace(compiled, user=user, stats=stats)
+
+    # ==================== 编码 ====================
+
+    def encode_scene(self, scene: Scene) -> str:
+        """一个镜头一行：id|in|out|shot|q|mood|subj|act|light|sum（没有视觉信息时只有 id|in|out）"""
+        visual = scene.visual
+        if visual is None:
+            return _row([scene.scene_id, scene.start_frame, scene.end_frame])
+        return _row([
+            scene.scene_id,
+            scene.start_frame,
+            scene.end_frame,
+            visual.shot_type,
+            visual.quality_score,
+            visual.mood,
+            visual.subjects,
+            visual.action,
+            visual.lighting,
+            _cell(visual.summary, self.summary_max_chars)
+        ])
+
+    @staticmethod
+    def dedupe_bgm(bgm_library: list) -> List[Dict[str, Any]]:
+        """BGM 去重（按 id）并只保留选曲需要的字段，接受字典或 BGMMetadata"""
+        seen = set()
+        entries = []
+        for item in bgm_library:
+            data = item.to_dict() if hasattr(item, "to_dict") else dict(item)
+            bgm_id = data.get("id")
+            if not bgm_id or bgm_id in seen:
+                continue
+            seen.add(bgm_id)
+            entries.append({field: data.get(field) for field in BGM_FIELDS})
+        return entries
+
+    def _render_prefix(
+        self,
+        scenes: ScenesJSON,
+        transcript: TranscriptJSON,
+        bgm: List[Dict[str, Any]],
+        scene_lines: List[str],
+        segment_lines: List[str],
+        sampled: bool
+    ) -> str:
+        """用户消息中风格要求之前的部分（素材表格，同一批素材的各风格共享）"""
+        fps = scenes.meta.fps if scenes.meta else 30.0
+        clip = scenes.media.primary_clip_path if scenes.media else ""
+        scene_header = f"#S fps={_cell(fps)}" + (f" clip={_cell(clip)}" if clip else "")
+        segment_header = "#T 秒"
+        if sampled:
+            segment_header += f" 抽样{len(segment_lines)}/{len(transcript.segments)}"
+        language = transcript.meta.language if transcript.meta else ""
+        if language:
+            segment_header += f" lang={language}"
+
+        parts = [
+            "【视觉素材 (Scenes)】",
+            f"{scene_header} 列=id|in|out|shot|q|mood|subj|act|light|sum",
+            *scene_lines,
+            "",
+            "【听觉素材 (Transcript)】",
+            f"{segment_header} 列=start|end|text",
+            *segment_lines
+        ]
+        if bgm:
+            parts += [
+                "",
+                "【BGM 素材库】",
+                "#B 列=" + "|".join(BGM_FIELDS),
+                *[_row([entry[field] for field in BGM_FIELDS]) for entry in bgm]
+            ]
+        parts += ["", "【风格要求】", ""]
+        return "\n".join(parts)
+
+    @staticmethod
+    def _compose(prefix: str, style_prompt: str, instruction: str) -> str:
+        return f"{prefix}{style_prompt.strip()}\n\n{instruction}"
+
+    # ==================== 预算 ====================
+
+    @staticmethod
+    def _sample_segments(costs: List[int], budget: int) -> List[int]:
+        """字幕超出预算时均匀抽样，返回保留的下标"""
+        if sum(costs) <= budget:
+            return list(range(len(costs)))
+        if not costs or budget <= 0:
+            return []
+        keep = max(1, min(len(costs), int(budget / (sum(costs) / len(costs)))))
+        while keep > 0:
+            indices = sorted({round(i * (len(costs) - 1) / max(1, keep - 1)) for i in range(keep)})
+            if sum(costs[i] for i in indices) <= budget:
+                return indices
+            keep -= 1
+        return []
+
+    def _fit_scenes(
+        self,
+        scenes: List[Scene],
+        lines: List[str],
+        costs: List[int],
+        transcript: TranscriptJSON,
+        fps: float,
+        budget: int
+    ) -> Tuple[List[str], int]:
+        """镜头超出预算时按价值保留，返回 (行, 保留的镜头数)"""
+        if sum(costs) <= budget:
+            return lines, len(lines)
+
+        ranked = self.rank_scenes(scenes, transcript, fps)
+
+        def build(keep: int) -> Tuple[List[str], int]:
+            kept = set(ranked[:keep])
+            block = []
+            tokens = 0
+            run: List[int] = []
+            for i in range(len(scenes) + 1):
+                if i < len(scenes) and i not in kept:
+                    run.append(i)
+                    continue
+                if run:
+                    line = self._omitted_line([scenes[j] for j in run])
+                    block.append(line)
+                    tokens += self._count(line) + 1
+                    run = []
+                if i < len(scenes):
+                    block.append(lines[i])
+                    tokens += costs[i]
+            return block, tokens
+
+        # 二分查找能放下的最多镜头数（一个都放不下时只输出摘要）
+        low, high = 1, len(scenes)
+        best, best_keep = build(0)[0], 0
+        while low <= high:
+            middle = (low + high) // 2
+            block, tokens = build(middle)
+            if tokens <= budget:
+                best, best_keep = block, middle
+                low = middle + 1
+            else:
+                high = middle - 1
+        return best, best_keep
+
+    def rank_scenes(self, scenes: List[Scene], transcript: TranscriptJSON, fps: float) -> List[int]:
+        """按价值从高到低排列的镜头下标（同分时按原顺序）"""
+        speech = _speech_index(transcript)
+        return sorted(
+            range(len(scenes)),
+            key=lambda i: (-self._scene_value(scenes[i], speech, fps), i)
+        )
+
+    @staticmethod
+    def _scene_value(scene: Scene, speech: Tuple[List[float], List[float]], fps: float) -> float:
+        """镜头价值：质量评分为基础，与语音重叠、特写 / 近景加分，光线差减分"""
+        visual = scene.visual
+        value = float(visual.quality_score) if visual else 5.0
+        if visual and visual.shot_type in ("特写", "近景"):
+            value += 1
+        if visual and visual.lighting in POOR_LIGHTING:
+            value -= 2
+        if _overlaps_speech(speech, scene.start_frame / fps, scene.end_frame / fps):
+            value += 2
+        return value
+
+    def _omitted_line(self, scenes: List[Scene]) -> str:
+        """连续省略的镜头合并为一行：~首..尾|省略N个|q≈平均质量|主要景别"""
+        first, last = scenes[0].scene_id, scenes[-1].scene_id
+        ids = first if len(scenes) == 1 else f"{first}..{last}"
+        cells = [f"~{ids}", f"省略{len(scenes)}个"]
+        visuals = [scene.visual for scene in scenes if scene.visual]
+        if visuals:
+            cells.append(f"q≈{sum(v.quality_score for v in visuals) / len(visuals):.0f}")
+            shot, count = Counter(v.shot_type for v in visuals).most_common(1)[0]
+            cells.append(f"{shot}×{count}")
+        return "|".join(cells)
+
+    def _count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+
+def _speech_index(transcript: TranscriptJSON) -> Tuple[List[float], List[float]]:
+    """合并后的有声区间（起点、终点两个有序列表），用于二分判断镜头是否与语音重叠"""
+    spans = sorted((seg.start, seg.end) for seg in transcript.segments if seg.end > seg.start)
+    starts: List[float] = []
+    ends: List[float] = []
+    for start, end in spans:
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def _overlaps_speech(speech: Tuple[List[float], List[float]], start: float, end: float) -> bool:
+    starts, ends = speech
+    index = bisect.bisect_left(starts, end) - 1
+    return index >= 0 and ends[index] > start
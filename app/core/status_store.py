@@ -0,0 +1,359 @@
+"""
+共享状态存储 - 项目 / 组装 / 导出任务的实时状态
+
+取代 routes_projects.project_status、routes_exports.export_tasks 等模块级字典：
+uvicorn reload 后状态丢失，--workers N 时每个进程各有一份，轮询落到哪个进程就看到哪份。
+
+后端（STATUS_STORE_BACKEND）:
+    memory  进程内字典（单进程开发 / 测试用，多 worker 时不共享）
+    sqlite  jobs/.status_store.sqlite3（默认，WAL）：同一台机器上的多个 worker 和重启后一致
+    redis   STATUS_STORE_REDIS_URL（需要安装 redis 包），可跨机器共享
+
+状态为 completed / error / failed / cancelled 的条目保留 STATUS_STORE_FINISHED_TTL_SEC 秒后清理，
+进行中的条目不过期。update() 的读-改-写是原子的（sqlite 用 BEGIN IMMEDIATE，redis 用 WATCH），
+多个 worker 同时更新同一条目不会互相覆盖。
+
+用法:
+    store = get_status_store()
+    store.put("project", project_id, {"status": "processing", "progress": 5})
+    store.update("project", project_id, lambda s: s.update(progress=40))
+    store.get("project", project_id)
+"""
+import copy
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import settings
+from .progress_bus import TERMINAL_STATUSES
+
+# 写入时顺带清理过期条目的最小间隔
+PURGE_INTERVAL_SEC = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS status (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_status_expires ON status (expires_at);
+"""
+
+# update() 的回调：原地修改状态，返回该条目的 TTL（秒，None 表示不过期）
+Mutator = Callable[[Dict[str, Any]], Optional[float]]
+
+
+class StatusBackend:
+    """后端接口（键已带命名空间前缀）"""
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[float]):
+        raise NotImplementedError
+
+    def update(self, key: str, mutate: Mutator) -> Optional[Dict[str, Any]]:
+        """原子读-改-写，条目不存在时返回 None"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def keys(self, prefix: str) -> List[str]:
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        return 0
+
+
+class MemoryBackend(StatusBackend):
+    """进程内字典"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[Dict[str, Any], Optional[float]]] = {}
+
+    def _live(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            value = self._live(key)
+            return copy.deepcopy(value) if value is not None else None
+
+    def put(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (copy.deepcopy(value), _expires_at(ttl))
+
+    def update(self, key, mutate):
+        with self._lock:
+            value = self._live(key)
+            if value is None:
+                return None
+            value = copy.deepcopy(value)
+            ttl = mutate(value)
+            self._data[key] = (value, _expires_at(ttl))
+            return copy.deepcopy(value)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def keys(self, prefix):
+        with self._lock:
+            return [k for k in list(self._data) if k.startswith(prefix) and self._live(k) is not None]
+
+    def purge_expired(self):
+        with self._lock:
+            before = len(self._data)
+            for key in list(self._data):
+                self._live(key)
+            return before - len(self._data)
+
+
+class SQLiteBackend(StatusBackend):
+    """SQLite（WAL），多进程共享同一个文件"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._last_purge = 0.0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM status WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, ttl):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO status (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), _expires_at(ttl), time.time())
+            )
+            self._maybe_purge()
+
+    def update(self, key, mutate):
+        with self._lock:
+            # BEGIN IMMEDIATE 先拿写锁：其它进程的 update 在这里排队，不会读到旧值
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM status WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                    (key, time.time())
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                value = json.loads(row[0])
+                ttl = mutate(value)
+                self._conn.execute(
+                    "UPDATE status SET value = ?, expires_at = ?, updated_at = ? WHERE key = ?",
+                    (json.dumps(value, ensure_ascii=False), _expires_at(ttl), time.time(), key)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._maybe_purge()
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM status WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def keys(self, prefix):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM status WHERE key LIKE ? ESCAPE '\\' "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (escaped + "%", time.time())
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge_expired(self):
+        with self._lock:
+            self._last_purge = time.time()
+            cursor = self._conn.execute(
+                "DELETE FROM status WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (self._last_purge,)
+            )
+        return cursor.rowcount
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge >= PURGE_INTERVAL_SEC:
+            self.purge_expired()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisBackend(StatusBackend):
+    """Redis（TTL 由 Redis 自身过期处理）"""
+
+    KEY_PREFIX = "autocut:status:"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "STATUS_STORE_BACKEND=redis 需要安装 redis 包。\n"
+                "运行: pip install redis"
+            )
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._watch_error = redis.WatchError
+
+    def get(self, key):
+        raw = self._redis.get(self.KEY_PREFIX + key)
+        return json.loads(raw) if raw else None
+
+    def put(self, key, value, ttl):
+        self._redis.set(
+            self.KEY_PREFIX + key,
+            json.dumps(value, ensure_ascii=False),
+            ex=max(1, int(ttl)) if ttl is not None else None
+        )
+
+    def update(self, key, mutate):
+        name = self.KEY_PREFIX + key
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(name)
+                    raw = pipe.get(name)
+                    if not raw:
+                        pipe.unwatch()
+                        return None
+                    value = json.loads(raw)
+                    ttl = mutate(value)
+                    pipe.multi()
+                    pipe.set(name, json.dumps(value, ensure_ascii=False),
+                             ex=max(1, int(ttl)) if ttl is not None else None)
+                    pipe.execute()
+                    return value
+                except self._watch_error:
+                    # 其它 worker 在此期间改过：重读重试
+                    continue
+
+    def delete(self, key):
+        return self._redis.delete(self.KEY_PREFIX + key) > 0
+
+    def keys(self, prefix):
+        start = len(self.KEY_PREFIX)
+        return [k[start:] for k in self._redis.scan_iter(match=self.KEY_PREFIX + prefix + "*")]
+
+
+def _expires_at(ttl: Optional[float]) -> Optional[float]:
+    return time.time() + ttl if ttl is not None else None
+
+
+class StatusStore:
+    """按命名空间（project / assembly / export）存取状态"""
+
+    def __init__(self, backend: StatusBackend, finished_ttl: Optional[float] = None):
+        """
+        Args:
+            backend: 存储后端
+            finished_ttl: 终态条目保留秒数（None 表示不过期）
+        """
+        self.backend = backend
+        self.finished_ttl = finished_ttl
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        return self.backend.get(f"{kind}:{key}")
+
+    def put(self, kind: str, key: str, value: Dict[str, Any]):
+        self.backend.put(f"{kind}:{key}", value, self._ttl(value))
+
+    def update(
+        self,
+        kind: str,
+        key: str,
+        mutate: Callable[[Dict[str, Any]], Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        原子更新（mutate 原地修改状态字典）
+
+        Returns:
+            更新后的状态；条目不存在时返回 None（不调用 mutate）
+        """
+        def apply(value: Dict[str, Any]) -> Optional[float]:
+            mutate(value)
+            return self._ttl(value)
+
+        return self.backend.update(f"{kind}:{key}", apply)
+
+    def delete(self, kind: str, key: str) -> bool:
+        return self.backend.delete(f"{kind}:{key}")
+
+    def delete_prefix(self, kind: str, prefix: str) -> int:
+        """删除以 prefix 开头的所有条目（如项目的全部版本）"""
+        keys = self.backend.keys(f"{kind}:{prefix}")
+        return sum(1 for key in keys if self.backend.delete(key))
+
+    def keys(self, kind: str) -> List[str]:
+        start = len(kind) + 1
+        return [key[start:] for key in self.backend.keys(f"{kind}:")]
+
+    def purge_expired(self) -> int:
+        return self.backend.purge_expired()
+
+    def _ttl(self, value: Dict[str, Any]) -> Optional[float]:
+        if value.get("status") in TERMINAL_STATUSES:
+            return self.finished_ttl
+        return None
+
+
+def create_backend(name: str) -> StatusBackend:
+    """按名称创建后端（memory / sqlite / redis）"""
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(settings.JOBS_DIR / settings.STATUS_STORE_FILE)
+    if name == "redis":
+        return RedisBackend(settings.STATUS_STORE_REDIS_URL)
+    raise ValueError(f"未知的状态存储后端: {name}")
+
+
+# 全局单例
+_status_store: Optional[StatusStore] = None
+_status_store_lock = threading.Lock()
+
+
+def get_status_store() -> StatusStore:
+    """获取全局状态存储"""
+    global _status_store
+    with _status_store_lock:
+        if _status_store is None:
+            _status_store = StatusStore(
+                create_backend(settings.STATUS_STORE_BACKEND),
+                finished_ttl=settings.STATUS_STORE_FINISHED_TTL_SEC or None
+            )
+        return _status_store
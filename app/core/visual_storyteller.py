@@ -14,9 +14,9 @@ import json
 from typing import List, Dict, Any, Optional
 from collections import defaultdict
 
-from openai import OpenAI
-
 from ..config import settings
+from .llm_cache import chat_json
+from .llm_client import get_llm_client
 from ..models.schemas import (
     ScenesJSON, 
     Scene, 
@@ -29,17 +29,19 @@ from ..models.schemas import (
 class VisualStoryteller:
     """无脚本模式的核心大脑 - 从视觉素材构思故事"""
     
-    def __init__(self):
-        """初始化 LLM 客户端"""
+    def __init__(self, use_cache: bool = True):
+        """
+        初始化 LLM 客户端
+        
+        Args:
+            use_cache: 是否读取 LLM 回复缓存（False 表示重新构思，新结果仍写回缓存）
+        """
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY not configured")
         
-        client_kwargs = {"api_key": settings.OPENAI_API_KEY}
-        if settings.OPENAI_BASE_URL:
-            client_kwargs["base_url"] = settings.OPENAI_BASE_URL
-        
-        self.client = OpenAI(**client_kwargs)
+        self.client = get_llm_client()
         self.model = "gpt-4o"  # 需要强推理能力
+        self.use_cache = use_cache
     
     def generate_story_from_visuals(
         self,
@@ -285,14 +287,14 @@ class VisualStoryteller:
   ]
 }}"""
         
-        response = self.client.chat.completions.create(
+        return chat_json(
+            self.client,
             model=self.model,
             messages=[{"role": "system", "content": system_prompt}],
             response_format={"type": "json_object"},
-            temperature=0.8  # 提高创造性
+            temperature=0.8,  # 提高创造性
+            use_cache=self.use_cache
         )
-        
-        return json.loads(response.choices[0].message.content)
     
     def _generate_virtual_transcript(
         self,
@@ -363,15 +365,15 @@ class VisualStoryteller:
 - 总时长不超过 {duration} 秒
 """
         
-        response = self.client.chat.completions.create(
+        data = chat_json(
+            self.client,
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
             response_format={"type": "json_object"},
-            temperature=0.7
+            temperature=0.7,
+            use_cache=self.use_cache
         )
         
-        data = json.loads(response.choices[0].message.content)
-        
         # 封装为标准 TranscriptJSON 对象
         return TranscriptJSON(
             meta=TranscriptMeta(
@@ -403,7 +405,7 @@ class VisualStoryteller:
         from .llm_engine import LLMDirector
         
         # 使用 LLM Director 生成 DSL
-        director = LLMDirector()
+        director = LLMDirector(use_cache=self.use_cache)
         
         # 构建风格提示
         style_prompt = f"""
@@ -1,8 +1,8 @@
 """FastAPI 主应用入口（最小骨架）"""
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
 from contextlib import asynccontextmanager
 
@@ -18,6 +18,7 @@ from .api.routes_visual import router as visual_router
 from .api.routes_storyteller import router as storyteller_router
 from .api.routes_orchestrator import router as orchestrator_router
 from .api.routes_runtime import router as runtime_router
+from .core.job_paths import InvalidJobId
 
 
 @asynccontextmanager
@@ -65,6 +66,30 @@ async def lifespan(app: FastAPI):
     monitor.register_degradation_callback(on_degradation)
     start_runtime_monitor()
     
+    # 4. 预加载 Whisper 模型（后台线程，不阻塞启动）
+    if settings.WHISPER_WARMUP:
+        import threading
+        from .tools.whisper_pool import get_whisper_pool
+        
+        def warmup_whisper():
+            try:
+                get_whisper_pool().warmup(
+                    settings.WHISPER_MODEL,
+                    settings.WHISPER_DEVICE,
+                    settings.WHISPER_COMPUTE_TYPE
+                )
+            except Exception as e:
+                print(f"⚠️  Whisper 预加载失败（首次转录时再加载）: {e}")
+        
+        print(f"\n🎙️  后台预加载 Whisper 模型: {settings.WHISPER_MODEL}")
+        threading.Thread(target=warmup_whisper, daemon=True, name="whisper-warmup").start()
+    
+    # 5. 启动持久化任务队列（恢复上次未完成的任务）
+    from .core.job_queue import get_job_queue
+    job_queue = get_job_queue()
+    await job_queue.start()
+    print(f"\n📋 任务队列已启动: {job_queue.get_stats()['slots']}")
+    
     print("\n" + "="*60)
     print("✅ AutoCut Director 启动完成")
     print("="*60 + "\n")
@@ -73,8 +98,15 @@ async def lifespan(app: FastAPI):
     
     # 关闭时清理
     print("\n🛑 AutoCut Director 关闭中...")
+    await job_queue.stop()
     from .core.runtime_monitor import stop_runtime_monitor
     stop_runtime_monitor()
+    from .core.job_store import flush_pending_writes
+    flush_pending_writes()
+    from .tools.whisper_pool import get_whisper_pool
+    get_whisper_pool().shutdown()
+    from .core.llm_client import get_llm_pool
+    get_llm_pool().close()
     print("✅ 已关闭")
 
 
@@ -85,6 +117,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+
+@app.exception_handler(InvalidJobId)
+async def invalid_job_id_handler(request: Request, exc: InvalidJobId):
+    """非法的 job / 项目 ID 是请求参数错误，返回 400 而不是 500"""
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
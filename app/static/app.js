@@ -222,13 +222,57 @@ async function createProject() {
     }
 }
 
-// 轮询组装项目进度
-async function pollAssemblyProgress() {
-    const pollInterval = setInterval(async () => {
+// 订阅进度事件（SSE），不支持 EventSource 时退回轮询 status 接口
+// onStatus(status) 在每次状态更新时调用；状态为 completed / error 后自动停止
+function watchProgress(eventsUrl, statusUrl, onStatus, onError) {
+    let stopped = false;
+    let source = null;
+    let pollInterval = null;
+
+    const stop = () => {
+        stopped = true;
+        if (source) source.close();
+        if (pollInterval) clearInterval(pollInterval);
+    };
+
+    const handle = async (status) => {
+        if (stopped) return;
+        if (status.status === 'completed' || status.status === 'error') {
+            stop();
+        }
         try {
-            const response = await fetch(`/api/assembly/${currentJobId}/status`);
-            const status = await response.json();
+            await onStatus(status);
+        } catch (error) {
+            stop();
+            if (onError) onError(error);
+        }
+    };
+
+    if (window.EventSource) {
+        source = new EventSource(eventsUrl);
+        source.addEventListener('status', (event) => handle(JSON.parse(event.data)));
+        // 连接断开时浏览器会按 retry 自动重连（带 Last-Event-ID），这里无需处理
+    } else {
+        pollInterval = setInterval(async () => {
+            try {
+                const response = await fetch(statusUrl);
+                await handle(await response.json());
+            } catch (error) {
+                stop();
+                if (onError) onError(error);
+            }
+        }, 2000);
+    }
+
+    return stop;
+}
 
+// 订阅组装项目进度
+async function pollAssemblyProgress() {
+    watchProgress(
+        `/api/assembly/${currentJobId}/events`,
+        `/api/assembly/${currentJobId}/status`,
+        async (status) => {
             // 更新进度
             updateProgress(status.progress);
 
@@ -239,35 +283,31 @@ async function pollAssemblyProgress() {
 
             // 检查是否完成
             if (status.status === 'completed') {
-                clearInterval(pollInterval);
                 addLog('组装项目处理完成！');
                 stopTimer();
 
                 // 切换到预览步骤
                 await sleep(1000);
                 await showPreview();
+            } else if (status.status === 'retrying') {
+                // 后端任务队列会自动重跑，继续等待
+                addLog(status.error || '处理失败，稍后重试', 'error');
             } else if (status.status === 'error') {
-                clearInterval(pollInterval);
                 addLog(`错误: ${status.error || '处理失败'}`, 'error');
                 stopTimer();
                 alert('处理失败，请重试');
             }
-
-        } catch (error) {
-            addLog(`轮询错误: ${error.message}`, 'error');
-        }
-    }, 2000);
+        },
+        (error) => addLog(`进度获取错误: ${error.message}`, 'error')
+    );
 }
 
-// 轮询项目进度
+// 订阅项目进度
 async function pollProjectProgress() {
-    let resolveSceneDetectionCalled = false;  // 标记是否已调用 Resolve 场景检测
-
-    const pollInterval = setInterval(async () => {
-        try {
-            const response = await fetch(`/api/projects/${currentJobId}/status`);
-            const status = await response.json();
-
+    watchProgress(
+        `/api/projects/${currentJobId}/events`,
+        `/api/projects/${currentJobId}/status`,
+        async (status) => {
             // 更新进度
             updateProgress(status.progress);
 
@@ -294,24 +334,23 @@ async function pollProjectProgress() {
 
             // 检查是否完成
             if (status.status === 'completed') {
-                clearInterval(pollInterval);
                 addLog('项目处理完成！');
                 stopTimer();
 
                 // 切换到预览步骤
                 await sleep(1000);
                 await showPreview();
+            } else if (status.status === 'retrying') {
+                // 后端任务队列会自动重跑，继续等待
+                addLog(status.error || '处理失败，稍后重试', 'error');
             } else if (status.status === 'error') {
-                clearInterval(pollInterval);
                 addLog(`错误: ${status.error || '处理失败'}`, 'error');
                 stopTimer();
                 alert('处理失败，请重试');
             }
-
-        } catch (error) {
-            addLog(`轮询错误: ${error.message}`, 'error');
-        }
-    }, 2000);  // 每 2 秒轮询一次
+        },
+        (error) => addLog(`进度获取错误: ${error.message}`, 'error')
+    );
 }
 
 // 显示预览
@@ -410,19 +449,17 @@ async function adjustIntent(intentType, action, event) {
     }
 }
 
-// 轮询调整进度
+// 订阅调整进度
 async function pollAdjustmentProgress(version) {
+    const versionProjectId = `${currentJobId}_v${version}`;
     return new Promise((resolve, reject) => {
-        const pollInterval = setInterval(async () => {
-            try {
-                const versionProjectId = `${currentJobId}_v${version}`;
-                const response = await fetch(`/api/projects/${versionProjectId}/status`);
-                const status = await response.json();
-
+        watchProgress(
+            `/api/projects/${versionProjectId}/events`,
+            `/api/projects/${versionProjectId}/status`,
+            async (status) => {
                 addLog(`调整进度: ${status.progress}%`);
 
                 if (status.status === 'completed') {
-                    clearInterval(pollInterval);
                     addLog('调整完成，刷新预览...');
 
                     // 更新当前项目 ID 为新版本
@@ -432,16 +469,14 @@ async function pollAdjustmentProgress(version) {
                     await showPreview();
 
                     resolve();
+                } else if (status.status === 'retrying') {
+                    addLog(status.error || '调整失败，稍后重试', 'error');
                 } else if (status.status === 'error') {
-                    clearInterval(pollInterval);
                     reject(new Error(status.error || '调整失败'));
                 }
-
-            } catch (error) {
-                clearInterval(pollInterval);
-                reject(error);
-            }
-        }, 2000);
+            },
+            reject
+        );
     });
 }
 
@@ -489,29 +524,25 @@ async function exportVideo(quality) {
     }
 }
 
-// 轮询导出进度
+// 订阅导出进度
 async function pollExportProgress(exportId) {
     return new Promise((resolve, reject) => {
-        const pollInterval = setInterval(async () => {
-            try {
-                const response = await fetch(`/api/exports/${exportId}/status`);
-                const status = await response.json();
-
+        watchProgress(
+            `/api/exports/${exportId}/events`,
+            `/api/exports/${exportId}/status`,
+            (status) => {
                 addLog(`导出进度: ${status.progress}%`);
 
                 if (status.status === 'completed') {
-                    clearInterval(pollInterval);
                     resolve();
+                } else if (status.status === 'retrying') {
+                    addLog(status.error || '导出失败，稍后重试', 'error');
                 } else if (status.status === 'error') {
-                    clearInterval(pollInterval);
                     reject(new Error(status.error || '导出失败'));
                 }
-
-            } catch (error) {
-                clearInterval(pollInterval);
-                reject(error);
-            }
-        }, 2000);
+            },
+            reject
+        );
     });
 }
 
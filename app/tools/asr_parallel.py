@@ -0,0 +1,450 @@
+"""
+分块并行 ASR - 长录音（60–120 分钟课程）多核转录
+
+流程：
+1. 统一为 16 kHz 单声道 WAV（与 MediaIngest.extract_audio 输出一致）
+2. silencedetect 找静音区间（与 ModalityAnalyzer 同一套参数），在静音中点切块
+3. 进程池并行转录（进程数按 CPUProfile.threads 和模型池内存上限计算），
+   每个工作进程通过自己的 Whisper 模型池只加载一次模型
+4. 时间戳加上块偏移后拼接；找不到静音的硬切点两侧各多转录一小段重叠，
+   按词级时间戳只保留属于本块的词，接缝处不会出现重复词
+
+输出格式与 transcribe_audio 相同。
+"""
+import functools
+import multiprocessing
+import tempfile
+import time
+import wave
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .asr_whisper import transcribe_audio
+from .whisper_pool import (
+    WhisperModelPool,
+    estimate_model_gb,
+    get_whisper_pool,
+    load_faster_whisper
+)
+from . import whisper_pool as whisper_pool_module
+
+
+SAMPLE_RATE = 16000
+
+
+@dataclass
+class AudioChunk:
+    """音频块（start/end 为名义边界，read_* 为实际读取范围，含重叠）"""
+    index: int
+    start: float
+    end: float
+    read_start: float
+    read_end: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def plan_chunks(
+    duration: float,
+    silences: Sequence[Tuple[float, float]],
+    target_sec: float = 300.0,
+    min_sec: float = 120.0,
+    max_sec: float = 480.0,
+    overlap_sec: float = 1.5
+) -> List[AudioChunk]:
+    """
+    规划切块：优先在 [min_sec, max_sec] 范围内最接近 target_sec 的静音中点切开，
+    找不到静音时在 target_sec 处硬切并加重叠。
+
+    Args:
+        duration: 音频总时长（秒）
+        silences: 静音区间 [(start, end), ...]
+        target_sec: 目标块长
+        min_sec: 最短块长
+        max_sec: 最长块长
+        overlap_sec: 硬切点两侧的重叠时长
+
+    Returns:
+        按时间排序的块列表
+    """
+    cut_points = sorted((s + e) / 2 for s, e in silences if e > s)
+
+    bounds = []  # (start, end, 是否硬切)
+    start = 0.0
+    while duration - start > max_sec:
+        window = [c for c in cut_points if start + min_sec <= c <= start + max_sec]
+        if window:
+            cut = min(window, key=lambda c: abs(c - (start + target_sec)))
+            hard = False
+        else:
+            cut = start + target_sec
+            hard = True
+        bounds.append((start, cut, hard))
+        start = cut
+
+    bounds.append((start, duration, False))
+
+    chunks = []
+    for i, (chunk_start, chunk_end, hard_after) in enumerate(bounds):
+        hard_before = i > 0 and bounds[i - 1][2]
+        chunks.append(AudioChunk(
+            index=i,
+            start=chunk_start,
+            end=chunk_end,
+            read_start=max(0.0, chunk_start - overlap_sec) if hard_before else chunk_start,
+            read_end=min(duration, chunk_end + overlap_sec) if hard_after else chunk_end
+        ))
+    return chunks
+
+
+def read_wav_slice(wav_path: str, start: float, end: float) -> np.ndarray:
+    """
+    读取 16 kHz 单声道 16-bit WAV 的一段，返回 faster-whisper 需要的 float32 数组
+    """
+    with wave.open(str(wav_path), "rb") as wav:
+        if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+            raise ValueError(f"需要 16kHz 单声道 16-bit WAV: {wav_path}")
+
+        first = max(0, int(start * SAMPLE_RATE))
+        last = min(wav.getnframes(), int(end * SAMPLE_RATE))
+        wav.setpos(first)
+        raw = wav.readframes(max(0, last - first))
+
+    return np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def wav_duration(wav_path: str) -> float:
+    """WAV 时长（秒）"""
+    with wave.open(str(wav_path), "rb") as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+
+def _is_pcm16k_mono(audio_path: str) -> bool:
+    try:
+        with wave.open(str(audio_path), "rb") as wav:
+            return (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) == (SAMPLE_RATE, 1, 2)
+    except (wave.Error, EOFError, OSError):
+        return False
+
+
+def _trim_segment(segment: Dict[str, Any], start: float, end: float) -> Optional[Dict[str, Any]]:
+    """只保留起点落在 [start, end) 内的词"""
+    words = segment.get("words") or []
+
+    if not words:
+        # 没有词级时间戳时按段落中点归属
+        mid = (segment["start"] + segment["end"]) / 2
+        return segment if start <= mid < end else None
+
+    kept = [w for w in words if start <= w["start"] < end]
+    if not kept:
+        return None
+    if len(kept) == len(words):
+        return segment
+
+    return {
+        "start": kept[0]["start"],
+        "end": min(segment["end"], kept[-1]["end"]),
+        "text": "".join(w["word"] for w in kept).strip(),
+        "words": kept
+    }
+
+
+def _normalize_word(word: str) -> str:
+    return word.strip().strip(",.!?;:，。！？；：、").lower()
+
+
+class ChunkStitcher:
+    """
+    增量拼接：按块顺序加入各块结果（时间戳已是绝对时间），立即返回确定的段落
+
+    1. 每块只保留名义边界内的词（去掉重叠区的重复转录）
+    2. 接缝处相邻两段首尾同一个词且时间相近时，去掉后一个
+
+    接缝去重只会修改新块的第一段，已返回的段落不会再变化，
+    因此可以边转录边输出。
+    """
+
+    def __init__(self, chunks: Sequence[AudioChunk], seam_tolerance: float = 0.5):
+        self.chunk_count = len(chunks)
+        self.seam_tolerance = seam_tolerance
+        self._last: Optional[Dict[str, Any]] = None
+
+    def add(self, chunk: AudioChunk, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        加入下一个块（必须按块顺序调用）
+
+        Returns:
+            [{"start", "end", "text"}, ...]
+        """
+        is_last = chunk.index == self.chunk_count - 1
+        chunk_end = float("inf") if is_last else chunk.end
+        chunk_start = chunk.start if chunk.index > 0 else float("-inf")
+
+        kept = []
+        for segment in sorted(segments, key=lambda seg: seg["start"]):
+            trimmed = _trim_segment(segment, chunk_start, chunk_end)
+            if trimmed is not None:
+                kept.append(trimmed)
+
+        if self._last and kept:
+            prev_words = self._last.get("words") or []
+            next_words = kept[0].get("words") or []
+            if (
+                prev_words and next_words
+                and _normalize_word(prev_words[-1]["word"]) == _normalize_word(next_words[0]["word"])
+                and abs(next_words[0]["start"] - prev_words[-1]["start"]) <= self.seam_tolerance
+            ):
+                rest = next_words[1:]
+                if rest:
+                    kept[0] = {
+                        "start": rest[0]["start"],
+                        "end": kept[0]["end"],
+                        "text": "".join(w["word"] for w in rest).strip(),
+                        "words": rest
+                    }
+                else:
+                    kept.pop(0)
+
+        if kept:
+            self._last = kept[-1]
+
+        return [
+            {"start": seg["start"], "end": seg["end"], "text": seg["text"]}
+            for seg in kept
+            if seg["text"]
+        ]
+
+
+def stitch_chunks(
+    chunks: Sequence[AudioChunk],
+    results: Sequence[List[Dict[str, Any]]],
+    seam_tolerance: float = 0.5
+) -> List[Dict[str, Any]]:
+    """
+    拼接各块的转录结果（一次性版本，见 ChunkStitcher）
+
+    Returns:
+        [{"start", "end", "text"}, ...]
+    """
+    stitcher = ChunkStitcher(chunks, seam_tolerance)
+    stitched = []
+    for chunk, segments in zip(chunks, results):
+        stitched.extend(stitcher.add(chunk, segments))
+    return stitched
+
+
+def _init_worker(cpu_threads: int, max_memory_gb: float):
+    """工作进程初始化：独立的模型池，限定 CTranslate2 线程数，避免超订"""
+    whisper_pool_module._whisper_pool = WhisperModelPool(
+        max_memory_gb=max_memory_gb,
+        idle_timeout=0,  # 进程池结束即释放
+        loader=functools.partial(load_faster_whisper, cpu_threads=cpu_threads)
+    )
+
+
+def _transcribe_chunk(
+    wav_path: str,
+    chunk: AudioChunk,
+    model_size: str,
+    device: str,
+    compute_type: str,
+    language: Optional[str]
+) -> Dict[str, Any]:
+    """工作进程：转录一个块，返回绝对时间戳的段落（含词级时间戳）"""
+    audio = read_wav_slice(wav_path, chunk.read_start, chunk.read_end)
+    pool = get_whisper_pool()
+    offset = chunk.read_start
+
+    with pool.acquire(model_size, device, compute_type) as model:
+        start = time.time()
+        segments, info = model.transcribe(
+            audio,
+            language=language,
+            word_timestamps=True,
+            vad_filter=True
+        )
+
+        result_segments = []
+        for segment in segments:
+            result_segments.append({
+                "start": segment.start + offset,
+                "end": segment.end + offset,
+                "text": segment.text.strip(),
+                "words": [
+                    {"start": w.start + offset, "end": w.end + offset, "word": w.word}
+                    for w in (segment.words or [])
+                ]
+            })
+
+        elapsed = time.time() - start
+        pool.record_transcription(model_size, device, compute_type, elapsed, chunk.read_end - chunk.read_start)
+
+    return {
+        "index": chunk.index,
+        "segments": result_segments,
+        "language": info.language,
+        "seconds": elapsed
+    }
+
+
+def plan_workers(
+    chunk_count: int,
+    model_size: str,
+    cpu_threads: Optional[int] = None,
+    max_memory_gb: Optional[float] = None
+) -> Tuple[int, int]:
+    """
+    计算进程数和每进程线程数
+
+    Returns:
+        (workers, cpu_threads_per_worker)
+    """
+    if cpu_threads is None:
+        try:
+            from ..core.runtime_profile import get_runtime_profile
+            cpu_threads = get_runtime_profile().cpu.threads
+        except Exception:
+            cpu_threads = multiprocessing.cpu_count()
+
+    if max_memory_gb is None:
+        max_memory_gb = get_whisper_pool().max_memory_gb
+
+    # 每个进程至少 2 个线程，且每个进程各自常驻一份模型
+    by_cpu = max(1, cpu_threads // 2)
+    by_memory = max(1, int(max_memory_gb // estimate_model_gb(model_size)))
+    workers = max(1, min(chunk_count, by_cpu, by_memory))
+
+    return workers, max(1, cpu_threads // workers)
+
+
+def transcribe_audio_parallel(
+    audio_path: str,
+    model_size: str = "base",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    language: Optional[str] = None,
+    silences: Optional[Sequence[Tuple[float, float]]] = None,
+    workers: Optional[int] = None,
+    target_chunk_sec: float = 300.0,
+    on_segment: Optional[Callable[[Dict], None]] = None,
+    on_info: Optional[Callable[[Dict], None]] = None
+) -> dict:
+    """
+    分块并行转录（长录音）
+
+    Args:
+        audio_path: 音频文件路径（推荐 MediaIngest.extract_audio 的 16kHz WAV）
+        model_size: 模型大小
+        device: 设备（cuda 下直接走单模型路径）
+        compute_type: 计算类型
+        language: 语言代码，None 为自动检测（各块投票）
+        silences: 已有的静音区间（如 ModalityAnalyzer 的 silence_intervals），None 则现场检测
+        workers: 进程数（None 按 CPUProfile.threads 计算）
+        target_chunk_sec: 目标块长（秒）
+        on_segment: 每确定一段回调一次（按时间顺序；前面的块全部完成后才输出后面的块）
+        on_info: 开始转录前回调一次 {"language", "duration"}
+
+    Returns:
+        与 transcribe_audio 相同的结构
+    """
+    single = functools.partial(
+        transcribe_audio,
+        audio_path,
+        model_size,
+        device,
+        compute_type,
+        language,
+        on_segment=on_segment,
+        on_info=on_info
+    )
+
+    if device != "cpu":
+        return single()
+
+    with tempfile.TemporaryDirectory(prefix="asr_chunks_") as tmp_dir:
+        wav_path = audio_path
+        if not _is_pcm16k_mono(audio_path):
+            from .media_ingest import MediaIngest
+            wav_path = MediaIngest(job_dir=tmp_dir).extract_audio(
+                audio_path,
+                output_path=str(Path(tmp_dir) / "audio_16k.wav")
+            )
+
+        duration = wav_duration(wav_path)
+        if duration <= target_chunk_sec * 1.5:
+            return single()
+
+        if silences is None:
+            from .modality_analyzer import ModalityAnalyzer
+            silences = ModalityAnalyzer().detect_silences(wav_path)
+
+        chunks = plan_chunks(
+            duration,
+            silences,
+            target_sec=target_chunk_sec,
+            min_sec=target_chunk_sec * 0.4,
+            max_sec=target_chunk_sec * 1.6
+        )
+
+        auto_workers, cpu_threads = plan_workers(len(chunks), model_size)
+        if workers:
+            workers = max(1, min(workers, len(chunks)))
+            cpu_threads = max(1, (cpu_threads * auto_workers) // workers)
+        else:
+            workers = auto_workers
+
+        hard_cuts = sum(1 for c in chunks[1:] if c.read_start < c.start)
+        print(f"🎙️  并行转录: {duration / 60:.1f} 分钟 → {len(chunks)} 块 "
+              f"({hard_cuts} 个硬切点), {workers} 进程 × {cpu_threads} 线程")
+
+        if on_info:
+            on_info({"language": language, "duration": duration})
+
+        start = time.time()
+        results: Dict[int, Dict[str, Any]] = {}
+        stitcher = ChunkStitcher(chunks)
+        segments: List[Dict[str, Any]] = []
+        next_index = 0
+
+        # spawn：避免 fork 带走父进程的线程（监控线程、uvicorn 等）
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(cpu_threads, get_whisper_pool().max_memory_gb)
+        ) as executor:
+            futures = [
+                executor.submit(_transcribe_chunk, wav_path, chunk, model_size, device, compute_type, language)
+                for chunk in chunks
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result["index"]] = result
+                print(f"  ✓ 块 {result['index'] + 1}/{len(chunks)} 完成 ({result['seconds']:.1f}s)")
+
+                # 按块顺序拼接输出：前缀全部完成的部分立即可用
+                while next_index in results:
+                    for segment in stitcher.add(chunks[next_index], results[next_index]["segments"]):
+                        segments.append(segment)
+                        if on_segment:
+                            on_segment(segment)
+                    next_index += 1
+
+        languages = Counter(r["language"] for r in results.values() if r.get("language"))
+        detected = language or (languages.most_common(1)[0][0] if languages else None)
+
+        print(f"✅ 并行转录完成: {len(segments)} 段, 用时 {time.time() - start:.1f}s")
+
+    return {
+        "segments": segments,
+        "language": detected,
+        "source": audio_path
+    }
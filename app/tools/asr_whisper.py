@@ -1,41 +1,117 @@
 """Whisper ASR 工具 - 使用 faster-whisper"""
-from faster_whisper import WhisperModel
+import time
 from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+from .whisper_pool import get_whisper_pool
+
+
+def transcribe_audio_stream(
+    audio_path: str,
+    model_size: str = "base",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    language: Optional[str] = None,
+    on_info: Optional[Callable[[Dict], None]] = None
+) -> Iterator[Dict]:
+    """
+    流式转录：faster-whisper 每解码出一段就产出一段
+    
+    模型在整个迭代期间从模型池借用；提前结束迭代（break / close）会归还模型。
+    
+    Args:
+        audio_path: 音频文件路径
+        model_size: 模型大小 (tiny, base, small, medium, large-v2)
+        device: 设备 (cpu, cuda)
+        compute_type: 计算类型 (int8, float16, float32)
+        language: 语言代码（如 zh），None 为自动检测
+        on_info: 第一段之前回调一次 {"language", "duration"}
+    
+    Yields:
+        {"start", "end", "text"}
+    """
+    pool = get_whisper_pool()
+    
+    with pool.acquire(model_size, device, compute_type) as model:
+        start = time.time()
+        
+        segments, info = model.transcribe(
+            audio_path,
+            language=language,
+            word_timestamps=True,
+            vad_filter=True
+        )
+        
+        if on_info:
+            on_info({
+                "language": info.language,
+                "duration": getattr(info, "duration", 0.0) or 0.0
+            })
+        
+        try:
+            # segments 是惰性生成器，解码发生在遍历期间，必须在借用期内完成
+            for segment in segments:
+                yield {
+                    "start": segment.start,
+                    "end": segment.end,
+                    "text": segment.text.strip()
+                }
+        finally:
+            pool.record_transcription(
+                model_size,
+                device,
+                compute_type,
+                seconds=time.time() - start,
+                audio_seconds=getattr(info, "duration", 0.0) or 0.0
+            )
 
 
 def transcribe_audio(
     audio_path: str,
     model_size: str = "base",
     device: str = "cpu",
-    compute_type: str = "int8"
+    compute_type: str = "int8",
+    language: Optional[str] = None,
+    on_segment: Optional[Callable[[Dict], None]] = None,
+    on_info: Optional[Callable[[Dict], None]] = None
 ) -> dict:
     """
     使用 faster-whisper 转录音频
     
+    模型从进程内模型池借用，同一 (model_size, device, compute_type)
+    只在首次调用时加载。
+    
     Args:
         audio_path: 音频文件路径
         model_size: 模型大小 (tiny, base, small, medium, large-v2)
         device: 设备 (cpu, cuda)
         compute_type: 计算类型 (int8, float16, float32)
+        language: 语言代码（如 zh），None 为自动检测
+        on_segment: 每产出一段回调一次（增量写盘 / 进度上报）
+        on_info: 第一段之前回调一次 {"language", "duration"}
     """
-    model = WhisperModel(model_size, device=device, compute_type=compute_type)
-    
-    segments, info = model.transcribe(
-        audio_path,
-        word_timestamps=True,
-        vad_filter=True
-    )
+    info = {}
+
+    def capture_info(data: Dict):
+        info.update(data)
+        if on_info:
+            on_info(data)
     
     result_segments = []
-    for segment in segments:
-        result_segments.append({
-            "start": segment.start,
-            "end": segment.end,
-            "text": segment.text.strip()
-        })
+    for segment in transcribe_audio_stream(
+        audio_path,
+        model_size,
+        device,
+        compute_type,
+        language=language,
+        on_info=capture_info
+    ):
+        result_segments.append(segment)
+        if on_segment:
+            on_segment(segment)
     
     return {
         "segments": result_segments,
-        "language": info.language,
+        "language": info.get("language"),
         "source": audio_path
     }
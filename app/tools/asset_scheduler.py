@@ -0,0 +1,290 @@
+"""
+按素材调度的任务图（DAG）- SmartPipeline 的执行器
+
+原来的流水线按步骤整体推进：所有素材做完模态分析后才开始分段，6A ASR 全部完成后才开始 6B Vision。
+这里每个素材的每个步骤是一个节点，依赖只在同一素材内部：
+
+    triage → match → modality → segment → asr → vision → structure → fuse
+
+素材自己的上游完成后下一步立即就绪：素材 1 的 Vision 可以在素材 200 还在做模态分析时开始，
+一个素材的 ASR 与另一个素材的 Vision 使用不同资源同时运行。
+
+资源：
+- 每个节点声明一种资源（cpu / asr / vision / ai），同种资源同时运行的节点数不超过 limits
+- vision / ai 节点运行前再从 Orchestrator 的 ResourceLock 获取 VISION / AI 槽位（与其它 job 共享容量），
+  对应开关（VISION_ALLOWED / AI_ALLOWED）关闭时（Resolve 导出中）等待；
+  开关与槽位的等待合计超过 resource_timeout 时节点抛出 ResourceTimeout（按节点失败处理），
+  避免某个 job 异常退出没有重新打开开关时流水线永远挂起
+- 本 job 已持有该信号量（进入 ANALYZING 时占用的 Vision 槽）时，节点依次使用这个槽位，不再额外获取
+
+就绪节点优先调度下游步骤（先把已开始的素材做完），同一步骤按素材顺序。
+某个节点失败后不再启动新节点，等运行中的节点结束后抛出第一个异常。
+"""
+import heapq
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ..core.orchestrator import ResourceTimeout
+
+# 节点资源 → (Orchestrator 信号量, 开关)
+GLOBAL_RESOURCES = {
+    "vision": ("VISION", "VISION_ALLOWED"),
+    "ai": ("AI", "AI_ALLOWED")
+}
+
+# 开关关闭时的轮询间隔（秒）
+GATE_POLL_SEC = 0.5
+
+
+@dataclass
+class TaskTiming:
+    """单个节点的时间线（time.monotonic）"""
+    ready_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    skipped: bool = False
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        if self.skipped:
+            return {"skipped": True}
+        started = self.started_at or self.finished_at or self.ready_at or origin
+        finished = self.finished_at or started
+        return {
+            "wait_sec": round(started - (self.ready_at or started), 3),
+            "run_sec": round(finished - started, 3),
+            "start_sec": round(started - origin, 3),
+            "end_sec": round(finished - origin, 3)
+        }
+
+
+@dataclass
+class _Node:
+    asset_id: str
+    stage: str
+    func: Callable[[], Any]
+    resource: str
+    condition: Optional[Callable[[], bool]]
+    order: int
+    depth: int
+    pending_deps: int
+    dependents: List["_Node"] = field(default_factory=list)
+    timing: TaskTiming = field(default_factory=TaskTiming)
+
+
+class AssetScheduler:
+    """按素材的任务图调度器"""
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        resource_lock: Any = None,
+        owner: str = "pipeline",
+        resource_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            limits: 资源 → 同时运行的节点数
+            resource_lock: Orchestrator 的 ResourceLock（None 表示只按 limits 限流）
+            owner: 获取全局槽位时的持有者前缀（通常是 job_id）
+            resource_timeout: 等待开关 + 全局槽位的最长秒数（None 表示一直等）
+        """
+        self.limits = {name: max(1, int(limit)) for name, limit in limits.items()}
+        self.resource_lock = resource_lock
+        self.owner = owner
+        self.resource_timeout = resource_timeout
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.peak_running: Dict[str, int] = {name: 0 for name in self.limits}
+        self._nodes: Dict[tuple, _Node] = {}
+        self._asset_order: Dict[str, int] = {}
+        self._borrowed = set()
+        self._origin = time.monotonic()
+
+    def add(
+        self,
+        asset_id: str,
+        stage: str,
+        func: Callable[[], Any],
+        resource: str = "cpu",
+        deps: Iterable[str] = (),
+        condition: Optional[Callable[[], bool]] = None
+    ):
+        """
+        添加节点
+
+        Args:
+            asset_id: 素材 ID
+            stage: 步骤名（同一素材内唯一）
+            func: 节点工作（返回值记录在 results[asset_id][stage]）
+            resource: 占用的资源（limits 中的键）
+            deps: 同一素材内必须先完成的步骤（必须已添加）
+            condition: 就绪时调用，返回 False 则跳过该节点（不占用资源，视为完成）
+        """
+        if resource not in self.limits:
+            raise ValueError(f"未配置资源 {resource} 的并发数")
+        if (asset_id, stage) in self._nodes:
+            raise ValueError(f"重复的节点: {asset_id}/{stage}")
+
+        parents = []
+        for dep in deps:
+            parent = self._nodes.get((asset_id, dep))
+            if parent is None:
+                raise ValueError(f"{asset_id}/{stage} 依赖的步骤 {dep} 尚未添加")
+            parents.append(parent)
+
+        order = self._asset_order.setdefault(asset_id, len(self._asset_order))
+        node = _Node(
+            asset_id=asset_id,
+            stage=stage,
+            func=func,
+            resource=resource,
+            condition=condition,
+            order=order,
+            depth=1 + max((parent.depth for parent in parents), default=0),
+            pending_deps=len(parents)
+        )
+        for parent in parents:
+            parent.dependents.append(node)
+        self._nodes[(asset_id, stage)] = node
+
+    def run(self) -> Dict[str, Dict[str, Any]]:
+        """运行全部节点，返回 素材 ID → 步骤 → 结果"""
+        limits = dict(self.limits)
+        if self.resource_lock is not None:
+            for resource, (semaphore, _) in GLOBAL_RESOURCES.items():
+                if resource in limits and self.resource_lock.held_by(semaphore, self.owner):
+                    # 借用本 job 已持有的槽位：同一时间只有一个节点使用
+                    self._borrowed.add(resource)
+                    limits[resource] = 1
+
+        self._origin = time.monotonic()
+        seq = itertools.count()
+        ready: Dict[str, List[tuple]] = {name: [] for name in limits}
+        running: Dict[str, int] = {name: 0 for name in limits}
+        futures: Dict[Future, _Node] = {}
+        error: Optional[BaseException] = None
+
+        def make_ready(nodes: List[_Node]):
+            # 条件不满足的节点直接完成，它的下游可能随之就绪
+            stack = list(nodes)
+            while stack:
+                node = stack.pop()
+                node.timing.ready_at = time.monotonic()
+                if node.condition is not None and not node.condition():
+                    node.timing.skipped = True
+                    stack.extend(self._complete(node, None))
+                    continue
+                heapq.heappush(ready[node.resource], (-node.depth, node.order, next(seq), node))
+
+        with ThreadPoolExecutor(max_workers=sum(limits.values()), thread_name_prefix="asset-dag") as executor:
+            make_ready([node for node in self._nodes.values() if node.pending_deps == 0])
+
+            while True:
+                if error is None:
+                    for resource, queue in ready.items():
+                        while queue and running[resource] < limits[resource]:
+                            node = heapq.heappop(queue)[-1]
+                            running[resource] += 1
+                            self.peak_running[resource] = max(self.peak_running[resource], running[resource])
+                            futures[executor.submit(self._execute, node)] = node
+
+                if not futures:
+                    break
+
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = futures.pop(future)
+                    running[node.resource] -= 1
+                    try:
+                        result = future.result()
+                    except BaseException as e:
+                        print(f"  ❌ {node.asset_id}/{node.stage} 失败: {e}")
+                        if error is None:
+                            error = e
+                        continue
+                    if error is None:
+                        make_ready(self._complete(node, result))
+
+        if error is not None:
+            raise error
+        return self.results
+
+    def asset_timings(self) -> Dict[str, Dict[str, Any]]:
+        """素材 ID → 各步骤等待 / 运行时间与该素材从就绪到完成的总耗时"""
+        timings = {}
+        for asset_id in self._asset_order:
+            nodes = [node for (aid, _), node in self._nodes.items() if aid == asset_id]
+            stages = {node.stage: node.timing.to_dict(self._origin) for node in nodes}
+            ran = [node.timing for node in nodes if node.timing.finished_at and not node.timing.skipped]
+            elapsed = None
+            if ran and all(node.timing.finished_at for node in nodes):
+                elapsed = round(
+                    max(t.finished_at for t in ran) - min(t.ready_at for t in ran), 3
+                )
+            timings[asset_id] = {"stages": stages, "elapsed_sec": elapsed}
+        return timings
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各资源的并发上限、峰值与总运行 / 等待时间"""
+        stats = {}
+        for resource, limit in self.limits.items():
+            nodes = [
+                node for node in self._nodes.values()
+                if node.resource == resource and node.timing.started_at and node.timing.finished_at
+            ]
+            stats[resource] = {
+                "limit": 1 if resource in self._borrowed else limit,
+                "peak_running": self.peak_running[resource],
+                "tasks": len(nodes),
+                "run_sec": round(sum(n.timing.finished_at - n.timing.started_at for n in nodes), 3),
+                "wait_sec": round(sum(n.timing.started_at - n.timing.ready_at for n in nodes), 3)
+            }
+        return stats
+
+    def _complete(self, node: _Node, result: Any) -> List[_Node]:
+        """记录结果，返回因此就绪的下游节点"""
+        if node.timing.finished_at is None:
+            node.timing.finished_at = time.monotonic()
+        self.results.setdefault(node.asset_id, {})[node.stage] = result
+        unlocked = []
+        for child in node.dependents:
+            child.pending_deps -= 1
+            if child.pending_deps == 0:
+                unlocked.append(child)
+        return unlocked
+
+    def _execute(self, node: _Node) -> Any:
+        """在工作线程中运行节点"""
+        try:
+            return self._run_node(node)
+        finally:
+            node.timing.finished_at = time.monotonic()
+
+    def _run_node(self, node: _Node) -> Any:
+        """需要时先等开关、获取全局槽位，再运行节点"""
+        global_resource = GLOBAL_RESOURCES.get(node.resource)
+        if self.resource_lock is None or global_resource is None:
+            node.timing.started_at = time.monotonic()
+            return node.func()
+
+        semaphore, gate = global_resource
+        deadline = None if self.resource_timeout is None else time.monotonic() + self.resource_timeout
+        while not self.resource_lock.is_locked(gate):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise ResourceTimeout(f"等待开关 {gate} 超时 ({self.resource_timeout}s)")
+            time.sleep(GATE_POLL_SEC)
+
+        if node.resource in self._borrowed:
+            node.timing.started_at = time.monotonic()
+            return node.func()
+
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        with self.resource_lock.hold(
+            semaphore,
+            owner=f"{self.owner}:{node.asset_id}:{node.stage}",
+            timeout=remaining
+        ):
+            node.timing.started_at = time.monotonic()
+            return node.func()
@@ -0,0 +1,369 @@
+"""
+Audio Analysis - Ingest 阶段单次解码的音频分析
+
+旧路径：同一段音频被解码三次
+1. MediaIngest.extract_audio 提取 16kHz WAV
+2. ModalityAnalyzer 再跑一次 silencedetect + volumedetect
+3. AudioMatcher 波形匹配再解码一次
+
+单次解码：一个 ffmpeg 进程输出 PCM 到管道，滤镜链同时做 silencedetect / volumedetect，
+Python 边读边写 WAV、边算 10ms RMS 包络。结果写入 WAV 旁边的 sidecar：
+- <stem>.analysis.json  静音区间、响度统计、源文件标识
+- <stem>.rms.npy        RMS 包络（每帧 10ms）
+
+模态分析、分段、波形匹配通过 find_audio_analysis(源文件) 复用 sidecar。
+"""
+import json
+import os
+import subprocess
+import threading
+import wave
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+SIDECAR_SUFFIX = ".analysis.json"
+ENVELOPE_SUFFIX = ".rms.npy"
+ENVELOPE_HOP_SEC = 0.01
+
+# 与 ModalityAnalyzer 默认参数一致，参数不同时 sidecar 不会被复用
+SILENCE_THRESHOLD_DB = -40
+MIN_SILENCE_SEC = 0.5
+
+
+def parse_silence_intervals(ffmpeg_output: str) -> List[Tuple[float, float]]:
+    """
+    解析 silencedetect 输出的静音区间
+
+    Returns:
+        [(silence_start, silence_end), ...]，未闭合的最后一段静音被忽略
+    """
+    silence_starts = []
+    silence_ends = []
+
+    for line in ffmpeg_output.split("\n"):
+        if "silence_start:" in line:
+            try:
+                start = float(line.split("silence_start:")[1].strip().split()[0])
+                silence_starts.append(start)
+            except (IndexError, ValueError):
+                pass
+
+        if "silence_end:" in line:
+            try:
+                end = float(line.split("silence_end:")[1].split("|")[0].strip())
+                silence_ends.append(end)
+            except (IndexError, ValueError):
+                pass
+
+    return list(zip(silence_starts, silence_ends))
+
+
+def parse_volume_stats(ffmpeg_output: str) -> Tuple[Optional[float], Optional[float]]:
+    """解析 volumedetect 输出的 (mean_volume, max_volume)，没有音频时为 (None, None)"""
+    mean_volume = max_volume = None
+    for line in ffmpeg_output.split("\n"):
+        try:
+            if "mean_volume:" in line:
+                mean_volume = float(line.split("mean_volume:")[1].split("dB")[0].strip())
+            elif "max_volume:" in line:
+                max_volume = float(line.split("max_volume:")[1].split("dB")[0].strip())
+        except (IndexError, ValueError):
+            pass
+    return mean_volume, max_volume
+
+
+def speech_spans(
+    duration: float,
+    silence_intervals: List[Tuple[float, float]],
+    min_silence_sec: float = 1.0,
+    min_speech_sec: float = 0.5
+) -> List[Tuple[float, float]]:
+    """
+    静音区间取反得到有声区间（用于按停顿分段）
+
+    Args:
+        duration: 总时长
+        silence_intervals: 静音区间
+        min_silence_sec: 短于该值的停顿不切分
+        min_speech_sec: 短于该值的有声片段丢弃
+
+    Returns:
+        [(start, end), ...]
+    """
+    spans = []
+    cursor = 0.0
+    for start, end in sorted(silence_intervals):
+        if end - start < min_silence_sec:
+            continue
+        if start - cursor >= min_speech_sec:
+            spans.append((cursor, start))
+        cursor = max(cursor, end)
+    if duration - cursor >= min_speech_sec:
+        spans.append((cursor, duration))
+    return spans
+
+
+def _source_signature(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+@dataclass
+class AudioAnalysis:
+    """单次解码的音频分析结果"""
+    source: str
+    source_size: int
+    source_mtime_ns: int
+    wav_path: str
+    sample_rate: int
+    duration: float
+    has_audio: bool
+    mean_volume_db: Optional[float] = None
+    max_volume_db: Optional[float] = None
+    silence_threshold_db: float = SILENCE_THRESHOLD_DB
+    min_silence_sec: float = MIN_SILENCE_SEC
+    silence_intervals: List[Tuple[float, float]] = field(default_factory=list)
+    envelope_hop_sec: float = ENVELOPE_HOP_SEC
+    envelope: Optional[np.ndarray] = None  # RMS 包络（单独存 .npy）
+
+    @property
+    def silence_duration(self) -> float:
+        return sum(end - start for start, end in self.silence_intervals)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("envelope")
+        data["silence_intervals"] = [list(interval) for interval in self.silence_intervals]
+        return data
+
+    def is_current(self) -> bool:
+        """源文件未变化且 WAV 仍存在"""
+        try:
+            return (
+                _source_signature(self.source) == (self.source_size, self.source_mtime_ns)
+                and Path(self.wav_path).exists()
+            )
+        except OSError:
+            return False
+
+    def save(self):
+        """写 sidecar（先写临时文件再替换）"""
+        wav_path = Path(self.wav_path)
+        if self.envelope is not None:
+            envelope_path = envelope_path_for(wav_path)
+            tmp_envelope = envelope_path.with_name(envelope_path.name + ".tmp.npy")
+            np.save(tmp_envelope, self.envelope.astype(np.float32))
+            os.replace(tmp_envelope, envelope_path)
+
+        path = sidecar_path_for(wav_path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, wav_path: str) -> Optional["AudioAnalysis"]:
+        """读取 WAV 对应的 sidecar（不存在或损坏时返回 None）"""
+        path = sidecar_path_for(Path(wav_path))
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["silence_intervals"] = [tuple(interval) for interval in data.get("silence_intervals", [])]
+            analysis = cls(**data)
+        except (OSError, json.JSONDecodeError, TypeError):
+            return None
+
+        envelope_path = envelope_path_for(Path(wav_path))
+        if envelope_path.exists():
+            try:
+                analysis.envelope = np.load(envelope_path)
+            except (OSError, ValueError):
+                analysis.envelope = None
+        return analysis
+
+
+def sidecar_path_for(wav_path: Path) -> Path:
+    """clip.wav -> clip.analysis.json"""
+    return wav_path.with_name(wav_path.stem + SIDECAR_SUFFIX)
+
+
+def envelope_path_for(wav_path: Path) -> Path:
+    """clip.wav -> clip.rms.npy"""
+    return wav_path.with_name(wav_path.stem + ENVELOPE_SUFFIX)
+
+
+def extract_and_analyze(
+    source_path: str,
+    wav_path: str,
+    sample_rate: int = 16000,
+    silence_threshold_db: float = SILENCE_THRESHOLD_DB,
+    min_silence_sec: float = MIN_SILENCE_SEC,
+    timeout: Optional[float] = None
+) -> AudioAnalysis:
+    """
+    单次解码：提取单声道 WAV + 静音 / 响度统计 + RMS 包络，并写 sidecar
+
+    Args:
+        source_path: 视频 / 音频文件
+        wav_path: 输出 WAV 路径
+        sample_rate: 输出采样率
+        silence_threshold_db: silencedetect 阈值
+        min_silence_sec: 最短静音时长
+        timeout: 超时（秒），None 不限制
+
+    Raises:
+        RuntimeError: ffmpeg 执行失败 / 未安装
+    """
+    source_path = str(source_path)
+    wav_path = Path(wav_path)
+    wav_path.parent.mkdir(parents=True, exist_ok=True)
+    size, mtime_ns = _source_signature(source_path)
+
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        "-i", source_path,
+        "-vn",
+        "-af", f"silencedetect=noise={silence_threshold_db}dB:d={min_silence_sec},volumedetect",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "-f", "s16le",
+        "pipe:1"
+    ]
+
+    hop = int(round(sample_rate * ENVELOPE_HOP_SEC))
+    read_bytes = hop * 2 * 100  # 每次读 1 秒
+    rms_blocks = []
+    pending = b""
+    frames_written = 0
+    stderr_chunks: List[bytes] = []
+
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError(
+            "ffmpeg 未安装。请安装 ffmpeg:\n"
+            "  Windows: choco install ffmpeg\n"
+            "  或下载: https://ffmpeg.org/download.html"
+        )
+
+    # stderr 单独线程读取，避免管道写满阻塞
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    stderr_thread.start()
+
+    tmp_wav = wav_path.with_name(wav_path.name + ".tmp")
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+
+    try:
+        with wave.open(str(tmp_wav), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+
+            while True:
+                data = process.stdout.read(read_bytes)
+                if not data:
+                    break
+                wav.writeframes(data)
+                frames_written += len(data) // 2
+
+                data = pending + data
+                usable = len(data) - len(data) % (hop * 2)
+                pending = data[usable:]
+                if usable:
+                    samples = np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32)
+                    blocks = samples.reshape(-1, hop)
+                    rms_blocks.append(np.sqrt(np.mean(blocks * blocks, axis=1)))
+
+        returncode = process.wait()
+        stderr_thread.join()
+    finally:
+        if timer:
+            timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+    if returncode != 0:
+        tmp_wav.unlink(missing_ok=True)
+        if timeout and returncode < 0:
+            raise RuntimeError(f"ffmpeg 超时（{timeout:.0f}s）: {Path(source_path).name}")
+        raise RuntimeError(f"ffmpeg 执行失败: {stderr.strip()[-500:]}")
+
+    os.replace(tmp_wav, wav_path)
+
+    mean_volume, max_volume = parse_volume_stats(stderr)
+    analysis = AudioAnalysis(
+        source=str(Path(source_path).absolute()),
+        source_size=size,
+        source_mtime_ns=mtime_ns,
+        wav_path=str(wav_path.absolute()),
+        sample_rate=sample_rate,
+        duration=frames_written / sample_rate,
+        has_audio=mean_volume is not None,
+        mean_volume_db=mean_volume,
+        max_volume_db=max_volume,
+        silence_threshold_db=silence_threshold_db,
+        min_silence_sec=min_silence_sec,
+        silence_intervals=parse_silence_intervals(stderr),
+        envelope=np.concatenate(rms_blocks) if rms_blocks else np.zeros(0, dtype=np.float32)
+    )
+    analysis.save()
+    _register(analysis)
+    return analysis
+
+
+# 进程内索引：源文件 → WAV 路径（sidecar 在 WAV 旁边）
+_index: Dict[str, str] = {}
+_index_lock = threading.Lock()
+
+
+def _register(analysis: AudioAnalysis):
+    with _index_lock:
+        _index[analysis.source] = analysis.wav_path
+        _index[analysis.wav_path] = analysis.wav_path
+
+
+def find_audio_analysis(source_path: str) -> Optional[AudioAnalysis]:
+    """
+    查找源文件（或提取出的 WAV 本身）对应的、仍然有效的 sidecar
+
+    查找顺序：
+    1. 本进程 ingest 时登记的路径
+    2. 同名 .wav（extract_audio 默认输出位置）
+    3. job 目录布局：input/<name> → temp/<stem>.wav
+    """
+    source = Path(source_path).absolute()
+    with _index_lock:
+        indexed = _index.get(str(source))
+
+    candidates = [indexed] if indexed else []
+    candidates += [
+        str(source) if source.suffix.lower() == ".wav" else None,
+        str(source.with_suffix(".wav")),
+        str(source.parent.parent / "temp" / f"{source.stem}.wav")
+    ]
+
+    for wav_path in candidates:
+        if not wav_path or not sidecar_path_for(Path(wav_path)).exists():
+            continue
+        analysis = AudioAnalysis.load(wav_path)
+        if analysis is None:
+            continue
+        if analysis.source != str(source) and analysis.wav_path != str(source):
+            continue
+        if analysis.is_current():
+            _register(analysis)
+            return analysis
+    return None
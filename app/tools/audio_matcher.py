@@ -8,13 +8,15 @@ Audio Matcher - 音频匹配器
 
 用于处理"外录音频 + 画面"的场景
 """
-import os
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass
-import subprocess
-import json
-from datetime import datetime
+
+import numpy as np
+
+from .media_probe import MediaProbe, get_media_probe
+from .audio_analysis import find_audio_analysis
+from .waveform_sync import HOP_SEC, cross_correlate, decode_envelope, onset_envelope
 
 
 @dataclass
@@ -39,8 +41,16 @@ class AudioMatch:
 class AudioMatcher:
     """音频匹配器"""
     
-    def __init__(self):
+    def __init__(self, probe: Optional[MediaProbe] = None, enable_waveform: bool = True):
         self.timestamp_tolerance_minutes = 5  # 时间戳容差（分钟）
+        self.probe = probe or get_media_probe()
+        
+        # 波形匹配
+        self.enable_waveform = enable_waveform
+        self.waveform_min_confidence = 0.3  # 主峰 / 次峰区分度下限
+        self.waveform_max_offset_sec = None  # 搜索范围（None 为不限）
+        self.waveform_max_seconds = None  # 只分析前 N 秒（None 为全长）
+        self._envelopes: Dict[str, np.ndarray] = {}
     
     def match_audio_to_videos(
         self,
@@ -103,10 +113,17 @@ class AudioMatcher:
                 audio_offset_sec=match["offset"]
             )
         
-        # 策略 3: 波形匹配（可选，较慢）
-        # match = self._waveform_match(video, audio_assets)
-        # if match:
-        #     return AudioMatch(...)
+        # 策略 3: 波形匹配（较慢）
+        if self.enable_waveform:
+            match = self._waveform_match(video, audio_assets)
+            if match:
+                return AudioMatch(
+                    video_asset_id=video_id,
+                    audio_asset_id=match["asset_id"],
+                    match_method="waveform",
+                    confidence=round(match["confidence"], 3),
+                    audio_offset_sec=round(match["offset"], 3)
+                )
         
         # 无匹配
         return AudioMatch(
@@ -154,11 +171,9 @@ class AudioMatcher:
         
         if same_dir_audios:
             # 按创建时间排序，选择最近的
+            video_time = self._get_creation_time(video["path"])
             same_dir_audios.sort(
-                key=lambda a: abs(
-                    self._get_creation_time(a["path"]) - 
-                    self._get_creation_time(video["path"])
-                )
+                key=lambda a: abs(self._get_creation_time(a["path"]) - video_time)
             )
             return same_dir_audios[0]
         
@@ -212,41 +227,10 @@ class AudioMatcher:
         优先级：
         1. 媒体文件的拍摄时间（metadata）
         2. 文件系统创建时间
-        """
-        # 尝试从媒体元数据获取
-        try:
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format_tags=creation_time",
-                "-of", "json",
-                file_path
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            data = json.loads(result.stdout)
-            creation_time_str = data.get("format", {}).get("tags", {}).get("creation_time")
-            
-            if creation_time_str:
-                # 解析 ISO 8601 时间
-                dt = datetime.fromisoformat(creation_time_str.replace("Z", "+00:00"))
-                return dt.timestamp()
         
-        except:
-            pass
-        
-        # 回退到文件系统时间
-        try:
-            stat = os.stat(file_path)
-            return stat.st_ctime  # Windows: 创建时间, Unix: 状态改变时间
-        except:
-            return 0.0
+        每个文件只探测一次（MediaProbe 缓存）
+        """
+        return self.probe.get_creation_time(file_path)
     
     def _waveform_match(
         self,
@@ -257,16 +241,61 @@ class AudioMatcher:
         波形匹配：互相关（cross-correlation）
         
         步骤：
-        1. 从视频提取低码率音轨
-        2. 与外置音频做互相关
-        3. 找最佳对齐，得到 offset
+        1. 从视频提取 8kHz 单声道音轨，计算起音包络
+        2. 与每个外置音频的包络做 FFT 互相关
+        3. 选置信度最高的候选，得到 offset
         
-        注意：这个方法较慢，作为最后手段
+        注意：这个方法较慢（每个文件解码一次），作为最后手段
         """
-        # TODO: 实现波形匹配
-        # 需要 librosa 或 scipy
-        return None
-
+        if not self.probe.probe(video["path"]).has_audio:
+            return None
+        
+        video_env = self._get_envelope(video["path"])
+        if len(video_env) == 0:
+            return None
+        
+        best = None
+        for audio in audio_assets:
+            audio_env = self._get_envelope(audio["path"])
+            if len(audio_env) == 0:
+                continue
+            
+            offset, confidence = cross_correlate(
+                video_env,
+                audio_env,
+                max_offset_sec=self.waveform_max_offset_sec
+            )
+            if best is None or confidence > best["confidence"]:
+                best = {
+                    "asset_id": audio["asset_id"],
+                    "offset": offset,
+                    "confidence": confidence
+                }
+        
+        if best is None or best["confidence"] < self.waveform_min_confidence:
+            return None
+        return best
+    
+    def _get_envelope(self, file_path: str):
+        """起音包络（优先复用 Ingest sidecar，否则每个文件只解码一次）"""
+        envelope = self._envelopes.get(file_path)
+        if envelope is None:
+            # Ingest 阶段已生成 RMS 包络 → 不再解码
+            analysis = find_audio_analysis(file_path)
+            if analysis is not None and analysis.envelope is not None and analysis.envelope_hop_sec == HOP_SEC:
+                envelope = onset_envelope(analysis.envelope)
+                if self.waveform_max_seconds:
+                    envelope = envelope[:int(self.waveform_max_seconds / HOP_SEC)]
+                self._envelopes[file_path] = envelope
+                return envelope
+            
+            try:
+                envelope = decode_envelope(file_path, max_seconds=self.waveform_max_seconds)
+            except Exception as e:
+                print(f"⚠️  波形解码失败: {Path(file_path).name} ({e})")
+                envelope = np.zeros(0, dtype=np.float32)
+            self._envelopes[file_path] = envelope
+        return envelope
 
 def match_audio_to_videos(
     video_assets: List[Dict[str, Any]],
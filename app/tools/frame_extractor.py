@@ -0,0 +1,365 @@
+"""
+关键帧提取服务 - 视觉分析器共享的截帧层
+
+功能：
+1. 一个 ffmpeg 进程解码整段视频，用 select 滤镜一次性取出所有场景中点帧
+2. JPEG 通过管道流式返回（内存中，不落临时文件）
+3. 三个视觉分析器（Ollama / LM Studio / GPT-4o）共用同一实现
+
+旧路径：每个场景启动一次 ffmpeg（-ss ... -frames:v 1），写临时 JPG 再读回。
+400 个场景 = 400 次进程启动 + 400 次 seek，启动开销主导整个视觉阶段。
+"""
+import base64
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+
+
+def extract_single_frame(video_path: str, time_sec: float, timeout: int = 10) -> Optional[bytes]:
+    """
+    单帧截取（旧的逐场景路径，作为回退和基准对照）
+
+    Args:
+        video_path: 视频文件路径
+        time_sec: 时间点（秒）
+        timeout: 超时时间（秒）
+
+    Returns:
+        JPEG 字节，失败返回 None
+    """
+    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+        temp_img = tmp.name
+
+    try:
+        cmd = [
+            "ffmpeg",
+            "-ss", str(time_sec),
+            "-i", video_path,
+            "-frames:v", "1",
+            "-q:v", "2",  # 高质量 JPG
+            "-y",
+            temp_img
+        ]
+
+        subprocess.run(
+            cmd,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout
+        )
+
+        if not os.path.exists(temp_img) or os.path.getsize(temp_img) == 0:
+            return None
+
+        with open(temp_img, "rb") as image_file:
+            return image_file.read()
+
+    except subprocess.TimeoutExpired:
+        print(f"  ⚠️ 截帧超时 ({time_sec}s)")
+        return None
+    except subprocess.CalledProcessError:
+        print(f"  ⚠️ 截帧失败 ({time_sec}s): FFmpeg error")
+        return None
+    except Exception as e:
+        print(f"  ⚠️ 截帧失败 ({time_sec}s): {e}")
+        return None
+    finally:
+        if os.path.exists(temp_img):
+            try:
+                os.remove(temp_img)
+            except:
+                pass
+
+
+def split_jpeg_stream(buffer: bytearray) -> Tuple[List[bytes], bytearray]:
+    """
+    从 mjpeg 管道缓冲区中切出完整的 JPEG 图片
+
+    ffmpeg 的 mjpeg 编码器不写 EXIF 缩略图，熵编码段中的 0xFF 会被填充 0x00，
+    因此 EOI (FFD9) 只会出现在每张图片末尾。
+
+    Args:
+        buffer: 累积的管道字节
+
+    Returns:
+        (完整图片列表, 剩余未完成的字节)
+    """
+    images = []
+
+    while True:
+        start = buffer.find(JPEG_SOI)
+        if start < 0:
+            # 没有图片起始标记，丢弃噪声
+            return images, bytearray()
+
+        end = buffer.find(JPEG_EOI, start + 2)
+        if end < 0:
+            return images, buffer[start:]
+
+        images.append(bytes(buffer[start:end + 2]))
+        buffer = buffer[end + 2:]
+
+
+def build_select_filter(frame_numbers: List[int]) -> str:
+    """
+    构建 select 滤镜表达式（按帧号精确选帧）
+
+    每个帧号只会被选中一次，因此输出的第 k 张图片对应第 k 个（升序去重后的）帧号。
+    """
+    terms = "+".join(f"eq(n\\,{n})" for n in frame_numbers)
+    return f"select={terms}"
+
+
+class KeyframeExtractor:
+    """关键帧提取器 - 单进程批量截帧 + 内存缓存"""
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        jpeg_quality: int = 2,
+        cache_max_mb: int = 256,
+        timeout_per_batch: int = 600
+    ):
+        """
+        Args:
+            batch_size: 单个 ffmpeg 进程的最大选帧数（限制命令行长度）
+            jpeg_quality: JPEG 质量（-q:v，2 为高质量，与旧路径一致）
+            cache_max_mb: 内存缓存上限（MB），0 表示不缓存
+            timeout_per_batch: 单个批次超时时间（秒）
+        """
+        self.batch_size = batch_size
+        self.jpeg_quality = jpeg_quality
+        self.cache_max_bytes = cache_max_mb * 1024 * 1024
+        self.timeout_per_batch = timeout_per_batch
+
+        self._cache: "OrderedDict[Tuple[str, int, float, int], bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+        # 统计
+        self._stats = {
+            "ffmpeg_processes": 0,
+            "frames_extracted": 0,
+            "cache_hits": 0,
+            "fallback_frames": 0
+        }
+
+    def iter_frames(
+        self,
+        video_path: str,
+        frame_numbers: Iterable[int]
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        流式截帧：按帧号升序逐张产出 (帧号, JPEG 字节)
+
+        缓存命中的帧立即产出，其余帧由单个 ffmpeg 管道解码一次得到。
+
+        Args:
+            video_path: 视频文件路径
+            frame_numbers: 需要的帧号（可乱序、可重复）
+
+        Yields:
+            (frame_number, jpeg_bytes)
+        """
+        wanted = sorted(set(int(n) for n in frame_numbers if n is not None and n >= 0))
+        if not wanted:
+            return
+
+        file_key = self._file_key(video_path)
+
+        missing = []
+        for n in wanted:
+            cached = self._cache_get(file_key, n)
+            if cached is not None:
+                yield n, cached
+            else:
+                missing.append(n)
+
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            for n, data in self._run_batch(video_path, batch):
+                self._cache_put(file_key, n, data)
+                yield n, data
+
+    def extract_frames(
+        self,
+        video_path: str,
+        frame_numbers: Iterable[int]
+    ) -> Dict[int, bytes]:
+        """
+        批量截帧
+
+        Returns:
+            {帧号: JPEG 字节}，解码失败的帧不在结果中
+        """
+        return dict(self.iter_frames(video_path, frame_numbers))
+
+    def extract_frames_base64(
+        self,
+        video_path: str,
+        frame_numbers: Iterable[int]
+    ) -> Dict[int, str]:
+        """批量截帧，返回 base64 字符串（视觉 API 的输入格式）"""
+        return {
+            n: base64.b64encode(data).decode('utf-8')
+            for n, data in self.iter_frames(video_path, frame_numbers)
+        }
+
+    def extract_frame_base64(
+        self,
+        video_path: str,
+        frame_number: int,
+        fps: float
+    ) -> Optional[str]:
+        """
+        单帧截取（回退路径）
+
+        用于批量管道没能产出的帧（例如帧号超出实际帧数、VFR 素材）。
+        """
+        file_key = self._file_key(video_path)
+        data = self._cache_get(file_key, frame_number)
+
+        if data is None:
+            data = extract_single_frame(video_path, frame_number / fps if fps else 0.0)
+            with self._lock:
+                self._stats["ffmpeg_processes"] += 1
+                self._stats["fallback_frames"] += 1
+            if data is None:
+                return None
+            self._cache_put(file_key, frame_number, data)
+
+        return base64.b64encode(data).decode('utf-8')
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                **self._stats,
+                "cache_entries": len(self._cache),
+                "cache_mb": round(self._cache_bytes / (1024 * 1024), 2)
+            }
+
+    def clear_cache(self):
+        """清空内存缓存"""
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def _run_batch(self, video_path: str, frame_numbers: List[int]) -> Iterator[Tuple[int, bytes]]:
+        """运行一个 ffmpeg 进程，产出该批次的所有帧"""
+        cmd = [
+            "ffmpeg",
+            "-v", "error",
+            "-i", video_path,
+            "-an",
+            "-vf", build_select_filter(frame_numbers),
+            "-vsync", "0",
+            "-frames:v", str(len(frame_numbers)),
+            "-q:v", str(self.jpeg_quality),
+            "-f", "image2pipe",
+            "-vcodec", "mjpeg",
+            "-"
+        ]
+
+        with self._lock:
+            self._stats["ffmpeg_processes"] += 1
+
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        except FileNotFoundError:
+            print("  ⚠️ ffmpeg 未安装，无法批量截帧")
+            return
+
+        # 超时保护：解码卡死时杀掉进程，读循环随之结束
+        timer = threading.Timer(self.timeout_per_batch, process.kill)
+        timer.start()
+
+        buffer = bytearray()
+        index = 0
+
+        try:
+            while index < len(frame_numbers):
+                chunk = process.stdout.read(65536)
+                if not chunk:
+                    break
+
+                buffer.extend(chunk)
+                images, buffer = split_jpeg_stream(buffer)
+
+                for image in images:
+                    if index >= len(frame_numbers):
+                        break
+                    with self._lock:
+                        self._stats["frames_extracted"] += 1
+                    yield frame_numbers[index], image
+                    index += 1
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+        if index < len(frame_numbers):
+            print(f"  ⚠️ 批量截帧只得到 {index}/{len(frame_numbers)} 帧: {Path(video_path).name}")
+
+    def _file_key(self, video_path: str) -> Tuple[str, int, float]:
+        """缓存键：路径 + 大小 + 修改时间（文件变化后自动失效）"""
+        try:
+            stat = os.stat(video_path)
+            return (str(Path(video_path).resolve()), stat.st_size, stat.st_mtime)
+        except OSError:
+            return (str(video_path), 0, 0.0)
+
+    def _cache_get(self, file_key: Tuple[str, int, float], frame_number: int) -> Optional[bytes]:
+        if self.cache_max_bytes <= 0:
+            return None
+
+        key = (*file_key, frame_number)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+            return data
+
+    def _cache_put(self, file_key: Tuple[str, int, float], frame_number: int, data: bytes):
+        if self.cache_max_bytes <= 0 or len(data) > self.cache_max_bytes:
+            return
+
+        key = (*file_key, frame_number)
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = data
+            self._cache_bytes += len(data)
+
+            # LRU 淘汰
+            while self._cache_bytes > self.cache_max_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+
+# 全局单例
+_keyframe_extractor: Optional[KeyframeExtractor] = None
+
+
+def get_keyframe_extractor() -> KeyframeExtractor:
+    """获取全局关键帧提取器（单例）"""
+    global _keyframe_extractor
+    if _keyframe_extractor is None:
+        _keyframe_extractor = KeyframeExtractor()
+    return _keyframe_extractor
@@ -11,6 +11,9 @@ from pathlib import Path
 from typing import Optional, Dict
 import shutil
 
+from ..core.job_paths import resolve_job_dir
+from .audio_analysis import extract_and_analyze
+
 
 class MediaIngest:
     """媒体素材 Ingest 管理器"""
@@ -35,8 +38,8 @@ class MediaIngest:
         Returns:
             job 目录路径
         """
-        job_path = self.job_dir / job_id
-        job_path.mkdir(exist_ok=True)
+        job_path = resolve_job_dir(job_id, self.job_dir)
+        job_path.mkdir(parents=True, exist_ok=True)
         
         # 创建子目录
         (job_path / "input").mkdir(exist_ok=True)
@@ -50,16 +53,22 @@ class MediaIngest:
         video_path: str, 
         output_path: Optional[str] = None,
         format: str = "wav",
-        sample_rate: int = 16000
+        sample_rate: int = 16000,
+        analyze: bool = True
     ) -> str:
         """
         从视频提取音频（使用 ffmpeg）
         
+        WAV 输出时默认同一次解码完成静音检测、响度统计和 RMS 包络，
+        写入 sidecar（<stem>.analysis.json / <stem>.rms.npy），
+        模态分析、分段、波形匹配直接复用，不再重复解码。
+        
         Args:
             video_path: 输入视频路径
             output_path: 输出音频路径（可选）
             format: 音频格式（wav/mp3/aac）
             sample_rate: 采样率（Hz）
+            analyze: WAV 输出时是否同时生成分析 sidecar
         
         Returns:
             输出音频文件路径
@@ -78,6 +87,16 @@ class MediaIngest:
         
         output_path = Path(output_path)
         
+        if format == "wav" and analyze:
+            print(f"🎵 提取音频 + 分析: {video_path.name} → {output_path.name}")
+            analysis = extract_and_analyze(str(video_path), str(output_path), sample_rate=sample_rate)
+            file_size = output_path.stat().st_size / (1024 * 1024)
+            print(
+                f"✅ 音频提取成功: {output_path} ({file_size:.2f} MB, "
+                f"静音 {len(analysis.silence_intervals)} 段)"
+            )
+            return str(output_path)
+        
         # 构建 ffmpeg 命令
         cmd = [
             "ffmpeg",
@@ -0,0 +1,281 @@
+"""
+Media Probe - 媒体信息探测（单次 ffprobe + 缓存）
+
+旧路径：时长、创建时间、帧率各自 shell out 一次 ffprobe，
+AudioMatcher._explicit_match 甚至在排序 key 里对每个候选重复探测两个文件，
+50 个视频 × 50 个音频的匹配会启动上千个 ffprobe 进程。
+
+MediaProbe：
+1. 每个文件只运行一次 `ffprobe -show_format -show_streams`
+2. 结果按 (path, size, mtime) 缓存，文件被替换后自动重新探测
+3. 时长 / 创建时间 / 分辨率 / 帧率 / 音视频流都从同一份结果读取
+"""
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def parse_frame_rate(value: Optional[str]) -> float:
+    """解析 ffprobe 帧率（"30000/1001" -> 29.97）"""
+    if not value:
+        return 0.0
+    try:
+        if "/" in value:
+            num, den = value.split("/", 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def parse_creation_time(value: Optional[str]) -> Optional[float]:
+    """解析 ISO 8601 创建时间为 Unix 时间戳"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+@dataclass
+class MediaInfo:
+    """单个媒体文件的探测结果"""
+    path: str
+    size: int
+    mtime: float
+    duration: float = 0.0
+    format_name: Optional[str] = None
+    bit_rate: int = 0
+    creation_time: Optional[float] = None  # 媒体元数据中的拍摄时间
+    has_video: bool = False
+    has_audio: bool = False
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    sample_rate: int = 0
+    channels: int = 0
+    error: Optional[str] = None
+    streams: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("streams")
+        return data
+
+    @classmethod
+    def from_ffprobe(cls, path: str, size: int, mtime: float, data: Dict[str, Any]) -> "MediaInfo":
+        """从 ffprobe JSON 构建"""
+        fmt = data.get("format", {})
+        streams = data.get("streams", [])
+        tags = fmt.get("tags", {}) or {}
+
+        info = cls(
+            path=path,
+            size=size,
+            mtime=mtime,
+            format_name=fmt.get("format_name"),
+            bit_rate=int(fmt.get("bit_rate") or 0),
+            creation_time=parse_creation_time(tags.get("creation_time")),
+            streams=streams
+        )
+
+        durations = []
+        if fmt.get("duration"):
+            durations.append(float(fmt["duration"]))
+
+        for stream in streams:
+            codec_type = stream.get("codec_type")
+            if codec_type == "video" and not info.has_video:
+                # 封面图（attached_pic）不算视频流
+                if (stream.get("disposition") or {}).get("attached_pic"):
+                    continue
+                info.has_video = True
+                info.width = int(stream.get("width") or 0)
+                info.height = int(stream.get("height") or 0)
+                info.fps = parse_frame_rate(stream.get("avg_frame_rate")) or parse_frame_rate(stream.get("r_frame_rate"))
+                info.video_codec = stream.get("codec_name")
+            elif codec_type == "audio" and not info.has_audio:
+                info.has_audio = True
+                info.sample_rate = int(stream.get("sample_rate") or 0)
+                info.channels = int(stream.get("channels") or 0)
+                info.audio_codec = stream.get("codec_name")
+
+            if stream.get("duration") and not durations:
+                durations.append(float(stream["duration"]))
+            if info.creation_time is None:
+                info.creation_time = parse_creation_time((stream.get("tags") or {}).get("creation_time"))
+
+        info.duration = durations[0] if durations else 0.0
+        return info
+
+
+def run_ffprobe(path: str, timeout: float = 10) -> Dict[str, Any]:
+    """运行一次 ffprobe，返回 JSON"""
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v", "error",
+            "-show_format",
+            "-show_streams",
+            "-of", "json",
+            path
+        ],
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ffprobe 退出码 {result.returncode}")
+    return json.loads(result.stdout)
+
+
+class MediaProbe:
+    """媒体探测缓存（进程内单例）"""
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        timeout: float = 10,
+        runner: Callable[[str, float], Dict[str, Any]] = run_ffprobe
+    ):
+        """
+        Args:
+            max_entries: 最多缓存的文件数（LRU）
+            timeout: 单次 ffprobe 超时（秒）
+            runner: 探测函数 (path, timeout) -> ffprobe JSON
+        """
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.runner = runner
+
+        self._cache: "OrderedDict[str, Tuple[Tuple[int, int], MediaInfo]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def probe(self, file_path: str) -> MediaInfo:
+        """
+        探测媒体文件（同一文件未变化时直接返回缓存）
+
+        探测失败不抛异常，返回 error 非空的 MediaInfo（时长为 0）。
+        """
+        path = str(Path(file_path).absolute())
+
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            return MediaInfo(path=path, size=0, mtime=0.0, error=str(e))
+
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._lookup(path, signature)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+
+        # 同一文件并发探测只跑一次 ffprobe
+        with path_lock:
+            cached = self._lookup(path, signature)
+            if cached is not None:
+                return cached
+
+            try:
+                data = self.runner(path, self.timeout)
+                info = MediaInfo.from_ffprobe(path, stat.st_size, stat.st_mtime, data)
+            except Exception as e:
+                info = MediaInfo(path=path, size=stat.st_size, mtime=stat.st_mtime, error=str(e))
+                print(f"⚠️  媒体探测失败: {Path(path).name} ({e})")
+
+            with self._lock:
+                self.misses += 1
+                if not info.ok:
+                    self.failures += 1
+                self._cache[path] = (signature, info)
+                self._cache.move_to_end(path)
+                while len(self._cache) > self.max_entries:
+                    evicted, _ = self._cache.popitem(last=False)
+                    self._path_locks.pop(evicted, None)
+
+        return info
+
+    def get_duration(self, file_path: str) -> float:
+        """媒体时长（秒），探测失败时为 0"""
+        return self.probe(file_path).duration
+
+    def get_creation_time(self, file_path: str) -> float:
+        """
+        创建时间（Unix 时间戳）
+
+        优先级：
+        1. 媒体元数据中的拍摄时间
+        2. 文件系统时间（Windows: 创建时间, Unix: 状态改变时间）
+        """
+        info = self.probe(file_path)
+        if info.creation_time is not None:
+            return info.creation_time
+        try:
+            return os.stat(file_path).st_ctime
+        except OSError:
+            return 0.0
+
+    def invalidate(self, file_path: str):
+        """移除单个文件的缓存"""
+        with self._lock:
+            self._cache.pop(str(Path(file_path).absolute()), None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+            self._path_locks.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "probes": self.misses,
+                "failures": self.failures,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+    def _lookup(self, path: str, signature: Tuple[int, int]) -> Optional[MediaInfo]:
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is None or entry[0] != signature:
+                return None
+            self._cache.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+
+# 全局单例
+_media_probe: Optional[MediaProbe] = None
+
+
+def get_media_probe() -> MediaProbe:
+    """获取全局媒体探测缓存（单例）"""
+    global _media_probe
+    if _media_probe is None:
+        _media_probe = MediaProbe()
+    return _media_probe
@@ -10,10 +10,12 @@ Content Modality Analyzer - 内容模态分析器
 """
 import numpy as np
 from pathlib import Path
-from typing import Dict, Any, Literal, Optional
-from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Literal, Optional, Tuple
+from dataclasses import dataclass, asdict, field
 import subprocess
-import json
+
+from .audio_analysis import AudioAnalysis, find_audio_analysis, parse_silence_intervals
+from .media_probe import get_media_probe
 
 
 @dataclass
@@ -33,6 +35,12 @@ class ModalityAnalysis:
     volume_variance: float
     speech_segments: int
     
+    # 静音区间（长音频分块转录的切点来源）
+    silence_intervals: List[Tuple[float, float]] = field(default_factory=list)
+    
+    # 特征提取失败原因（超时 / 解码失败），成功时为 None
+    error: Optional[str] = None
+    
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
@@ -44,6 +52,10 @@ class ModalityAnalyzer:
         self.silence_threshold_db = -40  # 静音阈值
         self.speech_min_duration = 0.5   # 最小语音段长度（秒）
         self.talking_head_threshold = 0.3  # 口播判断阈值
+        
+        # ffmpeg 解码超时：按时长估算（只解码音频约 20 倍实时），至少 30 秒
+        self.min_timeout = 30.0
+        self.decode_speed = 20.0
     
     def analyze(
         self,
@@ -92,7 +104,9 @@ class ModalityAnalyzer:
             audio_present=audio_features["has_audio"],
             avg_volume_db=audio_features["avg_volume_db"],
             volume_variance=audio_features["volume_variance"],
-            speech_segments=audio_features["speech_segments"]
+            speech_segments=audio_features["speech_segments"],
+            silence_intervals=audio_features.get("silence_intervals", []),
+            error=audio_features.get("error")
         )
     
     def _extract_audio_features(
@@ -108,13 +122,22 @@ class ModalityAnalyzer:
         # 选择音频源
         source_path = audio_path if audio_path else video_path
         
+        # Ingest 阶段已单次解码分析过 → 直接复用 sidecar
+        analysis = self._find_analysis(source_path)
+        if analysis is not None:
+            return self._features_from_analysis(analysis)
+        
+        duration = self._get_duration(source_path)
+        timeout = self.decode_timeout(duration)
+        
         try:
-            # 使用 ffmpeg 提取音频统计
+            # 使用 ffmpeg 提取音频统计（-vn: 不解码画面）
             # volumedetect: 音量检测
             # silencedetect: 静音检测
             cmd = [
                 "ffmpeg",
                 "-i", source_path,
+                "-vn",
                 "-af", f"silencedetect=noise={self.silence_threshold_db}dB:d={self.speech_min_duration},volumedetect",
                 "-f", "null",
                 "-"
@@ -124,52 +147,84 @@ class ModalityAnalyzer:
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=30
+                timeout=timeout
             )
             
             output = result.stderr
             
             # 解析音频统计
             features = self._parse_audio_stats(output)
+            return self._compute_ratios(features, duration)
+        
+        except subprocess.TimeoutExpired:
+            error = f"音频特征提取超时（{timeout:.0f}s，时长 {duration:.0f}s）: {Path(source_path).name}"
+        except Exception as e:
+            error = f"音频特征提取失败: {e}"
+        
+        print(f"⚠️  {error}")
+        # 返回默认值
+        return {
+            "has_audio": False,
+            "avg_volume_db": -100,
+            "volume_variance": 0,
+            "silence_duration": 0,
+            "speech_segments": 0,
+            "duration": duration,
+            "silence_ratio": 1.0,
+            "speech_ratio": 0.0,
+            "music_ratio": 0.0,
+            "error": error
+        }
+    
+    def _compute_ratios(self, features: Dict[str, Any], duration: float) -> Dict[str, Any]:
+        """由静音时长计算语音 / 静音 / 音乐占比"""
+        features["duration"] = duration
+        
+        if duration > 0:
+            silence_duration = features["silence_duration"]
+            features["silence_ratio"] = silence_duration / duration
+            features["speech_ratio"] = 1.0 - features["silence_ratio"]
             
-            # 获取音频时长
-            duration = self._get_duration(source_path)
-            features["duration"] = duration
-            
-            # 计算比例
-            if duration > 0:
-                silence_duration = features["silence_duration"]
-                features["silence_ratio"] = silence_duration / duration
-                features["speech_ratio"] = 1.0 - features["silence_ratio"]
-                
-                # 简单的音乐检测（基于音量方差）
-                # 音乐通常音量更稳定，语音波动更大
-                if features["volume_variance"] < 5.0:
-                    features["music_ratio"] = min(0.3, features["speech_ratio"] * 0.3)
-                    features["speech_ratio"] -= features["music_ratio"]
-                else:
-                    features["music_ratio"] = 0.0
+            # 简单的音乐检测（基于音量方差）
+            # 音乐通常音量更稳定，语音波动更大
+            if features["volume_variance"] < 5.0:
+                features["music_ratio"] = min(0.3, features["speech_ratio"] * 0.3)
+                features["speech_ratio"] -= features["music_ratio"]
             else:
-                features["silence_ratio"] = 1.0
-                features["speech_ratio"] = 0.0
                 features["music_ratio"] = 0.0
-            
-            return features
+        else:
+            features["silence_ratio"] = 1.0
+            features["speech_ratio"] = 0.0
+            features["music_ratio"] = 0.0
         
-        except Exception as e:
-            print(f"⚠️  音频特征提取失败: {e}")
-            # 返回默认值
-            return {
-                "has_audio": False,
-                "avg_volume_db": -100,
-                "volume_variance": 0,
-                "silence_duration": 0,
-                "speech_segments": 0,
-                "duration": 0,
-                "silence_ratio": 1.0,
-                "speech_ratio": 0.0,
-                "music_ratio": 0.0
-            }
+        return features
+    
+    def _find_analysis(self, source_path: str) -> Optional[AudioAnalysis]:
+        """查找参数一致、仍然有效的 Ingest sidecar"""
+        analysis = find_audio_analysis(source_path)
+        if analysis is None:
+            return None
+        if (
+            analysis.silence_threshold_db != self.silence_threshold_db
+            or analysis.min_silence_sec != self.speech_min_duration
+        ):
+            return None
+        return analysis
+    
+    def _features_from_analysis(self, analysis: AudioAnalysis) -> Dict[str, Any]:
+        """由 sidecar 构建音频特征（与 _parse_audio_stats 口径一致）"""
+        features = {
+            "has_audio": analysis.has_audio,
+            "avg_volume_db": analysis.mean_volume_db if analysis.mean_volume_db is not None else -100,
+            "volume_variance": 0,
+            "silence_duration": analysis.silence_duration,
+            "silence_intervals": list(analysis.silence_intervals),
+            "speech_segments": len(analysis.silence_intervals)  # 语音段数 ≈ 静音段数
+        }
+        if analysis.mean_volume_db is not None and analysis.max_volume_db is not None:
+            features["volume_variance"] = abs(analysis.max_volume_db - analysis.mean_volume_db)
+        
+        return self._compute_ratios(features, analysis.duration)
     
     def _parse_audio_stats(self, ffmpeg_output: str) -> Dict[str, Any]:
         """解析 ffmpeg 输出的音频统计"""
@@ -203,59 +258,89 @@ class ModalityAnalyzer:
                         pass
         
         # 解析静音段
-        silence_starts = []
-        silence_ends = []
-        
-        for line in ffmpeg_output.split("\n"):
-            if "silence_start:" in line:
-                try:
-                    start = float(line.split("silence_start:")[1].split()[0])
-                    silence_starts.append(start)
-                except:
-                    pass
-            
-            if "silence_end:" in line:
-                try:
-                    end = float(line.split("silence_end:")[1].split("|")[0].strip())
-                    silence_ends.append(end)
-                except:
-                    pass
+        silence_intervals = self.parse_silence_intervals(ffmpeg_output)
         
         # 计算静音总时长
         silence_duration = 0
-        for start, end in zip(silence_starts, silence_ends):
+        for start, end in silence_intervals:
             silence_duration += (end - start)
         
         features["silence_duration"] = silence_duration
-        features["speech_segments"] = len(silence_starts)  # 语音段数 ≈ 静音段数
+        features["silence_intervals"] = silence_intervals
+        features["speech_segments"] = len(silence_intervals)  # 语音段数 ≈ 静音段数
         
         return features
     
-    def _get_duration(self, file_path: str) -> float:
-        """获取音频/视频时长"""
+    @staticmethod
+    def parse_silence_intervals(ffmpeg_output: str) -> List[Tuple[float, float]]:
+        """
+        解析 silencedetect 输出的静音区间
+        
+        Returns:
+            [(silence_start, silence_end), ...]，未闭合的最后一段静音被忽略
+        """
+        return parse_silence_intervals(ffmpeg_output)
+    
+    def detect_silences(
+        self,
+        source_path: str,
+        min_silence: Optional[float] = None,
+        timeout: Optional[float] = None
+    ) -> List[Tuple[float, float]]:
+        """
+        静音区间检测（与模态分析相同的 silencedetect 参数）
+        
+        用于长音频分块转录时选择切点。
+        
+        Args:
+            source_path: 音频/视频文件路径
+            min_silence: 最短静音时长（秒），默认 speech_min_duration
+            timeout: 超时时间（秒），默认按时长估算
+        
+        Returns:
+            [(silence_start, silence_end), ...]
+        """
+        min_silence = min_silence or self.speech_min_duration
+        
+        analysis = self._find_analysis(source_path)
+        if analysis is not None and analysis.min_silence_sec == min_silence:
+            return list(analysis.silence_intervals)
+        
+        if timeout is None:
+            timeout = self.decode_timeout(self._get_duration(source_path))
+        
+        cmd = [
+            "ffmpeg",
+            "-i", source_path,
+            "-vn",
+            "-af", f"silencedetect=noise={self.silence_threshold_db}dB:d={min_silence}",
+            "-f", "null",
+            "-"
+        ]
+        
         try:
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "json",
-                file_path
-            ]
-            
             result = subprocess.run(
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=10
+                timeout=timeout
             )
-            
-            data = json.loads(result.stdout)
-            duration = float(data["format"]["duration"])
-            return duration
+            return self.parse_silence_intervals(result.stderr)
         
         except Exception as e:
-            print(f"⚠️  获取时长失败: {e}")
-            return 0.0
+            print(f"⚠️  静音检测失败: {e}")
+            return []
+    
+    def decode_timeout(self, duration: float) -> float:
+        """按时长估算 ffmpeg 音频解码超时（时长未知时用最小值）"""
+        return max(self.min_timeout, duration / self.decode_speed)
+    
+    def _get_duration(self, file_path: str) -> float:
+        """获取音频/视频时长（MediaProbe 缓存，同一文件只探测一次）"""
+        info = get_media_probe().probe(file_path)
+        if not info.ok:
+            print(f"⚠️  获取时长失败: {info.error}")
+        return info.duration
     
     def _is_likely_talking_head(self, audio_features: Dict[str, Any]) -> bool:
         """
@@ -0,0 +1,191 @@
+"""
+流水线检查点 - 按资源 / 段记录每个步骤的输入指纹，输入未变化的条目直接复用上次的结果
+
+temp/checkpoints.json 与各步骤的输出文件放在一起：
+    {
+        "segment": {"items": {"V001": "...", ...}, "output": "segments_by_asset.json", "updated_at": "..."},
+        "asr": {"items": {"V001_S001": "...", ...}, "output": "transcripts.json", ...}
+    }
+
+- items 记录每个资源 / 段各自的输入指纹（上游输出 + 配置 + 步骤版本），只重新计算指纹变化或缺失的条目（ItemResults）
+- 先写输出再写检查点，中途崩溃时最多重算最后一批
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+CHECKPOINT_FILE = "checkpoints.json"
+
+# 文件指纹读取的头 / 尾字节数（大小 + 修改时间 + 头尾内容，不读全文件）
+SAMPLE_BYTES = 64 * 1024
+
+
+def fingerprint(*parts: Any) -> str:
+    """任意可 JSON 序列化数据的指纹（字典键顺序无关）"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def file_fingerprint(path: Optional[str]) -> Optional[str]:
+    """源文件指纹：大小 + 修改时间 + 头尾各 64KB 内容（不读全文件），文件不存在时返回 None"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    try:
+        with open(path, "rb") as f:
+            digest.update(f.read(SAMPLE_BYTES))
+            if stat.st_size > SAMPLE_BYTES * 2:
+                f.seek(-SAMPLE_BYTES, os.SEEK_END)
+                digest.update(f.read(SAMPLE_BYTES))
+    except OSError:
+        return None
+    return digest.hexdigest()[:32]
+
+
+class StageCheckpoints:
+    """temp/checkpoints.json 的读写"""
+
+    def __init__(self, temp_dir: Path):
+        self.temp_dir = Path(temp_dir)
+        self.path = self.temp_dir / CHECKPOINT_FILE
+        self._lock = threading.Lock()
+        self.data: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        data = read_json(self.path)
+        return data if isinstance(data, dict) else {}
+
+    def items(self, stage: str) -> Dict[str, str]:
+        return dict(self.data.get(stage, {}).get("items", {}))
+
+    def record(self, stage: str, output: str, items: Dict[str, str]):
+        """记录步骤各条目的输入指纹（在输出文件写完之后调用）"""
+        entry = {"output": output, "items": items, "updated_at": datetime.now().isoformat()}
+        with self._lock:
+            self.data[stage] = entry
+            self._save()
+
+    def clear(self, stage: Optional[str] = None):
+        """清除检查点（不指定 stage 时清除全部，下次运行全部重算）"""
+        with self._lock:
+            if stage is None:
+                self.data.clear()
+            else:
+                self.data.pop(stage, None)
+            self._save()
+
+    def _save(self):
+        write_json(self.path, self.data)
+
+
+class ItemResults:
+    """
+    条目级检查点（线程安全，多个素材的任务同时读写）
+
+    输出文件是 条目 ID → 结果 的字典。lookup 命中的条目直接复用，store 记录新结果，
+    每累计 batch 条落盘一次；未被本次运行触及的旧条目在 finish() 之前保留，中途崩溃不会丢失。
+    """
+
+    def __init__(
+        self,
+        checkpoints: StageCheckpoints,
+        stage: str,
+        output_file: str,
+        version: int,
+        batch: int = 8
+    ):
+        self.checkpoints = checkpoints
+        self.stage = stage
+        self.output_file = output_file
+        self.path = checkpoints.temp_dir / output_file
+        self.version = version
+        self.batch = batch
+        self.reused = 0
+        self.computed = 0
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+        previous = read_json(self.path)
+        self._previous = previous if isinstance(previous, dict) else {}
+        self._previous_items = checkpoints.items(stage) if isinstance(previous, dict) else {}
+        self._data: Dict[str, Any] = dict(self._previous)
+        self._items: Dict[str, str] = dict(self._previous_items)
+
+    def lookup(self, key: str, item_fingerprint: str) -> bool:
+        """条目输入未变化时返回 True（结果可用 get 读取，没有结果的条目 get 返回 None）"""
+        with self._lock:
+            if self._items.get(key) != fingerprint(self.version, item_fingerprint):
+                return False
+            self.reused += 1
+            return True
+
+    def store(self, item_fingerprints: Dict[str, str], results: Dict[str, Any]):
+        """记录一批条目的结果（item_fingerprints 中没有结果的条目表示不需要结果）"""
+        with self._lock:
+            for key, item_fingerprint in item_fingerprints.items():
+                self._items[key] = fingerprint(self.version, item_fingerprint)
+                if key in results:
+                    self._data[key] = results[key]
+                else:
+                    self._data.pop(key, None)
+            self.computed += len(item_fingerprints)
+            self._unsaved += len(item_fingerprints)
+            if self._unsaved >= self.batch:
+                self._save()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.get(key, default)
+
+    def select(self, keys: List[str]) -> Dict[str, Any]:
+        """按 keys 顺序取出有结果的条目"""
+        with self._lock:
+            return {key: self._data[key] for key in keys if key in self._data}
+
+    def flush(self):
+        """落盘尚未保存的结果（失败退出前调用）"""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def finish(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        结束本次运行：只保留 keys 中的条目（素材删除后输出和检查点同步收缩），按 keys 顺序输出
+        """
+        with self._lock:
+            self._data = {key: self._data[key] for key in keys if key in self._data}
+            self._items = {key: self._items[key] for key in keys if key in self._items}
+            if self._unsaved or self._data != self._previous or self._items != self._previous_items:
+                self._save()
+            return dict(self._data)
+
+    def _save(self):
+        write_json(self.path, self._data)
+        self.checkpoints.record(self.stage, self.output_file, items=dict(self._items))
+        self._unsaved = 0
+
+
+def read_json(path: Path) -> Optional[Any]:
+    """读取 JSON 文件（不存在或损坏时返回 None）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_json(path: Path, data: Any):
+    """先写临时文件再替换，中断时不会留下半个文件"""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
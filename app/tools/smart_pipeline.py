@@ -8,14 +8,60 @@ Step 2A: ASR 主路径（大多数情况）
 Step 2B: Vision 补充路径（只在必要时）
 Step 3: 融合生成 ShotCards
 
-主流程：Ingest → Triage → Segment → ASR/Vision → Fuse
+主流程：Ingest → 按素材调度（Triage → Match → Modality → Segment → ASR ∥ Vision → Structure → Fuse）
+
+调度：Ingest 之后每个素材独立推进（asset_scheduler），素材自己的上游完成即可进入下一步，
+不同素材的 ASR / Vision / 云端结构化按各自资源上限并行；每个素材各步骤的耗时写入 temp/asset_timings.json。
+
+续跑：每个步骤按素材 / 段把输入指纹（源文件指纹 + 上游输出 + 配置）记录在 temp/checkpoints.json，
+重新运行时只重新计算输入变化的部分。
 """
+from functools import partial
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-import json
+from typing import Dict, Any, List, Optional, Callable
+import os
+import threading
 
+from ..config import settings
+from ..core.orchestrator import get_orchestrator
 from .modality_analyzer import ModalityAnalyzer, should_run_vision
+from .audio_analysis import find_audio_analysis, speech_spans
 from .audio_matcher import AudioMatcher
+from .asset_scheduler import AssetScheduler
+from .media_probe import get_media_probe
+from .pipeline_checkpoint import (
+    ItemResults,
+    StageCheckpoints,
+    file_fingerprint,
+    fingerprint,
+    read_json,
+    write_json
+)
+
+
+# 各步骤的实现版本：修改步骤逻辑后递增，旧检查点随之失效
+STAGE_VERSIONS = {
+    "matching": 1,
+    "segment": 2,
+    "asr": 1,
+    "vision": 1,
+    "structure": 1
+}
+
+# 按条目记录检查点的步骤 → temp/ 下的输出文件（条目 ID → 结果）
+ITEM_OUTPUTS = {
+    "matching": "audio_matches.json",
+    "segment": "segments_by_asset.json",
+    "asr": "transcripts.json",
+    "vision": "vision_captions.json",
+    "structure": "vision_meta.json"
+}
+
+# 需要运行 ASR 的模态
+ASR_MODES = ("ASR_PRIMARY", "HYBRID")
+
+# 按条目计算的步骤每完成这么多条落盘一次（步骤中途崩溃后从这里继续）
+CHECKPOINT_BATCH = 8
 
 
 class SmartPipeline:
@@ -26,6 +72,7 @@ class SmartPipeline:
         self.input_dir = job_dir / "input"
         self.output_dir = job_dir / "output"
         self.temp_dir = job_dir / "temp"
+        self.job_id = job_dir.name
         
         # 确保目录存在
         self.input_dir.mkdir(exist_ok=True)
@@ -35,76 +82,53 @@ class SmartPipeline:
         # 初始化分析器
         self.modality_analyzer = ModalityAnalyzer()
         self.audio_matcher = AudioMatcher()
+        
+        # 按停顿分段：短于该值的停顿不切分（秒）
+        self.segment_min_silence = 1.0
+        
+        # 步骤检查点（续跑时跳过输入未变化的步骤）
+        self.checkpoints = StageCheckpoints(self.temp_dir)
     
-    def run(self, input_paths: List[str]) -> Dict[str, Any]:
+    def run(self, input_paths: List[str], force: bool = False) -> Dict[str, Any]:
         """
         运行完整流水线
         
         Args:
             input_paths: 输入文件路径列表
+            force: 忽略检查点，全部重新计算
         
         Returns:
-            处理结果
+            处理结果（timings 为每个素材各步骤的等待 / 运行时间）
         """
         print("\n" + "="*60)
         print("🚀 Smart Pipeline 启动")
         print("="*60)
         
+        if force:
+            # 清除检查点以及 Ingest / 模态分析按资源复用的结果
+            self.checkpoints.clear()
+            for filename in ("assets_manifest.json", "modality_policy.json"):
+                (self.temp_dir / filename).unlink(missing_ok=True)
+        
         # Step 1: Ingest & Index
         print("\n📦 Step 1: Ingest & Index")
         assets = self._build_assets_manifest(input_paths)
         self._save_json("assets_manifest.json", assets)
         print(f"✓ 发现 {len(assets['videos'])} 个视频, {len(assets['audios'])} 个音频")
         
-        # Step 2: Triage (cheap quality check)
-        print("\n🔍 Step 2: Quick Quality Triage")
-        assets = self._quick_quality_triage(assets)
-        self._save_json("assets_manifest_with_triage.json", assets)
-        usable_count = sum(1 for v in assets['videos'] if v.get('quality', {}).get('usable', True))
-        print(f"✓ {usable_count}/{len(assets['videos'])} 个视频可用")
+        # Step 2-7: 每个素材独立推进（见 asset_scheduler）
+        print("\n⚙️  Step 2-7: Triage → Match → Modality → Segment → ASR ∥ Vision → Structure → Fuse（按素材调度）")
+        result = self._process_assets(assets)
         
-        # Step 3: Match external audio to video
-        print("\n🎵 Step 3: Match Audio to Video")
-        assets = self._match_audio_to_video(assets)
-        self._save_json("assets_manifest_with_matching.json", assets)
+        usable_count = sum(1 for v in assets['videos'] if v.get('quality', {}).get('usable', True))
         matched_count = sum(1 for v in assets['videos'] if v.get('matched_audio_asset_id'))
-        print(f"✓ {matched_count} 个视频匹配到外部音频")
-        
-        # Step 4: Decide modality per asset
-        print("\n🧠 Step 4: Modality Analysis")
-        policies = self._decide_modality_policies(assets)
-        self._save_json("modality_policy.json", policies)
-        self._print_modality_summary(policies)
-        
-        # Step 5: Segment assets
-        print("\n✂️  Step 5: Segment Assets")
-        segments = self._segment_assets(assets, policies)
-        self._save_json("segments.json", segments)
-        print(f"✓ 生成 {len(segments)} 个可剪辑段")
-        
-        # Step 6A: ASR pass
-        print("\n🎤 Step 6A: ASR Recognition")
-        transcripts = self._run_asr_pass(segments, policies)
-        self._save_json("transcripts.json", transcripts)
-        print(f"✓ 转录 {len(transcripts)} 个语音段")
-        
-        # Step 6B: Vision pass (only when needed)
-        print("\n👁️  Step 6B: Vision Analysis (selective)")
-        vision_caps = self._run_vision_pass(segments, policies, transcripts)
-        self._save_json("vision_captions.json", vision_caps)
-        print(f"✓ 分析 {len(vision_caps)} 个视觉段")
-        
-        # Step 6C: Cloud structuring
-        print("\n🧠 Step 6C: Structure Vision Data")
-        vision_meta = self._structure_vision_data(vision_caps)
-        self._save_json("vision_meta.json", vision_meta)
-        print(f"✓ 结构化 {len(vision_meta)} 个视觉元数据")
-        
-        # Step 7: Fuse into ShotCards
-        print("\n🎬 Step 7: Generate ShotCards")
-        shotcards = self._generate_shotcards(segments, transcripts, vision_meta, assets)
-        self._save_json("shotcards.json", shotcards)
-        print(f"✓ 生成 {len(shotcards)} 个 ShotCard")
+        print(f"✓ {usable_count}/{len(assets['videos'])} 个视频可用, {matched_count} 个视频匹配到外部音频")
+        self._print_modality_summary(result["policies"])
+        print(f"✓ 生成 {len(result['segments'])} 个可剪辑段")
+        print(f"✓ 转录 {len(result['transcripts'])} 个语音段")
+        print(f"✓ 分析 {len(result['vision_caps'])} 个视觉段, 结构化 {len(result['vision_meta'])} 个")
+        print(f"✓ 生成 {len(result['shotcards'])} 个 ShotCard")
+        self._print_timings(result["timings"])
         
         print("\n" + "="*60)
         print("✅ Smart Pipeline 完成")
@@ -113,17 +137,241 @@ class SmartPipeline:
         return {
             "job_dir": str(self.job_dir),
             "assets": assets,
+            "policies": result["policies"],
+            "segments": result["segments"],
+            "transcripts": result["transcripts"],
+            "vision_meta": result["vision_meta"],
+            "shotcards": result["shotcards"],
+            "timings": result["timings"]
+        }
+    
+    def _process_assets(self, assets: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按素材的任务图执行 Step 2-7
+        
+        每个素材的步骤结果记录在各步骤的条目级检查点中；任一任务失败时，
+        先把已完成的结果落盘再抛出异常，重新运行时只计算剩下的部分。
+        """
+        videos = assets["videos"]
+        audios = assets["audios"]
+        audios_by_id = {audio["asset_id"]: audio for audio in audios}
+        
+        # 匹配结果取决于视频、全部外部音频、两者的音频分析 sidecar（波形）和匹配参数
+        audio_inputs = [(audio, self._audio_analysis_key(audio["path"])) for audio in audios]
+        matcher_config = self._matcher_config()
+        asr_config = [settings.WHISPER_MODEL, settings.WHISPER_COMPUTE_TYPE]
+        vision_config = [settings.USE_LOCAL_VISION, settings.LOCAL_VISION_PROVIDER, settings.LOCAL_VISION_MODEL]
+        
+        stages = {
+            stage: ItemResults(self.checkpoints, stage, output_file, STAGE_VERSIONS[stage], CHECKPOINT_BATCH)
+            for stage, output_file in ITEM_OUTPUTS.items()
+        }
+        previous_policies = self._load_json("modality_policy.json") or {}
+        saved_policies = dict(previous_policies)
+        save_lock = threading.Lock()
+        asset_keys: Dict[str, str] = {}
+        policies: Dict[str, Any] = {}
+        segments: Dict[str, List[Dict[str, Any]]] = {}
+        
+        def seg_ids_of(asset_id: str) -> List[str]:
+            return [seg["seg_id"] for seg in segments.get(asset_id, [])]
+        
+        def triage(video):
+            self._triage_video(video)
+        
+        def match(video):
+            asset_id = video["asset_id"]
+            fields = self._compute_items(
+                stages["matching"],
+                {asset_id: fingerprint(video, self._audio_analysis_key(video["path"]), audio_inputs, matcher_config)},
+                lambda ids: {asset_id: self._match_video(video, audios)}
+            )
+            video.update(fields.get(asset_id, {}))
+        
+        def modality(video):
+            asset_id = video["asset_id"]
+            if not video.get("quality", {}).get("usable", True):
+                policy = {"mode": "SKIP", "reason": "质量不可用"}
+            else:
+                audio_path = self._modality_audio_path(video, audios)
+                input_key = self._modality_input_key(video["path"], audio_path)
+                policy = self._cached_policy(previous_policies, asset_id, input_key)
+                if policy is None:
+                    policy = self._analyze_modality(video["path"], audio_path, input_key)
+            
+            # 部分结果落盘（崩溃后可续跑）
+            with save_lock:
+                policies[asset_id] = policy
+                saved_policies[asset_id] = policy
+                self._save_json("modality_policy.json", saved_policies)
+        
+        def segment(video):
+            asset_id = video["asset_id"]
+            asset_keys[asset_id] = self._asset_input_key(video, audios_by_id)
+            policy = policies[asset_id]
+            result = self._compute_items(
+                stages["segment"],
+                {asset_id: fingerprint(asset_keys[asset_id], policy.get("mode"), self.segment_min_silence)},
+                lambda ids: {asset_id: self._segment_assets({"videos": [video], "audios": []}, {asset_id: policy})}
+            )
+            segments[asset_id] = result.get(asset_id, [])
+        
+        def needs_asr(asset_id: str) -> bool:
+            return bool(segments.get(asset_id)) and policies[asset_id].get("mode") in ASR_MODES
+        
+        def asr(video):
+            asset_id = video["asset_id"]
+            by_id = {seg["seg_id"]: seg for seg in segments[asset_id]}
+            mode = policies[asset_id].get("mode")
+            self._compute_items(
+                stages["asr"],
+                {
+                    seg_id: fingerprint(seg, mode, asset_keys[asset_id], asr_config)
+                    for seg_id, seg in by_id.items()
+                },
+                lambda ids: self._run_asr_pass([by_id[s] for s in ids], policies)
+            )
+        
+        def vision(video):
+            asset_id = video["asset_id"]
+            by_id = {seg["seg_id"]: seg for seg in segments[asset_id]}
+            transcripts = stages["asr"].select(list(by_id))
+            self._compute_items(
+                stages["vision"],
+                {
+                    seg_id: fingerprint(
+                        seg, policies[asset_id], transcripts.get(seg_id), asset_keys[asset_id], vision_config
+                    )
+                    for seg_id, seg in by_id.items()
+                },
+                lambda ids: self._run_vision_pass([by_id[s] for s in ids], policies, transcripts)
+            )
+        
+        def has_captions(asset_id: str) -> bool:
+            return bool(stages["vision"].select(seg_ids_of(asset_id)))
+        
+        def structure(video):
+            captions = stages["vision"].select(seg_ids_of(video["asset_id"]))
+            self._compute_items(
+                stages["structure"],
+                {seg_id: fingerprint(caption, settings.OPENAI_MODEL) for seg_id, caption in captions.items()},
+                lambda ids: self._structure_vision_data({s: captions[s] for s in ids})
+            )
+        
+        def fuse(video):
+            seg_ids = seg_ids_of(video["asset_id"])
+            return self._generate_shotcards(
+                segments.get(video["asset_id"], []),
+                stages["asr"].select(seg_ids),
+                stages["structure"].select(seg_ids),
+                assets
+            )
+        
+        scheduler = AssetScheduler(
+            self._resource_limits(len(videos)),
+            resource_lock=get_orchestrator().resource_lock,
+            owner=self.job_id,
+            resource_timeout=settings.PIPELINE_RESOURCE_TIMEOUT_SEC
+        )
+        for video in videos:
+            asset_id = video["asset_id"]
+            scheduler.add(asset_id, "triage", partial(triage, video))
+            upstream = "triage"
+            if audios:
+                scheduler.add(asset_id, "match", partial(match, video), deps=["triage"])
+                upstream = "match"
+            scheduler.add(asset_id, "modality", partial(modality, video), deps=[upstream])
+            scheduler.add(asset_id, "segment", partial(segment, video), deps=["modality"])
+            scheduler.add(asset_id, "asr", partial(asr, video), resource="asr", deps=["segment"],
+                          condition=partial(needs_asr, asset_id))
+            # 口播素材按转录置信度决定是否补跑 Vision，画面素材的 ASR 节点直接跳过
+            scheduler.add(asset_id, "vision", partial(vision, video), resource="vision", deps=["asr"],
+                          condition=partial(seg_ids_of, asset_id))
+            scheduler.add(asset_id, "structure", partial(structure, video), resource="ai", deps=["vision"],
+                          condition=partial(has_captions, asset_id))
+            scheduler.add(asset_id, "fuse", partial(fuse, video), deps=["structure"])
+        
+        try:
+            results = scheduler.run()
+        finally:
+            for items in stages.values():
+                items.flush()
+            timings = {"assets": scheduler.asset_timings(), "resources": scheduler.get_stats()}
+            self._save_json("asset_timings.json", timings)
+        
+        video_ids = [video["asset_id"] for video in videos]
+        seg_list = [seg for asset_id in video_ids for seg in segments.get(asset_id, [])]
+        seg_ids = [seg["seg_id"] for seg in seg_list]
+        
+        for stage, items in stages.items():
+            items.finish(video_ids if stage in ("matching", "segment") else seg_ids)
+            if items.reused:
+                print(f"  ↻ {stage}: 复用 {items.reused} 个未变化的结果，重新计算 {items.computed} 个")
+        
+        policies = {asset_id: policies[asset_id] for asset_id in video_ids}
+        shotcards = [card for asset_id in video_ids for card in results[asset_id]["fuse"]]
+        self._save_json("modality_policy.json", policies)
+        self._save_json("assets_manifest_with_matching.json", assets)
+        self._save_json("segments.json", seg_list)
+        self._save_json("shotcards.json", shotcards)
+        
+        return {
             "policies": policies,
-            "segments": segments,
-            "transcripts": transcripts,
-            "vision_meta": vision_meta,
-            "shotcards": shotcards
+            "segments": seg_list,
+            "transcripts": stages["asr"].select(seg_ids),
+            "vision_caps": stages["vision"].select(seg_ids),
+            "vision_meta": stages["structure"].select(seg_ids),
+            "shotcards": shotcards,
+            "timings": timings
         }
     
+    def _resource_limits(self, videos: int) -> Dict[str, int]:
+        """
+        任务图中各类节点的并发上限
+        
+        - cpu：模态分析等 ffmpeg 解码，同 _modality_workers（Resolve 繁忙时减半）
+        - asr：PIPELINE_ASR_WORKERS（Whisper 模型占用大量内存 / 显存）
+        - vision / ai：Orchestrator 的 VISION / AI 容量（运行时再从全局资源锁获取槽位）
+        """
+        return {
+            "cpu": self._modality_workers(max(1, videos)),
+            "asr": settings.PIPELINE_ASR_WORKERS,
+            "vision": settings.RESOURCE_VISION_SLOTS,
+            "ai": settings.RESOURCE_AI_SLOTS
+        }
+    
+    def _print_timings(self, timings: Dict[str, Any]):
+        """打印各资源的并发情况和最慢的素材"""
+        for resource, stats in timings["resources"].items():
+            if stats["tasks"]:
+                print(f"  ⏱️  {resource}: {stats['tasks']} 个任务, 并发峰值 {stats['peak_running']}/{stats['limit']}, "
+                      f"运行 {stats['run_sec']:.2f}s, 排队 {stats['wait_sec']:.2f}s")
+        
+        finished = [(asset_id, t) for asset_id, t in timings["assets"].items() if t["elapsed_sec"] is not None]
+        for asset_id, t in sorted(finished, key=lambda item: item[1]["elapsed_sec"], reverse=True)[:3]:
+            steps = ", ".join(
+                f"{stage} {stage_timing['run_sec']:.2f}s"
+                for stage, stage_timing in t["stages"].items()
+                if not stage_timing.get("skipped") and stage_timing["run_sec"] >= 0.01
+            )
+            print(f"  ⏱️  {asset_id}: {t['elapsed_sec']:.2f}s" + (f"（{steps}）" if steps else ""))
+    
     def _build_assets_manifest(self, input_paths: List[str]) -> Dict[str, Any]:
-        """构建资源清单"""
+        """
+        构建资源清单（媒体信息每个文件只探测一次，后续步骤复用缓存）
+        
+        每个资源记录源文件指纹 source_fp；上次清单中指纹相同的文件直接复用，不再探测。
+        """
+        probe = get_media_probe()
+        previous = self._load_json("assets_manifest.json") or {}
+        known = {
+            entry["path"]: entry
+            for entry in previous.get("videos", []) + previous.get("audios", [])
+            if entry.get("source_fp")
+        }
         videos = []
         audios = []
+        reused = 0
         
         for path in input_paths:
             p = Path(path)
@@ -134,100 +382,175 @@ class SmartPipeline:
             
             # 判断文件类型
             ext = p.suffix.lower()
+            abs_path = str(p.absolute())
+            source_fp = file_fingerprint(abs_path)
+            cached = known.get(abs_path)
+            if cached and cached["source_fp"] == source_fp:
+                reused += 1
+            else:
+                cached = None
             
             if ext in ['.mp4', '.mov', '.avi', '.mkv', '.mts', '.m4v']:
+                asset_id = f"V{len(videos)+1:03d}"
+                if cached:
+                    videos.append({**cached, "asset_id": asset_id})
+                    continue
+                info = probe.probe(str(p))
                 videos.append({
-                    "asset_id": f"V{len(videos)+1:03d}",
+                    "asset_id": asset_id,
                     "type": "video",
-                    "path": str(p.absolute()),
+                    "path": abs_path,
                     "filename": p.name,
-                    "size_mb": p.stat().st_size / (1024*1024)
+                    "size_mb": info.size / (1024*1024),
+                    "duration": info.duration,
+                    "fps": info.fps,
+                    "width": info.width,
+                    "height": info.height,
+                    "has_audio": info.has_audio,
+                    "source_fp": source_fp
                 })
             
             elif ext in ['.wav', '.mp3', '.aac', '.m4a', '.flac']:
+                asset_id = f"A{len(audios)+1:03d}"
+                if cached:
+                    audios.append({**cached, "asset_id": asset_id})
+                    continue
+                info = probe.probe(str(p))
                 audios.append({
-                    "asset_id": f"A{len(audios)+1:03d}",
+                    "asset_id": asset_id,
                     "type": "audio",
-                    "path": str(p.absolute()),
+                    "path": abs_path,
                     "filename": p.name,
-                    "size_mb": p.stat().st_size / (1024*1024)
+                    "size_mb": info.size / (1024*1024),
+                    "duration": info.duration,
+                    "source_fp": source_fp
                 })
         
+        if reused:
+            print(f"  ↻ 复用 {reused} 个未变化文件的媒体信息")
+        
         return {
             "videos": videos,
             "audios": audios
         }
     
-    def _quick_quality_triage(self, assets: Dict[str, Any]) -> Dict[str, Any]:
+    def _triage_video(self, video: Dict[str, Any]):
         """快速质量筛选（无需 AI）"""
-        for video in assets["videos"]:
-            # 简单规则：文件大小 < 1MB 可能损坏
-            usable = video["size_mb"] >= 1.0
-            
-            video["quality"] = {
-                "usable": usable,
-                "reason": "文件过小" if not usable else "OK"
-            }
+        # 简单规则：文件大小 < 1MB 可能损坏
+        usable = video["size_mb"] >= 1.0
         
-        return assets
+        video["quality"] = {
+            "usable": usable,
+            "reason": "文件过小" if not usable else "OK"
+        }
     
-    def _match_audio_to_video(self, assets: Dict[str, Any]) -> Dict[str, Any]:
-        """匹配外部音频到视频"""
-        if not assets["audios"]:
-            return assets
-        
-        matches = self.audio_matcher.match_audio_to_videos(
-            assets["videos"],
-            assets["audios"]
+    def _match_video(self, video: Dict[str, Any], audios: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """为单个视频匹配外部音频，返回要写入视频资源的字段"""
+        audio_paths = {audio["asset_id"]: audio["path"] for audio in audios}
+        m = self.audio_matcher.match_audio_to_videos([video], audios)[0]
+        return {
+            "matched_audio_asset_id": m.audio_asset_id,
+            "matched_audio_path": audio_paths.get(m.audio_asset_id),
+            "audio_match_method": m.match_method,
+            "audio_match_confidence": m.confidence,
+            "audio_offset_sec": m.audio_offset_sec
+        }
+    
+    def _matcher_config(self) -> List[Any]:
+        """影响匹配结果的匹配器参数"""
+        matcher = self.audio_matcher
+        return [
+            matcher.enable_waveform,
+            matcher.timestamp_tolerance_minutes,
+            matcher.waveform_min_confidence,
+            matcher.waveform_max_offset_sec,
+            matcher.waveform_max_seconds
+        ]
+    
+    @staticmethod
+    def _audio_analysis_key(path: Optional[str]) -> Optional[Dict[str, Any]]:
+        """源文件当前有效的音频分析 sidecar（静音区间等，影响分段和波形匹配）"""
+        if not path:
+            return None
+        analysis = find_audio_analysis(path)
+        return analysis.to_dict() if analysis else None
+    
+    def _asset_input_key(self, video: Dict[str, Any], audios_by_id: Dict[str, Any]) -> str:
+        """
+        视频资源的输入指纹：资源信息（含源文件指纹、质量、音频匹配）+ 匹配音频的源文件指纹 +
+        音频分析 sidecar。下游按资源 / 段的检查点都以此为基础。
+        """
+        return fingerprint(
+            video,
+            audios_by_id.get(video.get("matched_audio_asset_id")),
+            self._audio_analysis_key(video["path"]),
+            self._audio_analysis_key(video.get("matched_audio_path"))
         )
-        
-        # 更新视频资源
-        for match in matches:
-            for video in assets["videos"]:
-                if video["asset_id"] == match.video_asset_id:
-                    video["matched_audio_asset_id"] = match.audio_asset_id
-                    video["audio_match_method"] = match.match_method
-                    video["audio_match_confidence"] = match.confidence
-                    video["audio_offset_sec"] = match.audio_offset_sec
-                    break
-        
-        return assets
     
-    def _decide_modality_policies(self, assets: Dict[str, Any]) -> Dict[str, Any]:
-        """决定每个资源的模态策略"""
-        policies = {}
+    def _analyze_modality(self, video_path: str, audio_path: Optional[str], input_key: str) -> Dict[str, Any]:
+        """分析单个资源的模态，返回策略"""
+        analysis = self.modality_analyzer.analyze(video_path, audio_path)
+        
+        policy = {
+            "mode": analysis.recommended_mode,
+            "confidence": analysis.confidence,
+            "has_voice": analysis.has_voice,
+            "speech_ratio": analysis.speech_ratio,
+            "likely_talking_head": analysis.likely_talking_head,
+            "input_key": input_key
+        }
+        if analysis.error:
+            policy["error"] = analysis.error
+        return policy
+    
+    @staticmethod
+    def _modality_audio_path(video: Dict[str, Any], audios: List[Dict[str, Any]]) -> Optional[str]:
+        """视频匹配到的外部音频路径"""
+        if video.get("matched_audio_asset_id"):
+            for audio in audios:
+                if audio["asset_id"] == video["matched_audio_asset_id"]:
+                    return audio["path"]
+        return None
+    
+    @staticmethod
+    def _cached_policy(previous: Dict[str, Any], asset_id: str, input_key: str) -> Optional[Dict[str, Any]]:
+        """上次输入相同且分析成功的策略"""
+        cached = previous.get(asset_id)
+        if cached and cached.get("input_key") == input_key and not cached.get("error"):
+            return cached
+        return None
+    
+    def _modality_workers(self, pending: int) -> int:
+        """
+        模态分析并发数
         
-        for video in assets["videos"]:
-            if not video.get("quality", {}).get("usable", True):
-                policies[video["asset_id"]] = {
-                    "mode": "SKIP",
-                    "reason": "质量不可用"
-                }
-                continue
-            
-            # 获取音频路径
-            audio_path = None
-            if video.get("matched_audio_asset_id"):
-                for audio in assets["audios"]:
-                    if audio["asset_id"] == video["matched_audio_asset_id"]:
-                        audio_path = audio["path"]
-                        break
-            
-            # 分析模态
-            analysis = self.modality_analyzer.analyze(
-                video["path"],
-                audio_path
-            )
-            
-            policies[video["asset_id"]] = {
-                "mode": analysis.recommended_mode,
-                "confidence": analysis.confidence,
-                "has_voice": analysis.has_voice,
-                "speech_ratio": analysis.speech_ratio,
-                "likely_talking_head": analysis.likely_talking_head
-            }
+        - 上限：MODALITY_WORKERS，或 CPU 线程数的一半（每个 ffmpeg 解码约占 1~2 个线程）
+        - Resolve 渲染 / GPU 重任务进行中时减半，给前台让出 CPU
+        """
+        if settings.MODALITY_WORKERS > 0:
+            cap = settings.MODALITY_WORKERS
+        else:
+            cap = max(1, (os.cpu_count() or 2) // 2)
+        
+        resource_lock = get_orchestrator().resource_lock
+        if resource_lock.is_locked("RESOLVE_BUSY") or resource_lock.is_locked("GPU_HEAVY"):
+            cap = max(1, cap // 2)
         
-        return policies
+        return max(1, min(cap, pending))
+    
+    @staticmethod
+    def _modality_input_key(video_path: str, audio_path: Optional[str]) -> str:
+        """模态分析输入的标识（路径 + 大小 + 修改时间），用于续跑时判断结果是否可复用"""
+        parts = []
+        for path in (video_path, audio_path):
+            if not path:
+                continue
+            try:
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                parts.append(f"{path}:missing")
+        return "|".join(parts)
     
     def _print_modality_summary(self, policies: Dict[str, Any]):
         """打印模态分析摘要"""
@@ -255,18 +578,52 @@ class SmartPipeline:
             if mode == "SKIP":
                 continue
             
+            # 有 Ingest sidecar 时按停顿分段（静音检测已在提取音频时完成）
+            spans = self._speech_spans_for(video)
+            if spans:
+                for index, (start, end) in enumerate(spans, start=1):
+                    segments.append({
+                        "seg_id": f"{asset_id}_S{index:03d}",
+                        "asset_id": asset_id,
+                        "start_sec": round(start, 3),
+                        "end_sec": round(end, 3),
+                        "priority": "high" if mode == "ASR_PRIMARY" else "medium"
+                    })
+                continue
+            
             # 简化版：固定时长分段（实际应该用 VAD 或场景检测）
-            # TODO: 实现基于 VAD 的智能分段
             segments.append({
                 "seg_id": f"{asset_id}_S001",
                 "asset_id": asset_id,
                 "start_sec": 0,
-                "end_sec": 999999,  # 整个视频
+                "end_sec": video.get("duration") or 999999,  # 整个视频
                 "priority": "high" if mode == "ASR_PRIMARY" else "medium"
             })
         
         return segments
     
+    def _speech_spans_for(self, video: Dict[str, Any]) -> List[tuple]:
+        """
+        由 Ingest sidecar 的静音区间得到有声区间（视频时间轴）
+        
+        优先使用视频自身音轨；没有时使用匹配的外录音频并按 audio_offset_sec 换算
+        """
+        analysis = find_audio_analysis(video["path"])
+        offset = 0.0
+        if analysis is None and video.get("matched_audio_path"):
+            analysis = find_audio_analysis(video["matched_audio_path"])
+            offset = video.get("audio_offset_sec", 0.0)
+        if analysis is None or not analysis.has_audio:
+            return []
+        
+        spans = speech_spans(analysis.duration, analysis.silence_intervals, self.segment_min_silence)
+        duration = video.get("duration") or analysis.duration + offset
+        return [
+            (max(0.0, start + offset), min(duration, end + offset))
+            for start, end in spans
+            if end + offset > 0 and start + offset < duration
+        ]
+    
     def _run_asr_pass(
         self,
         segments: List[Dict[str, Any]],
@@ -281,7 +638,7 @@ class SmartPipeline:
             mode = policy.get("mode", "SKIP")
             
             # 只对 ASR_PRIMARY 和 HYBRID 运行 ASR
-            if mode not in ["ASR_PRIMARY", "HYBRID"]:
+            if mode not in ASR_MODES:
                 continue
             
             # TODO: 实际调用 Whisper ASR
@@ -395,12 +752,36 @@ class SmartPipeline:
         
         return shotcard
     
+    def _compute_items(
+        self,
+        items: ItemResults,
+        item_fingerprints: Dict[str, str],
+        compute: Callable[[List[str]], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        条目级检查点：只计算指纹变化或尚未完成的条目（每批最多 CHECKPOINT_BATCH 条）
+        
+        Args:
+            items: 该步骤的条目级检查点
+            item_fingerprints: 条目 ID → 输入指纹
+            compute: 计算一批条目，返回 条目 ID → 结果（不需要结果的条目可以不返回）
+        
+        Returns:
+            这些条目中有结果的部分（按 item_fingerprints 顺序）
+        """
+        pending = [key for key, item_fp in item_fingerprints.items() if not items.lookup(key, item_fp)]
+        for start in range(0, len(pending), CHECKPOINT_BATCH):
+            batch = pending[start:start + CHECKPOINT_BATCH]
+            items.store({key: item_fingerprints[key] for key in batch}, compute(batch))
+        return items.select(list(item_fingerprints))
+    
     def _save_json(self, filename: str, data: Any):
-        """保存 JSON 文件"""
-        path = self.temp_dir / filename
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-
+        """保存 JSON 文件（先写临时文件再替换，中断时不会留下半个文件）"""
+        write_json(self.temp_dir / filename, data)
+    
+    def _load_json(self, filename: str) -> Optional[Any]:
+        """读取 JSON 文件（不存在或损坏时返回 None）"""
+        return read_json(self.temp_dir / filename)
 
 def run_smart_pipeline(job_dir: Path, input_paths: List[str]) -> Dict[str, Any]:
     """
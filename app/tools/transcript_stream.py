@@ -0,0 +1,239 @@
+"""
+流式转录输出 - 边转录边写 transcript.json
+
+旧路径：ASR 全部完成后一次性写 transcript.json，
+一小时的录音要等几十分钟才能开始生成字幕 / 调用 LLM 导演。
+
+流式输出：
+1. 每产出一段立即追加到 JSONL 旁路文件（transcript.partial.jsonl），崩溃也不丢已转录内容
+2. 定期原子重写 transcript.json（"partial": true + "transcribed_until"），
+   下游可以直接读取前 N 分钟
+3. 按已转录时长上报进度（节流，避免频繁重写 metadata.json）
+4. 完成后写最终 transcript.json（与旧格式一致）并删除旁路文件
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+PARTIAL_SUFFIX = ".partial.jsonl"
+
+
+def partial_path_for(transcript_path: Path) -> Path:
+    """transcript.json -> transcript.partial.jsonl"""
+    transcript_path = Path(transcript_path)
+    return transcript_path.with_name(transcript_path.stem + PARTIAL_SUFFIX)
+
+
+def _write_json_atomic(path: Path, data: Dict[str, Any]):
+    """先写临时文件再 os.replace，读方不会看到半个文件"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class TranscriptStreamWriter:
+    """
+    流式 transcript 写入器
+
+    用法:
+        writer = TranscriptStreamWriter(job_dir / "transcript.json", str(audio_path))
+        transcript = transcribe_audio_parallel(
+            ..., on_segment=writer.on_segment, on_info=writer.on_info
+        )
+        writer.finish(transcript)
+    """
+
+    def __init__(
+        self,
+        transcript_path: Path,
+        source: str,
+        flush_interval: float = 10.0,
+        on_progress: Optional[Callable[[int], None]] = None,
+        progress_range: Tuple[int, int] = (50, 80),
+        progress_interval: float = 2.0
+    ):
+        """
+        Args:
+            transcript_path: transcript.json 路径
+            source: 音频来源路径（写入 transcript 的 source 字段）
+            flush_interval: 重写 transcript.json 快照的最小间隔（秒）
+            on_progress: 进度回调 (progress) -> None
+            progress_range: 转录进度映射到的任务进度区间
+            progress_interval: 进度回调的最小间隔（秒）
+        """
+        self.transcript_path = Path(transcript_path)
+        self.partial_path = partial_path_for(self.transcript_path)
+        self.source = source
+        self.flush_interval = flush_interval
+        self.on_progress = on_progress
+        self.progress_range = progress_range
+        self.progress_interval = progress_interval
+
+        self.language: Optional[str] = None
+        self.duration: float = 0.0
+        self.segments: List[Dict[str, Any]] = []
+
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._last_progress_time = 0.0
+        self._last_progress: Optional[int] = None
+
+        self.transcript_path.parent.mkdir(parents=True, exist_ok=True)
+        self._partial_file = open(self.partial_path, "w", encoding="utf-8")
+
+    @property
+    def transcribed_until(self) -> float:
+        return self.segments[-1]["end"] if self.segments else 0.0
+
+    def on_info(self, info: Dict[str, Any]):
+        """转录开始时的信息 {"language", "duration"}"""
+        with self._lock:
+            self.language = info.get("language") or self.language
+            self.duration = float(info.get("duration") or 0.0)
+            self._append({"type": "info", "language": self.language, "duration": self.duration})
+
+    def on_segment(self, segment: Dict[str, Any]):
+        """追加一段（必须按时间顺序）"""
+        with self._lock:
+            record = {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+            self.segments.append(record)
+            self._append({"type": "segment", **record})
+
+            now = time.time()
+            if now - self._last_flush >= self.flush_interval:
+                self._write_snapshot()
+                self._last_flush = now
+
+            self._report_progress(now)
+
+    def finish(self, transcript: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        写最终 transcript.json 并删除旁路文件
+
+        Args:
+            transcript: ASR 返回的完整结果（None 时使用已收到的段落）
+        """
+        with self._lock:
+            if transcript is None:
+                transcript = {
+                    "segments": list(self.segments),
+                    "language": self.language,
+                    "source": self.source
+                }
+
+            self._partial_file.close()
+            _write_json_atomic(self.transcript_path, transcript)
+            self.partial_path.unlink(missing_ok=True)
+
+        return transcript
+
+    def abort(self):
+        """转录失败：保留旁路文件和最后一次快照，便于排查 / 续用"""
+        with self._lock:
+            if not self._partial_file.closed:
+                self._partial_file.close()
+            if self.segments:
+                self._write_snapshot()
+
+    def _append(self, record: Dict[str, Any]):
+        self._partial_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._partial_file.flush()
+
+    def _write_snapshot(self):
+        _write_json_atomic(self.transcript_path, {
+            "segments": list(self.segments),
+            "language": self.language,
+            "source": self.source,
+            "partial": True,
+            "transcribed_until": self.transcribed_until,
+            "duration": self.duration
+        })
+
+    def _report_progress(self, now: float):
+        if not self.on_progress or self.duration <= 0:
+            return
+        if now - self._last_progress_time < self.progress_interval:
+            return
+
+        low, high = self.progress_range
+        ratio = min(1.0, self.transcribed_until / self.duration)
+        progress = int(low + (high - low) * ratio)
+        if progress == self._last_progress:
+            return
+
+        self._last_progress = progress
+        self._last_progress_time = now
+        self.on_progress(progress)
+
+
+def read_partial_transcript(
+    transcript_path: Path,
+    until_sec: Optional[float] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    读取（可能仍在转录中的）transcript
+
+    优先读 JSONL 旁路文件（比快照新），转录已完成时读最终 transcript.json。
+
+    Args:
+        transcript_path: transcript.json 路径
+        until_sec: 只返回结束时间不超过该值的段落（下游只处理前 N 秒）
+
+    Returns:
+        {"segments", "language", "source", "partial", "transcribed_until"}，不存在时返回 None
+    """
+    transcript_path = Path(transcript_path)
+    partial_path = partial_path_for(transcript_path)
+
+    transcript = None
+    if partial_path.exists():
+        language = None
+        duration = 0.0
+        segments = []
+        with open(partial_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # 最后一行可能正在写入
+                if record.get("type") == "info":
+                    language = record.get("language")
+                    duration = record.get("duration", 0.0)
+                elif record.get("type") == "segment":
+                    segments.append({"start": record["start"], "end": record["end"], "text": record["text"]})
+
+        source = None
+        if transcript_path.exists():
+            try:
+                with open(transcript_path, "r", encoding="utf-8") as f:
+                    source = json.load(f).get("source")
+            except (OSError, json.JSONDecodeError):
+                pass
+
+        transcript = {
+            "segments": segments,
+            "language": language,
+            "source": source,
+            "partial": True,
+            "transcribed_until": segments[-1]["end"] if segments else 0.0,
+            "duration": duration
+        }
+    elif transcript_path.exists():
+        with open(transcript_path, "r", encoding="utf-8") as f:
+            transcript = json.load(f)
+        transcript.setdefault("partial", False)
+        segments = transcript.get("segments", [])
+        transcript.setdefault("transcribed_until", segments[-1]["end"] if segments else 0.0)
+
+    if transcript is None:
+        return None
+
+    if until_sec is not None:
+        transcript["segments"] = [seg for seg in transcript["segments"] if seg["end"] <= until_sec]
+
+    return transcript
@@ -0,0 +1,113 @@
+"""
+视觉分析结果缓存 - 按内容寻址的磁盘缓存
+
+键：(关键帧 JPEG 字节的 sha256, 模型名, prompt 版本)
+值：分析结果（VisualMetadata 等可 JSON 序列化的数据）
+
+场景 ID、任务 ID、项目版本都不参与计算键，因此：
+- 重新导入 / 调整项目后，同一素材的同一帧直接命中
+- 换模型或修改 prompt（递增 prompt 版本）后自动失效
+
+存储布局：
+    cache/vision/ab/ab12...ef.json   # 两级目录，避免单目录文件过多
+
+超过容量上限时按最近访问时间淘汰（命中会刷新文件 mtime，重启后依然有效），见 DiskLRUCache。
+"""
+import base64
+import hashlib
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from ..config import settings
+from ..core.disk_cache import DiskLRUCache
+
+
+class VisionResultCache(DiskLRUCache):
+    """视觉分析结果磁盘缓存"""
+
+    label = "视觉缓存"
+
+    def __init__(self, cache_dir: Path, max_mb: int = 512):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_mb: 容量上限（MB）
+        """
+        super().__init__(cache_dir, max_mb)
+
+    @staticmethod
+    def frame_hash(img_b64: str) -> str:
+        """关键帧哈希（对解码后的 JPEG 字节计算）"""
+        return hashlib.sha256(base64.b64decode(img_b64)).hexdigest()
+
+    @staticmethod
+    def make_key(frame_hash: str, model: str, prompt_version: str) -> str:
+        """缓存键：帧哈希 + 模型 + prompt 版本"""
+        raw = f"{frame_hash}|{model}|{prompt_version}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，未命中返回 None"""
+        entry = self._read_entry(key)
+        return entry.get("result") if entry is not None else None
+
+    def put(self, key: str, result: Any, model: str = "", prompt_version: str = ""):
+        """写入缓存"""
+        self._write_entry(key, {
+            "model": model,
+            "prompt_version": prompt_version,
+            "created_at": time.time(),
+            "result": result
+        })
+
+    def wrap(
+        self,
+        infer: Callable[[str], Any],
+        model: str,
+        prompt_version: str,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value
+    ) -> Callable[[str], Any]:
+        """
+        包装推理函数：先查缓存，未命中再调用模型并写回
+
+        Args:
+            infer: 推理函数（输入 base64 JPEG）
+            model: 模型名（包含后端，如 ollama/moondream）
+            prompt_version: prompt 版本（修改 prompt 时递增）
+            encode: 结果 → 可 JSON 序列化的数据
+            decode: 缓存数据 → 结果
+        """
+        def cached_infer(img_b64: str) -> Any:
+            key = self.make_key(self.frame_hash(img_b64), model, prompt_version)
+
+            cached = self.get(key)
+            if cached is not None:
+                try:
+                    return decode(cached)
+                except Exception:
+                    pass  # 结构变化的旧条目，重新分析后覆盖
+
+            result = infer(img_b64)
+            self.put(key, encode(result), model=model, prompt_version=prompt_version)
+            return result
+
+        return cached_infer
+
+
+# 全局单例
+_vision_cache: Optional[VisionResultCache] = None
+
+
+def get_vision_cache() -> Optional[VisionResultCache]:
+    """获取全局视觉结果缓存（单例），配置关闭时返回 None"""
+    global _vision_cache
+    if not settings.VISION_CACHE_ENABLED:
+        return None
+    if _vision_cache is None:
+        _vision_cache = VisionResultCache(
+            settings.VISION_CACHE_DIR,
+            max_mb=settings.VISION_CACHE_MAX_MB
+        )
+    return _vision_cache
@@ -0,0 +1,169 @@
+"""
+视觉推理流水线 - 截帧 / 推理 / 解析 三段重叠
+
+旧流程（逐场景串行）：
+    截帧 → requests.post（阻塞）→ 解析 → 下一个场景
+
+新流程：
+    截帧线程：单个 ffmpeg 管道持续产出 JPEG
+    推理线程池：最多 concurrency 个请求同时在途（由 VisionPolicy 按 profile 设定）
+    主线程：按场景原始顺序回写结果
+
+concurrency=1 时与串行行为完全一致（同样的场景、同样的 max_scenes 语义），
+只是截帧与推理重叠。
+"""
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional
+
+from ..models.schemas import Scene
+from .frame_extractor import KeyframeExtractor, get_keyframe_extractor
+
+
+class FrameExtractionError(RuntimeError):
+    """截帧失败（与推理失败区分，便于分析器打印不同提示）"""
+
+
+def scene_mid_frame(scene: Scene) -> int:
+    """场景中间帧号（所有分析器统一的代表帧）"""
+    return (scene.start_frame + scene.end_frame) // 2
+
+
+class VisionPipeline:
+    """有界并发的视觉推理流水线"""
+
+    def __init__(
+        self,
+        video_path: str,
+        fps: float,
+        concurrency: int = 1,
+        extractor: Optional[KeyframeExtractor] = None
+    ):
+        """
+        Args:
+            video_path: 视频文件路径
+            fps: 场景帧号对应的帧率
+            concurrency: 同时在途的推理请求上限
+            extractor: 关键帧提取器（默认全局单例）
+        """
+        self.video_path = video_path
+        self.fps = fps
+        self.concurrency = max(1, int(concurrency or 1))
+        self.extractor = extractor or get_keyframe_extractor()
+
+    def run(
+        self,
+        scenes: List[Scene],
+        infer: Callable[[str], Any],
+        max_scenes: Optional[int] = None,
+        on_result: Optional[Callable[[Scene, Any], None]] = None,
+        on_error: Optional[Callable[[Scene, Exception], None]] = None
+    ) -> int:
+        """
+        运行流水线
+
+        Args:
+            scenes: 待分析的场景（按回写顺序）
+            infer: 推理函数，输入 base64 JPEG，返回解析后的结果
+            max_scenes: 成功分析数量上限（与串行循环语义相同：失败的场景不计数，
+                        会继续尝试后面的场景）
+            on_result: 成功回调（按场景顺序调用，负责回写 ScenesJSON）
+            on_error: 失败回调（按场景顺序调用）
+
+        Returns:
+            成功分析的场景数
+        """
+        if not scenes:
+            return 0
+
+        # 预取范围：不考虑失败时需要的场景；失败后补位的场景走单帧回退
+        prefetch = scenes[:max_scenes] if max_scenes else scenes
+        prefetch_frames = set(scene_mid_frame(s) for s in prefetch)
+
+        frames: Dict[int, bytes] = {}
+        cond = threading.Condition()
+        state = {"producer_done": False, "stop": False}
+
+        def produce():
+            try:
+                for n, data in self.extractor.iter_frames(self.video_path, prefetch_frames):
+                    with cond:
+                        if state["stop"]:
+                            break
+                        frames[n] = data
+                        cond.notify_all()
+            except Exception as e:
+                print(f"  ⚠️ 批量截帧中断: {e}")
+            finally:
+                with cond:
+                    state["producer_done"] = True
+                    cond.notify_all()
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        def get_frame_base64(frame_number: int) -> Optional[str]:
+            if frame_number in prefetch_frames:
+                with cond:
+                    while frame_number not in frames and not state["producer_done"]:
+                        cond.wait()
+                    data = frames.get(frame_number)
+                if data is not None:
+                    return base64.b64encode(data).decode('utf-8')
+
+            return self.extractor.extract_frame_base64(self.video_path, frame_number, self.fps)
+
+        def task(scene: Scene) -> Any:
+            img_b64 = get_frame_base64(scene_mid_frame(scene))
+            if not img_b64:
+                raise FrameExtractionError(f"截帧失败: {scene.scene_id}")
+            return infer(img_b64)
+
+        results: Dict[int, tuple] = {}
+        in_flight: Dict[Any, int] = {}
+        next_submit = 0
+        next_emit = 0
+        successes = 0
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                while True:
+                    # 提交：在途 + 已成功 不超过 max_scenes
+                    while (
+                        next_submit < len(scenes)
+                        and len(in_flight) < self.concurrency
+                        and (not max_scenes or successes + len(in_flight) < max_scenes)
+                    ):
+                        future = pool.submit(task, scenes[next_submit])
+                        in_flight[future] = next_submit
+                        next_submit += 1
+
+                    if not in_flight:
+                        break
+
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = in_flight.pop(future)
+                        try:
+                            results[index] = (True, future.result())
+                            successes += 1
+                        except Exception as e:
+                            results[index] = (False, e)
+
+                    # 按原始顺序回写
+                    while next_emit in results:
+                        ok, value = results.pop(next_emit)
+                        scene = scenes[next_emit]
+                        if ok:
+                            if on_result:
+                                on_result(scene, value)
+                        elif on_error:
+                            on_error(scene, value)
+                        next_emit += 1
+        finally:
+            with cond:
+                state["stop"] = True
+                cond.notify_all()
+
+        return successes
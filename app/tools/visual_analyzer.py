@@ -8,95 +8,45 @@
 
 注意：推荐使用 visual_analyzer_local.py（本地模型，零成本）
 """
-import base64
 import json
-import subprocess
-import os
-import tempfile
 from pathlib import Path
 from typing import List, Optional
 
-from openai import OpenAI
-
 from ..config import settings
+from ..core.llm_client import get_llm_client
 from ..models.schemas import ScenesJSON, VisualMetadata
+from .vision_pipeline import VisionPipeline, FrameExtractionError, scene_mid_frame
+from .vision_cache import VisionResultCache
+
+# 修改 _call_vision_api 中的 prompt 时递增（使视觉缓存失效）
+VISION_PROMPT_VERSION = "cloud-v1"
 
 
 class VisualAnalyzer:
     """视觉分析器 - 让 AI 导演能"看懂"画面"""
     
-    def __init__(self):
-        """初始化：复用配置中的 API Key"""
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY not configured in .env")
-        
-        client_kwargs = {"api_key": settings.OPENAI_API_KEY}
-        if settings.OPENAI_BASE_URL:
-            client_kwargs["base_url"] = settings.OPENAI_BASE_URL
-        
-        self.client = OpenAI(**client_kwargs)
-        
-        # 强制使用支持视觉的模型
-        self.vision_model = "gpt-4o"
-    
-    def _extract_frame_base64(self, video_path: str, time_sec: float) -> Optional[str]:
+    def __init__(
+        self,
+        concurrency: int = 1,
+        result_cache: Optional[VisionResultCache] = None
+    ):
         """
-        使用 FFmpeg 截取指定时间点的帧，返回 base64 字符串
+        初始化：复用配置中的 API Key
         
         Args:
-            video_path: 视频文件路径
-            time_sec: 时间点（秒）
-        
-        Returns:
-            base64 编码的图片字符串，失败返回 None
+            concurrency: 同时在途的推理请求数（由 VisionPolicy 决定）
+            result_cache: 视觉结果缓存（None 表示不缓存）
         """
-        # 使用临时文件
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-            temp_img = tmp.name
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY not configured in .env")
         
-        try:
-            cmd = [
-                "ffmpeg",
-                "-ss", str(time_sec),
-                "-i", video_path,
-                "-frames:v", "1",
-                "-q:v", "2",  # 高质量 JPG
-                "-y",
-                temp_img
-            ]
-            
-            # 执行截帧（静默模式）
-            result = subprocess.run(
-                cmd,
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=10
-            )
-            
-            if not os.path.exists(temp_img):
-                raise RuntimeError("Frame extraction failed: image not created")
-            
-            # 读取并编码
-            with open(temp_img, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+        # 进程内共享的客户端（限流与重试见 llm_client）
+        self.client = get_llm_client()
         
-        except subprocess.TimeoutExpired:
-            print(f"  ⚠️ 截帧超时 ({time_sec}s)")
-            return None
-        except subprocess.CalledProcessError as e:
-            print(f"  ⚠️ 截帧失败 ({time_sec}s): FFmpeg error")
-            return None
-        except Exception as e:
-            print(f"  ⚠️ 截帧失败 ({time_sec}s): {e}")
-            return None
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_img):
-                try:
-                    os.remove(temp_img)
-                except:
-                    pass
+        # 强制使用支持视觉的模型
+        self.vision_model = "gpt-4o"
+        self.concurrency = concurrency
+        self.result_cache = result_cache
     
     def analyze_scene_visuals(
         self,
@@ -121,36 +71,51 @@ class VisualAnalyzer:
             print(f"  ❌ 视频文件不存在: {video_path}")
             return scenes_data
         
-        count = 0
+        fps = scenes_data.meta.fps
+        pending = []
         for scene in scenes_data.scenes:
-            if max_scenes and count >= max_scenes:
-                print(f"\n  ⏸️  已达到限制 ({max_scenes} 个场景)，停止分析")
-                break
-            
-            # 1. 如果已有视觉数据，跳过
+            # 已有视觉数据的场景跳过
             if scene.visual:
                 print(f"  ⏭️  {scene.scene_id} 已有视觉数据，跳过")
-                continue
-            
-            # 2. 计算中间时刻
-            mid_frame = (scene.start_frame + scene.end_frame) // 2
-            mid_sec = mid_frame / scenes_data.meta.fps
-            
-            # 3. 截取代表帧
-            print(f"  > 分析 {scene.scene_id} (T={mid_sec:.1f}s)...", end="", flush=True)
-            img_b64 = self._extract_frame_base64(video_path, mid_sec)
-            
-            if not img_b64:
-                print(" ❌ 截帧失败")
-                continue
-            
-            # 4. 调用 GPT-4o 识图
-            try:
-                scene.visual = self._call_vision_api(img_b64)
-                print(f" ✅ [{scene.visual.shot_type}] {scene.visual.summary}")
-                count += 1
-            except Exception as e:
-                print(f" ❌ API 错误: {e}")
+            else:
+                pending.append(scene)
+        
+        attempted = []
+        
+        def on_result(scene, visual):
+            scene.visual = visual
+            attempted.append(scene.scene_id)
+            print(f"  > {scene.scene_id} (T={scene_mid_frame(scene) / fps:.1f}s) ✅ [{visual.shot_type}] {visual.summary}")
+        
+        def on_error(scene, error):
+            attempted.append(scene.scene_id)
+            if isinstance(error, FrameExtractionError):
+                print(f"  > {scene.scene_id} ❌ 截帧失败")
+            else:
+                print(f"  > {scene.scene_id} ❌ API 错误: {error}")
+        
+        infer = self._call_vision_api
+        if self.result_cache:
+            infer = self.result_cache.wrap(
+                infer,
+                model=f"openai/{self.vision_model}",
+                prompt_version=VISION_PROMPT_VERSION,
+                encode=lambda visual: visual.model_dump(),
+                decode=lambda data: VisualMetadata(**data)
+            )
+        
+        # 截帧 / GPT-4o 识图 / 解析 重叠，按场景顺序回写
+        pipeline = VisionPipeline(video_path, fps, concurrency=self.concurrency)
+        count = pipeline.run(
+            pending,
+            infer,
+            max_scenes=max_scenes,
+            on_result=on_result,
+            on_error=on_error
+        )
+        
+        if max_scenes and count >= max_scenes and len(attempted) < len(pending):
+            print(f"\n  ⏸️  已达到限制 ({max_scenes} 个场景)，停止分析")
         
         print(f"\n✅ 视觉分析完成: {count}/{len(scenes_data.scenes)} 个场景")
         return scenes_data
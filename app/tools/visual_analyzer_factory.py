@@ -10,6 +10,7 @@ v2.0: 集成 RuntimeProfile 和 ExecutionPolicy
 from typing import Optional, Literal
 from ..config import settings
 from ..models.schemas import ScenesJSON
+from .vision_cache import get_vision_cache
 
 
 def get_visual_analyzer(
@@ -34,6 +35,7 @@ def get_visual_analyzer(
     use_local = settings.USE_LOCAL_VISION
     selected_model = model
     local_backend = settings.LOCAL_VISION_PROVIDER  # ollama 或 lmstudio
+    concurrency = 1  # 推理并发度（由 VisionPolicy 按 profile 决定）
     
     # 如果启用策略，从 ExecutionPolicy 获取配置
     if use_policy and not force_local and not force_cloud and not model:
@@ -44,8 +46,9 @@ def get_visual_analyzer(
             use_local = (policy.vision.provider == "local")
             selected_model = policy.vision.model
             local_backend = policy.vision.local_backend or local_backend
+            concurrency = policy.vision.concurrency
             
-            print(f"📊 使用执行策略: provider={policy.vision.provider}, backend={local_backend}, model={selected_model}")
+            print(f"📊 使用执行策略: provider={policy.vision.provider}, backend={local_backend}, model={selected_model}, concurrency={concurrency}")
         except Exception as e:
             print(f"⚠️  无法获取执行策略，使用默认配置: {e}")
     
@@ -58,6 +61,9 @@ def get_visual_analyzer(
     if model:
         selected_model = model
     
+    # 视觉结果缓存（按帧哈希 + 模型 + prompt 版本命中，跨任务 / 项目版本复用）
+    result_cache = get_vision_cache()
+    
     if use_local:
         # 使用本地模型
         if local_backend == "lmstudio":
@@ -70,7 +76,9 @@ def get_visual_analyzer(
             
             return LMStudioVisualAnalyzer(
                 base_url=settings.LMSTUDIO_HOST,
-                model=lmstudio_model
+                model=lmstudio_model,
+                concurrency=concurrency,
+                result_cache=result_cache
             )
         else:
             # 使用 Ollama
@@ -93,7 +101,9 @@ def get_visual_analyzer(
             
             return LocalVisualAnalyzer(
                 model=local_model,
-                ollama_host=settings.OLLAMA_HOST
+                ollama_host=settings.OLLAMA_HOST,
+                concurrency=concurrency,
+                result_cache=result_cache
             )
     else:
         # 使用云端模型
@@ -101,7 +111,7 @@ def get_visual_analyzer(
         
         cloud_model = selected_model or "gpt-4o"
         print(f"☁️  使用云端视觉模型: {cloud_model}")
-        return VisualAnalyzer()
+        return VisualAnalyzer(concurrency=concurrency, result_cache=result_cache)
 
 
 def analyze_scenes_auto(
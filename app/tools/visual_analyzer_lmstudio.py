@@ -14,13 +14,16 @@ LM Studio 优势：
 - MiniCPM-V (5GB) - 不推荐，体积大，不适合边缘设备
 """
 import base64
-import tempfile
-import os
 from pathlib import Path
 from typing import List, Optional
 import requests
 
 from ..models.schemas import ScenesJSON, Scene
+from .vision_pipeline import VisionPipeline, FrameExtractionError
+from .vision_cache import VisionResultCache
+
+# 修改 analyze_scene_visuals 中的 prompt 时递增（使视觉缓存失效）
+VISION_PROMPT_VERSION = "lmstudio-v1"
 
 
 class LMStudioVisualAnalyzer:
@@ -30,7 +33,9 @@ class LMStudioVisualAnalyzer:
         self,
         base_url: str = "http://localhost:1234/v1",
         model: str = "auto",  # LM Studio 会自动使用加载的模型
-        timeout: int = 30
+        timeout: int = 30,
+        concurrency: int = 1,
+        result_cache: Optional[VisionResultCache] = None
     ):
         """
         初始化 LM Studio 视觉分析器
@@ -39,10 +44,14 @@ class LMStudioVisualAnalyzer:
             base_url: LM Studio API 地址（默认 http://localhost:1234/v1）
             model: 模型名称（"auto" 表示使用当前加载的模型）
             timeout: 请求超时时间（秒）
+            concurrency: 同时在途的推理请求数（由 VisionPolicy 决定）
+            result_cache: 视觉结果缓存（None 表示不缓存）
         """
         self.base_url = base_url.rstrip('/')
         self.model = model
         self.timeout = timeout
+        self.concurrency = concurrency
+        self.result_cache = result_cache
     
     def is_available(self) -> bool:
         """检查 LM Studio 是否可用"""
@@ -94,6 +103,23 @@ class LMStudioVisualAnalyzer:
         
         image_base64 = base64.b64encode(image_data).decode('utf-8')
         
+        return self.analyze_image_base64(image_base64, prompt)
+    
+    def analyze_image_base64(
+        self,
+        image_base64: str,
+        prompt: str = "Describe this image in detail, focusing on the main subject, action, mood, and visual quality."
+    ) -> str:
+        """
+        分析单张图片（base64，内存中的 JPEG）
+        
+        Args:
+            image_base64: base64 编码的 JPEG
+            prompt: 分析提示词
+        
+        Returns:
+            图片描述文本
+        """
         # 构建 OpenAI 兼容的请求
         payload = {
             "model": self.model,
@@ -154,8 +180,6 @@ class LMStudioVisualAnalyzer:
         Returns:
             更新后的场景数据
         """
-        import cv2
-        
         # 检查 LM Studio 是否可用
         if not self.is_available():
             raise RuntimeError(
@@ -172,12 +196,10 @@ class LMStudioVisualAnalyzer:
         else:
             print(f"⚠️  无法获取模型信息，使用默认配置")
         
-        # 打开视频
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
+        if not Path(video_path).exists():
             raise ValueError(f"无法打开视频: {video_path}")
         
-        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = scenes_data.meta.fps
         
         # 限制分析数量
         scenes_to_analyze = scenes_data.scenes
@@ -188,60 +210,50 @@ class LMStudioVisualAnalyzer:
         print(f"\n👁️  开始视觉分析（LM Studio）...")
         print(f"  场景数: {len(scenes_to_analyze)}")
         
-        # 分析每个场景
-        for i, scene in enumerate(scenes_to_analyze, 1):
-            print(f"\n[{i}/{len(scenes_to_analyze)}] 分析场景 {scene.scene_id}...")
-            
-            try:
-                # 提取关键帧（场景中间位置）
-                mid_frame = (scene.start_frame + scene.end_frame) // 2
-                cap.set(cv2.CAP_PROP_POS_FRAMES, mid_frame)
-                ret, frame = cap.read()
-                
-                if not ret:
-                    print(f"  ⚠️  无法提取帧，跳过")
-                    continue
-                
-                # 保存临时图片
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-                    temp_img = tmp.name
-                    cv2.imwrite(temp_img, frame)
-                
-                try:
-                    # 调用 LM Studio 分析
-                    description = self.analyze_image(
-                        temp_img,
-                        prompt=(
-                            "Analyze this video frame for editing purposes. Describe:\n"
-                            "1. Main subject and action\n"
-                            "2. Shot type (close-up, medium, wide)\n"
-                            "3. Mood and atmosphere\n"
-                            "4. Visual quality (1-10)\n"
-                            "Be concise and focus on editing-relevant details."
-                        )
-                    )
-                    
-                    # 解析描述并更新场景
-                    scene.visual = {
-                        "summary": description,
-                        "analyzed_by": "lmstudio",
-                        "model": loaded_model or "unknown"
-                    }
-                    
-                    print(f"  ✓ {description[:80]}...")
-                
-                finally:
-                    # 清理临时文件
-                    try:
-                        os.remove(temp_img)
-                    except:
-                        pass
-            
-            except Exception as e:
-                print(f"  ✗ 分析失败: {e}")
-                continue
+        prompt = (
+            "Analyze this video frame for editing purposes. Describe:\n"
+            "1. Main subject and action\n"
+            "2. Shot type (close-up, medium, wide)\n"
+            "3. Mood and atmosphere\n"
+            "4. Visual quality (1-10)\n"
+            "Be concise and focus on editing-relevant details."
+        )
+        total = len(scenes_to_analyze)
+        position = {scene.scene_id: i for i, scene in enumerate(scenes_to_analyze, 1)}
+        
+        def on_result(scene, description):
+            # 解析描述并更新场景
+            scene.visual = {
+                "summary": description,
+                "analyzed_by": "lmstudio",
+                "model": loaded_model or "unknown"
+            }
+            print(f"\n[{position[scene.scene_id]}/{total}] 分析场景 {scene.scene_id}...")
+            print(f"  ✓ {description[:80]}...")
+        
+        def on_error(scene, error):
+            print(f"\n[{position[scene.scene_id]}/{total}] 分析场景 {scene.scene_id}...")
+            if isinstance(error, FrameExtractionError):
+                print(f"  ⚠️  无法提取帧，跳过")
+            else:
+                print(f"  ✗ 分析失败: {error}")
+        
+        infer = lambda img_b64: self.analyze_image_base64(img_b64, prompt=prompt)
+        if self.result_cache:
+            infer = self.result_cache.wrap(
+                infer,
+                model=f"lmstudio/{loaded_model or self.model}",
+                prompt_version=VISION_PROMPT_VERSION
+            )
         
-        cap.release()
+        # 截帧 / 推理 / 解析 重叠，按场景顺序回写
+        pipeline = VisionPipeline(video_path, fps, concurrency=self.concurrency)
+        pipeline.run(
+            scenes_to_analyze,
+            infer,
+            on_result=on_result,
+            on_error=on_error
+        )
         
         print(f"\n✓ 视觉分析完成")
         
@@ -11,16 +11,17 @@
 - 速度快（GPU 加速）
 - 隐私保护
 """
-import base64
 import json
-import subprocess
-import os
-import tempfile
 from pathlib import Path
 from typing import List, Optional, Literal
 import requests
 
 from ..models.schemas import ScenesJSON, VisualMetadata
+from .vision_pipeline import VisionPipeline, FrameExtractionError, scene_mid_frame
+from .vision_cache import VisionResultCache
+
+# 修改 _call_vision_api 中的 prompt 时递增（使视觉缓存失效）
+VISION_PROMPT_VERSION = "local-v1"
 
 
 class LocalVisualAnalyzer:
@@ -29,7 +30,9 @@ class LocalVisualAnalyzer:
     def __init__(
         self,
         model: Literal["moondream", "llava-phi3"] = "moondream",
-        ollama_host: str = "http://localhost:11434"
+        ollama_host: str = "http://localhost:11434",
+        concurrency: int = 1,
+        result_cache: Optional[VisionResultCache] = None
     ):
         """
         初始化本地视觉分析器
@@ -37,8 +40,12 @@ class LocalVisualAnalyzer:
         Args:
             model: 使用的模型（moondream 或 llava-phi3）
             ollama_host: Ollama 服务地址
+            concurrency: 同时在途的推理请求数（由 VisionPolicy 决定）
+            result_cache: 视觉结果缓存（None 表示不缓存）
         """
         self.model = model
+        self.concurrency = concurrency
+        self.result_cache = result_cache
         self.ollama_host = ollama_host
         self.api_url = f"{ollama_host}/api/generate"
         
@@ -78,55 +85,6 @@ class LocalVisualAnalyzer:
         except:
             return False
     
-    def _extract_frame_base64(self, video_path: str, time_sec: float) -> Optional[str]:
-        """
-        使用 FFmpeg 截取指定时间点的帧，返回 base64 字符串
-        
-        Args:
-            video_path: 视频文件路径
-            time_sec: 时间点（秒）
-        
-        Returns:
-            base64 编码的图片字符串，失败返回 None
-        """
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-            temp_img = tmp.name
-        
-        try:
-            cmd = [
-                "ffmpeg",
-                "-ss", str(time_sec),
-                "-i", video_path,
-                "-frames:v", "1",
-                "-q:v", "2",
-                "-y",
-                temp_img
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=10
-            )
-            
-            if not os.path.exists(temp_img):
-                raise RuntimeError("Frame extraction failed")
-            
-            with open(temp_img, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
-        
-        except Exception as e:
-            print(f"  ⚠️ 截帧失败 ({time_sec}s): {e}")
-            return None
-        finally:
-            if os.path.exists(temp_img):
-                try:
-                    os.remove(temp_img)
-                except:
-                    pass
-
     def analyze_scene_visuals(
         self,
         scenes_data: ScenesJSON,
@@ -150,32 +108,50 @@ class LocalVisualAnalyzer:
             print(f"  ❌ 视频文件不存在: {video_path}")
             return scenes_data
         
-        count = 0
+        fps = scenes_data.meta.fps
+        pending = []
         for scene in scenes_data.scenes:
-            if max_scenes and count >= max_scenes:
-                print(f"\n  ⏸️  已达到限制 ({max_scenes} 个场景)，停止分析")
-                break
-            
             if scene.visual:
                 print(f"  ⏭️  {scene.scene_id} 已有视觉数据，跳过")
-                continue
-            
-            mid_frame = (scene.start_frame + scene.end_frame) // 2
-            mid_sec = mid_frame / scenes_data.meta.fps
-            
-            print(f"  > 分析 {scene.scene_id} (T={mid_sec:.1f}s)...", end="", flush=True)
-            img_b64 = self._extract_frame_base64(video_path, mid_sec)
-            
-            if not img_b64:
-                print(" ❌ 截帧失败")
-                continue
-            
-            try:
-                scene.visual = self._call_vision_api(img_b64)
-                print(f" ✅ [{scene.visual.shot_type}] {scene.visual.summary}")
-                count += 1
-            except Exception as e:
-                print(f" ❌ 分析错误: {e}")
+            else:
+                pending.append(scene)
+        
+        attempted = []
+        
+        def on_result(scene, visual):
+            scene.visual = visual
+            attempted.append(scene.scene_id)
+            print(f"  > {scene.scene_id} (T={scene_mid_frame(scene) / fps:.1f}s) ✅ [{visual.shot_type}] {visual.summary}")
+        
+        def on_error(scene, error):
+            attempted.append(scene.scene_id)
+            if isinstance(error, FrameExtractionError):
+                print(f"  > {scene.scene_id} ❌ 截帧失败")
+            else:
+                print(f"  > {scene.scene_id} ❌ 分析错误: {error}")
+        
+        infer = self._call_vision_api
+        if self.result_cache:
+            infer = self.result_cache.wrap(
+                infer,
+                model=f"ollama/{self.model}",
+                prompt_version=VISION_PROMPT_VERSION,
+                encode=lambda visual: visual.model_dump(),
+                decode=lambda data: VisualMetadata(**data)
+            )
+        
+        # 截帧 / 推理 / 解析 重叠，按场景顺序回写
+        pipeline = VisionPipeline(video_path, fps, concurrency=self.concurrency)
+        count = pipeline.run(
+            pending,
+            infer,
+            max_scenes=max_scenes,
+            on_result=on_result,
+            on_error=on_error
+        )
+        
+        if max_scenes and count >= max_scenes and len(attempted) < len(pending):
+            print(f"\n  ⏸️  已达到限制 ({max_scenes} 个场景)，停止分析")
         
         print(f"\n✅ 本地视觉分析完成: {count}/{len(scenes_data.scenes)} 个场景")
         return scenes_data
@@ -0,0 +1,167 @@
+"""
+Waveform Sync - 波形互相关对齐（双系统录音同步）
+
+用于 AudioMatcher 的第三级匹配：文件名、时间戳都匹配不上时，
+用声音本身找外录音频相对视频的偏移。
+
+做法：
+1. ffmpeg 管道解码为 8kHz 单声道 s16le，边读边算 10ms 帧能量（不在内存中保留 PCM）
+2. 能量取对数后差分、半波整流 → 起音包络（onset envelope），对音量 / 麦克风差异不敏感
+3. NumPy FFT 互相关找峰值，抛物线插值到亚帧精度
+4. 置信度 = 1 - 次峰 / 主峰（主峰附近 ±0.5s 之外的最大值）
+
+一小时音频的包络只有 36 万个点，互相关一次 FFT 即可完成。
+"""
+import subprocess
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+SYNC_SAMPLE_RATE = 8000  # 解码采样率
+HOP_SEC = 0.01           # 包络帧长（10ms）
+PEAK_EXCLUSION_SEC = 0.5  # 计算次峰时排除的主峰邻域
+
+
+def frame_rms(samples: np.ndarray, hop: int) -> np.ndarray:
+    """按 hop 个采样一帧计算 RMS（末尾不足一帧的部分丢弃）"""
+    frames = len(samples) // hop
+    if frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    blocks = samples[:frames * hop].astype(np.float32).reshape(frames, hop)
+    return np.sqrt(np.mean(blocks * blocks, axis=1))
+
+
+def onset_envelope(rms: np.ndarray) -> np.ndarray:
+    """
+    帧能量 → 起音包络（零均值、单位方差）
+
+    对数能量的正向差分只保留"声音变响"的时刻，
+    拍板、辅音、脚步等瞬态在两条音轨上位置一致，与增益无关。
+    """
+    if len(rms) < 2:
+        return np.zeros(len(rms), dtype=np.float32)
+
+    log_energy = np.log(rms.astype(np.float64) + 1e-3)
+    onset = np.maximum(np.diff(log_energy, prepend=log_energy[0]), 0.0)
+    onset -= onset.mean()
+    std = onset.std()
+    if std > 0:
+        onset /= std
+    return onset.astype(np.float32)
+
+
+def decode_envelope(
+    file_path: str,
+    sample_rate: int = SYNC_SAMPLE_RATE,
+    hop_sec: float = HOP_SEC,
+    max_seconds: Optional[float] = None,
+    timeout: Optional[float] = None
+) -> np.ndarray:
+    """
+    解码音轨并计算起音包络（流式，内存只与包络长度有关）
+
+    Args:
+        file_path: 音频 / 视频文件
+        sample_rate: 解码采样率
+        hop_sec: 帧长（秒）
+        max_seconds: 只分析前 N 秒（None 为全长）
+        timeout: 解码超时（秒）
+
+    Returns:
+        起音包络，每帧 hop_sec 秒；没有音轨或解码失败时为空数组
+    """
+    hop = int(round(sample_rate * hop_sec))
+    cmd = ["ffmpeg", "-v", "error", "-i", file_path, "-vn", "-ac", "1", "-ar", str(sample_rate)]
+    if max_seconds:
+        cmd += ["-t", str(max_seconds)]
+    cmd += ["-f", "s16le", "pipe:1"]
+
+    # 每次读 1 秒（整数帧），剩余不足一帧的字节留到下次
+    read_bytes = hop * 2 * int(round(1 / hop_sec))
+    rms_blocks = []
+    pending = b""
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = process.stdout.read(read_bytes)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % (hop * 2)
+            pending = data[usable:]
+            if usable:
+                rms_blocks.append(frame_rms(np.frombuffer(data[:usable], dtype=np.int16), hop))
+        process.wait(timeout=timeout)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    if not rms_blocks:
+        return np.zeros(0, dtype=np.float32)
+    return onset_envelope(np.concatenate(rms_blocks))
+
+
+def cross_correlate(
+    reference: np.ndarray,
+    other: np.ndarray,
+    hop_sec: float = HOP_SEC,
+    max_offset_sec: Optional[float] = None
+) -> Tuple[float, float]:
+    """
+    FFT 互相关：找 other 相对 reference 的偏移
+
+    偏移定义与时间戳匹配一致：reference 的 t 时刻对应 other 的 t - offset 时刻，
+    即 offset > 0 表示 other（外录音频）比 reference（视频）晚开始。
+
+    Args:
+        reference: 视频音轨的起音包络
+        other: 外录音频的起音包络
+        hop_sec: 包络帧长（秒）
+        max_offset_sec: 只搜索 |offset| 不超过该值的范围
+
+    Returns:
+        (offset_sec, confidence)；无法计算时为 (0.0, 0.0)
+    """
+    if len(reference) < 2 or len(other) < 2:
+        return 0.0, 0.0
+
+    size = len(reference) + len(other) - 1
+    nfft = 1 << (size - 1).bit_length()
+    spectrum = np.fft.rfft(reference, nfft) * np.conj(np.fft.rfft(other, nfft))
+    circular = np.fft.irfft(spectrum, nfft)
+
+    # 重排为 lag = -(len(other)-1) .. len(reference)-1
+    corr = np.concatenate((circular[nfft - (len(other) - 1):], circular[:len(reference)]))
+    lags = np.arange(-(len(other) - 1), len(reference))
+
+    if max_offset_sec is not None:
+        max_lag = int(max_offset_sec / hop_sec)
+        window = np.abs(lags) <= max_lag
+        corr, lags = corr[window], lags[window]
+        if len(corr) == 0:
+            return 0.0, 0.0
+
+    best = int(np.argmax(corr))
+    peak = float(corr[best])
+    if peak <= 0:
+        return 0.0, 0.0
+
+    # 置信度：主峰与主峰邻域外次峰的差距
+    exclusion = max(1, int(PEAK_EXCLUSION_SEC / hop_sec))
+    outside = np.concatenate((corr[:max(0, best - exclusion)], corr[best + exclusion + 1:]))
+    second = float(outside.max()) if len(outside) else 0.0
+    confidence = float(np.clip(1.0 - max(second, 0.0) / peak, 0.0, 1.0))
+
+    # 抛物线插值到亚帧精度
+    shift = 0.0
+    if 0 < best < len(corr) - 1:
+        left, right = corr[best - 1], corr[best + 1]
+        denom = left - 2 * peak + right
+        if denom < 0:
+            shift = 0.5 * (left - right) / denom
+
+    offset_sec = (lags[best] + shift) * hop_sec
+    return float(offset_sec), confidence
@@ -0,0 +1,315 @@
+"""
+Whisper 模型池 - 进程内复用 faster-whisper 模型
+
+旧路径：transcribe_audio 每次调用都 new 一个 WhisperModel，
+每个请求都要付出数秒加载时间 + 一次峰值内存。
+
+模型池：
+1. 按 (model_size, device, compute_type) 缓存已加载模型
+2. 同一个键并发请求只加载一次
+3. 内存上限：按 MemoryProfile 估算，超出时淘汰最久未用的空闲模型
+4. 空闲淘汰：超过 idle_timeout 未使用的模型由后台线程释放
+5. 统计加载耗时与转录耗时（分开统计）
+"""
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..config import settings
+
+
+# 各模型常驻内存估算（GB，int8/float16 下的量级，用于内存上限判断）
+MODEL_MEMORY_GB = {
+    "tiny": 0.2,
+    "base": 0.3,
+    "small": 0.8,
+    "medium": 1.8,
+    "large": 3.5,
+    "large-v1": 3.5,
+    "large-v2": 3.5,
+    "large-v3": 3.5,
+}
+
+# 内存上限默认占物理内存的比例（WHISPER_POOL_MAX_GB 未设置时）
+DEFAULT_MEMORY_FRACTION = 0.25
+
+ModelKey = Tuple[str, str, str]
+
+
+def estimate_model_gb(model_size: str) -> float:
+    """估算模型常驻内存（未知模型按 large 估算）"""
+    return MODEL_MEMORY_GB.get(model_size, MODEL_MEMORY_GB["large"])
+
+
+def load_faster_whisper(model_size: str, device: str, compute_type: str, cpu_threads: int = 0):
+    """加载 faster-whisper 模型（cpu_threads=0 表示使用库默认值）"""
+    from faster_whisper import WhisperModel
+    return WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+@dataclass
+class ModelStats:
+    """单个模型的统计"""
+    loads: int = 0
+    load_seconds: float = 0.0
+    transcriptions: int = 0
+    transcribe_seconds: float = 0.0
+    audio_seconds: float = 0.0
+    evictions: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for name in ("load_seconds", "transcribe_seconds", "audio_seconds"):
+            data[name] = round(data[name], 3)
+        return data
+
+
+@dataclass
+class _PoolEntry:
+    model: Any
+    size_gb: float
+    last_used: float = field(default_factory=time.time)
+    in_use: int = 0
+
+
+class WhisperModelPool:
+    """Whisper 模型池（进程内单例）"""
+
+    def __init__(
+        self,
+        max_memory_gb: Optional[float] = None,
+        idle_timeout: float = 900,
+        loader: Callable[[str, str, str], Any] = load_faster_whisper
+    ):
+        """
+        Args:
+            max_memory_gb: 模型总内存上限（None 表示按 MemoryProfile 自动计算）
+            idle_timeout: 空闲淘汰时间（秒），0 表示不淘汰
+            loader: 模型加载函数 (model_size, device, compute_type) -> model
+        """
+        self.max_memory_gb = max_memory_gb if max_memory_gb else self._detect_memory_cap()
+        self.idle_timeout = idle_timeout
+        self.loader = loader
+
+        self._entries: Dict[ModelKey, _PoolEntry] = {}
+        self._stats: Dict[ModelKey, ModelStats] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[ModelKey, threading.Lock] = {}
+
+        self._janitor: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _detect_memory_cap() -> float:
+        """按 MemoryProfile 计算内存上限"""
+        try:
+            from ..core.runtime_profile import get_runtime_profile
+            total_gb = get_runtime_profile().memory.total_gb
+        except Exception:
+            from ..core.runtime_profile import MemoryProfile
+            total_gb = MemoryProfile.detect().total_gb
+        return round(max(total_gb * DEFAULT_MEMORY_FRACTION, MODEL_MEMORY_GB["base"]), 1)
+
+    @contextmanager
+    def acquire(
+        self,
+        model_size: str,
+        device: str = "cpu",
+        compute_type: str = "int8"
+    ) -> Iterator[Any]:
+        """
+        借用模型（使用期间不会被淘汰）
+
+        用法:
+            with pool.acquire("base") as model:
+                segments, info = model.transcribe(...)
+        """
+        key = (model_size, device, compute_type)
+        entry = self._get_or_load(key)
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+
+    def record_transcription(
+        self,
+        model_size: str,
+        device: str,
+        compute_type: str,
+        seconds: float,
+        audio_seconds: float = 0.0
+    ):
+        """记录一次转录耗时"""
+        key = (model_size, device, compute_type)
+        with self._lock:
+            stats = self._stats.setdefault(key, ModelStats())
+            stats.transcriptions += 1
+            stats.transcribe_seconds += seconds
+            stats.audio_seconds += audio_seconds
+
+    def warmup(self, model_size: str, device: str = "cpu", compute_type: str = "int8") -> float:
+        """
+        预加载模型
+
+        Returns:
+            加载耗时（秒），已加载时为 0
+        """
+        start = time.time()
+        with self.acquire(model_size, device, compute_type):
+            pass
+        return time.time() - start
+
+    def evict_idle(self, now: Optional[float] = None) -> List[ModelKey]:
+        """淘汰超过 idle_timeout 未使用的空闲模型"""
+        if not self.idle_timeout:
+            return []
+
+        now = now or time.time()
+        with self._lock:
+            expired = [
+                key for key, entry in self._entries.items()
+                if entry.in_use == 0 and now - entry.last_used > self.idle_timeout
+            ]
+            for key in expired:
+                self._evict(key)
+
+        if expired:
+            gc.collect()
+            for key in expired:
+                print(f"♻️  Whisper 模型空闲释放: {key[0]} ({key[1]}/{key[2]})")
+        return expired
+
+    def clear(self):
+        """释放所有空闲模型"""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.in_use == 0]:
+                self._evict(key)
+        gc.collect()
+
+    def shutdown(self):
+        """停止后台线程并释放模型"""
+        self._stop_event.set()
+        self.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息（加载耗时与转录耗时分开）"""
+        with self._lock:
+            loaded = {
+                self._key_name(key): {
+                    "size_gb": entry.size_gb,
+                    "in_use": entry.in_use,
+                    "idle_seconds": round(time.time() - entry.last_used, 1)
+                }
+                for key, entry in self._entries.items()
+            }
+            models = {self._key_name(key): stats.to_dict() for key, stats in self._stats.items()}
+            used_gb = sum(entry.size_gb for entry in self._entries.values())
+
+        return {
+            "max_memory_gb": self.max_memory_gb,
+            "used_memory_gb": round(used_gb, 2),
+            "idle_timeout": self.idle_timeout,
+            "loaded": loaded,
+            "models": models,
+            "total_load_seconds": round(sum(m["load_seconds"] for m in models.values()), 3),
+            "total_transcribe_seconds": round(sum(m["transcribe_seconds"] for m in models.values()), 3)
+        }
+
+    def _get_or_load(self, key: ModelKey) -> _PoolEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.in_use += 1
+                entry.last_used = time.time()
+                return entry
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 同一个键只加载一次，其他请求等待
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.in_use += 1
+                    entry.last_used = time.time()
+                    return entry
+
+                size_gb = estimate_model_gb(key[0])
+                self._make_room(size_gb)
+
+            print(f"📥 加载 Whisper 模型: {key[0]} ({key[1]}/{key[2]})")
+            start = time.time()
+            model = self.loader(*key)
+            load_seconds = time.time() - start
+            print(f"✓ Whisper 模型已加载: {key[0]} ({load_seconds:.1f}s)")
+
+            with self._lock:
+                entry = _PoolEntry(model=model, size_gb=size_gb, in_use=1)
+                self._entries[key] = entry
+                stats = self._stats.setdefault(key, ModelStats())
+                stats.loads += 1
+                stats.load_seconds += load_seconds
+
+        self._ensure_janitor()
+        return entry
+
+    def _make_room(self, size_gb: float):
+        """按 LRU 淘汰空闲模型，直到新模型放得下（调用方持有锁）"""
+        used_gb = sum(entry.size_gb for entry in self._entries.values())
+        idle = sorted(
+            (item for item in self._entries.items() if item[1].in_use == 0),
+            key=lambda item: item[1].last_used
+        )
+
+        for key, entry in idle:
+            if used_gb + size_gb <= self.max_memory_gb:
+                break
+            self._evict(key)
+            used_gb -= entry.size_gb
+            print(f"♻️  Whisper 模型池超出内存上限，释放: {key[0]} ({key[1]}/{key[2]})")
+
+        if used_gb + size_gb > self.max_memory_gb:
+            print(f"⚠️  Whisper 模型池超出内存上限 ({used_gb + size_gb:.1f}/{self.max_memory_gb}GB)，模型均在使用中")
+
+    def _evict(self, key: ModelKey):
+        """移除模型（调用方持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._stats.setdefault(key, ModelStats()).evictions += 1
+
+    def _ensure_janitor(self):
+        """启动空闲淘汰线程"""
+        if not self.idle_timeout or (self._janitor and self._janitor.is_alive()):
+            return
+
+        def run():
+            interval = max(1.0, min(60.0, self.idle_timeout / 4))
+            while not self._stop_event.wait(interval):
+                self.evict_idle()
+
+        self._stop_event.clear()
+        self._janitor = threading.Thread(target=run, daemon=True, name="whisper-pool-janitor")
+        self._janitor.start()
+
+    @staticmethod
+    def _key_name(key: ModelKey) -> str:
+        return "/".join(key)
+
+
+# 全局单例
+_whisper_pool: Optional[WhisperModelPool] = None
+
+
+def get_whisper_pool() -> WhisperModelPool:
+    """获取全局 Whisper 模型池（单例）"""
+    global _whisper_pool
+    if _whisper_pool is None:
+        _whisper_pool = WhisperModelPool(
+            max_memory_gb=settings.WHISPER_POOL_MAX_GB or None,
+            idle_timeout=settings.WHISPER_POOL_IDLE_SEC
+        )
+    return _whisper_pool
@@ -0,0 +1,99 @@
+"""
+基准测试：批量关键帧提取 vs 逐场景 ffmpeg 截帧
+
+用法:
+    python bench_frame_extractor.py                      # 自动生成 60 秒测试视频
+    python bench_frame_extractor.py <video.mp4> [场景数]
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools.frame_extractor import KeyframeExtractor, extract_single_frame
+
+
+def make_test_video(path: Path, duration: int = 60, fps: int = 30):
+    """用 lavfi testsrc 生成测试视频"""
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc=size=1280x720:rate={fps}:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-y", str(path)
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def probe_fps_and_frames(path: str) -> tuple[float, int]:
+    """获取 fps 和总帧数"""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=r_frame_rate,nb_frames,duration",
+         "-of", "default=nw=1", path],
+        capture_output=True, text=True, check=True
+    )
+    info = dict(line.split("=", 1) for line in result.stdout.strip().splitlines())
+    num, den = info["r_frame_rate"].split("/")
+    fps = float(num) / float(den)
+    if info.get("nb_frames", "N/A").isdigit():
+        total = int(info["nb_frames"])
+    else:
+        total = int(float(info["duration"]) * fps)
+    return fps, total
+
+
+def main():
+    if not shutil.which("ffmpeg"):
+        print("❌ 未找到 ffmpeg，无法运行基准测试")
+        sys.exit(1)
+
+    tmp_dir = None
+    if len(sys.argv) > 1:
+        video_path = sys.argv[1]
+        fps, total_frames = probe_fps_and_frames(video_path)
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        video_path = str(Path(tmp_dir) / "bench.mp4")
+        print("🎬 生成 60 秒测试视频...")
+        make_test_video(Path(video_path))
+        fps, total_frames = 30.0, 60 * 30
+
+    scene_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    # 均匀分布的场景中点
+    step = total_frames / scene_count
+    frame_numbers = [int(step * i + step / 2) for i in range(scene_count)]
+
+    print(f"\n📹 视频: {video_path}")
+    print(f"   fps={fps:.2f}, 总帧数={total_frames}, 场景数={scene_count}")
+
+    # 旧路径：逐场景 ffmpeg
+    print("\n[1/2] 逐场景截帧（旧路径）...")
+    t0 = time.perf_counter()
+    old_ok = sum(1 for n in frame_numbers if extract_single_frame(video_path, n / fps))
+    old_time = time.perf_counter() - t0
+    print(f"  ✓ {old_ok}/{scene_count} 帧, {old_time:.2f}s, {scene_count} 个 ffmpeg 进程")
+
+    # 新路径：单进程批量
+    print("\n[2/2] 批量截帧（KeyframeExtractor）...")
+    extractor = KeyframeExtractor(cache_max_mb=0)
+    t0 = time.perf_counter()
+    frames = extractor.extract_frames(video_path, frame_numbers)
+    new_time = time.perf_counter() - t0
+    stats = extractor.get_stats()
+    print(f"  ✓ {len(frames)}/{scene_count} 帧, {new_time:.2f}s, {stats['ffmpeg_processes']} 个 ffmpeg 进程")
+
+    print("\n" + "=" * 60)
+    print(f"加速比: {old_time / new_time:.1f}x" if new_time > 0 else "加速比: N/A")
+    print("=" * 60)
+
+    if tmp_dir:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
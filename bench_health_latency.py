@@ -0,0 +1,159 @@
+"""
+基准测试：转码进行中 /health 的响应延迟
+
+对比三种情况下 /health 的 p50 / p99 / max：
+- 空闲
+- 旧实现：async 路由里直接 subprocess.run（ffmpeg 期间事件循环被卡住）
+- 当前实现：GET /api/jobs/{job_id}/preview（asyncio 子进程）
+
+用法:
+    python bench_health_latency.py              # 自动生成 20 秒 1080p 测试视频
+    python bench_health_latency.py <video.mp4>
+"""
+import http.client
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.config import settings
+
+
+def make_test_video(path: Path, duration: int = 20):
+    """用 lavfi testsrc 生成 1080p 测试视频"""
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc=size=1920x1080:rate=30:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest",
+        "-y", str(path)
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def probe_health(port: int, stop: threading.Event, min_duration: float = 0.0) -> list:
+    """持续请求 /health（间隔 20ms），返回每次的延迟（毫秒）"""
+    latencies = []
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    started = time.perf_counter()
+    while not stop.is_set() or time.perf_counter() - started < min_duration:
+        t0 = time.perf_counter()
+        conn.request("GET", "/health")
+        conn.getresponse().read()
+        latencies.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.02)
+    conn.close()
+    return latencies
+
+
+def run_case(name: str, port: int, path: str = None, idle_seconds: float = 3.0):
+    stop = threading.Event()
+    result = {}
+
+    def heavy():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+        t0 = time.perf_counter()
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        result["status"] = response.status
+        result["seconds"] = time.perf_counter() - t0
+        conn.close()
+        stop.set()
+
+    worker = None
+    if path:
+        worker = threading.Thread(target=heavy)
+        worker.start()
+        time.sleep(0.2)  # 让转码先开始
+        latencies = probe_health(port, stop)
+        worker.join()
+    else:
+        stop.set()
+        latencies = probe_health(port, stop, min_duration=idle_seconds)
+
+    extra = f"  (转码 {result['seconds']:.1f}s, HTTP {result['status']})" if path else ""
+    print(
+        f"  {name:<28} n={len(latencies):<4} "
+        f"p50={percentile(latencies, 50):7.1f}ms  "
+        f"p99={percentile(latencies, 99):8.1f}ms  "
+        f"max={max(latencies):8.1f}ms{extra}"
+    )
+
+
+def main():
+    if not shutil.which("ffmpeg"):
+        print("❌ 未找到 ffmpeg，无法运行基准测试")
+        sys.exit(1)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        # 任务目录放在临时目录（必须在导入路由之前设置）
+        settings.JOBS_DIR = tmp_dir / "jobs"
+        settings.JOBS_DIR.mkdir()
+
+        import uvicorn
+        from app.core.job_store import JobStore
+        from app.main import app
+
+        store = JobStore()
+        job_id = store.create_job()
+        source = store.job_dir(job_id) / "output" / "final.mp4"
+        if len(sys.argv) > 1:
+            shutil.copy(sys.argv[1], source)
+        else:
+            print("生成 20 秒 1080p 测试视频...")
+            make_test_video(source)
+
+        @app.get("/bench/legacy-preview")
+        async def legacy_preview():
+            """旧实现：事件循环里同步执行 ffmpeg"""
+            output = tmp_dir / "legacy_preview.mp4"
+            subprocess.run(
+                ["ffmpeg", "-i", str(source), "-vf", "scale=-2:720", "-b:v", "1000k",
+                 "-c:v", "libx264", "-preset", "fast", "-c:a", "aac", "-b:a", "128k",
+                 "-y", str(output)],
+                capture_output=True,
+                text=True
+            )
+            return {"ok": True}
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"
+        ))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+
+        print("\n/health 延迟（每 20ms 一次）:")
+        run_case("空闲", port)
+        run_case("旧实现: subprocess.run", port, "/bench/legacy-preview")
+        run_case("当前: preview (asyncio 子进程)", port, f"/api/jobs/{job_id}/preview?quality=720p")
+
+        server.should_exit = True
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
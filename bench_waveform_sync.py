@@ -0,0 +1,118 @@
+"""
+基准测试：波形互相关对齐（合成偏移片段）
+
+1. 互相关：不同时长（1 分钟 ~ 1 小时）的包络做 FFT 互相关，记录耗时与偏移误差
+2. 端到端：合成 48kHz WAV，经 ffmpeg 流式解码 + 互相关，记录耗时与峰值内存
+
+用法:
+    python bench_waveform_sync.py              # 互相关 + 端到端（10 分钟片段）
+    python bench_waveform_sync.py 3600         # 端到端使用 1 小时片段
+"""
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools.waveform_sync import HOP_SEC, cross_correlate, decode_envelope
+
+
+def synth_onsets(seconds: float, seed: int) -> np.ndarray:
+    """合成起音包络（10ms 一帧的稀疏瞬态 + 噪声）"""
+    rng = np.random.default_rng(seed)
+    frames = int(seconds / HOP_SEC)
+    env = rng.normal(0, 0.3, frames)
+    hits = rng.choice(frames, size=frames // 30, replace=False)
+    env[hits] += rng.uniform(2, 8, len(hits))
+    return env.astype(np.float32)
+
+
+def bench_correlation():
+    print("\n[1] FFT 互相关（包络 100 帧/秒）")
+    print(f"  {'时长':>8s} {'耗时':>10s} {'偏移误差':>10s} {'置信度':>8s}")
+    for seconds in (60, 600, 1800, 3600):
+        scene = synth_onsets(seconds + 60, seed=seconds)
+        true_offset = 37.42
+        video = scene[:int(seconds / HOP_SEC)]
+        start = int(true_offset / HOP_SEC)
+        audio = scene[start:start + int(seconds / HOP_SEC)] * 0.5
+        audio = audio + np.random.default_rng(1).normal(0, 0.3, len(audio)).astype(np.float32)
+
+        t0 = time.time()
+        offset, confidence = cross_correlate(video, audio)
+        elapsed = time.time() - t0
+        error = abs(offset - round(true_offset / HOP_SEC) * HOP_SEC)
+        print(f"  {seconds:>7d}s {elapsed * 1000:>8.1f}ms {error * 1000:>8.1f}ms {confidence:>8.2f}")
+
+
+def write_scene_wav(path: Path, scene: np.ndarray, start_sec: float, seconds: float,
+                    gain: float, seed: int, sample_rate: int = 48000):
+    """按 10 秒一块写入 WAV（只在内存中保留一块 PCM）"""
+    rng = np.random.default_rng(seed)
+    block_sec = 10
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        t = 0.0
+        while t < seconds:
+            length = min(block_sec, seconds - t)
+            # 包络帧 → 该帧内的噪声幅度
+            first = int((start_sec + t) / HOP_SEC)
+            frames = scene[first:first + int(length / HOP_SEC)]
+            amplitude = np.repeat(np.maximum(frames, 0) * 2000 * gain + 30, int(sample_rate * HOP_SEC))
+            samples = rng.normal(0, 1, len(amplitude)) * amplitude
+            wav.writeframes(np.clip(samples, -32768, 32767).astype(np.int16).tobytes())
+            t += length
+
+
+def bench_end_to_end(seconds: float):
+    print(f"\n[2] 端到端：ffmpeg 流式解码 + 互相关（{seconds:.0f} 秒，48kHz）")
+    if not shutil.which("ffmpeg"):
+        print("  ⚠️  未找到 ffmpeg，跳过")
+        return
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        true_offset = 12.34
+        scene = synth_onsets(seconds + 60, seed=7)
+        video_path = tmp_dir / "video.wav"
+        audio_path = tmp_dir / "audio.wav"
+        write_scene_wav(video_path, scene, 0.0, seconds, 1.0, seed=1)
+        write_scene_wav(audio_path, scene, true_offset, seconds, 0.4, seed=2)
+        size_mb = (video_path.stat().st_size + audio_path.stat().st_size) / 1024 / 1024
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        t0 = time.time()
+        video_env = decode_envelope(str(video_path))
+        audio_env = decode_envelope(str(audio_path))
+        decode_time = time.time() - t0
+
+        t0 = time.time()
+        offset, confidence = cross_correlate(video_env, audio_env)
+        corr_time = time.time() - t0
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        print(f"  输入: 2 × {seconds:.0f}s WAV ({size_mb:.0f} MB)")
+        print(f"  解码 + 包络: {decode_time:.2f}s")
+        print(f"  互相关: {corr_time * 1000:.1f}ms")
+        print(f"  偏移: {offset:.3f}s (期望 {true_offset}), 置信度 {confidence:.2f}")
+        print(f"  峰值内存增长: {max(0.0, rss_after - rss_before):.0f} MB")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 600
+    bench_correlation()
+    bench_end_to_end(seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -126,7 +126,7 @@ class Pipeline:
                 self.print_info("使用 Whisper 转录音频（可能需要几分钟）...")
                 transcript_data = transcribe_audio(
                     audio_path,
-                    model=self.config.get("whisper_model", "base"),
+                    model_size=self.config.get("whisper_model", "base"),
                     language=self.config.get("language", "zh")
                 )
                 
@@ -0,0 +1,270 @@
+"""
+测试分块并行 ASR
+
+测试内容：
+1. 切块规划：优先静音中点，找不到静音时硬切并加重叠
+2. 静音区间解析（与 ModalityAnalyzer 共用）
+3. WAV 片段读取
+4. 分块转录 + 拼接：时间戳正确、接缝无重复词
+"""
+import shutil
+import sys
+import tempfile
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools import whisper_pool as whisper_pool_module
+from app.tools.asr_parallel import (
+    SAMPLE_RATE,
+    plan_chunks,
+    read_wav_slice,
+    stitch_chunks,
+    _transcribe_chunk
+)
+from app.tools.modality_analyzer import ModalityAnalyzer
+from app.tools.whisper_pool import WhisperModelPool
+
+
+# 合成音频：第 k 秒的 [k, k+0.5) 是"单词 k"（幅度编码 k），其余为静音
+def _write_word_wav(path: Path, seconds: int):
+    samples = np.zeros(seconds * SAMPLE_RATE, dtype=np.int16)
+    for k in range(seconds):
+        first = k * SAMPLE_RATE
+        samples[first:first + SAMPLE_RATE // 2] = (k + 1) * 10
+
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+
+
+class _Word:
+    def __init__(self, start, end, word):
+        self.start, self.end, self.word = start, end, word
+
+
+class _Segment:
+    def __init__(self, words):
+        self.words = words
+        self.start = words[0].start
+        self.end = words[-1].end
+        self.text = "".join(w.word for w in words)
+
+
+class _Info:
+    language = "zh"
+
+
+class FakeWhisperModel:
+    """按幅度把非零片段识别为单词，时间戳相对于输入数组"""
+
+    def transcribe(self, audio, language=None, word_timestamps=True, vad_filter=True):
+        values = np.rint(audio * 32768).astype(np.int32)
+        nonzero = values != 0
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], nonzero.astype(np.int8), [0]))))
+
+        words = []
+        for run_start, run_end in zip(edges[::2], edges[1::2]):
+            k = values[run_start] // 10 - 1
+            words.append(_Word(run_start / SAMPLE_RATE, run_end / SAMPLE_RATE, f" w{k}"))
+
+        segments = [_Segment(words[i:i + 4]) for i in range(0, len(words), 4)]
+        return iter(segments), _Info()
+
+
+def test_plan_chunks():
+    """测试 1: 切块规划"""
+    print("\n" + "=" * 70)
+    print("测试 1: 切块规划")
+    print("=" * 70)
+
+    # 静音中点：100, 290, 310, 620
+    silences = [(99.0, 101.0), (289.0, 291.0), (309.0, 311.0), (619.0, 621.0)]
+    chunks = plan_chunks(900, silences, target_sec=300, min_sec=120, max_sec=480)
+
+    cuts = [c.start for c in chunks[1:]]
+    print(f"  切点: {cuts}")
+    assert cuts == [290.0, 620.0]  # 290 与 310 距目标等距，取较早的
+    assert all(c.read_start == c.start for c in chunks[1:3]), "静音切点不需要重叠"
+
+    # 没有静音：硬切 + 重叠
+    hard = plan_chunks(900, [], target_sec=300, min_sec=120, max_sec=480, overlap_sec=1.5)
+    print(f"  硬切: {[(c.start, c.end, c.read_start, c.read_end) for c in hard]}")
+    assert [c.start for c in hard] == [0.0, 300.0, 600.0]
+    assert hard[0].read_end == 301.5
+    assert hard[1].read_start == 298.5 and hard[1].read_end == 601.5
+    assert hard[2].read_start == 598.5 and hard[2].read_end == 900
+
+    # 短音频不切
+    assert len(plan_chunks(200, silences)) == 1
+
+    print("  ✅ 切块规划正确")
+    return True
+
+
+def test_parse_silence_intervals():
+    """测试 2: 静音区间解析"""
+    print("\n" + "=" * 70)
+    print("测试 2: 静音区间解析")
+    print("=" * 70)
+
+    output = (
+        "[silencedetect @ 0x1] silence_start: 1.5\n"
+        "[silencedetect @ 0x1] silence_end: 2.75 | silence_duration: 1.25\n"
+        "[silencedetect @ 0x1] silence_start: 10\n"
+        "[silencedetect @ 0x1] silence_end: 12.5 | silence_duration: 2.5\n"
+    )
+    intervals = ModalityAnalyzer.parse_silence_intervals(output)
+    assert intervals == [(1.5, 2.75), (10.0, 12.5)]
+
+    features = ModalityAnalyzer()._parse_audio_stats(output)
+    assert features["silence_intervals"] == intervals
+    assert features["silence_duration"] == 3.75
+
+    print("  ✅ 静音区间解析正确")
+    return True
+
+
+def test_read_wav_slice():
+    """测试 3: WAV 片段读取"""
+    print("\n" + "=" * 70)
+    print("测试 3: WAV 片段读取")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        wav_path = tmp_dir / "words.wav"
+        _write_word_wav(wav_path, 5)
+
+        audio = read_wav_slice(str(wav_path), 2.0, 3.0)
+        assert audio.dtype == np.float32
+        assert len(audio) == SAMPLE_RATE
+        assert round(float(audio[0]) * 32768) == 30  # 单词 2
+        assert float(audio[-1]) == 0.0
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 片段读取正确")
+    return True
+
+
+def test_chunked_transcription_no_duplicates():
+    """测试 4: 分块转录 + 拼接"""
+    print("\n" + "=" * 70)
+    print("测试 4: 分块转录 + 拼接（接缝无重复）")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    original_pool = whisper_pool_module._whisper_pool
+    try:
+        wav_path = tmp_dir / "words.wav"
+        seconds = 40
+        _write_word_wav(wav_path, seconds)
+
+        whisper_pool_module._whisper_pool = WhisperModelPool(
+            max_memory_gb=4,
+            idle_timeout=0,
+            loader=lambda *key: FakeWhisperModel()
+        )
+
+        # 无静音信息 → 硬切在 10.25 / 20.5 / 30.75，切在单词中间
+        chunks = plan_chunks(seconds, [], target_sec=10.25, min_sec=4, max_sec=16, overlap_sec=1.5)
+        print(f"  块: {[(c.start, c.end) for c in chunks]}")
+        assert len(chunks) == 4
+
+        results = [
+            _transcribe_chunk(str(wav_path), chunk, "base", "cpu", "int8", None)["segments"]
+            for chunk in chunks
+        ]
+        segments = stitch_chunks(chunks, results)
+
+        words = " ".join(seg["text"] for seg in segments).split()
+        print(f"  词数: {len(words)}")
+        assert words == [f"w{k}" for k in range(seconds)], f"拼接结果错误: {words}"
+
+        # 时间戳是绝对时间
+        assert segments[0]["start"] == 0.0
+        starts = [seg["start"] for seg in segments]
+        assert starts == sorted(starts)
+        assert abs(segments[-1]["end"] - (seconds - 1 + 0.5)) < 1e-6
+    finally:
+        whisper_pool_module._whisper_pool = original_pool
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 时间戳正确，接缝无重复 / 无丢词")
+    return True
+
+
+def test_seam_duplicate_word():
+    """测试 5: 接缝处同一个词被两块都识别时去重"""
+    print("\n" + "=" * 70)
+    print("测试 5: 接缝重复词去重")
+    print("=" * 70)
+
+    chunks = plan_chunks(20, [(9.8, 10.2)], target_sec=10, min_sec=4, max_sec=12)
+    assert [c.start for c in chunks] == [0.0, 10.0]
+
+    # 块 0 把 "今天" 识别在 9.95，块 1 又在 10.05 识别了一次
+    first = [{"start": 8.0, "end": 10.0, "text": "我们 今天", "words": [
+        {"start": 8.0, "end": 9.0, "word": "我们"},
+        {"start": 9.95, "end": 10.0, "word": " 今天"},
+    ]}]
+    second = [{"start": 10.05, "end": 12.0, "text": "今天 讲课", "words": [
+        {"start": 10.05, "end": 10.4, "word": "今天"},
+        {"start": 11.0, "end": 12.0, "word": " 讲课"},
+    ]}]
+
+    segments = stitch_chunks(chunks, [first, second])
+    print(f"  结果: {[s['text'] for s in segments]}")
+    assert [s["text"] for s in segments] == ["我们 今天", "讲课"]
+
+    print("  ✅ 接缝重复词已去除")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("分块并行 ASR 测试")
+    print("=" * 70)
+
+    tests = [
+        ("切块规划", test_plan_chunks),
+        ("静音区间解析", test_parse_silence_intervals),
+        ("WAV 片段读取", test_read_wav_slice),
+        ("分块转录拼接", test_chunked_transcription_no_duplicates),
+        ("接缝重复词去重", test_seam_duplicate_word),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
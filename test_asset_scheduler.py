@@ -0,0 +1,315 @@
+"""
+测试按素材的任务图调度器（SmartPipeline Step 2-7）
+
+测试内容：
+1. 依赖顺序、各资源并发上限、条件跳过、耗时记录
+2. 流式推进：素材 1 的 Vision 不等最后一个素材的模态分析；ASR 与 Vision 并行
+3. 节点失败：不再启动新节点，等待运行中的节点结束后抛出
+4. Orchestrator 资源：全局 VISION 槽位、开关关闭时等待、借用本 job 已持有的槽位
+5. 等待超时：开关一直关闭 / 槽位一直被占用时节点抛出 ResourceTimeout，流水线不会挂起
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.orchestrator import ResourceLock, ResourceTimeout
+from app.tools import asset_scheduler as asset_scheduler_module
+from app.tools.asset_scheduler import AssetScheduler
+
+
+class Tracker:
+    """记录每种资源同时运行的节点数和每个节点的起止时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.spans = {}
+
+    def task(self, resource: str, key: str, seconds: float = 0.02, result=None):
+        def run():
+            with self._lock:
+                self.running[resource] = self.running.get(resource, 0) + 1
+                self.peak[resource] = max(self.peak.get(resource, 0), self.running[resource])
+            start = time.perf_counter()
+            time.sleep(seconds)
+            with self._lock:
+                self.running[resource] -= 1
+                self.spans[key] = (start, time.perf_counter())
+            return result
+        return run
+
+
+def test_dependencies_and_limits():
+    """测试 1: 依赖与并发上限"""
+    print("\n" + "=" * 70)
+    print("测试 1: 依赖与并发上限")
+    print("=" * 70)
+
+    tracker = Tracker()
+    scheduler = AssetScheduler({"cpu": 2, "asr": 1, "vision": 3})
+    for i in range(6):
+        asset_id = f"V{i + 1:03d}"
+        scheduler.add(asset_id, "modality", tracker.task("cpu", f"{asset_id}/modality", result=i))
+        scheduler.add(asset_id, "asr", tracker.task("asr", f"{asset_id}/asr"), resource="asr",
+                      deps=["modality"], condition=lambda i=i: i % 2 == 0)
+        scheduler.add(asset_id, "vision", tracker.task("vision", f"{asset_id}/vision"), resource="vision",
+                      deps=["asr"])
+
+    try:
+        scheduler.add("V001", "fuse", lambda: None, resource="gpu")
+        assert False, "未配置的资源应该报错"
+    except ValueError:
+        pass
+    try:
+        scheduler.add("V001", "fuse", lambda: None, deps=["missing"])
+        assert False, "依赖不存在应该报错"
+    except ValueError:
+        pass
+
+    results = scheduler.run()
+    print(f"  并发峰值: {tracker.peak}")
+    assert tracker.peak["cpu"] <= 2 and tracker.peak["asr"] == 1 and tracker.peak["vision"] <= 3
+    assert results["V003"]["modality"] == 2
+
+    for i in range(6):
+        asset_id = f"V{i + 1:03d}"
+        modality_end = tracker.spans[f"{asset_id}/modality"][1]
+        assert tracker.spans[f"{asset_id}/vision"][0] >= modality_end
+        if i % 2 == 0:
+            assert tracker.spans[f"{asset_id}/vision"][0] >= tracker.spans[f"{asset_id}/asr"][1]
+        else:
+            # 条件不满足：跳过，不占用 ASR
+            assert f"{asset_id}/asr" not in tracker.spans
+
+    timings = scheduler.asset_timings()
+    assert timings["V002"]["stages"]["asr"] == {"skipped": True}
+    assert timings["V001"]["stages"]["vision"]["run_sec"] >= 0.015
+    assert timings["V006"]["elapsed_sec"] > 0
+    stats = scheduler.get_stats()
+    print(f"  资源统计: {stats}")
+    assert stats["asr"]["tasks"] == 3 and stats["vision"]["peak_running"] <= 3
+
+    print("  ✅ 依赖 / 上限 / 跳过 / 耗时正确")
+    return True
+
+
+def test_streaming():
+    """测试 2: 素材流式推进"""
+    print("\n" + "=" * 70)
+    print("测试 2: 素材流式推进")
+    print("=" * 70)
+
+    tracker = Tracker()
+    count = 8
+    scheduler = AssetScheduler({"cpu": 1, "asr": 1, "vision": 2})
+    for i in range(count):
+        asset_id = f"V{i + 1:03d}"
+        talking = i % 2 == 0
+        scheduler.add(asset_id, "modality", tracker.task("cpu", f"{asset_id}/modality", 0.03))
+        scheduler.add(asset_id, "asr", tracker.task("asr", f"{asset_id}/asr", 0.08), resource="asr",
+                      deps=["modality"], condition=lambda talking=talking: talking)
+        scheduler.add(asset_id, "vision", tracker.task("vision", f"{asset_id}/vision", 0.08), resource="vision",
+                      deps=["asr"], condition=lambda talking=talking: not talking)
+
+    t0 = time.perf_counter()
+    scheduler.run()
+    elapsed = time.perf_counter() - t0
+
+    last_modality_end = tracker.spans[f"V{count:03d}/modality"][1]
+    first_vision_start = tracker.spans["V002/vision"][0]
+    overlaps = sum(
+        1
+        for a in range(0, count, 2)
+        for v in range(1, count, 2)
+        if tracker.spans[f"V{a + 1:03d}/asr"][0] < tracker.spans[f"V{v + 1:03d}/vision"][1]
+        and tracker.spans[f"V{v + 1:03d}/vision"][0] < tracker.spans[f"V{a + 1:03d}/asr"][1]
+    )
+    serial = count * 0.03 + count // 2 * 0.08 * 2
+    print(f"  V002 Vision 开始 {first_vision_start - t0:.2f}s, 最后一个模态分析结束 {last_modality_end - t0:.2f}s")
+    print(f"  ASR / Vision 重叠 {overlaps} 对, 总耗时 {elapsed:.2f}s（按步骤串行约 {serial:.2f}s）")
+    assert first_vision_start < last_modality_end
+    assert overlaps >= 1
+    assert elapsed < serial
+
+    print("  ✅ 素材不等其它素材的上游步骤")
+    return True
+
+
+def test_failure_drains():
+    """测试 3: 节点失败"""
+    print("\n" + "=" * 70)
+    print("测试 3: 节点失败")
+    print("=" * 70)
+
+    tracker = Tracker()
+    scheduler = AssetScheduler({"cpu": 3})
+
+    def boom():
+        time.sleep(0.01)
+        raise RuntimeError("模拟失败")
+
+    scheduler.add("V001", "modality", boom)
+    scheduler.add("V001", "segment", tracker.task("cpu", "V001/segment"), deps=["modality"])
+    scheduler.add("V002", "modality", tracker.task("cpu", "V002/modality", 0.1))
+    for i in range(3, 10):
+        scheduler.add(f"V{i:03d}", "modality", tracker.task("cpu", f"V{i:03d}/modality", 0.1))
+
+    try:
+        scheduler.run()
+        assert False, "应该抛出异常"
+    except RuntimeError as e:
+        assert str(e) == "模拟失败"
+
+    print(f"  已完成: {sorted(tracker.spans)}")
+    # 失败时正在运行的节点跑完（结果可以落盘），之后不再启动新节点
+    assert sorted(tracker.spans) == ["V002/modality", "V003/modality"]
+    assert tracker.running["cpu"] == 0
+
+    print("  ✅ 失败后排空运行中的节点再抛出")
+    return True
+
+
+def test_orchestrator_resources():
+    """测试 4: Orchestrator 资源"""
+    print("\n" + "=" * 70)
+    print("测试 4: Orchestrator 资源")
+    print("=" * 70)
+
+    original_poll = asset_scheduler_module.GATE_POLL_SEC
+    asset_scheduler_module.GATE_POLL_SEC = 0.01
+    try:
+        # 本地上限 4，全局 VISION 容量 2：最多 2 个同时运行
+        lock = ResourceLock({"VISION": 2, "AI": 1})
+        tracker = Tracker()
+        scheduler = AssetScheduler({"vision": 4, "ai": 4}, resource_lock=lock, owner="job_a")
+        for i in range(6):
+            asset_id = f"V{i + 1:03d}"
+            scheduler.add(asset_id, "vision", tracker.task("vision", f"{asset_id}/vision", 0.03), resource="vision")
+            scheduler.add(asset_id, "structure", tracker.task("ai", f"{asset_id}/structure", 0.01), resource="ai",
+                          deps=["vision"])
+        scheduler.run()
+        stats = lock.get_stats()
+        print(f"  并发峰值: {tracker.peak}, VISION 获取 {stats['VISION']['acquisitions']} 次")
+        assert tracker.peak["vision"] == 2 and tracker.peak["ai"] == 1
+        assert stats["VISION"]["acquisitions"] == 6 and stats["VISION"]["in_use"] == 0
+
+        # 开关关闭（Resolve 导出中）：Vision 节点等待
+        lock.disable("VISION_ALLOWED")
+        tracker = Tracker()
+        scheduler = AssetScheduler({"vision": 2}, resource_lock=lock, owner="job_b")
+        scheduler.add("V001", "vision", tracker.task("vision", "V001/vision"), resource="vision")
+        worker = threading.Thread(target=scheduler.run)
+        worker.start()
+        time.sleep(0.1)
+        assert tracker.spans == {}
+        lock.enable("VISION_ALLOWED")
+        worker.join(timeout=5)
+        assert "V001/vision" in tracker.spans
+        print(f"  开关关闭时等待 {scheduler.asset_timings()['V001']['stages']['vision']['wait_sec']:.2f}s")
+
+        # 本 job 已持有一个 VISION 槽位：节点依次使用该槽位，不再额外获取
+        lock.acquire("VISION", "job_c")
+        acquisitions = lock.get_stats()["VISION"]["acquisitions"]
+        tracker = Tracker()
+        scheduler = AssetScheduler({"vision": 3}, resource_lock=lock, owner="job_c")
+        for i in range(3):
+            scheduler.add(f"V{i + 1:03d}", "vision", tracker.task("vision", f"V{i + 1:03d}/vision"), resource="vision")
+        scheduler.run()
+        assert tracker.peak["vision"] == 1
+        assert lock.get_stats()["VISION"]["acquisitions"] == acquisitions
+        assert scheduler.get_stats()["vision"]["limit"] == 1
+        lock.release("VISION", "job_c")
+    finally:
+        asset_scheduler_module.GATE_POLL_SEC = original_poll
+
+    print("  ✅ 遵守全局资源容量与开关")
+    return True
+
+
+def test_resource_timeout():
+    """测试 5: 等待超时"""
+    print("\n" + "=" * 70)
+    print("测试 5: 等待超时")
+    print("=" * 70)
+
+    original_poll = asset_scheduler_module.GATE_POLL_SEC
+    asset_scheduler_module.GATE_POLL_SEC = 0.01
+    try:
+        # 开关一直关闭（例如某个 job 在 EXECUTING 中崩溃，没有调用 exit_state）
+        lock = ResourceLock({"VISION": 2, "AI": 1})
+        lock.disable("VISION_ALLOWED")
+        tracker = Tracker()
+        scheduler = AssetScheduler({"vision": 2}, resource_lock=lock, owner="job_a", resource_timeout=0.2)
+        scheduler.add("V001", "vision", tracker.task("vision", "V001/vision"), resource="vision")
+        t0 = time.perf_counter()
+        try:
+            scheduler.run()
+            assert False, "应该抛出 ResourceTimeout"
+        except ResourceTimeout as e:
+            print(f"  开关关闭: {e}（{time.perf_counter() - t0:.2f}s）")
+        assert tracker.spans == {} and time.perf_counter() - t0 < 2
+
+        # 开关打开但槽位一直被其它 job 占用：开关与槽位共用同一个等待期限
+        lock.enable("VISION_ALLOWED")
+        lock.acquire("VISION", "other_1")
+        lock.acquire("VISION", "other_2")
+        scheduler = AssetScheduler({"vision": 2}, resource_lock=lock, owner="job_b", resource_timeout=0.2)
+        scheduler.add("V001", "vision", tracker.task("vision", "V001/vision"), resource="vision")
+        try:
+            scheduler.run()
+            assert False, "应该抛出 ResourceTimeout"
+        except ResourceTimeout as e:
+            print(f"  槽位占满: {e}")
+        assert tracker.spans == {} and lock.get_stats()["VISION"]["timeouts"] == 1
+    finally:
+        asset_scheduler_module.GATE_POLL_SEC = original_poll
+
+    print("  ✅ 等待有上限，超时按节点失败处理")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("按素材调度测试")
+    print("=" * 70)
+
+    tests = [
+        ("依赖与并发上限", test_dependencies_and_limits),
+        ("素材流式推进", test_streaming),
+        ("节点失败", test_failure_drains),
+        ("Orchestrator 资源", test_orchestrator_resources),
+        ("等待超时", test_resource_timeout),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+测试 Ingest 单次解码音频分析
+
+测试内容：
+1. 静音 / 响度解析、有声区间
+2. sidecar 读写与查找（job 目录布局、源文件变化后失效）
+3. 模态分析 / 分段 / 波形匹配复用 sidecar，不再启动 ffmpeg
+4. 单次解码：WAV + 静音 + 响度 + 包络（需要 ffmpeg）
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools import audio_matcher as audio_matcher_module
+from app.tools import modality_analyzer as modality_module
+from app.tools.audio_analysis import (
+    AudioAnalysis,
+    extract_and_analyze,
+    find_audio_analysis,
+    parse_volume_stats,
+    sidecar_path_for,
+    speech_spans
+)
+from app.tools.audio_matcher import AudioMatcher
+from app.tools.modality_analyzer import ModalityAnalyzer
+from app.tools.smart_pipeline import SmartPipeline
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError("不应再次解码音频")
+
+
+def _make_job(tmp_dir: Path):
+    """job 目录布局：input/clip.mp4 + temp/clip.wav + sidecar"""
+    (tmp_dir / "input").mkdir()
+    (tmp_dir / "temp").mkdir()
+    video = tmp_dir / "input" / "clip.mp4"
+    video.write_bytes(b"fake video")
+    wav = tmp_dir / "temp" / "clip.wav"
+    wav.write_bytes(b"fake wav")
+
+    stat = os.stat(video)
+    analysis = AudioAnalysis(
+        source=str(video.absolute()),
+        source_size=stat.st_size,
+        source_mtime_ns=stat.st_mtime_ns,
+        wav_path=str(wav.absolute()),
+        sample_rate=16000,
+        duration=60.0,
+        has_audio=True,
+        mean_volume_db=-25.0,
+        max_volume_db=-5.0,
+        silence_intervals=[(10.0, 12.0), (30.0, 30.6), (40.0, 45.0)],
+        envelope=np.abs(np.sin(np.arange(6000) / 7.0)).astype(np.float32)
+    )
+    analysis.save()
+    return video, wav, analysis
+
+
+def test_parsers():
+    """测试 1: 解析与有声区间"""
+    print("\n" + "=" * 70)
+    print("测试 1: 解析与有声区间")
+    print("=" * 70)
+
+    output = (
+        "[Parsed_volumedetect_1 @ 0x1] mean_volume: -27.3 dB\n"
+        "[Parsed_volumedetect_1 @ 0x1] max_volume: -3.1 dB\n"
+    )
+    assert parse_volume_stats(output) == (-27.3, -3.1)
+    assert parse_volume_stats("") == (None, None)
+
+    spans = speech_spans(60.0, [(10.0, 12.0), (30.0, 30.6), (40.0, 45.0), (59.8, 60.0)])
+    print(f"  有声区间: {spans}")
+    # 0.6s 的停顿不切分；末尾 0.2s 静音不足 min_silence 也不切
+    assert spans == [(0.0, 10.0), (12.0, 40.0), (45.0, 60.0)]
+
+    print("  ✅ 解析正确")
+    return True
+
+
+def test_sidecar_lookup():
+    """测试 2: sidecar 查找与失效"""
+    print("\n" + "=" * 70)
+    print("测试 2: sidecar 查找与失效")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        video, wav, analysis = _make_job(tmp_dir)
+        assert sidecar_path_for(wav).name == "clip.analysis.json"
+
+        found = find_audio_analysis(str(video))
+        assert found is not None
+        assert found.silence_intervals == analysis.silence_intervals
+        assert len(found.envelope) == 6000
+
+        # 也可以用 WAV 本身查找
+        assert find_audio_analysis(str(wav)) is not None
+
+        # 源文件变化 → 失效
+        time.sleep(0.01)
+        video.write_bytes(b"fake video v2")
+        assert find_audio_analysis(str(video)) is None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 查找 / 失效正确")
+    return True
+
+
+def test_consumers_reuse_sidecar():
+    """测试 3: 模态分析 / 分段 / 波形匹配复用 sidecar"""
+    print("\n" + "=" * 70)
+    print("测试 3: 下游复用 sidecar")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    original_run = modality_module.subprocess.run
+    original_decode = audio_matcher_module.decode_envelope
+    try:
+        video, wav, analysis = _make_job(tmp_dir)
+        modality_module.subprocess.run = _fail
+        audio_matcher_module.decode_envelope = _fail
+
+        # 模态分析
+        analyzer = ModalityAnalyzer()
+        features = analyzer._extract_audio_features(str(video))
+        print(f"  语音占比: {features['speech_ratio']:.2f}, 静音段: {features['speech_segments']}")
+        assert features["has_audio"] is True
+        assert features["duration"] == 60.0
+        assert abs(features["silence_duration"] - 7.6) < 1e-6
+        assert features["volume_variance"] == 20.0
+        assert analyzer.detect_silences(str(video)) == analysis.silence_intervals
+
+        # 参数不同 → 不复用
+        other = ModalityAnalyzer()
+        other.speech_min_duration = 1.0
+        assert other._find_analysis(str(video)) is None
+
+        # 分段
+        job_dir = tmp_dir / "job"
+        job_dir.mkdir()
+        pipeline = SmartPipeline(job_dir)
+        segments = pipeline._segment_assets(
+            {"videos": [{"asset_id": "V001", "path": str(video), "duration": 60.0}], "audios": []},
+            {"V001": {"mode": "ASR_PRIMARY"}}
+        )
+        print(f"  分段: {[(s['start_sec'], s['end_sec']) for s in segments]}")
+        assert [(s["start_sec"], s["end_sec"]) for s in segments] == [(0.0, 10.0), (12.0, 40.0), (45.0, 60.0)]
+        assert segments[1]["seg_id"] == "V001_S002"
+
+        # 波形匹配包络
+        matcher = AudioMatcher()
+        envelope = matcher._get_envelope(str(video))
+        assert len(envelope) == 6000
+    finally:
+        modality_module.subprocess.run = original_run
+        audio_matcher_module.decode_envelope = original_decode
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 模态分析 / 分段 / 波形匹配均未重新解码")
+    return True
+
+
+def test_single_decode():
+    """测试 4: 单次解码（需要 ffmpeg）"""
+    print("\n" + "=" * 70)
+    print("测试 4: 单次解码")
+    print("=" * 70)
+
+    if not shutil.which("ffmpeg"):
+        print("  ⚠️  未找到 ffmpeg，跳过")
+        return True
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        # 48kHz 立体声：0-3s 有声，3-5s 静音，5-8s 有声
+        rate = 48000
+        rng = np.random.default_rng(0)
+        mono = rng.normal(0, 3000, 8 * rate)
+        mono[3 * rate:5 * rate] = 0
+        stereo = np.repeat(mono.astype(np.int16)[:, None], 2, axis=1)
+        source = tmp_dir / "take.wav"
+        with wave.open(str(source), "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(stereo.tobytes())
+
+        out = tmp_dir / "temp" / "take_16k.wav"
+        analysis = extract_and_analyze(str(source), str(out))
+        print(f"  {analysis.to_dict()}")
+
+        with wave.open(str(out), "rb") as w:
+            assert w.getframerate() == 16000 and w.getnchannels() == 1
+            assert abs(w.getnframes() / 16000 - 8.0) < 0.05
+        assert analysis.has_audio
+        assert len(analysis.silence_intervals) == 1
+        start, end = analysis.silence_intervals[0]
+        assert abs(start - 3.0) < 0.05 and abs(end - 5.0) < 0.05
+        assert abs(len(analysis.envelope) - 800) <= 2
+        assert float(analysis.envelope[400]) == 0.0 and float(analysis.envelope[100]) > 1000
+
+        found = find_audio_analysis(str(source))
+        assert found is not None and found.wav_path == str(out.absolute())
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 一次 ffmpeg 输出 WAV + 静音 + 响度 + 包络")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("Ingest 单次解码音频分析测试")
+    print("=" * 70)
+
+    tests = [
+        ("解析与有声区间", test_parsers),
+        ("sidecar 查找", test_sidecar_lookup),
+        ("下游复用", test_consumers_reuse_sidecar),
+        ("单次解码", test_single_decode),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+测试分层 DSL 规划（初筛 map → 成片 reduce）
+
+测试内容：
+1. 窗口切分与并发初筛：每个窗口一次调用，按 LLM_MAP_CONCURRENCY 并发
+2. 成片只收到候选镜头和相关字幕，输出通过 DSLValidator（越界 / 不存在的镜头被修复）
+3. 初筛失败的窗口按镜头价值选取候选，不影响其它窗口；超过截止时间后不再发起初筛 / 成片请求
+4. LLMDirector 超出预算时自动改用分层规划（请求超时传给每次调用），素材较少时仍是一次调用
+"""
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.config import settings
+from app.core import llm_client, llm_engine
+from app.core.dsl_planner import SHORTLIST_SYSTEM_PROMPT, HierarchicalPlanner
+from app.core.llm_client import LLMDeadlineExceeded
+from app.core.prompt_compiler import PromptCompiler
+from app.models.dsl_validator import DSLValidator
+from app.models.schemas import ScenesJSON, TranscriptJSON
+
+# 假客户端的回复不读写 LLM 回复缓存，也不限流
+settings.LLM_CACHE_ENABLED = False
+settings.LLM_RATE_LIMIT_RPM = 0
+
+SHOT_TYPES = ["全景", "中景", "近景", "特写"]
+
+
+def _make_materials(minutes: int):
+    """每 6 秒一个镜头（180 帧），每 9 秒一句话"""
+    scene_count = minutes * 10
+    scenes = ScenesJSON(**{
+        "meta": {"schema": "scenes.v1", "fps": 30},
+        "media": {"primary_clip_path": "/media/long_take.mp4"},
+        "scenes": [
+            {
+                "scene_id": f"S{i + 1:04d}",
+                "start_frame": i * 180,
+                "end_frame": i * 180 + 179,
+                "start_tc": "00:00:00:00",
+                "end_tc": "00:00:00:00",
+                "visual": {
+                    "summary": f"第 {i + 1} 个镜头：主持人讲解咖啡豆的产地和烘焙程度",
+                    "shot_type": SHOT_TYPES[i % 4],
+                    "subjects": ["主持人", "咖啡豆"],
+                    "mood": "平静",
+                    "lighting": "自然光",
+                    "quality_score": 3 + (i * 5) % 7
+                }
+            }
+            for i in range(scene_count)
+        ]
+    })
+    transcript = TranscriptJSON(**{
+        "meta": {"schema": "transcript.v1", "language": "zh"},
+        "segments": [
+            {"start": i * 9.0, "end": i * 9.0 + 4.0, "text": f"第 {i + 1} 句：这款咖啡豆的风味是第 {i + 1} 种"}
+            for i in range(minutes * 60 // 9)
+        ]
+    })
+    return scenes, transcript
+
+
+def _table(content: str, prefix: str):
+    return [line.split("|") for line in content.splitlines() if line.startswith(prefix) and "|" in line]
+
+
+def _scene_rows(user: str):
+    """#S 表中的镜头行（不含 #C 初筛表）"""
+    return _table(user.split("#C")[0], "S")
+
+
+def _segment_rows(user: str):
+    """#T 表中的字幕行"""
+    block = user.split("#T", 1)[1].split("\n\n", 1)[0]
+    return [line.split("|") for line in block.splitlines()[1:]]
+
+
+class FakeCompletions:
+    """初筛：挑 q 最高的两个镜头 + 一个不存在的镜头；成片：包含越界 / 幻觉片段"""
+
+    def __init__(self, map_delay: float = 0.0, broken_windows=()):
+        self.map_delay = map_delay
+        self.broken_windows = set(broken_windows)
+        self.map_calls = []
+        self.reduce_calls = []
+        self.timeouts = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        system, user = kwargs["messages"][0]["content"], kwargs["messages"][1]["content"]
+        self.timeouts.append(kwargs.get("timeout"))
+        if system == SHORTLIST_SYSTEM_PROMPT:
+            content = self._shortlist(user)
+        else:
+            self.reduce_calls.append(kwargs["messages"])
+            content = self._timeline(user)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def _shortlist(self, user: str) -> str:
+        with self._lock:
+            self.map_calls.append(user)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.map_delay)
+        with self._lock:
+            self.running -= 1
+
+        window = int(user.split("这是第 ")[1].split(" ")[0])
+        if window in self.broken_windows:
+            return "这不是 JSON"
+        rows = sorted(_scene_rows(user), key=lambda row: -int(row[4]))
+        segments = _segment_rows(user)
+        return json.dumps({
+            "candidates": [
+                {"scene_id": rows[0][0], "score": 9, "purpose": "hook", "reason": "质量 | 最高"},
+                {"scene_id": rows[1][0], "score": 7, "purpose": "body", "reason": "次高"},
+                {"scene_id": "S9999", "score": 10, "purpose": "hook", "reason": "不存在"}
+            ],
+            "quotes": [float(segments[0][0])] if segments else []
+        }, ensure_ascii=False)
+
+    def _timeline(self, user: str) -> str:
+        rows = _scene_rows(user)
+        first, second = rows[0], rows[1]
+        return json.dumps({
+            "meta": {"schema": "editing_dsl.v1", "target": "douyin", "aspect": "9:16"},
+            "editing_plan": {
+                "timeline": [
+                    {"order": 1, "scene_id": first[0], "trim_frames": [int(first[1]), int(first[2]) + 60],
+                     "purpose": "hook", "overlay_text": "开场"},
+                    {"order": 2, "scene_id": "S8888", "trim_frames": [0, 30], "purpose": "body"},
+                    {"order": 3, "scene_id": second[0], "trim_frames": [int(second[1]), int(second[1]) + 90],
+                     "purpose": "cta", "broll": ["closeup.mp4"]}
+                ],
+                "subtitles": {"mode": "from_transcript", "style": "bold_yellow"}
+            }
+        }, ensure_ascii=False)
+
+
+class FakeOpenAI:
+    completions = None
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeOpenAI.completions)
+
+
+def _make_director(completions: FakeCompletions, token_budget: int = 20000) -> llm_engine.LLMDirector:
+    FakeOpenAI.completions = completions
+    original_key, original_pool = settings.OPENAI_API_KEY, llm_client._llm_pool
+    settings.OPENAI_API_KEY = "sk-test"
+    llm_client._llm_pool = llm_client.LLMClientPool(client_factory=FakeOpenAI)
+    try:
+        director = llm_engine.LLMDirector()
+    finally:
+        settings.OPENAI_API_KEY, llm_client._llm_pool = original_key, original_pool
+    director.prompt_compiler = PromptCompiler(token_budget=token_budget)
+    return director
+
+
+def test_parallel_shortlist():
+    """测试 1: 窗口切分与并发初筛"""
+    print("\n" + "=" * 70)
+    print("测试 1: 窗口切分与并发初筛")
+    print("=" * 70)
+
+    scenes, transcript = _make_materials(60)
+    completions = FakeCompletions(map_delay=0.1)
+    planner = HierarchicalPlanner(_make_director(completions), chunk_seconds=300, concurrency=4, shortlist_size=2)
+
+    chunks = planner.split(scenes, transcript)
+    assert len(chunks) == 12
+    assert sum(len(c.scenes) for c in chunks) == 600 and sum(len(c.segments) for c in chunks) == 400
+    assert all(c.index * 300 <= s.start_frame / 30 < (c.index + 1) * 300 for c in chunks for s in c.scenes)
+
+    t0 = time.perf_counter()
+    planner.generate(scenes, transcript, "快节奏")
+    elapsed = time.perf_counter() - t0
+    stats = planner.last_stats
+
+    print(f"  {len(completions.map_calls)} 次初筛，并发峰值 {completions.peak}，总耗时 {elapsed:.2f}s")
+    print(f"  {stats.to_dict()}")
+    assert len(completions.map_calls) == 12 and len(completions.reduce_calls) == 1
+    assert completions.peak == 4
+    assert elapsed < 12 * 0.1 * 0.5
+    assert stats.chunks == 12 and stats.concurrency == 4 and stats.fallback_chunks == []
+    # 每个窗口的初筛只看到本窗口的镜头
+    window_2 = next(call for call in completions.map_calls if "这是第 2 个窗口" in call)
+    assert "S0051|" in window_2 and "S0050|" not in window_2 and "S0101|" not in window_2
+
+    print("  ✅ 每个窗口一次调用，并发受限")
+    return True
+
+
+def test_reduce_validates():
+    """测试 2: 成片输入与验证"""
+    print("\n" + "=" * 70)
+    print("测试 2: 成片输入与验证")
+    print("=" * 70)
+
+    scenes, transcript = _make_materials(30)
+    completions = FakeCompletions()
+    planner = HierarchicalPlanner(_make_director(completions), chunk_seconds=300, shortlist_size=2)
+    dsl = planner.generate(scenes, transcript, "快节奏")
+    stats = planner.last_stats
+
+    user = completions.reduce_calls[0][1]["content"]
+    kept = [row[0] for row in _scene_rows(user)]
+    print(f"  成片输入镜头: {kept}")
+    # 每个窗口 2 个候选（不存在的 S9999 被丢弃），按原顺序
+    assert len(kept) == 12 and kept == sorted(kept) and "S9999" not in user.split("#C")[0]
+    assert stats.shortlisted_scenes == 12 and stats.shortlisted_segments < len(transcript.segments)
+    assert "#C 列=id|score|purpose|reason" in user and "质量 / 最高" in user
+    # 关键语句与候选镜头重叠的字幕都在
+    assert "0|4|第 1 句" in user
+
+    errors = DSLValidator.validate_dsl_against_scenes(dsl, scenes.model_dump(by_alias=True))
+    timeline = dsl["editing_plan"]["timeline"]
+    print(f"  修复: {stats.repairs}")
+    assert errors == []
+    assert [item["order"] for item in timeline] == [1, 2]
+    assert timeline[0]["trim_frames"][1] == next(
+        s.end_frame for s in scenes.scenes if s.scene_id == timeline[0]["scene_id"]
+    )
+    assert timeline[1]["broll"] == [] and dsl["assumptions"]
+    assert any("S8888" in repair for repair in stats.repairs)
+
+    # 修复后仍不通过（Schema 错误）时抛出
+    broken = {"meta": {"schema": "editing_dsl.v1"}, "editing_plan": {"timeline": []}}
+    planner.director._chat_json = lambda prompt, temperature, timeout=None, deadline=None: broken
+    try:
+        planner.generate(scenes, transcript, "快节奏")
+        assert False, "应该抛出异常"
+    except ValueError as e:
+        assert "未通过验证" in str(e)
+
+    print("  ✅ 输出通过 DSLValidator")
+    return True
+
+
+def test_map_fallback():
+    """测试 3: 初筛失败的窗口"""
+    print("\n" + "=" * 70)
+    print("测试 3: 初筛失败的窗口")
+    print("=" * 70)
+
+    scenes, transcript = _make_materials(20)
+    completions = FakeCompletions(broken_windows={2})
+    planner = HierarchicalPlanner(_make_director(completions), chunk_seconds=300, shortlist_size=3)
+    dsl = planner.generate(scenes, transcript, "快节奏")
+    stats = planner.last_stats
+
+    print(f"  {stats.to_dict()}")
+    assert stats.fallback_chunks == [1]
+    user = completions.reduce_calls[0][1]["content"]
+    window_2 = [row for row in _scene_rows(user) if 50 <= int(row[0][1:]) - 1 < 100]
+    # 按价值选取：3 个 q 最高的镜头
+    assert len(window_2) == 3 and all(int(row[4]) == 9 for row in window_2)
+    assert "按画面价值自动选取" in user
+    assert dsl["editing_plan"]["timeline"]
+
+    # 调用方放弃等待（批量生成单风格超时）：剩余窗口和成片都不再请求
+    scenes, transcript = _make_materials(60)
+    completions = FakeCompletions(map_delay=0.1)
+    planner = HierarchicalPlanner(
+        _make_director(completions), chunk_seconds=300, concurrency=1, deadline=time.monotonic() + 0.25
+    )
+    try:
+        planner.generate(scenes, transcript, "快节奏")
+        assert False, "应该抛出 LLMDeadlineExceeded"
+    except LLMDeadlineExceeded:
+        pass
+    print(f"  截止后: 初筛 {len(completions.map_calls)}/12 次，成片 {len(completions.reduce_calls)} 次")
+    assert len(completions.map_calls) <= 4 and completions.reduce_calls == []
+    assert all(timeout <= 0.25 for timeout in completions.timeouts)
+
+    print("  ✅ 失败窗口不影响整体，截止后停止请求")
+    return True
+
+
+def test_director_auto_switch():
+    """测试 4: LLMDirector 自动切换"""
+    print("\n" + "=" * 70)
+    print("测试 4: LLMDirector 自动切换")
+    print("=" * 70)
+
+    # 素材少：一次调用
+    completions = FakeCompletions()
+    director = _make_director(completions, token_budget=20000)
+    scenes, transcript = _make_materials(2)
+    director.generate_editing_dsl(scenes, transcript, "快节奏")
+    assert completions.map_calls == [] and len(completions.reduce_calls) == 1
+    assert director.last_plan_stats is None
+
+    # 一小时素材放不进预算：分层规划
+    completions = FakeCompletions()
+    director = _make_director(completions, token_budget=20000)
+    scenes, transcript = _make_materials(60)
+    dsl = director.generate_editing_dsl(scenes, transcript, "快节奏", timeout=45)
+    print(f"  初筛 {len(completions.map_calls)} 次，成片 {len(completions.reduce_calls)} 次，"
+          f"成片 prompt {director.last_prompt_stats.total_tokens} tokens")
+    assert len(completions.map_calls) == 12 and len(completions.reduce_calls) == 1
+    # 超时传给每一次初筛 / 成片请求
+    assert completions.timeouts == [45] * 13
+    assert director.last_plan_stats.chunks == 12
+    assert director.last_prompt_stats.scenes_kept == director.last_prompt_stats.scenes_total
+    assert DSLValidator.validate_dsl_against_scenes(dsl, scenes.model_dump(by_alias=True)) == []
+
+    # 显式关闭
+    completions = FakeCompletions()
+    director = _make_director(completions, token_budget=20000)
+    director.generate_editing_dsl(scenes, transcript, "快节奏", hierarchical=False)
+    assert completions.map_calls == []
+
+    print("  ✅ 超出预算时自动分层")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("分层 DSL 规划测试")
+    print("=" * 70)
+
+    tests = [
+        ("窗口切分与并发初筛", test_parallel_shortlist),
+        ("成片输入与验证", test_reduce_validates),
+        ("初筛失败的窗口", test_map_fallback),
+        ("LLMDirector 自动切换", test_director_auto_switch),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
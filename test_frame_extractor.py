@@ -0,0 +1,117 @@
+"""
+测试关键帧提取服务
+
+测试内容：
+1. select 滤镜表达式
+2. JPEG 管道切分
+3. 内存缓存 LRU 淘汰
+4. 批量截帧（需要 ffmpeg）
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools.frame_extractor import (
+    KeyframeExtractor,
+    build_select_filter,
+    split_jpeg_stream
+)
+
+
+def _fake_jpeg(payload: bytes) -> bytes:
+    return b"\xff\xd8\xff\xe0" + payload + b"\xff\xd9"
+
+
+def test_select_filter():
+    """测试 1: select 滤镜表达式"""
+    expr = build_select_filter([0, 15, 300])
+    print(f"  表达式: {expr}")
+    assert expr == "select=eq(n\\,0)+eq(n\\,15)+eq(n\\,300)"
+    return True
+
+
+def test_split_jpeg_stream():
+    """测试 2: JPEG 管道切分（含跨 chunk 的半张图片）"""
+    img1 = _fake_jpeg(b"frame-one")
+    img2 = _fake_jpeg(b"frame-two")
+
+    stream = img1 + img2
+    buffer = bytearray(stream[:len(img1) + 5])
+
+    images, rest = split_jpeg_stream(buffer)
+    assert images == [img1]
+    assert bytes(rest) == img2[:5]
+
+    rest.extend(stream[len(img1) + 5:])
+    images, rest = split_jpeg_stream(rest)
+    assert images == [img2]
+    assert len(rest) == 0
+
+    print("  ✅ 切分正确")
+    return True
+
+
+def test_cache_eviction():
+    """测试 3: 内存缓存 LRU 淘汰"""
+    extractor = KeyframeExtractor(cache_max_mb=1)
+    file_key = ("video.mp4", 1, 0.0)
+    big = b"x" * (400 * 1024)
+
+    extractor._cache_put(file_key, 1, big)
+    extractor._cache_put(file_key, 2, big)
+    assert extractor._cache_get(file_key, 1) == big  # 1 变为最近使用
+    extractor._cache_put(file_key, 3, big)           # 超出 1MB，淘汰 2
+
+    assert extractor._cache_get(file_key, 2) is None
+    assert extractor._cache_get(file_key, 1) == big
+    assert extractor._cache_get(file_key, 3) == big
+    print(f"  统计: {extractor.get_stats()}")
+    return True
+
+
+def test_extract_frames_with_ffmpeg():
+    """测试 4: 单进程批量截帧"""
+    if not shutil.which("ffmpeg"):
+        print("  ⏭️  未安装 ffmpeg，跳过")
+        return True
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        video = tmp_dir / "test.mp4"
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-f", "lavfi",
+             "-i", "testsrc=size=320x240:rate=25:duration=4",
+             "-pix_fmt", "yuv420p", "-y", str(video)],
+            check=True
+        )
+
+        extractor = KeyframeExtractor()
+        frames = extractor.extract_frames(str(video), [90, 10, 50, 10])
+
+        assert sorted(frames.keys()) == [10, 50, 90]
+        assert all(data.startswith(b"\xff\xd8") for data in frames.values())
+        assert extractor.get_stats()["ffmpeg_processes"] == 1
+
+        # 第二次命中缓存，不再启动进程
+        extractor.extract_frames(str(video), [10, 50])
+        assert extractor.get_stats()["ffmpeg_processes"] == 1
+        return True
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    tests = [
+        ("select 滤镜表达式", test_select_filter),
+        ("JPEG 管道切分", test_split_jpeg_stream),
+        ("内存缓存淘汰", test_cache_eviction),
+        ("批量截帧", test_extract_frames_with_ffmpeg),
+    ]
+
+    for name, func in tests:
+        print(f"\n[{name}]")
+        print("  ✅ 通过" if func() else "  ❌ 失败")
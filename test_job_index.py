@@ -0,0 +1,256 @@
+"""
+测试任务索引（SQLite）
+
+测试内容：
+1. JobStore 写入同步索引，分页 / 状态 / 日期过滤
+2. 从磁盘重建（已有 job 目录、索引丢失）
+3. 产物清单：目录未变化时命中索引，变化后重新扫描
+4. 删除任务同步索引
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core import job_index as job_index_module
+from app.core.job_index import JobIndex, get_job_index
+from app.core.job_store import JobStore
+
+
+def _write_job(jobs_dir: Path, job_id: str, state: str, created_at: str):
+    """直接在磁盘上写一个 job 目录（模拟索引出现之前的旧任务）"""
+    job_dir = jobs_dir / job_id
+    for sub in ("input", "temp", "output"):
+        (job_dir / sub).mkdir(parents=True, exist_ok=True)
+    metadata = {
+        "job_id": job_id,
+        "state": state,
+        "status": state,
+        "progress": 100 if state == "COMPLETED" else 0,
+        "created_at": created_at,
+        "updated_at": created_at,
+        "error": None,
+        "result": None,
+        "state_history": [{"state": "CREATED", "timestamp": created_at}]
+    }
+    (job_dir / "metadata.json").write_text(json.dumps(metadata), encoding="utf-8")
+    return metadata
+
+
+def _fresh_index(jobs_dir: Path) -> JobIndex:
+    """丢弃全局缓存的实例，模拟进程重启"""
+    key = str(jobs_dir.absolute())
+    old = job_index_module._job_indexes.pop(key, None)
+    if old:
+        old.close()
+    return get_job_index(jobs_dir)
+
+
+def test_sync_and_query():
+    """测试 1: 写入同步与过滤查询"""
+    print("\n" + "=" * 70)
+    print("测试 1: 写入同步与过滤查询")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        jobs_dir = tmp_dir / "jobs"
+        for i in range(30):
+            state = "COMPLETED" if i % 3 == 0 else "FAILED" if i % 3 == 1 else "CREATED"
+            _write_job(jobs_dir, f"job_202601{i + 1:02d}_120000", state, f"2026-01-{i + 1:02d}T12:00:00")
+
+        store = JobStore(jobs_dir, coalesce_ms=0)
+        store.index = _fresh_index(jobs_dir)
+
+        page = store.list_jobs(limit=10)
+        assert [j["job_id"] for j in page][:2] == ["job_20260130_120000", "job_20260129_120000"]
+        page2 = store.list_jobs(limit=10, offset=10)
+        assert page2[0]["job_id"] == "job_20260120_120000"
+        assert store.count_jobs() == 30
+
+        completed = store.list_jobs(limit=100, state="COMPLETED")
+        assert len(completed) == 10 and all(j["state"] == "COMPLETED" for j in completed)
+
+        window = store.list_jobs(limit=100, created_after="2026-01-10", created_before="2026-01-20")
+        print(f"  1/10 ~ 1/20: {len(window)} 个")
+        assert len(window) == 10
+        assert store.count_jobs(state="FAILED", created_after="2026-01-10", created_before="2026-01-20") == 3
+
+        # JobStore 写入后立即可查
+        store.update_job("job_20260101_120000", status="rendering", progress=42)
+        job = store.list_jobs(limit=1, status="rendering")[0]
+        assert job["job_id"] == "job_20260101_120000" and job["progress"] == 42
+
+        history = store.index.get_state_history("job_20260101_120000")
+        assert history[0]["state"] == "CREATED"
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 分页 / 过滤 / 同步正确")
+    return True
+
+
+def test_rebuild_from_disk():
+    """测试 2: 从磁盘重建"""
+    print("\n" + "=" * 70)
+    print("测试 2: 从磁盘重建")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        jobs_dir = tmp_dir / "jobs"
+        for i in range(5):
+            _write_job(jobs_dir, f"job_old_{i}", "COMPLETED", f"2025-12-0{i + 1}T08:00:00")
+        (jobs_dir / "not_a_job").mkdir()
+
+        index = _fresh_index(jobs_dir)
+        assert not index.is_built()
+        index.ensure_built()
+        assert index.count_jobs() == 5
+
+        # 删除数据库文件后重建
+        index.close()
+        for suffix in ("", "-wal", "-shm"):
+            path = Path(str(index.db_path) + suffix)
+            if path.exists():
+                path.unlink()
+        index = _fresh_index(jobs_dir)
+        assert index.count_jobs() == 0
+        assert index.rebuild() == 5
+        assert index.count_by_state() == {"COMPLETED": 5}
+
+        mode = index._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        print(f"  重建 5 个 job, journal_mode={mode}")
+        assert mode == "wal"
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 重建正确")
+    return True
+
+
+def test_artifact_listing():
+    """测试 3: 产物清单缓存"""
+    print("\n" + "=" * 70)
+    print("测试 3: 产物清单缓存")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    original_window = job_index_module.RACY_WINDOW_NS
+    try:
+        jobs_dir = tmp_dir / "jobs"
+        _write_job(jobs_dir, "job_a", "COMPLETED", "2026-01-01T00:00:00")
+        (jobs_dir / "job_a" / "output" / "final.mp4").write_bytes(b"x" * 10)
+        (jobs_dir / "job_a" / "input" / "raw.mp4").write_bytes(b"x" * 3)
+
+        store = JobStore(jobs_dir)
+        store.index = _fresh_index(jobs_dir)
+        job_index_module.RACY_WINDOW_NS = 0
+
+        first = store.get_job_artifacts("job_a")
+        assert first["output"] == [{
+            "name": "final.mp4",
+            "path": str(Path("job_a") / "output" / "final.mp4"),
+            "size": 10,
+            "modified": first["output"][0]["modified"]
+        }]
+        assert store.index.get_stats()["artifact_scans"] == 3
+
+        second = store.get_job_artifacts("job_a")
+        assert second == first
+        assert store.index.get_stats()["artifact_hits"] == 3
+
+        # 新增文件 → output 目录 mtime 变化 → 只重新扫描 output
+        time.sleep(0.01)
+        (jobs_dir / "job_a" / "output" / "trace.json").write_text("[]")
+        output_dir = jobs_dir / "job_a" / "output"
+        os.utime(output_dir, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        third = store.get_job_artifacts("job_a")
+        print(f"  output: {[a['name'] for a in third['output']]}")
+        assert [a["name"] for a in third["output"]] == ["final.mp4", "trace.json"]
+        assert store.index.get_stats()["artifact_scans"] == 4
+
+        # 强制刷新
+        store.get_job_artifacts("job_a", refresh=True)
+        assert store.index.get_stats()["artifact_scans"] == 7
+    finally:
+        job_index_module.RACY_WINDOW_NS = original_window
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 目录未变化时命中索引")
+    return True
+
+
+def test_delete_job():
+    """测试 4: 删除任务"""
+    print("\n" + "=" * 70)
+    print("测试 4: 删除任务")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        jobs_dir = tmp_dir / "jobs"
+        _write_job(jobs_dir, "job_a", "COMPLETED", "2026-01-01T00:00:00")
+        _write_job(jobs_dir, "job_b", "COMPLETED", "2026-01-02T00:00:00")
+
+        store = JobStore(jobs_dir)
+        store.index = _fresh_index(jobs_dir)
+        assert store.count_jobs() == 2
+        store.get_job_artifacts("job_a")
+
+        store.delete_job("job_a")
+        assert not (jobs_dir / "job_a").exists()
+        assert [j["job_id"] for j in store.list_jobs()] == ["job_b"]
+        assert store.index.get_state_history("job_a") == []
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 删除同步索引")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("任务索引测试")
+    print("=" * 70)
+
+    tests = [
+        ("写入同步与查询", test_sync_and_query),
+        ("从磁盘重建", test_rebuild_from_disk),
+        ("产物清单缓存", test_artifact_listing),
+        ("删除任务", test_delete_job),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+测试 Job ID 生成与目录定位
+
+测试内容：
+1. ID 单调递增、多线程下不重复、兼容旧格式排序
+2. 目录定位：平铺 / 日期分片、非法 ID、项目版本查找
+3. JobStore 在分片布局下创建 / 读取 / 列出任务，指定 ID 冲突时拒绝
+4. 迁移工具：平铺 → 分片 → 平铺，索引重建后仍可查询
+5. API：非法 ID 返回 400 而不是 500
+"""
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.core.job_paths import (
+    find_job_dirs,
+    iter_job_dirs,
+    migrate_job_dirs,
+    new_job_id,
+    resolve_job_dir,
+    shard_parts
+)
+from app.core.job_store import JobStore
+
+
+def test_id_generation():
+    """测试 1: ID 生成"""
+    print("\n" + "=" * 70)
+    print("测试 1: ID 生成")
+    print("=" * 70)
+
+    ids = [new_job_id() for _ in range(2000)]
+    assert ids == sorted(ids), "同一线程内应严格递增"
+    assert len(set(ids)) == len(ids)
+    print(f"  示例: {ids[0]}")
+
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        local = [new_job_id("proj") for _ in range(1000)]
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(results)) == 8000
+
+    # 旧格式排在同一秒的新 ID 之前，日期可解析
+    new_id = ids[0]
+    old_id = new_id[:len("job_YYYYmmdd_HHMMSS")]
+    assert old_id < new_id
+    assert shard_parts(old_id) == shard_parts(new_id)
+    assert shard_parts("job_custom") is None
+
+    print("  ✅ 8 线程 × 1000 个 ID 无重复，单线程严格递增")
+    return True
+
+
+def test_resolve_job_dir():
+    """测试 2: 目录定位"""
+    print("\n" + "=" * 70)
+    print("测试 2: 目录定位")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        root = tmp_dir / "jobs"
+        job_id = "job_20261016_153012_482913_a7f3c2"
+        flat = root / job_id
+        shard = root / "2026" / "10" / "16" / job_id
+
+        assert resolve_job_dir(job_id, root, sharded=False) == flat
+        assert resolve_job_dir(job_id, root, sharded=True) == shard
+
+        # 已存在的目录优先（迁移前的旧任务在分片模式下仍能找到）
+        flat.mkdir(parents=True)
+        assert resolve_job_dir(job_id, root, sharded=True) == flat
+
+        # 没有日期的 ID 始终平铺
+        assert resolve_job_dir("job_custom", root, sharded=True) == root / "job_custom"
+
+        for bad in ("../etc", "a/b", "", ".hidden", "job\\x"):
+            try:
+                resolve_job_dir(bad, root)
+                assert False, f"应拒绝: {bad!r}"
+            except ValueError:
+                pass
+
+        # 项目版本与原项目位于同一分片
+        project = "proj_20261016_101010_000001_abcdef"
+        for name in (project, f"{project}_v2", f"{project}_v3"):
+            (root / "2026" / "10" / "16" / name).mkdir(parents=True)
+        (root / "proj_20261016_101010_000001_other").mkdir()
+        versions = [p.name for p in find_job_dirs(project, root)]
+        print(f"  项目版本: {versions}")
+        assert versions == [project, f"{project}_v2", f"{project}_v3"]
+
+        all_dirs = {p.name for p in iter_job_dirs(root)}
+        assert job_id in all_dirs and f"{project}_v2" in all_dirs and "2026" not in all_dirs
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 定位正确，非法 ID 被拒绝")
+    return True
+
+
+def test_job_store_sharded():
+    """测试 3: JobStore 分片布局"""
+    print("\n" + "=" * 70)
+    print("测试 3: JobStore 分片布局")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    original = settings.JOB_DIR_SHARDING
+    try:
+        settings.JOB_DIR_SHARDING = True
+        store = JobStore(tmp_dir / "jobs", coalesce_ms=0)
+
+        job_ids = [store.create_job() for _ in range(20)]
+        assert len(set(job_ids)) == 20
+        job_dir = store.job_dir(job_ids[0])
+        print(f"  目录: {job_dir.relative_to(tmp_dir / 'jobs')}")
+        assert job_dir.parent.parent.parent.parent == tmp_dir / "jobs"
+        assert (job_dir / "metadata.json").exists()
+
+        store.update_job(job_ids[0], status="uploaded", extra={"video_path": "/tmp/a.mp4"})
+        assert store.get_job(job_ids[0])["video_path"] == "/tmp/a.mp4"
+        assert [j["job_id"] for j in store.list_jobs(limit=3)] == job_ids[::-1][:3]
+
+        # 指定 ID：冲突时拒绝，不再共用目录
+        assert store.create_job("job_manual") == "job_manual"
+        try:
+            store.create_job("job_manual")
+            assert False, "应该拒绝重复 ID"
+        except FileExistsError:
+            pass
+        assert store.get_job("../../etc") is None
+
+        # 重建索引能找到分片目录中的任务
+        assert store.rebuild_index() == 21
+    finally:
+        settings.JOB_DIR_SHARDING = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 分片布局下读写正常")
+    return True
+
+
+def test_migration():
+    """测试 4: 迁移工具"""
+    print("\n" + "=" * 70)
+    print("测试 4: 迁移工具")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        root = tmp_dir / "jobs"
+        store = JobStore(root, coalesce_ms=0)
+        old_ids = ["job_20250101_120000", "job_20250102_120000"]
+        for job_id in old_ids:
+            store.create_job(job_id)
+        store.create_job("job_custom")
+        (store.job_dir(old_ids[0]) / "output" / "final.mp4").write_bytes(b"x")
+
+        plan = migrate_job_dirs(root, sharded=True, dry_run=True)
+        assert len(plan["moved"]) == 2 and (root / old_ids[0]).exists()
+
+        report = migrate_job_dirs(root, sharded=True)
+        print(f"  移动 {len(report['moved'])} 个, 保持 {len(report['skipped'])} 个")
+        assert (root / "2025" / "01" / "01" / old_ids[0] / "output" / "final.mp4").exists()
+        assert not (root / old_ids[0]).exists()
+        assert report["skipped"] == [str(root / "job_custom")]
+
+        store.rebuild_index()
+        assert store.get_job(old_ids[0])["job_id"] == old_ids[0]
+        artifacts = store.get_job_artifacts(old_ids[0])
+        assert artifacts["output"][0]["path"] == str(Path("2025/01/01") / old_ids[0] / "output" / "final.mp4")
+        assert store.count_jobs() == 3
+
+        # 迁回平铺，空分片目录被清理
+        migrate_job_dirs(root, sharded=False)
+        assert (root / old_ids[1]).exists() and not (root / "2025").exists()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 迁移正确")
+    return True
+
+
+def test_api_invalid_id():
+    """测试 5: API 非法 ID"""
+    print("\n" + "=" * 70)
+    print("测试 5: API 非法 ID")
+    print("=" * 70)
+
+    # 导入 app.main 会创建任务队列 / 状态库，放到临时目录
+    tmp_dir = Path(tempfile.mkdtemp())
+    original_jobs_dir = settings.JOBS_DIR
+    settings.JOBS_DIR = tmp_dir
+    try:
+        from app.main import app
+
+        client = TestClient(app, raise_server_exceptions=False)
+        bad = "-bad"
+        responses = {
+            "GET /api/assembly/{id}/status": client.get(f"/api/assembly/{bad}/status"),
+            "GET /api/projects/{id}": client.get(f"/api/projects/{bad}"),
+            "DELETE /api/projects/{id}": client.delete(f"/api/projects/{bad}"),
+            "GET /api/storyteller/story/{id}": client.get(f"/api/storyteller/story/{bad}"),
+            "POST /api/visual/analyze-from-job": client.post("/api/visual/analyze-from-job", data={"job_id": bad}),
+            "POST /api/exports/": client.post("/api/exports/", params={"project_id": bad}),
+            "GET /api/analyze/job/{id}/transcript": client.get(f"/api/analyze/job/{bad}/transcript"),
+        }
+    finally:
+        settings.JOBS_DIR = original_jobs_dir
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for route, response in responses.items():
+        print(f"  {response.status_code}  {route}")
+        assert response.status_code == 400, route
+        assert "无效的 job ID" in response.json()["detail"]
+
+    print("  ✅ 非法 ID 返回 400")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("Job ID 与目录定位测试")
+    print("=" * 70)
+
+    tests = [
+        ("ID 生成", test_id_generation),
+        ("目录定位", test_resolve_job_dir),
+        ("分片布局", test_job_store_sharded),
+        ("迁移工具", test_migration),
+        ("API 非法 ID", test_api_invalid_id),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+测试持久化任务队列
+
+测试内容：
+1. 资源类别由 JobState 推导
+2. 优先级顺序与各资源类别的槽位上限
+3. 被挡住的任务为资源占位，低优先级任务不能插队
+4. 同步 / 异步处理函数、失败记录、取消
+5. 重启恢复：中断的任务重新执行，超过最大次数标记失败，其它 worker 的任务不受影响
+6. 资源锁：槽位数取 Orchestrator 资源锁容量，资源锁被其它 job 占满时等待；失败的任务按最大次数重试
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.job_queue import JobQueue, QueuedTask, resource_classes_for_state, will_retry
+from app.core.orchestrator import JobState, ResourceLock
+
+
+SLOTS = {"CPU": 2, "VISION": 1, "RESOLVE": 1, "GPU_HEAVY": 1}
+
+
+def test_resource_classes():
+    """测试 1: 资源类别推导"""
+    print("\n" + "=" * 70)
+    print("测试 1: 资源类别推导")
+    print("=" * 70)
+
+    assert resource_classes_for_state(JobState.INGESTED) == ["CPU"]
+    assert resource_classes_for_state(JobState.ANALYZING) == ["CPU", "VISION"]
+    assert resource_classes_for_state(JobState.EXECUTING) == ["CPU", "RESOLVE", "GPU_HEAVY"]
+    for state in JobState:
+        print(f"  {state.value:<12} → {resource_classes_for_state(state)}")
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        queue = JobQueue(tmp_dir / "queue.sqlite3", slots=SLOTS)
+        try:
+            queue.enqueue("x", {}, resources=["NPU"])
+            assert False, "应拒绝未知资源类别"
+        except ValueError:
+            pass
+        task_id = queue.enqueue("x", {"a": 1}, state=JobState.ANALYZING, job_id="job_a")
+        task = queue.get_task(task_id)
+        assert task.resources == ["CPU", "VISION"] and task.payload == {"a": 1}
+        queue.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 推导正确")
+    return True
+
+
+def test_priority_and_slots():
+    """测试 2: 优先级与槽位上限"""
+    print("\n" + "=" * 70)
+    print("测试 2: 优先级与槽位上限")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        queue = JobQueue(tmp_dir / "queue.sqlite3", slots=SLOTS)
+        started = []
+        active = {"CPU": 0, "VISION": 0}
+        peak = {"CPU": 0, "VISION": 0}
+
+        async def handler(name: str, resources: list):
+            started.append(name)
+            for r in resources:
+                active[r] += 1
+                peak[r] = max(peak[r], active[r])
+            await asyncio.sleep(0.05)
+            for r in resources:
+                active[r] -= 1
+
+        queue.register("work", handler)
+
+        # 入队时调度器未启动，启动后按优先级执行
+        for i in range(3):
+            queue.enqueue("work", {"name": f"vision_{i}", "resources": ["CPU", "VISION"]},
+                          resources=["CPU", "VISION"])
+        queue.enqueue("work", {"name": "urgent", "resources": ["CPU"]}, priority=10)
+        for i in range(3):
+            queue.enqueue("work", {"name": f"cpu_{i}", "resources": ["CPU"]})
+
+        async def run():
+            await queue.start()
+            await queue.wait_idle(timeout=10)
+            await queue.stop()
+
+        asyncio.run(run())
+
+        print(f"  执行顺序: {started}")
+        print(f"  峰值占用: {peak}")
+        assert started[0] == "urgent"
+        assert peak == {"CPU": 2, "VISION": 1}
+        assert queue.get_stats()["tasks"] == {"done": 7}
+        assert all(v["in_use"] == 0 for v in queue.get_stats()["slots"].values())
+        queue.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 优先级与槽位上限正确")
+    return True
+
+
+def test_reservation():
+    """测试 3: 资源占位"""
+    print("\n" + "=" * 70)
+    print("测试 3: 资源占位")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        queue = JobQueue(tmp_dir / "queue.sqlite3", slots=SLOTS)
+        events = []
+        release = None
+
+        async def handler(name: str, hold: bool = False):
+            events.append(("start", name))
+            if hold:
+                await release.wait()
+            else:
+                await asyncio.sleep(0.02)
+            events.append(("end", name))
+
+        queue.register("work", handler)
+
+        async def run():
+            nonlocal release
+            release = asyncio.Event()
+            await queue.start()
+            # 占住 GPU_HEAVY
+            queue.enqueue("work", {"name": "render_a", "hold": True},
+                          resources=["CPU", "GPU_HEAVY"], priority=5)
+            await asyncio.sleep(0.1)
+            # 高优先级的 render_b 被挡住；低优先级的 render_c 也要 GPU_HEAVY，不能插队
+            queue.enqueue("work", {"name": "render_b"}, resources=["CPU", "GPU_HEAVY"], priority=5)
+            queue.enqueue("work", {"name": "render_c"}, resources=["CPU", "GPU_HEAVY"], priority=0)
+            # 不冲突的资源照常执行
+            queue.enqueue("work", {"name": "light"}, resources=["CPU"], priority=0)
+            await asyncio.sleep(0.2)
+            release.set()
+            await queue.wait_idle(timeout=10)
+            await queue.stop()
+
+        asyncio.run(run())
+
+        starts = [name for kind, name in events if kind == "start"]
+        print(f"  启动顺序: {starts}")
+        assert starts.index("light") < starts.index("render_b")
+        assert starts.index("render_b") < starts.index("render_c")
+        assert events.index(("end", "render_a")) < events.index(("start", "render_b"))
+        queue.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 大任务不会被低优先级任务饿死")
+    return True
+
+
+def test_handlers_and_cancel():
+    """测试 4: 同步 / 异步处理函数与取消"""
+    print("\n" + "=" * 70)
+    print("测试 4: 同步 / 异步处理函数与取消")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        queue = JobQueue(tmp_dir / "queue.sqlite3", slots=SLOTS)
+        threads = []
+
+        def blocking(value: int):
+            threads.append(threading.current_thread().name)
+            time.sleep(0.05)
+            if value < 0:
+                raise RuntimeError("negative")
+
+        queue.register("blocking", blocking)
+
+        ok_id = queue.enqueue("blocking", {"value": 1})
+        bad_id = queue.enqueue("blocking", {"value": -1})
+        cancel_id = queue.enqueue("blocking", {"value": 2})
+        orphan_id = queue.enqueue("unregistered", {})
+        assert queue.cancel(cancel_id)
+        assert not queue.cancel(cancel_id)
+
+        async def run():
+            await queue.start()
+            # 同步处理函数在线程池执行，不阻塞事件循环
+            ticks = 0
+            while queue.get_task(bad_id).status in ("queued", "running"):
+                ticks += 1
+                await asyncio.sleep(0.005)
+            await queue.wait_idle(timeout=10)
+            await queue.stop()
+            return ticks
+
+        ticks = asyncio.run(run())
+        print(f"  执行期间事件循环 tick: {ticks}, 线程: {set(threads)}")
+        assert ticks > 5
+        assert "MainThread" not in threads
+
+        assert queue.get_task(ok_id).status == "done"
+        bad = queue.get_task(bad_id)
+        assert bad.status == "failed" and "RuntimeError: negative" in bad.error
+        assert bad.attempts == 3  # 失败后重试到最大次数
+        assert queue.get_task(cancel_id).status == "cancelled"
+        # 没有处理函数的任务保持排队
+        assert queue.get_task(orphan_id).status == "queued"
+        queue.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 处理函数与取消正确")
+    return True
+
+
+def test_restart_recovery():
+    """测试 5: 重启恢复"""
+    print("\n" + "=" * 70)
+    print("测试 5: 重启恢复")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        db_path = tmp_dir / "queue.sqlite3"
+        runs = []
+
+        async def slow(name: str):
+            runs.append(name)
+            await asyncio.sleep(10)
+
+        # 第一次运行：任务执行到一半服务关闭
+        queue = JobQueue(db_path, slots=SLOTS, max_attempts=2)
+        queue.register("slow", slow)
+        task_id = queue.enqueue("slow", {"name": "a"})
+        pending_id = queue.enqueue("slow", {"name": "b"}, resources=["CPU", "GPU_HEAVY"])
+        queue.slots["CPU"] = 1
+
+        async def interrupted():
+            await queue.start()
+            await asyncio.sleep(0.1)
+            await queue.stop()
+
+        asyncio.run(interrupted())
+        assert queue.get_task(task_id).status == "running"
+        assert queue.get_task(pending_id).status == "queued"
+        queue.close()
+
+        # 第二次运行：中断的任务重新执行
+        done = []
+
+        async def quick(name: str):
+            done.append(name)
+
+        queue = JobQueue(db_path, slots=SLOTS, max_attempts=2)
+        queue.register("slow", quick)
+
+        async def resumed():
+            await queue.start()
+            await queue.wait_idle(timeout=10)
+            await queue.stop()
+
+        asyncio.run(resumed())
+        print(f"  重启后执行: {sorted(done)}")
+        assert sorted(done) == ["a", "b"]
+        assert queue.get_task(task_id).status == "done"
+        assert queue.get_task(task_id).attempts == 2
+        queue.close()
+
+        # 超过最大次数：再次中断后不再重跑
+        queue = JobQueue(db_path, slots=SLOTS, max_attempts=1)
+        queue.register("slow", slow)
+        crash_id = queue.enqueue("slow", {"name": "c"})
+        asyncio.run(interrupted())
+        queue.close()
+
+        queue = JobQueue(db_path, slots=SLOTS, max_attempts=1)
+        assert queue._recover_interrupted() == 0
+        crashed = queue.get_task(crash_id)
+        assert crashed.status == "failed" and crashed.error
+
+        # 其它存活 worker 进程正在执行的任务不恢复
+        busy_id = queue.enqueue("slow", {"name": "d"})
+        queue._conn.execute(
+            "UPDATE tasks SET status = 'running', attempts = 1, worker_pid = ? WHERE task_id = ?",
+            (os.getppid(), busy_id)
+        )
+        assert queue._recover_interrupted() == 0
+        assert queue.get_task(busy_id).status == "running"
+        queue.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 中断的任务在重启后恢复")
+    return True
+
+
+def test_resource_lock():
+    """测试 6: 资源锁与失败重试"""
+    print("\n" + "=" * 70)
+    print("测试 6: 资源锁与失败重试")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        lock = ResourceLock({"GPU_HEAVY": 1, "RESOLVE_BUSY": 1, "VISION": 2, "AI": 1})
+        queue = JobQueue(tmp_dir / "queue.sqlite3", max_attempts=2, resource_lock=lock)
+        print(f"  槽位: {queue.slots}")
+        assert queue.slots["VISION"] == 2 and queue.slots["RESOLVE"] == 1 and queue.slots["GPU_HEAVY"] == 1
+
+        runs = []
+        lock_seen = {}
+        release_held = None
+
+        async def render(name: str):
+            runs.append(name)
+            if name == "held":
+                # 执行中的队列任务占用资源锁：队列外的调度看得到
+                lock_seen["GPU_HEAVY"] = lock.available("GPU_HEAVY")
+                lock_seen["outside"] = lock.acquire("GPU_HEAVY", "job_outside")
+                await release_held.wait()
+
+        retry_flags = []
+
+        async def flaky(name: str):
+            runs.append(name)
+            if name == "invalid":
+                raise ValueError("DSL 校验失败")
+            if runs.count(name) == 1 or name == "broken":
+                error = RuntimeError(f"{name} 失败")
+                # 处理函数据此决定发布 retrying 还是 error 终态
+                retry_flags.append((name, will_retry(error)))
+                raise error
+
+        queue.register("render", render)
+        queue.register("flaky", flaky)
+
+        async def run():
+            nonlocal release_held
+            release_held = asyncio.Event()
+            await queue.start()
+            # 队列外的 job 正在 Resolve 导出：占用 GPU_HEAVY 的任务等待，其它任务照常执行
+            assert lock.acquire("GPU_HEAVY", "job_outside")
+            render_id = queue.enqueue("render", {"name": "render"}, resources=["CPU", "GPU_HEAVY"])
+            light_id = queue.enqueue("render", {"name": "light"})
+            await asyncio.sleep(0.2)
+            assert queue.get_task(render_id).status == "queued"
+            assert queue.get_task(light_id).status == "done"
+            assert queue.get_stats()["slots"]["GPU_HEAVY"]["lock_available"] == 0
+            lock.release("GPU_HEAVY", "job_outside")
+            await queue.wait_idle(timeout=10)
+            assert queue.get_task(render_id).status == "done"
+
+            # 执行中的 GPU_HEAVY 任务以 task_id 持有信号量，结束后释放
+            held_id = queue.enqueue("render", {"name": "held"}, resources=["CPU", "GPU_HEAVY"])
+            await asyncio.sleep(0.2)
+            assert lock.held_by("GPU_HEAVY", held_id) and lock_seen == {"GPU_HEAVY": 0, "outside": False}
+            release_held.set()
+            await queue.wait_idle(timeout=10)
+            assert lock.available("GPU_HEAVY") == 1
+
+            # 拿不全时退还已获取的信号量
+            assert lock.acquire("RESOLVE_BUSY", "job_outside")
+            export = QueuedTask(task_id="task_x", kind="render", payload={}, resources=["CPU", "GPU_HEAVY", "RESOLVE"])
+            assert queue._acquire_locks(export) == {"RESOLVE"}
+            assert lock.available("GPU_HEAVY") == 1
+            lock.release("RESOLVE_BUSY", "job_outside")
+
+            # 第一次失败、第二次成功；一直失败的在最大次数后标记失败
+            retry_id = queue.enqueue("flaky", {"name": "retry"})
+            broken_id = queue.enqueue("flaky", {"name": "broken"})
+            # 确定性的失败不重试
+            invalid_id = queue.enqueue("flaky", {"name": "invalid"})
+            await queue.wait_idle(timeout=10)
+            await queue.stop()
+            return queue.get_task(retry_id), queue.get_task(broken_id), queue.get_task(invalid_id)
+
+        retried, broken, invalid = asyncio.run(run())
+        print(f"  执行: {runs}")
+        assert retried.status == "done" and retried.attempts == 2
+        assert broken.status == "failed" and broken.attempts == 2 and "broken 失败" in broken.error
+        assert invalid.status == "failed" and invalid.attempts == 1 and runs.count("invalid") == 1
+        assert sorted(retry_flags) == [("broken", False), ("broken", True), ("retry", True)]
+        assert not will_retry(RuntimeError("队列外调用"))
+        queue.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 与资源锁共用容量，失败任务按次数重试")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("任务队列测试")
+    print("=" * 70)
+
+    tests = [
+        ("资源类别推导", test_resource_classes),
+        ("优先级与槽位", test_priority_and_slots),
+        ("资源占位", test_reservation),
+        ("处理函数与取消", test_handlers_and_cancel),
+        ("重启恢复", test_restart_recovery),
+        ("资源锁与失败重试", test_resource_lock),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+测试 JobStore 并发写入
+
+测试内容：
+1. 并发 update_job / transition_state 不丢更新、不写坏 JSON
+2. update_job(state=...) 的状态转换不会被随后的写入覆盖
+3. 进度更新合并：窗口内多次更新只落盘一次，读取始终是最新值
+4. 状态转换 / 错误 / 结果立即落盘（并带上合并中的进度）
+"""
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.job_store import JobStore
+from app.core.orchestrator import JobState
+
+
+class CountingStore(JobStore):
+    """统计实际落盘次数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writes = 0
+
+    def _write_metadata(self, job_id, metadata):
+        self.writes += 1
+        super()._write_metadata(job_id, metadata)
+
+
+def _read_disk(store: JobStore, job_id: str) -> dict:
+    return json.loads((store.jobs_dir / job_id / "metadata.json").read_text(encoding="utf-8"))
+
+
+def test_concurrent_updates():
+    """测试 1: 并发更新"""
+    print("\n" + "=" * 70)
+    print("测试 1: 并发更新")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        store = JobStore(tmp_dir / "jobs", coalesce_ms=0)
+        other = JobStore(tmp_dir / "jobs", coalesce_ms=0)  # 路由模块各自持有实例
+        job_id = store.create_job()
+
+        errors = []
+        stop = threading.Event()
+
+        def writer(instance, worker):
+            try:
+                for i in range(50):
+                    instance.update_job(job_id, status=f"worker_{worker}", progress=i)
+            except Exception as e:
+                errors.append(e)
+
+        def results(instance):
+            try:
+                for i in range(20):
+                    job = instance.get_job(job_id)
+                    job_result = dict(job.get("result") or {})
+                    instance.update_job(job_id, result={**job_result, f"k{i}": i})
+            except Exception as e:
+                errors.append(e)
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    _read_disk(store, job_id)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(store if i % 2 else other, i)) for i in range(4)]
+        threads.append(threading.Thread(target=reader))
+        threads.append(threading.Thread(target=store.transition_state, args=(job_id, JobState.INGESTING)))
+        for t in threads:
+            t.start()
+        for t in threads[:4] + threads[5:]:
+            t.join()
+        results(other)
+        stop.set()
+        threads[4].join()
+
+        job = _read_disk(store, job_id)
+        print(f"  state={job['state']}, history={[h['state'] for h in job['state_history']]}")
+        assert not errors, errors
+        assert job["state"] == JobState.INGESTING.value
+        assert [h["state"] for h in job["state_history"]] == ["created", "ingesting"]
+        assert len(job["result"]) == 20
+        assert not list((store.jobs_dir / job_id).glob(".metadata.json.*"))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 无撕裂写入、无丢失更新")
+    return True
+
+
+def test_state_not_overwritten():
+    """测试 2: update_job 带状态转换"""
+    print("\n" + "=" * 70)
+    print("测试 2: update_job 带状态转换")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        store = JobStore(tmp_dir / "jobs", coalesce_ms=0)
+        job_id = store.create_job()
+
+        store.update_job(job_id, state=JobState.INGESTING, progress=5)
+        job = store.get_job(job_id)
+        assert job["state"] == JobState.INGESTING.value
+        assert job["progress"] == 5
+        assert job["state_history"][-1]["state"] == JobState.INGESTING.value
+
+        store.update_job(job_id, error="boom")
+        job = store.get_job(job_id)
+        print(f"  出错后状态: {job['state']}")
+        assert job["state"] == JobState.FAILED.value and job["error"] == "boom"
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 状态转换保留")
+    return True
+
+
+def test_progress_coalescing():
+    """测试 3: 进度更新合并"""
+    print("\n" + "=" * 70)
+    print("测试 3: 进度更新合并")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        store = CountingStore(tmp_dir / "jobs", coalesce_ms=100)
+        job_id = store.create_job()
+        store.writes = 0
+
+        for i in range(200):
+            store.update_job(job_id, status="transcribing", progress=i % 100)
+        assert store.get_job(job_id)["progress"] == 99
+        assert _read_disk(store, job_id)["progress"] == 0
+        assert store.list_jobs()[0]["progress"] == 0
+
+        time.sleep(0.3)
+        print(f"  200 次进度更新 → 落盘 {store.writes} 次")
+        assert store.writes == 1
+        assert _read_disk(store, job_id)["progress"] == 99
+        assert store.list_jobs()[0]["status"] == "transcribing"
+
+        # 返回的是副本，调用方修改不影响待写数据
+        store.update_job(job_id, progress=10)
+        store.get_job(job_id)["progress"] = -1
+        store.flush(job_id)
+        assert _read_disk(store, job_id)["progress"] == 10
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 合并落盘正确")
+    return True
+
+
+def test_immediate_writes():
+    """测试 4: 立即落盘的更新"""
+    print("\n" + "=" * 70)
+    print("测试 4: 立即落盘")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        store = CountingStore(tmp_dir / "jobs", coalesce_ms=10_000)
+        job_id = store.create_job()
+
+        store.update_job(job_id, progress=42)
+        store.update_job(job_id, result={"ok": True})
+        job = _read_disk(store, job_id)
+        assert job["progress"] == 42 and job["result"] == {"ok": True}
+
+        store.update_job(job_id, progress=50)
+        assert store.transition_state(job_id, JobState.INGESTING)[0]
+        job = _read_disk(store, job_id)
+        assert job["progress"] == 50 and job["state"] == JobState.INGESTING.value
+
+        # 删除任务会丢弃合并中的写入，不会在删除后重新生成目录
+        store.update_job(job_id, progress=60)
+        store.delete_job(job_id)
+        store.flush()
+        assert not (store.jobs_dir / job_id).exists()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 状态 / 结果立即落盘")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("JobStore 并发写入测试")
+    print("=" * 70)
+
+    tests = [
+        ("并发更新", test_concurrent_updates),
+        ("状态转换保留", test_state_not_overwritten),
+        ("进度合并", test_progress_coalescing),
+        ("立即落盘", test_immediate_writes),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
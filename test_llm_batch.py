@@ -0,0 +1,263 @@
+"""
+测试 /api/llm/batch-generate 并发批量生成
+
+测试内容：
+1. 各风格并发生成（受 LLM_BATCH_CONCURRENCY 限制，每个风格一个 LLMDirector），素材只编码一次，消息前缀完全相同
+2. 单个风格超时只影响该风格，未知风格单独报错
+3. stream=true 时每个风格完成即推送 result 事件，最后推送 done
+"""
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes_llm
+from app.config import settings
+from app.core import llm_client, llm_engine
+
+EXAMPLES = Path(__file__).parent / "examples"
+
+
+class FakeCompletions:
+    """记录请求与并发数；风格要求包含 slow_marker 的请求额外等待 slow_sec"""
+
+    def __init__(self, delay: float = 0.2, slow_marker: str = "", slow_sec: float = 0.0):
+        self.delay = delay
+        self.slow_marker = slow_marker
+        self.slow_sec = slow_sec
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        user = kwargs["messages"][1]["content"]
+        with self._lock:
+            self.calls.append(kwargs)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay + (self.slow_sec if self.slow_marker and self.slow_marker in user else 0))
+        finally:
+            with self._lock:
+                self.running -= 1
+
+        scene = next(line.split("|") for line in user.splitlines() if line.startswith("S0"))
+        content = json.dumps({
+            "meta": {"schema": "editing_dsl.v1", "target": "douyin", "aspect": "9:16"},
+            "editing_plan": {
+                "timeline": [{"order": 1, "scene_id": scene[0], "trim_frames": [int(scene[1]), int(scene[2])],
+                              "purpose": "hook"}],
+                "subtitles": {"mode": "from_transcript", "style": "bold_yellow"}
+            }
+        })
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeOpenAI:
+    completions = None
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeOpenAI.completions)
+
+
+class BatchClient:
+    """挂载 LLM 路由的测试应用，LLMDirector 使用假客户端（关闭回复缓存和限流），退出时恢复配置"""
+
+    def __init__(self, completions: FakeCompletions, concurrency: int = 3, timeout: float = 30.0):
+        self.completions = completions
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.compile_calls = 0
+        self.directors = []
+
+    def __enter__(self):
+        self._saved = (
+            settings.OPENAI_API_KEY, settings.LLM_BATCH_CONCURRENCY, settings.LLM_BATCH_STYLE_TIMEOUT_SEC,
+            settings.LLM_CACHE_ENABLED, settings.LLM_RATE_LIMIT_RPM, llm_client._llm_pool, routes_llm.LLMDirector
+        )
+        settings.OPENAI_API_KEY = "sk-test"
+        settings.LLM_BATCH_CONCURRENCY = self.concurrency
+        settings.LLM_BATCH_STYLE_TIMEOUT_SEC = self.timeout
+        settings.LLM_CACHE_ENABLED = False
+        settings.LLM_RATE_LIMIT_RPM = 0
+        FakeOpenAI.completions = self.completions
+        llm_client._llm_pool = llm_client.LLMClientPool(client_factory=FakeOpenAI)
+
+        def make_director():
+            director = llm_engine.LLMDirector()
+            compile_ = director.prompt_compiler.compile
+
+            def counting_compile(*args, **kwargs):
+                self.compile_calls += 1
+                return compile_(*args, **kwargs)
+
+            director.prompt_compiler.compile = counting_compile
+            self.directors.append(director)
+            return director
+
+        routes_llm.LLMDirector = make_director
+        app = FastAPI()
+        app.include_router(routes_llm.router, prefix="/api/llm")
+        self.client = TestClient(app)
+        return self
+
+    def __exit__(self, *exc):
+        (settings.OPENAI_API_KEY, settings.LLM_BATCH_CONCURRENCY, settings.LLM_BATCH_STYLE_TIMEOUT_SEC,
+         settings.LLM_CACHE_ENABLED, settings.LLM_RATE_LIMIT_RPM, llm_client._llm_pool,
+         routes_llm.LLMDirector) = self._saved
+
+    def post(self, styles: str, stream: bool = False):
+        files = {
+            "scenes_file": ("scenes.json", (EXAMPLES / "scenes.v1.json").read_bytes()),
+            "transcript_file": ("transcript.json", (EXAMPLES / "transcript.v1.json").read_bytes())
+        }
+        data = {"styles": styles, "stream": "true" if stream else "false"}
+        return self.client.post("/api/llm/batch-generate", files=files, data=data)
+
+
+def _parse_sse(text: str):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_concurrent_shared_prefix():
+    """测试 1: 并发生成与共享前缀"""
+    print("\n" + "=" * 70)
+    print("测试 1: 并发生成与共享前缀")
+    print("=" * 70)
+
+    completions = FakeCompletions(delay=0.2)
+    with BatchClient(completions, concurrency=3) as batch:
+        t0 = time.perf_counter()
+        response = batch.post("douyin,bilibili,youtube,kuaishou")
+        elapsed = time.perf_counter() - t0
+
+    assert response.status_code == 200
+    body = response.json()
+    print(f"  4 个风格耗时 {elapsed:.2f}s，并发峰值 {completions.peak}，meta={body['meta']['elapsed_sec']}s")
+    assert list(body["results"]) == ["douyin", "bilibili", "youtube", "kuaishou"]
+    assert all(result["success"] for result in body["results"].values())
+    assert completions.peak == 3
+    assert elapsed < 4 * 0.2
+    assert body["meta"]["styles"] == 4 and body["meta"]["prompt"]["scenes_total"] == 3
+
+    # 素材只编码一次；系统提示词和用户消息前缀相同，只有风格要求不同
+    assert batch.compile_calls == 1
+    # 编码用一个 LLMDirector，每个风格各用一个（统计不在线程间共享）
+    assert len({id(director) for director in batch.directors}) == 5
+    systems = {call["messages"][0]["content"] for call in completions.calls}
+    prefixes = {call["messages"][1]["content"].split("【风格要求】")[0] for call in completions.calls}
+    users = {call["messages"][1]["content"] for call in completions.calls}
+    assert len(systems) == 1 and len(prefixes) == 1 and len(users) == 4
+    # 每次请求的超时不超过该风格剩余的时间
+    assert all(29.0 < call["timeout"] <= 30.0 for call in completions.calls)
+    assert not any("deadline" in call for call in completions.calls)
+    # 风格要求在用户消息末尾
+    assert all(call["messages"][1]["content"].rstrip().endswith("JSON。") for call in completions.calls)
+
+    print("  ✅ 并发受限，前缀共享")
+    return True
+
+
+def test_style_timeout():
+    """测试 2: 单个风格超时"""
+    print("\n" + "=" * 70)
+    print("测试 2: 单个风格超时")
+    print("=" * 70)
+
+    completions = FakeCompletions(delay=0.05, slow_marker="B站知识区风格", slow_sec=1.0)
+    with BatchClient(completions, concurrency=2, timeout=0.4) as batch:
+        response = batch.post("douyin,bilibili,unknown,youtube")
+
+    results = response.json()["results"]
+    print(f"  { {key: result.get('error', 'ok') for key, result in results.items()} }")
+    assert results["bilibili"]["timeout"] is True and "超时" in results["bilibili"]["error"]
+    assert results["unknown"] == {"error": "未知风格: unknown"}
+    assert results["douyin"]["success"] and results["youtube"]["success"]
+    assert results["bilibili"]["elapsed_sec"] < 1.0
+
+    # 超时后 LLM 线程还在跑：并发名额等线程返回才释放，下一个风格不会与它同时请求
+    completions = FakeCompletions(delay=0.05, slow_marker="B站知识区风格", slow_sec=0.6)
+    with BatchClient(completions, concurrency=1, timeout=0.2) as batch:
+        results = batch.post("bilibili,douyin").json()["results"]
+    print(f"  并发 1：{ {key: result.get('error', 'ok') for key, result in results.items()} }，峰值 {completions.peak}")
+    assert results["bilibili"]["timeout"] is True and results["douyin"]["success"]
+    assert completions.peak == 1
+
+    print("  ✅ 超时只影响该风格")
+    return True
+
+
+def test_stream_partial_results():
+    """测试 3: 流式返回"""
+    print("\n" + "=" * 70)
+    print("测试 3: 流式返回")
+    print("=" * 70)
+
+    completions = FakeCompletions(delay=0.05, slow_marker="YouTube Vlog 风格", slow_sec=0.3)
+    with BatchClient(completions, concurrency=3) as batch:
+        response = batch.post("youtube,douyin,nope", stream=True)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    print(f"  事件顺序: {[(event, data.get('style')) for event, data in events]}")
+    assert [event for event, _ in events] == ["result", "result", "result", "done"]
+    # 未知风格立即返回，快的风格先于慢的风格
+    assert [data["style"] for _, data in events[:3]] == ["nope", "douyin", "youtube"]
+    assert events[1][1]["success"] and events[1][1]["dsl"]["meta"]["schema"] == "editing_dsl.v1"
+    assert events[3][1]["styles"] == 3
+
+    print("  ✅ 每个风格完成即推送")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("批量生成测试")
+    print("=" * 70)
+
+    tests = [
+        ("并发生成与共享前缀", test_concurrent_shared_prefix),
+        ("单个风格超时", test_style_timeout),
+        ("流式返回", test_stream_partial_results),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+测试 LLM 回复缓存
+
+测试内容：
+1. 相同请求命中缓存：只调用一次服务商，统计命中率与节省的耗时
+2. use_cache=False 重新生成：跳过读取，新回复覆盖旧条目；无效 JSON 不写入缓存
+3. 过期与容量淘汰：超过 TTL 的条目读取时删除，超出容量按最近访问时间淘汰
+4. LLMDirector / VisualStoryteller 接入缓存，/api/runtime/llm-cache 返回统计
+"""
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes_runtime
+from app.config import settings
+from app.core import llm_cache, llm_client, llm_engine, visual_storyteller
+from app.core.llm_cache import LLMResponseCache, chat_json
+from app.core.prompt_compiler import PromptCompiler
+from app.models.schemas import ScenesJSON, TranscriptJSON
+
+
+class FakeCompletions:
+    """按调用次数返回不同的回复，便于区分缓存结果与新结果"""
+
+    def __init__(self, delay: float = 0.02, content: str = None):
+        self.delay = delay
+        self.content = content
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        time.sleep(self.delay)
+        content = self.content or json.dumps({"call": len(self.calls)})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeOpenAI:
+    completions = None
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeOpenAI.completions)
+
+
+class TempCache:
+    """临时目录中的全局 LLM 缓存，退出时恢复配置并删除目录"""
+
+    def __init__(self, max_mb: int = 16, ttl_sec: float = 0):
+        self.max_mb = max_mb
+        self.ttl_sec = ttl_sec
+
+    def __enter__(self) -> LLMResponseCache:
+        self._saved = (settings.LLM_CACHE_ENABLED, llm_cache._llm_cache)
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="llm_cache_"))
+        settings.LLM_CACHE_ENABLED = True
+        llm_cache._llm_cache = LLMResponseCache(self.tmp_dir, max_mb=self.max_mb, ttl_sec=self.ttl_sec)
+        return llm_cache._llm_cache
+
+    def __exit__(self, *exc):
+        settings.LLM_CACHE_ENABLED, llm_cache._llm_cache = self._saved
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def _client(completions: FakeCompletions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def _messages(text: str = "构思一个故事"):
+    return [{"role": "system", "content": "你是剪辑导演"}, {"role": "user", "content": text}]
+
+
+def test_cache_hit():
+    """测试 1: 相同请求命中缓存"""
+    print("\n" + "=" * 70)
+    print("测试 1: 相同请求命中缓存")
+    print("=" * 70)
+
+    completions = FakeCompletions(delay=0.05)
+    client = _client(completions)
+    with TempCache() as cache:
+        first = chat_json(client, "gpt-4o", _messages(), temperature=0.7, timeout=30)
+        second = chat_json(client, "gpt-4o", _messages(), temperature=0.7, timeout=60)
+        # 温度或消息不同都是新请求
+        chat_json(client, "gpt-4o", _messages(), temperature=0.8)
+        chat_json(client, "gpt-4o", _messages("换一个主题"), temperature=0.7)
+        stats = cache.get_stats()
+
+    print(f"  {stats}")
+    assert first == second == {"call": 1}
+    assert len(completions.calls) == 3
+    assert stats["hits"] == 1 and stats["misses"] == 3 and stats["writes"] == 3
+    assert stats["hit_rate"] == 0.25 and stats["entries"] == 3
+    assert stats["saved_ms"] >= 50 and stats["avg_call_ms"] >= 50
+
+    print("  ✅ 相同请求只调用一次")
+    return True
+
+
+def test_bypass_and_invalid_json():
+    """测试 2: 重新生成与无效 JSON"""
+    print("\n" + "=" * 70)
+    print("测试 2: 重新生成与无效 JSON")
+    print("=" * 70)
+
+    completions = FakeCompletions(delay=0.0)
+    client = _client(completions)
+    with TempCache() as cache:
+        assert chat_json(client, "gpt-4o", _messages()) == {"call": 1}
+        # 跳过读取，新回复覆盖旧条目
+        assert chat_json(client, "gpt-4o", _messages(), use_cache=False) == {"call": 2}
+        assert chat_json(client, "gpt-4o", _messages()) == {"call": 2}
+
+        broken = _client(FakeCompletions(delay=0.0, content="不是 JSON"))
+        try:
+            chat_json(broken, "gpt-4o", _messages("坏回复"))
+            assert False, "应该抛出 JSONDecodeError"
+        except json.JSONDecodeError:
+            pass
+        stats = cache.get_stats()
+
+    print(f"  {stats}")
+    assert len(completions.calls) == 2
+    assert stats["bypassed"] == 1 and stats["hits"] == 1 and stats["entries"] == 1
+
+    print("  ✅ 重新生成覆盖旧结果，无效回复不缓存")
+    return True
+
+
+def test_ttl_and_eviction():
+    """测试 3: 过期与容量淘汰"""
+    print("\n" + "=" * 70)
+    print("测试 3: 过期与容量淘汰")
+    print("=" * 70)
+
+    with TempCache(ttl_sec=60) as cache:
+        key = cache.make_key("gpt-4o", _messages(), 0.7)
+        cache.put(key, '{"a": 1}', model="gpt-4o", latency_ms=10)
+        assert cache.get(key) == '{"a": 1}'
+
+        # 把创建时间改到 TTL 之前
+        path = cache._path(key)
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        entry["created_at"] -= 120
+        path.write_text(json.dumps(entry), encoding="utf-8")
+        assert cache.get(key) is None and not path.exists()
+        assert cache.get_stats()["expired"] == 1
+
+    with TempCache(max_mb=1) as cache:
+        payload = json.dumps({"text": "x" * 300_000})
+        keys = [cache.make_key("gpt-4o", _messages(str(i)), 0.7) for i in range(4)]
+        for key in keys[:3]:
+            cache.put(key, payload)
+            time.sleep(0.01)
+        cache.get(keys[0])  # 最近访问过，保留
+        cache.put(keys[3], payload)
+        stats = cache.get_stats()
+        remaining = [cache._path(key).exists() for key in keys]
+
+    print(f"  淘汰 {stats['evictions']} 条，剩余 {stats['entries']} 条 {stats['size_mb']}MB")
+    assert remaining == [True, False, True, True]
+    assert stats["evictions"] == 1 and stats["size_mb"] <= 1
+
+    print("  ✅ 过期条目删除，超出容量淘汰最久未访问的条目")
+    return True
+
+
+def test_director_and_storyteller():
+    """测试 4: LLMDirector / VisualStoryteller 接入缓存"""
+    print("\n" + "=" * 70)
+    print("测试 4: LLMDirector / VisualStoryteller 接入缓存")
+    print("=" * 70)
+
+    scenes = ScenesJSON(**json.loads((Path(__file__).parent / "examples" / "scenes.v1.json").read_text(encoding="utf-8")))
+    transcript = TranscriptJSON(**json.loads((Path(__file__).parent / "examples" / "transcript.v1.json").read_text(encoding="utf-8")))
+
+    completions = FakeCompletions(delay=0.02)
+    FakeOpenAI.completions = completions
+    saved = (settings.OPENAI_API_KEY, llm_client._llm_pool)
+    settings.OPENAI_API_KEY = "sk-test"
+    llm_client._llm_pool = llm_client.LLMClientPool(client_factory=FakeOpenAI)
+    try:
+        with TempCache():
+            for use_cache in (True, True, False):
+                director = llm_engine.LLMDirector(use_cache=use_cache)
+                director.prompt_compiler = PromptCompiler(token_budget=100000)
+                director.generate_editing_dsl(scenes, transcript, "快节奏", hierarchical=False)
+            assert len(completions.calls) == 2
+
+            storyteller = visual_storyteller.VisualStoryteller()
+            storyteller._brainstorm_story("S0001: 咖啡", 30, None)
+            storyteller._brainstorm_story("S0001: 咖啡", 30, None)
+            assert len(completions.calls) == 3
+            assert completions.calls[2]["temperature"] == 0.8
+
+            app = FastAPI()
+            app.include_router(routes_runtime.router, prefix="/api")
+            stats = TestClient(app).get("/api/runtime/llm-cache").json()
+    finally:
+        settings.OPENAI_API_KEY, llm_client._llm_pool = saved
+
+    print(f"  {stats}")
+    assert stats["enabled"] is True
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["bypassed"] == 1
+    assert stats["saved_ms"] > 0 and stats["entries"] == 2
+
+    saved_enabled = settings.LLM_CACHE_ENABLED
+    settings.LLM_CACHE_ENABLED = False
+    try:
+        assert TestClient(app).get("/api/runtime/llm-cache").json() == {"enabled": False}
+    finally:
+        settings.LLM_CACHE_ENABLED = saved_enabled
+
+    print("  ✅ 重复生成命中缓存，可通过运行时接口查看统计")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("LLM 回复缓存测试")
+    print("=" * 70)
+
+    tests = [
+        ("相同请求命中缓存", test_cache_hit),
+        ("重新生成与无效 JSON", test_bypass_and_invalid_json),
+        ("过期与容量淘汰", test_ttl_and_eviction),
+        ("LLMDirector / VisualStoryteller 接入缓存", test_director_and_storyteller),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+测试共享 LLM 客户端池
+
+测试内容：
+1. 客户端共享：LLMDirector / VisualStoryteller / VisualAnalyzer 共用一个客户端，按服务商分组
+2. 抖动重试：429 / 5xx / 连接错误退避后重试（遵循 Retry-After），其它 4xx 直接失败
+3. 令牌桶：超出突发容量后按速率排队，429 时整个服务商暂停
+4. 并发调用方共享限流，/runtime/llm-clients 返回统计
+"""
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import httpx
+import openai
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes_runtime
+from app.config import settings
+from app.core import llm_client, llm_engine, visual_storyteller
+from app.core.llm_client import LLMClientPool, LLMDeadlineExceeded, TokenBucket, backoff_seconds
+from app.tools import visual_analyzer
+
+
+def _status_error(status: int, headers: dict = None) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    response = httpx.Response(status, request=request, headers=headers or {})
+    error_class = {
+        400: openai.BadRequestError,
+        429: openai.RateLimitError,
+        500: openai.InternalServerError
+    }.get(status, openai.APIStatusError)
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+
+class FakeCompletions:
+    """按脚本依次抛出错误，之后返回成功回复"""
+
+    def __init__(self, errors: list = None, delay: float = 0.0):
+        self.errors = list(errors or [])
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls.append((time.monotonic(), kwargs))
+            error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+        time.sleep(self.delay)
+        content = json.dumps({"ok": True})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeOpenAI:
+    """记录创建次数与参数的假客户端"""
+    created = []
+
+    def __init__(self, **kwargs):
+        FakeOpenAI.created.append(kwargs)
+        self.chat = SimpleNamespace(completions=FakeCompletions())
+
+
+class TempPool:
+    """临时替换全局客户端池与限流 / 重试配置，退出时恢复"""
+
+    def __init__(self, rpm: int = 0, burst: int = 10, retries: int = 3, retry_base: float = 0.01):
+        self.config = {
+            "LLM_RATE_LIMIT_RPM": rpm,
+            "LLM_RATE_LIMIT_BURST": burst,
+            "LLM_MAX_RETRIES": retries,
+            "LLM_RETRY_BASE_SEC": retry_base,
+            "LLM_RETRY_MAX_SEC": 1.0,
+            "OPENAI_API_KEY": "sk-test",
+            "OPENAI_BASE_URL": "",
+            "LLM_CACHE_ENABLED": False
+        }
+
+    def __enter__(self) -> LLMClientPool:
+        self._saved = ({name: getattr(settings, name) for name in self.config}, llm_client._llm_pool)
+        for name, value in self.config.items():
+            setattr(settings, name, value)
+        FakeOpenAI.created = []
+        llm_client._llm_pool = LLMClientPool(client_factory=FakeOpenAI)
+        return llm_client._llm_pool
+
+    def __exit__(self, *exc):
+        saved_config, llm_client._llm_pool = self._saved
+        for name, value in saved_config.items():
+            setattr(settings, name, value)
+
+
+def test_shared_client():
+    """测试 1: 客户端共享"""
+    print("\n" + "=" * 70)
+    print("测试 1: 客户端共享")
+    print("=" * 70)
+
+    with TempPool() as pool:
+        directors = [llm_engine.LLMDirector() for _ in range(3)]
+        storyteller = visual_storyteller.VisualStoryteller()
+        analyzer = visual_analyzer.VisualAnalyzer()
+        clients = {id(obj.client) for obj in directors + [storyteller, analyzer]}
+        assert len(clients) == 1 and len(FakeOpenAI.created) == 1
+        assert FakeOpenAI.created[0] == {"api_key": "sk-test", "base_url": ""}
+
+        # 自定义端点是另一个服务商，单独的客户端和令牌桶
+        deepseek = llm_client.get_llm_client(base_url="https://api.deepseek.com/v1")
+        assert deepseek.provider == "api.deepseek.com" and deepseek.bucket is not directors[0].client.bucket
+        assert len(FakeOpenAI.created) == 2
+        print(f"  5 个实例 → 1 个客户端；服务商: {sorted(pool.get_stats()['providers'])}")
+
+    # 默认工厂：自带连接池，重试交给 PooledClient
+    real = LLMClientPool._create_openai(api_key="sk-test", base_url="https://api.example.com/v1")
+    try:
+        assert real.max_retries == 0 and str(real.base_url) == "https://api.example.com/v1/"
+        assert isinstance(real._client, httpx.Client)
+    finally:
+        real.close()
+
+    print("  ✅ 所有调用方共用一个长连接客户端")
+    return True
+
+
+def test_retry_with_backoff():
+    """测试 2: 抖动重试"""
+    print("\n" + "=" * 70)
+    print("测试 2: 抖动重试")
+    print("=" * 70)
+
+    with TempPool(retries=3) as pool:
+        client = llm_client.get_llm_client()
+        fake = client.client.chat.completions
+        connection_error = openai.APIConnectionError(request=httpx.Request("POST", "https://api.example.com"))
+        fake.errors = [_status_error(429, {"retry-after": "0.2"}), _status_error(500), connection_error]
+
+        t0 = time.perf_counter()
+        response = client.chat.completions.create(model="gpt-4o", messages=[], timeout=5)
+        elapsed = time.perf_counter() - t0
+        assert json.loads(response.choices[0].message.content) == {"ok": True}
+        assert len(fake.calls) == 4 and fake.calls[-1][1]["timeout"] == 5
+        # 遵循 Retry-After
+        assert fake.calls[1][0] - fake.calls[0][0] >= 0.2 and elapsed >= 0.2
+
+        stats = pool.get_stats()["providers"]["openai"]
+        print(f"  {stats}")
+        assert stats["retries"] == 3 and stats["rate_limited"] == 1 and stats["server_errors"] == 1
+        assert stats["successes"] == 1 and stats["failures"] == 0 and stats["requests"] == 4
+
+        # 参数错误不重试
+        fake.calls.clear()
+        fake.errors = [_status_error(400)]
+        try:
+            client.chat.completions.create(model="gpt-4o", messages=[])
+            assert False, "应该抛出 BadRequestError"
+        except openai.BadRequestError:
+            pass
+        assert len(fake.calls) == 1
+
+        # 重试用尽后抛出最后一次错误
+        fake.calls.clear()
+        fake.errors = [_status_error(503)] * 4
+        try:
+            client.chat.completions.create(model="gpt-4o", messages=[])
+            assert False, "应该抛出 APIStatusError"
+        except openai.APIStatusError as e:
+            assert e.status_code == 503
+        assert len(fake.calls) == 4
+        assert pool.get_stats()["providers"]["openai"]["failures"] == 2
+
+        # 截止时间：请求超时不超过剩余时间，等不到下一次重试时直接失败，过期后不再请求
+        fake.calls.clear()
+        fake.errors = [_status_error(429, {"retry-after": "0.5"})]
+        try:
+            client.chat.completions.create(model="gpt-4o", messages=[], timeout=5, deadline=time.monotonic() + 0.3)
+            assert False, "应该抛出 RateLimitError"
+        except openai.RateLimitError:
+            pass
+        assert len(fake.calls) == 1 and fake.calls[0][1]["timeout"] <= 0.3
+        assert "deadline" not in fake.calls[0][1]
+        try:
+            client.chat.completions.create(model="gpt-4o", messages=[], deadline=time.monotonic() - 1)
+            assert False, "应该抛出 LLMDeadlineExceeded"
+        except LLMDeadlineExceeded:
+            pass
+        assert len(fake.calls) == 1
+
+    # 完全抖动：等待时间在 0 ~ min(cap, base * 2^n) 之间且不全相同
+    delays = [backoff_seconds(3, 1.0, 5.0) for _ in range(200)]
+    assert all(0 <= d <= 5.0 for d in delays) and len({round(d, 3) for d in delays}) > 50
+
+    print("  ✅ 429 / 5xx / 连接错误重试，其它错误直接失败")
+    return True
+
+
+def test_token_bucket():
+    """测试 3: 令牌桶"""
+    print("\n" + "=" * 70)
+    print("测试 3: 令牌桶")
+    print("=" * 70)
+
+    now = [100.0]
+    bucket = TokenBucket(rate_per_min=60, burst=2, clock=lambda: now[0])
+    # 突发 2 个立即放行，之后每秒 1 个，后来者排在后面
+    waits = [bucket.reserve() for _ in range(4)]
+    print(f"  等待: {waits}")
+    assert waits == [0.0, 0.0, 1.0, 2.0]
+
+    now[0] += 10  # 空闲后最多恢复到桶容量
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 1.0]
+
+    now[0] += 10
+    bucket.pause(5)
+    assert bucket.reserve() == 5.0
+
+    unlimited = TokenBucket(rate_per_min=0, burst=1)
+    assert all(unlimited.reserve() == 0.0 for _ in range(100))
+
+    print("  ✅ 按速率排队，429 时暂停")
+    return True
+
+
+def test_concurrent_rate_limit():
+    """测试 4: 并发调用方共享限流"""
+    print("\n" + "=" * 70)
+    print("测试 4: 并发调用方共享限流")
+    print("=" * 70)
+
+    # 每秒 10 个请求，突发 2 个：12 个并发请求至少需要 1 秒
+    with TempPool(rpm=600, burst=2) as pool:
+        directors = [llm_engine.LLMDirector() for _ in range(4)]
+        fake = directors[0].client.client.chat.completions
+        fake.delay = 0.01
+
+        def worker(director):
+            for _ in range(3):
+                director.client.chat.completions.create(model="gpt-4o", messages=[])
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(director,)) for director in directors]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - t0
+
+        starts = sorted(t for t, _ in fake.calls)
+        windows = max(sum(1 for t in starts if s <= t < s + 0.5) for s in starts)
+        print(f"  12 个请求耗时 {elapsed:.2f}s，任意 0.5s 内最多 {windows} 个")
+        assert len(fake.calls) == 12 and elapsed >= 0.95
+        assert windows <= 2 + 5 + 1
+
+        app = FastAPI()
+        app.include_router(routes_runtime.router, prefix="/api")
+        stats = TestClient(app).get("/api/runtime/llm-clients").json()
+
+    print(f"  {stats}")
+    provider = stats["providers"]["openai"]
+    assert provider["requests"] == 12 and provider["successes"] == 12 and provider["clients"] == 1
+    assert provider["throttled_seconds"] > 0 and provider["avg_call_ms"] >= 10
+    assert stats["rate_limit_rpm"] == 600 and stats["rate_limit_burst"] == 2
+
+    print("  ✅ 并发调用方共享一个令牌桶")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("共享 LLM 客户端测试")
+    print("=" * 70)
+
+    tests = [
+        ("客户端共享", test_shared_client),
+        ("抖动重试", test_retry_with_backoff),
+        ("令牌桶", test_token_bucket),
+        ("并发调用方共享限流", test_concurrent_rate_limit),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+测试媒体探测缓存
+
+测试内容：
+1. ffprobe 结果解析：时长 / 帧率 / 分辨率 / 音视频流 / 创建时间
+2. 缓存：同一文件只探测一次，文件变化后重新探测
+3. 探测失败：不抛异常，时长为 0
+4. AudioMatcher：50 视频 × 50 音频只探测 100 次
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools.audio_matcher import AudioMatcher
+from app.tools.media_probe import MediaInfo, MediaProbe, parse_frame_rate
+
+
+SAMPLE_FFPROBE = {
+    "format": {
+        "format_name": "mov,mp4,m4a,3gp,3g2,mj2",
+        "duration": "12.500000",
+        "bit_rate": "8000000",
+        "tags": {"creation_time": "2024-05-01T08:00:00.000000Z"}
+    },
+    "streams": [
+        {
+            "codec_type": "video",
+            "codec_name": "h264",
+            "width": 1920,
+            "height": 1080,
+            "r_frame_rate": "30000/1001",
+            "avg_frame_rate": "30000/1001"
+        },
+        {
+            "codec_type": "audio",
+            "codec_name": "aac",
+            "sample_rate": "48000",
+            "channels": 2
+        }
+    ]
+}
+
+
+class CountingRunner:
+    """记录 ffprobe 调用次数的假探测函数"""
+
+    def __init__(self, data=None):
+        self.data = data or SAMPLE_FFPROBE
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path, timeout):
+        with self._lock:
+            self.calls.append(path)
+        return self.data
+
+
+def test_parse_ffprobe():
+    """测试 1: ffprobe 结果解析"""
+    print("\n" + "=" * 70)
+    print("测试 1: ffprobe 结果解析")
+    print("=" * 70)
+
+    info = MediaInfo.from_ffprobe("/x.mp4", 100, 1.0, SAMPLE_FFPROBE)
+    print(f"  {info.to_dict()}")
+    assert info.duration == 12.5
+    assert info.width == 1920 and info.height == 1080
+    assert abs(info.fps - 29.97) < 0.01
+    assert info.has_video and info.has_audio
+    assert info.sample_rate == 48000 and info.channels == 2
+    assert info.creation_time is not None
+    assert "streams" not in info.to_dict()
+
+    # 纯音频 + 封面图
+    audio_only = MediaInfo.from_ffprobe("/x.mp3", 100, 1.0, {
+        "format": {"duration": "3.0"},
+        "streams": [
+            {"codec_type": "audio", "codec_name": "mp3"},
+            {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}}
+        ]
+    })
+    assert audio_only.has_audio and not audio_only.has_video
+    assert audio_only.creation_time is None
+
+    assert parse_frame_rate("25/1") == 25.0
+    assert parse_frame_rate("0/0") == 0.0
+    assert parse_frame_rate(None) == 0.0
+
+    print("  ✅ 解析正确")
+    return True
+
+
+def test_probe_cache():
+    """测试 2: 缓存与失效"""
+    print("\n" + "=" * 70)
+    print("测试 2: 缓存与失效")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        media = tmp_dir / "clip.mp4"
+        media.write_bytes(b"0" * 100)
+
+        runner = CountingRunner()
+        probe = MediaProbe(runner=runner)
+
+        for _ in range(5):
+            assert probe.get_duration(str(media)) == 12.5
+        probe.get_creation_time(str(media))
+        assert len(runner.calls) == 1, f"同一文件应只探测一次，实际 {len(runner.calls)}"
+
+        # 相对路径与绝对路径共用缓存
+        cwd = os.getcwd()
+        try:
+            os.chdir(tmp_dir)
+            probe.probe("clip.mp4")
+        finally:
+            os.chdir(cwd)
+        assert len(runner.calls) == 1
+
+        # 文件被替换（大小 / mtime 变化）后重新探测
+        media.write_bytes(b"0" * 200)
+        probe.probe(str(media))
+        assert len(runner.calls) == 2
+
+        # 并发探测同一文件只跑一次
+        probe.clear()
+        threads = [threading.Thread(target=probe.probe, args=(str(media),)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(runner.calls) == 3
+
+        stats = probe.get_stats()
+        print(f"  统计: {stats}")
+        assert stats["probes"] == 3
+        assert stats["entries"] == 1
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 缓存命中 / 失效正确")
+    return True
+
+
+def test_probe_failure():
+    """测试 3: 探测失败"""
+    print("\n" + "=" * 70)
+    print("测试 3: 探测失败")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        media = tmp_dir / "broken.mp4"
+        media.write_bytes(b"not a video")
+
+        def failing_runner(path, timeout):
+            raise RuntimeError("Invalid data found when processing input")
+
+        probe = MediaProbe(runner=failing_runner)
+        info = probe.probe(str(media))
+        assert not info.ok and info.duration == 0.0
+
+        # 回退到文件系统时间
+        assert probe.get_creation_time(str(media)) == os.stat(media).st_ctime
+
+        missing = probe.probe(str(tmp_dir / "missing.mp4"))
+        assert not missing.ok
+        assert probe.get_stats()["failures"] == 1
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 失败不抛异常")
+    return True
+
+
+def test_matcher_probe_count():
+    """测试 4: AudioMatcher 探测次数"""
+    print("\n" + "=" * 70)
+    print("测试 4: 50 视频 × 50 音频匹配的探测次数")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        videos, audios = [], []
+        for i in range(50):
+            video = tmp_dir / f"CAM_{i:03d}.mp4"
+            audio = tmp_dir / f"ZOOM_{i:03d}.wav"
+            video.write_bytes(b"v")
+            audio.write_bytes(b"a")
+            videos.append({"asset_id": f"V{i:03d}", "path": str(video)})
+            audios.append({"asset_id": f"A{i:03d}", "path": str(audio)})
+
+        runner = CountingRunner()
+        matcher = AudioMatcher(probe=MediaProbe(runner=runner))
+        matches = matcher.match_audio_to_videos(videos, audios)
+
+        print(f"  ffprobe 次数: {len(runner.calls)}")
+        assert len(matches) == 50
+        assert all(m.match_method == "explicit" for m in matches)
+        assert len(runner.calls) == 100
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 每个文件只探测一次")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("媒体探测缓存测试")
+    print("=" * 70)
+
+    tests = [
+        ("ffprobe 解析", test_parse_ffprobe),
+        ("缓存与失效", test_probe_cache),
+        ("探测失败", test_probe_failure),
+        ("匹配探测次数", test_matcher_probe_count),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+测试并发模态分析
+
+测试内容：
+1. 素材任务图中模态分析节点按 cpu 上限并发，结果按资源顺序输出
+2. 中断后续跑：只分析未完成 / 失败 / 输入已变化的资源
+3. 并发上限：MODALITY_WORKERS + 调度器资源锁
+4. 解码超时按时长缩放
+"""
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.config import settings
+from app.core.orchestrator import get_orchestrator
+from app.tools.modality_analyzer import ModalityAnalysis, ModalityAnalyzer
+from app.tools.smart_pipeline import SmartPipeline
+
+
+class FakeAnalyzer:
+    """记录调用与并发度的假分析器"""
+
+    def __init__(self, delay=0.05, crash_on=None, fail_on=None):
+        self.delay = delay
+        self.crash_on = crash_on
+        self.fail_on = fail_on
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def analyze(self, video_path, audio_path=None):
+        with self._lock:
+            self.calls.append(Path(video_path).name)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.crash_on and video_path.endswith(self.crash_on):
+                raise RuntimeError("模拟崩溃")
+            return ModalityAnalysis(
+                has_voice=True,
+                speech_ratio=0.7,
+                music_ratio=0.0,
+                silence_ratio=0.3,
+                likely_talking_head=True,
+                recommended_mode="ASR_PRIMARY",
+                confidence=0.9,
+                audio_present=True,
+                avg_volume_db=-20,
+                volume_variance=12,
+                speech_segments=10,
+                error="音频特征提取超时" if self.fail_on and video_path.endswith(self.fail_on) else None
+            )
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _make_assets(tmp_dir: Path, count: int):
+    videos = []
+    for i in range(count):
+        path = tmp_dir / f"clip_{i}.mp4"
+        path.write_bytes(b"0" * (i + 1))
+        videos.append({"asset_id": f"V{i + 1:03d}", "path": str(path), "quality": {"usable": True}})
+    videos.append({"asset_id": "VBAD", "path": str(tmp_dir / "bad.mp4"), "quality": {"usable": False}})
+    return {"videos": videos, "audios": []}
+
+
+def _make_pipeline(job_dir: Path, analyzer: FakeAnalyzer) -> SmartPipeline:
+    """模态分析之外的节点替换为空操作（质量在 _make_assets 中已给定，不切段）"""
+    job_dir.mkdir(exist_ok=True)
+    pipeline = SmartPipeline(job_dir)
+    pipeline.modality_analyzer = analyzer
+    pipeline._triage_video = lambda video: None
+    pipeline._segment_assets = lambda assets, policies: []
+    return pipeline
+
+
+def _process(pipeline: SmartPipeline, assets, workers: int) -> dict:
+    """按素材任务图运行，cpu 节点（含模态分析）并发数为 workers"""
+    original = settings.MODALITY_WORKERS
+    settings.MODALITY_WORKERS = workers
+    try:
+        return pipeline._process_assets(assets)["policies"]
+    finally:
+        settings.MODALITY_WORKERS = original
+
+
+def test_parallel_analysis():
+    """测试 1: 并发分析"""
+    print("\n" + "=" * 70)
+    print("测试 1: 并发分析")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        assets = _make_assets(tmp_dir, 8)
+        pipeline = _make_pipeline(tmp_dir / "job", FakeAnalyzer(delay=0.1))
+
+        start = time.time()
+        policies = _process(pipeline, assets, workers=4)
+        elapsed = time.time() - start
+
+        print(f"  8 个资源, 4 workers: {elapsed:.2f}s, 最大并发 {pipeline.modality_analyzer.max_active}")
+        assert pipeline.modality_analyzer.max_active == 4
+        assert elapsed < 0.6
+        assert list(policies) == [v["asset_id"] for v in assets["videos"]]
+        assert policies["VBAD"]["mode"] == "SKIP"
+        assert all(p["mode"] == "ASR_PRIMARY" for k, p in policies.items() if k != "VBAD")
+
+        saved = json.loads((tmp_dir / "job" / "temp" / "modality_policy.json").read_text(encoding="utf-8"))
+        assert set(saved) == set(policies)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 并发分析正确")
+    return True
+
+
+def test_resume_after_crash():
+    """测试 2: 中断后续跑"""
+    print("\n" + "=" * 70)
+    print("测试 2: 中断后续跑")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        assets = _make_assets(tmp_dir, 6)
+        pipeline = _make_pipeline(tmp_dir / "job", FakeAnalyzer(crash_on="clip_5.mp4", fail_on="clip_4.mp4"))
+
+        # 第一次：clip_5 崩溃，clip_4 超时
+        try:
+            _process(pipeline, assets, workers=1)
+            assert False, "应该抛出异常"
+        except RuntimeError:
+            pass
+
+        saved = json.loads((tmp_dir / "job" / "temp" / "modality_policy.json").read_text(encoding="utf-8"))
+        print(f"  崩溃前已保存: {sorted(saved)}")
+        assert "V006" not in saved and "V005" in saved
+
+        # 输入变化：clip_0 被替换
+        (tmp_dir / "clip_0.mp4").write_bytes(b"new content")
+
+        # 第二次：只分析 clip_0（变化）、clip_4（失败）、clip_5（未完成）
+        pipeline.modality_analyzer = FakeAnalyzer()
+        policies = _process(pipeline, assets, workers=2)
+        print(f"  续跑分析: {sorted(pipeline.modality_analyzer.calls)}")
+        assert sorted(pipeline.modality_analyzer.calls) == ["clip_0.mp4", "clip_4.mp4", "clip_5.mp4"]
+        assert len(policies) == 7
+        assert not any(p.get("error") for p in policies.values())
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 续跑只分析必要的资源")
+    return True
+
+
+def test_worker_cap():
+    """测试 3: 并发上限"""
+    print("\n" + "=" * 70)
+    print("测试 3: 并发上限")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    original = settings.MODALITY_WORKERS
+    resource_lock = get_orchestrator().resource_lock
+    try:
+        (tmp_dir / "job").mkdir()
+        pipeline = SmartPipeline(tmp_dir / "job")
+        settings.MODALITY_WORKERS = 8
+
+        assert pipeline._modality_workers(20) == 8
+        assert pipeline._modality_workers(3) == 3
+
+        was_locked = resource_lock.is_locked("RESOLVE_BUSY")
+        resource_lock.acquire("RESOLVE_BUSY")
+        try:
+            print(f"  Resolve 渲染中: {pipeline._modality_workers(20)} workers")
+            assert pipeline._modality_workers(20) == 4
+        finally:
+            if not was_locked:
+                resource_lock.release("RESOLVE_BUSY")
+
+        settings.MODALITY_WORKERS = 0
+        assert pipeline._modality_workers(20) >= 1
+    finally:
+        settings.MODALITY_WORKERS = original
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 并发上限正确")
+    return True
+
+
+def test_timeout_scaling():
+    """测试 4: 解码超时按时长缩放"""
+    print("\n" + "=" * 70)
+    print("测试 4: 解码超时")
+    print("=" * 70)
+
+    analyzer = ModalityAnalyzer()
+    assert analyzer.decode_timeout(0) == 30.0
+    assert analyzer.decode_timeout(60) == 30.0
+    assert analyzer.decode_timeout(3600) == 180.0
+    print(f"  1 小时素材超时: {analyzer.decode_timeout(3600):.0f}s")
+
+    print("  ✅ 超时按时长缩放")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("并发模态分析测试")
+    print("=" * 70)
+
+    tests = [
+        ("并发分析", test_parallel_analysis),
+        ("中断续跑", test_resume_after_crash),
+        ("并发上限", test_worker_cap),
+        ("超时缩放", test_timeout_scaling),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+测试阻塞工作移出事件循环
+
+测试内容：
+1. run_subprocess：返回码 / 输出、超时终止子进程
+2. 子进程并发上限，等待期间事件循环照常运行
+3. run_blocking：有界线程池、异常透传
+4. 系统状态查询不再阻塞（cpu_percent 不带采样间隔）
+5. run_llm：LLM 调用在单独的线程池，限流等待不占用 run_blocking 线程
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.config import settings
+from app.core.offload import get_executor, get_llm_executor, run_blocking, run_llm, run_subprocess
+from app.core.orchestrator import Orchestrator
+
+
+def test_subprocess_result():
+    """测试 1: 子进程结果与超时"""
+    print("\n" + "=" * 70)
+    print("测试 1: 子进程结果与超时")
+    print("=" * 70)
+
+    async def run():
+        result = await run_subprocess([
+            sys.executable, "-c",
+            "import sys; print('中文输出'); sys.stderr.write('err'); sys.exit(3)"
+        ])
+        assert result.returncode == 3
+        assert result.stdout.strip() == "中文输出" and result.stderr == "err"
+
+        t0 = time.perf_counter()
+        try:
+            await run_subprocess([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.3)
+            assert False, "应该超时"
+        except asyncio.TimeoutError:
+            pass
+        return time.perf_counter() - t0
+
+    elapsed = asyncio.run(run())
+    print(f"  超时后 {elapsed:.2f}s 返回（子进程已终止）")
+    assert elapsed < 5
+
+    print("  ✅ 结果与超时正确")
+    return True
+
+
+def test_subprocess_concurrency():
+    """测试 2: 并发上限与事件循环响应"""
+    print("\n" + "=" * 70)
+    print("测试 2: 并发上限与事件循环响应")
+    print("=" * 70)
+
+    original = settings.OFFLOAD_MAX_SUBPROCESSES
+    settings.OFFLOAD_MAX_SUBPROCESSES = 2
+    try:
+        async def run():
+            gaps = []
+
+            async def ticker(stop: asyncio.Event):
+                last = time.perf_counter()
+                while not stop.is_set():
+                    await asyncio.sleep(0.01)
+                    now = time.perf_counter()
+                    gaps.append(now - last)
+                    last = now
+
+            stop = asyncio.Event()
+            tick_task = asyncio.create_task(ticker(stop))
+            t0 = time.perf_counter()
+            await asyncio.gather(*(
+                run_subprocess([sys.executable, "-c", "import time; time.sleep(0.4)"])
+                for _ in range(4)
+            ))
+            elapsed = time.perf_counter() - t0
+            stop.set()
+            await tick_task
+            return elapsed, max(gaps)
+
+        elapsed, max_gap = asyncio.run(run())
+        print(f"  4 个子进程（上限 2）: {elapsed:.2f}s, 事件循环最大间隔 {max_gap * 1000:.0f}ms")
+        assert elapsed >= 0.75, "应分两批执行"
+        assert max_gap < 0.3, "子进程运行期间事件循环不应被阻塞"
+    finally:
+        settings.OFFLOAD_MAX_SUBPROCESSES = original
+
+    print("  ✅ 并发受限且事件循环保持响应")
+    return True
+
+
+def test_run_blocking():
+    """测试 3: 有界线程池"""
+    print("\n" + "=" * 70)
+    print("测试 3: 有界线程池")
+    print("=" * 70)
+
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def blocking(value: int, scale: int = 1) -> int:
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        if value < 0:
+            raise ValueError("negative")
+        return value * scale
+
+    async def run():
+        results = await asyncio.gather(*(run_blocking(blocking, i, scale=2) for i in range(12)))
+        try:
+            await run_blocking(blocking, -1)
+            assert False, "异常应透传"
+        except ValueError:
+            pass
+        return results
+
+    results = asyncio.run(run())
+    limit = get_executor()._max_workers
+    print(f"  线程池上限 {limit}, 峰值并发 {peak}")
+    assert results == [i * 2 for i in range(12)]
+    assert peak <= limit
+
+    print("  ✅ 线程池有界，结果与异常正确")
+    return True
+
+
+def test_system_status_non_blocking():
+    """测试 4: 系统状态查询不阻塞"""
+    print("\n" + "=" * 70)
+    print("测试 4: 系统状态查询不阻塞")
+    print("=" * 70)
+
+    orchestrator = Orchestrator()
+    t0 = time.perf_counter()
+    for _ in range(10):
+        status = orchestrator.get_system_status()
+    elapsed = (time.perf_counter() - t0) / 10
+    print(f"  平均耗时: {elapsed * 1000:.1f}ms, CPU {status['system']['cpu_percent']}%")
+    assert elapsed < 0.05
+    assert 0 <= status["system"]["cpu_percent"] <= 100
+
+    print("  ✅ 不再阻塞 100ms 采样")
+    return True
+
+
+def test_llm_executor():
+    """测试 5: LLM 线程池独立"""
+    print("\n" + "=" * 70)
+    print("测试 5: LLM 线程池独立")
+    print("=" * 70)
+
+    threads = set()
+
+    def waiting_llm_call():
+        # 模拟限流排队 / 重试退避
+        threads.add(threading.current_thread().name)
+        time.sleep(0.5)
+
+    async def run():
+        calls = [asyncio.ensure_future(run_llm(waiting_llm_call)) for _ in range(get_executor()._max_workers * 2)]
+        await asyncio.sleep(0.05)
+        t0 = time.perf_counter()
+        # LLM 调用都在等待时，run_blocking 的工作不需要排队
+        result = await run_blocking(lambda: threading.current_thread().name)
+        elapsed = time.perf_counter() - t0
+        await asyncio.gather(*calls)
+        return result, elapsed
+
+    name, elapsed = asyncio.run(run())
+    print(f"  LLM 线程: {sorted(threads)[:3]}..., run_blocking 等待 {elapsed * 1000:.1f}ms")
+    assert elapsed < 0.2 and name.startswith("offload")
+    assert all(t.startswith("llm") for t in threads)
+    assert get_llm_executor()._max_workers == settings.LLM_MAX_THREADS
+
+    print("  ✅ LLM 等待不占用 run_blocking 线程")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("阻塞工作移出事件循环测试")
+    print("=" * 70)
+
+    tests = [
+        ("子进程结果与超时", test_subprocess_result),
+        ("并发上限与响应", test_subprocess_concurrency),
+        ("有界线程池", test_run_blocking),
+        ("系统状态不阻塞", test_system_status_non_blocking),
+        ("LLM 线程池独立", test_llm_executor),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
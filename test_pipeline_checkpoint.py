@@ -0,0 +1,346 @@
+"""
+测试 SmartPipeline 步骤检查点
+
+测试内容：
+1. 指纹：源文件内容变化（大小 / 修改时间不变）也能发现，字典键顺序无关
+2. 重新运行：输入未变化时所有步骤跳过，输出不变
+3. 单个素材变化：只重新计算该素材（探测 / 模态 / Vision）
+4. Vision 中途崩溃：已完成的结果落盘，续跑时每个素材的每个步骤都不重做
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools import smart_pipeline as smart_pipeline_module
+from app.tools.modality_analyzer import ModalityAnalysis
+from app.tools.pipeline_checkpoint import file_fingerprint, fingerprint
+from app.tools.smart_pipeline import SmartPipeline
+
+
+class FakeInfo:
+    def __init__(self, size: int):
+        self.size = size
+        self.duration = 10.0
+        self.fps = 25.0
+        self.width = 1920
+        self.height = 1080
+        self.has_audio = True
+
+
+class FakeProbe:
+    """不调用 ffprobe 的探测器，记录探测过的文件"""
+
+    def __init__(self):
+        self.calls = []
+
+    def probe(self, path: str):
+        self.calls.append(Path(path).name)
+        return FakeInfo(os.path.getsize(path))
+
+
+class FakeAnalyzer:
+    """偶数编号为口播（ASR），奇数编号为画面（Vision）"""
+
+    def __init__(self):
+        self.calls = []
+
+    def analyze(self, video_path, audio_path=None):
+        self.calls.append(Path(video_path).name)
+        index = int(Path(video_path).stem.split("_")[1])
+        mode = "ASR_PRIMARY" if index % 2 == 0 else "VISION_PRIMARY"
+        return ModalityAnalysis(
+            has_voice=mode == "ASR_PRIMARY",
+            speech_ratio=0.7 if mode == "ASR_PRIMARY" else 0.0,
+            music_ratio=0.0,
+            silence_ratio=0.3,
+            likely_talking_head=mode == "ASR_PRIMARY",
+            recommended_mode=mode,
+            confidence=0.9,
+            audio_present=True,
+            avg_volume_db=-20,
+            volume_variance=12,
+            speech_segments=10
+        )
+
+
+class Recorder:
+    """替换流水线的 ASR / Vision / 结构化步骤，记录处理过的段"""
+
+    def __init__(self, pipeline: SmartPipeline, crash_after_vision_calls: int = None):
+        self.asr, self.vision, self.structure = [], [], []
+        self.vision_calls = 0
+        self.crash_after = crash_after_vision_calls
+        self._lock = threading.Lock()
+        self._asr = pipeline._run_asr_pass
+        self._vision = pipeline._run_vision_pass
+        self._structure = pipeline._structure_vision_data
+        pipeline._run_asr_pass = self.run_asr
+        pipeline._run_vision_pass = self.run_vision
+        pipeline._structure_vision_data = self.run_structure
+
+    def run_asr(self, segments, policies):
+        self.asr += [seg["seg_id"] for seg in segments]
+        return self._asr(segments, policies)
+
+    def run_vision(self, segments, policies, transcripts):
+        with self._lock:
+            if self.crash_after is not None and self.vision_calls >= self.crash_after:
+                raise RuntimeError("模拟 Vision 崩溃")
+            self.vision_calls += 1
+        self.vision += [seg["seg_id"] for seg in segments]
+        return self._vision(segments, policies, transcripts)
+
+    def run_structure(self, vision_caps):
+        self.structure += list(vision_caps)
+        return self._structure(vision_caps)
+
+
+def _make_clips(input_dir: Path, count: int):
+    input_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = input_dir / f"clip_{i}.mp4"
+        path.write_bytes(f"clip {i}".encode() + b"\0" * 1_100_000)
+        paths.append(str(path))
+    return paths
+
+
+def _make_pipeline(job_dir: Path, crash_after_vision_calls: int = None):
+    pipeline = SmartPipeline(job_dir)
+    pipeline.modality_analyzer = FakeAnalyzer()
+    recorder = Recorder(pipeline, crash_after_vision_calls)
+    return pipeline, recorder
+
+
+def _with_fake_probe(func):
+    """在假探测器下运行测试"""
+    def wrapper():
+        original = smart_pipeline_module.get_media_probe
+        probe = FakeProbe()
+        smart_pipeline_module.get_media_probe = lambda: probe
+        try:
+            return func(probe)
+        finally:
+            smart_pipeline_module.get_media_probe = original
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def test_fingerprints():
+    """测试 1: 指纹"""
+    print("\n" + "=" * 70)
+    print("测试 1: 指纹")
+    print("=" * 70)
+
+    assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [1, 2], "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        path = tmp_dir / "clip.mp4"
+        path.write_bytes(b"A" * 300_000)
+        first = file_fingerprint(str(path))
+        stat = os.stat(path)
+
+        # 同样大小、恢复修改时间，但末尾内容变了
+        path.write_bytes(b"A" * 299_999 + b"B")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        second = file_fingerprint(str(path))
+        print(f"  {first} → {second}")
+        assert first != second
+        assert file_fingerprint(str(path)) == second
+        assert file_fingerprint(str(tmp_dir / "missing.mp4")) is None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 指纹正确")
+    return True
+
+
+@_with_fake_probe
+def test_rerun_skips(probe):
+    """测试 2: 输入未变化时跳过"""
+    print("\n" + "=" * 70)
+    print("测试 2: 输入未变化时跳过")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        paths = _make_clips(tmp_dir / "input", 6)
+        job_dir = tmp_dir / "job"
+        job_dir.mkdir()
+
+        pipeline, recorder = _make_pipeline(job_dir)
+        first = pipeline.run(paths)
+        assert len(first["segments"]) == 6
+        # 画面素材不跑 ASR；口播素材的 Vision 按转录置信度判断后不产生结果
+        assert len(recorder.asr) == 3 and len(recorder.vision) == 6
+        assert len(first["transcripts"]) == 3 and len(first["vision_meta"]) == 3
+
+        probe.calls.clear()
+        pipeline, recorder = _make_pipeline(job_dir)
+        second = pipeline.run(paths)
+        print(f"  重新运行: 探测 {probe.calls}, 模态 {pipeline.modality_analyzer.calls}, "
+              f"ASR {recorder.asr}, Vision {recorder.vision}")
+        assert probe.calls == [] and pipeline.modality_analyzer.calls == []
+        assert recorder.asr == [] and recorder.vision == [] and recorder.structure == []
+        assert second["shotcards"] == first["shotcards"]
+        assert second["transcripts"] == first["transcripts"]
+
+        checkpoints = json.loads((job_dir / "temp" / "checkpoints.json").read_text(encoding="utf-8"))
+        assert {"segment", "asr", "vision", "structure"} <= set(checkpoints)
+
+        # force：全部重新计算
+        pipeline, recorder = _make_pipeline(job_dir)
+        probe.calls.clear()
+        pipeline.run(paths, force=True)
+        assert len(recorder.asr) == 3 and len(probe.calls) == 6
+        assert len(pipeline.modality_analyzer.calls) == 6
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 所有步骤跳过，结果一致")
+    return True
+
+
+@_with_fake_probe
+def test_changed_asset(probe):
+    """测试 3: 只重新计算变化的素材"""
+    print("\n" + "=" * 70)
+    print("测试 3: 只重新计算变化的素材")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        paths = _make_clips(tmp_dir / "input", 6)
+        job_dir = tmp_dir / "job"
+        job_dir.mkdir()
+        _make_pipeline(job_dir)[0].run(paths)
+
+        # 替换 clip_3（画面类素材）
+        Path(paths[3]).write_bytes(b"clip 3 retake" + b"\0" * 1_200_000)
+        probe.calls.clear()
+        pipeline, recorder = _make_pipeline(job_dir)
+        result = pipeline.run(paths)
+
+        print(f"  探测 {probe.calls}, 模态 {pipeline.modality_analyzer.calls}, "
+              f"ASR {recorder.asr}, Vision {recorder.vision}, 结构化 {recorder.structure}")
+        assert probe.calls == ["clip_3.mp4"]
+        assert pipeline.modality_analyzer.calls == ["clip_3.mp4"]
+        assert recorder.asr == [] and recorder.vision == ["V004_S001"]
+        # 画面描述没有变化，结构化结果直接复用
+        assert recorder.structure == []
+        assert len(result["shotcards"]) == 6
+
+        video = next(v for v in result["assets"]["videos"] if v["asset_id"] == "V004")
+        assert video["size_mb"] > 1.1
+
+        # 删除一个素材：其它素材不重新计算，输出同步收缩
+        pipeline, recorder = _make_pipeline(job_dir)
+        result = pipeline.run(paths[:5])
+        assert recorder.asr == [] and recorder.vision == []
+        assert len(result["shotcards"]) == 5
+        vision_caps = json.loads((job_dir / "temp" / "vision_captions.json").read_text(encoding="utf-8"))
+        assert "V006_S001" not in vision_caps
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 只重新计算变化的素材")
+    return True
+
+
+@_with_fake_probe
+def test_resume_after_vision_crash(probe):
+    """测试 4: Vision 崩溃后续跑"""
+    print("\n" + "=" * 70)
+    print("测试 4: Vision 崩溃后续跑")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        count = 20
+        paths = _make_clips(tmp_dir / "input", count)
+        job_dir = tmp_dir / "job"
+        job_dir.mkdir()
+
+        first, recorder = _make_pipeline(job_dir, crash_after_vision_calls=5)
+        try:
+            first.run(paths)
+            assert False, "应该抛出异常"
+        except RuntimeError:
+            pass
+        assert len(recorder.vision) == 5
+
+        probe.calls.clear()
+        second, resumed = _make_pipeline(job_dir)
+        result = second.run(paths)
+        print(f"  崩溃前: 模态 {len(first.modality_analyzer.calls)}, ASR {len(recorder.asr)}, "
+              f"Vision {len(recorder.vision)}")
+        print(f"  续跑: 探测 {len(probe.calls)}, 模态 {len(second.modality_analyzer.calls)}, "
+              f"ASR {len(resumed.asr)}, Vision {len(resumed.vision)}")
+
+        # 崩溃前完成的每个素材步骤都不重做，两次合起来正好覆盖全部
+        assert probe.calls == []
+        for before, after, total in (
+            (first.modality_analyzer.calls, second.modality_analyzer.calls, count),
+            (recorder.asr, resumed.asr, count // 2),
+            (recorder.vision, resumed.vision, count)
+        ):
+            assert not set(before) & set(after)
+            assert len(before) + len(after) == total
+        assert len(result["vision_meta"]) == count // 2
+        assert len(result["shotcards"]) == count
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 崩溃前完成的素材步骤不再重做")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("SmartPipeline 检查点测试")
+    print("=" * 70)
+
+    tests = [
+        ("指纹", test_fingerprints),
+        ("输入未变化时跳过", test_rerun_skips),
+        ("只重新计算变化的素材", test_changed_asset),
+        ("Vision 崩溃后续跑", test_resume_after_vision_crash),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+测试进度事件总线（SSE 取代轮询）
+
+测试内容：
+1. 发布 / 订阅：新订阅者先收到最新快照，终态事件后流结束
+2. 断线重连：按 Last-Event-ID 补发错过的事件
+3. 跨线程发布的推送延迟、心跳
+4. JobStore / Orchestrator 发布事件，SSE 端点输出格式
+"""
+import asyncio
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from typing import Optional
+
+from fastapi import FastAPI, Header
+from fastapi.testclient import TestClient
+
+from app.core.job_store import JobStore
+from app.core.orchestrator import JobState, Orchestrator
+from app.core.progress_bus import ProgressBus, get_progress_bus, sse_response
+
+
+def test_publish_subscribe():
+    """测试 1: 发布 / 订阅"""
+    print("\n" + "=" * 70)
+    print("测试 1: 发布 / 订阅")
+    print("=" * 70)
+
+    bus = ProgressBus()
+    bus.publish("p1", "status", {"status": "processing", "progress": 10})
+    bus.publish("p1", "log", {"message": "step 1"})
+    bus.publish("p1", "status", {"status": "processing", "progress": 30})
+
+    async def run():
+        received = []
+
+        async def consumer():
+            async for event in bus.subscribe("p1"):
+                received.append((event.type, event.data.get("progress")))
+
+        task = asyncio.create_task(consumer())
+        await asyncio.sleep(0.01)
+        bus.publish("p1", "log", {"message": "step 2"})
+        bus.publish("p1", "status", {"status": "completed", "progress": 100})
+        bus.publish("p1", "log", {"message": "after end"})
+        await asyncio.wait_for(task, 2)
+        return received
+
+    received = asyncio.run(run())
+    print(f"  收到: {received}")
+    # 只补发最新快照，不补发旧日志
+    assert received == [("status", 30), ("log", None), ("status", 100)]
+    assert bus.get_snapshot("p1")["progress"] == 100
+    assert bus.get_stats()["subscribers"] == 0
+
+    # 快照已是终态：补发后立即结束
+    async def late():
+        return [event.data["status"] async for event in bus.subscribe("p1")]
+
+    assert asyncio.run(late()) == ["completed"]
+
+    print("  ✅ 快照 + 实时事件，终态结束")
+    return True
+
+
+def test_last_event_id_replay():
+    """测试 2: 断线重连补发"""
+    print("\n" + "=" * 70)
+    print("测试 2: 断线重连补发")
+    print("=" * 70)
+
+    bus = ProgressBus()
+    events = [bus.publish("e1", "status", {"status": "processing", "progress": p}) for p in (10, 20, 30)]
+    bus.publish("e1", "log", {"message": "encoding"})
+    bus.publish("e1", "status", {"status": "completed", "progress": 100})
+
+    async def replay(last_id):
+        return [(e.type, e.data.get("progress")) async for e in bus.subscribe("e1", last_id)]
+
+    replayed = asyncio.run(replay(events[0].id))
+    print(f"  Last-Event-ID={events[0].id} 补发: {replayed}")
+    assert replayed == [("status", 20), ("status", 30), ("log", None), ("status", 100)]
+
+    # 其它进程 / 重启前发出的 ID 不能按序号补发
+    assert bus.parse_event_id(f"{bus.epoch}.{events[0].id}") == events[0].id
+    assert ProgressBus().parse_event_id(f"{bus.epoch}.{events[0].id}") is None
+    assert bus.parse_event_id(str(events[0].id)) is None and bus.parse_event_id(None) is None
+
+    bus.clear("e1")
+    assert not bus.has_channel("e1") and bus.get_snapshot("e1") is None
+
+    print("  ✅ 按 Last-Event-ID 补发")
+    return True
+
+
+def test_cross_thread_latency():
+    """测试 3: 跨线程推送延迟与心跳"""
+    print("\n" + "=" * 70)
+    print("测试 3: 跨线程推送延迟与心跳")
+    print("=" * 70)
+
+    bus = ProgressBus()
+
+    async def run():
+        latencies = []
+        heartbeats = 0
+
+        def producer():
+            for i in range(20):
+                time.sleep(0.01)
+                bus.publish("job", "status", {"status": "processing", "sent": time.perf_counter()})
+            time.sleep(0.15)
+            bus.publish("job", "status", {"status": "completed", "sent": time.perf_counter()})
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        async for event in bus.subscribe("job", heartbeat=0.05):
+            if event is None:
+                heartbeats += 1
+                continue
+            latencies.append(time.perf_counter() - event.data["sent"])
+        thread.join()
+        return latencies, heartbeats
+
+    latencies, heartbeats = asyncio.run(run())
+    print(f"  {len(latencies)} 条事件, 最大延迟 {max(latencies) * 1000:.1f}ms, 心跳 {heartbeats} 次")
+    assert len(latencies) == 21
+    assert max(latencies) < 0.1
+    assert heartbeats >= 1
+
+    print("  ✅ 事件即时送达，空闲时发送心跳")
+    return True
+
+
+def test_producers_and_sse():
+    """测试 4: JobStore / Orchestrator 发布，SSE 输出"""
+    print("\n" + "=" * 70)
+    print("测试 4: JobStore / Orchestrator 发布，SSE 输出")
+    print("=" * 70)
+
+    bus = get_progress_bus()
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        store = JobStore(tmp_dir / "jobs", coalesce_ms=500)
+        job_id = store.create_job()
+
+        # 合并落盘窗口内的进度也会立即推送
+        store.update_job(job_id, status="processing", progress=42)
+        assert bus.get_snapshot(job_id)["progress"] == 42
+
+        orchestrator = Orchestrator()
+        orchestrator.current_jobs[job_id] = JobState.INGESTED
+        orchestrator.enter_state(job_id, JobState.ANALYZING)
+        orchestrator.exit_state(job_id, JobState.ANALYZING)
+
+        store.update_job(job_id, status="completed", progress=100)
+        store.flush(job_id)
+
+        app = FastAPI()
+
+        @app.get("/events/{channel}")
+        async def events(channel: str, last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID")):
+            return sse_response(channel, last_event_id)
+
+        with TestClient(app) as client:
+            response = client.get(f"/events/{job_id}", headers={"Last-Event-ID": f"{bus.epoch}.0"})
+        body = response.text
+        print(body.replace("\n\n", "\n")[:600])
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert body.startswith("retry: 1000\n\n")
+        assert "event: state" in body and '"state": "analyzing"' in body
+        for block in body.strip().split("\n\n")[1:]:
+            lines = block.split("\n")
+            assert lines[0].startswith("id: ") and lines[1].startswith("event: ") and lines[2].startswith("data: ")
+        assert '"status": "completed"' in body.split("event: ")[-1]
+
+        # 重启前的 Last-Event-ID：不补发历史，只发最新快照
+        with TestClient(app) as client:
+            stale = client.get(f"/events/{job_id}", headers={"Last-Event-ID": "0123456789ab.999"}).text
+        assert stale.count("event: ") == 1 and '"status": "completed"' in stale
+
+        store.delete_job(job_id)
+        assert not bus.has_channel(job_id)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 生产者接入，SSE 格式正确")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("进度事件总线测试")
+    print("=" * 70)
+
+    tests = [
+        ("发布 / 订阅", test_publish_subscribe),
+        ("断线重连补发", test_last_event_id_replay),
+        ("跨线程延迟与心跳", test_cross_thread_latency),
+        ("生产者与 SSE 输出", test_producers_and_sse),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+测试 LLMDirector 的 Prompt 编译器（紧凑表格 + token 预算）
+
+测试内容：
+1. 紧凑编码：每个镜头 / 字幕段一行，没有缩进和键名，比原来的 JSON 小得多
+2. BGM 去重：只在用户消息中发送一次，支持 BGMMetadata
+3. token 预算：300 个镜头的素材压到预算内，保留高价值镜头，省略的镜头合并为摘要
+4. LLMDirector：请求使用编译后的消息，记录 token 数和编码耗时
+"""
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.config import settings
+from app.core import llm_client, llm_engine
+from app.core.prompt_compiler import PromptCompiler, count_tokens
+from app.models.schemas import ScenesJSON, TranscriptJSON
+from app.tools.bgm_library import BGMMetadata
+
+# 假客户端的回复不读写 LLM 回复缓存，也不限流
+settings.LLM_CACHE_ENABLED = False
+settings.LLM_RATE_LIMIT_RPM = 0
+
+SHOT_TYPES = ["全景", "中景", "近景", "特写"]
+
+
+def _make_scenes(count: int) -> ScenesJSON:
+    scenes = []
+    for i in range(count):
+        scenes.append({
+            "scene_id": f"S{i + 1:04d}",
+            "start_frame": i * 90,
+            "end_frame": i * 90 + 89,
+            "start_tc": "00:00:00:00",
+            "end_tc": "00:00:00:00",
+            "visual": {
+                "summary": f"第 {i + 1} 个镜头：主持人在厨房里介绍咖啡机的使用方法，镜头缓慢推进 | 背景有绿植",
+                "shot_type": SHOT_TYPES[i % 4],
+                "subjects": ["主持人", "咖啡机"],
+                "action": "讲解",
+                "mood": "平静",
+                "lighting": "自然光",
+                "quality_score": 3 + (i * 5) % 7
+            }
+        })
+    return ScenesJSON(**{
+        "meta": {"schema": "scenes.v1", "fps": 30},
+        "media": {"primary_clip_path": "/media/take.mp4"},
+        "scenes": scenes
+    })
+
+
+def _make_transcript(count: int, gap: float = 0.0) -> TranscriptJSON:
+    return TranscriptJSON(**{
+        "meta": {"schema": "transcript.v1", "language": "zh"},
+        "segments": [
+            {"start": i * (3 + gap), "end": i * (3 + gap) + 3, "text": f"这是第 {i + 1} 句话，讲咖啡机的第 {i + 1} 个功能"}
+            for i in range(count)
+        ]
+    })
+
+
+def _legacy_user_content(scenes: ScenesJSON, transcript: TranscriptJSON, style: str, bgm: list) -> str:
+    """原来的用户消息（json.dumps indent=2）"""
+    return "\n".join([
+        json.dumps(scenes.model_dump(), ensure_ascii=False, indent=2),
+        json.dumps(transcript.model_dump(), ensure_ascii=False, indent=2),
+        style,
+        json.dumps(bgm, ensure_ascii=False, indent=2)
+    ])
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = json.dumps({"meta": {"schema": "editing_dsl.v1"}, "editing_plan": {"timeline": []}})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeOpenAI:
+    """替代 OpenAI 客户端：记录请求，返回固定的 DSL"""
+
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeCompletions())
+
+
+def _make_director() -> llm_engine.LLMDirector:
+    original_key, original_pool = settings.OPENAI_API_KEY, llm_client._llm_pool
+    settings.OPENAI_API_KEY = "sk-test"
+    llm_client._llm_pool = llm_client.LLMClientPool(client_factory=FakeOpenAI)
+    try:
+        return llm_engine.LLMDirector()
+    finally:
+        settings.OPENAI_API_KEY, llm_client._llm_pool = original_key, original_pool
+
+
+def test_compact_encoding():
+    """测试 1: 紧凑编码"""
+    print("\n" + "=" * 70)
+    print("测试 1: 紧凑编码")
+    print("=" * 70)
+
+    scenes = _make_scenes(20)
+    scenes.scenes.append(scenes.scenes[0].model_copy(update={"scene_id": "S9999", "visual": None}))
+    transcript = _make_transcript(10)
+    compiler = PromptCompiler(token_budget=100000)
+    prompt = compiler.compile("系统", scenes, transcript, "快节奏")
+
+    lines = prompt.user.splitlines()
+    print("\n".join("  " + line for line in lines[:4]))
+    assert "#S fps=30 clip=/media/take.mp4 列=id|in|out|shot|q|mood|subj|act|light|sum" in lines
+    first = next(line for line in lines if line.startswith("S0001|"))
+    cells = first.split("|")
+    assert cells[:7] == ["S0001", "0", "89", "全景", "3", "平静", "主持人,咖啡机"]
+    assert len(cells) == 10 and "/ 背景有绿植" in cells[9]
+    assert "S9999|0|89" in lines
+    assert "0|3|这是第 1 句话，讲咖啡机的第 1 个功能" in lines
+    assert not any(line.startswith(" ") for line in lines) and '"scene_id"' not in prompt.user
+
+    legacy = count_tokens(_legacy_user_content(scenes, transcript, "快节奏", []))
+    print(f"  用户消息: {prompt.stats.user_tokens} tokens（原 JSON {legacy} tokens）")
+    assert prompt.stats.user_tokens < legacy * 0.5
+    assert prompt.stats.scenes_kept == 21 and prompt.stats.segments_kept == 10
+
+    print("  ✅ 每行一条记录，体积不到原来的一半")
+    return True
+
+
+def test_bgm_dedup():
+    """测试 2: BGM 去重"""
+    print("\n" + "=" * 70)
+    print("测试 2: BGM 去重")
+    print("=" * 70)
+
+    bgm = [
+        BGMMetadata(id="piano_072_03", path="/bgm/calm.mp3", bpm=72, mood="calm", energy="low",
+                    usage=["story", "vlog"], copyright="royalty_free", tags=["piano"]),
+        {"id": "fast_128_02", "path": "/bgm/fast.mp3", "bpm": 128, "mood": "fast", "energy": "high",
+         "usage": ["product"], "copyright": "licensed"},
+        {"id": "piano_072_03", "mood": "calm", "bpm": 72, "energy": "low", "usage": ["story"]},
+    ]
+
+    director = _make_director()
+    prompt = director.build_prompt(_make_scenes(3), _make_transcript(2), "vlog", bgm)
+    print(f"  BGM: {prompt.stats.bgm_total} → {prompt.stats.bgm_kept}")
+    assert "piano_072_03" not in prompt.system and "#B 表" in prompt.system
+    assert prompt.user.count("piano_072_03") == 1 and prompt.user.count("fast_128_02") == 1
+    assert "piano_072_03|calm|72|low|story,vlog|piano" in prompt.user
+    assert "/bgm/" not in prompt.user and "royalty_free" not in prompt.user
+    assert prompt.stats.bgm_total == 3 and prompt.stats.bgm_kept == 2
+
+    # 没有 BGM 时系统提示词不含 BGM 说明
+    assert "BGM 素材库（可选）" not in director.build_prompt(_make_scenes(3), _make_transcript(2), "vlog").system
+
+    print("  ✅ BGM 只发送一次")
+    return True
+
+
+def test_token_budget():
+    """测试 3: token 预算"""
+    print("\n" + "=" * 70)
+    print("测试 3: token 预算")
+    print("=" * 70)
+
+    scenes = _make_scenes(300)
+    # 每 9 秒只有前 3 秒有语音：与语音重叠的镜头价值更高
+    transcript = _make_transcript(300, gap=6.0)
+    compiler = PromptCompiler(token_budget=6000)
+    prompt = compiler.compile("系统提示词" * 50, scenes, transcript, "快节奏")
+    stats = prompt.stats
+
+    legacy = count_tokens(_legacy_user_content(scenes, transcript, "快节奏", []))
+    print(f"  {stats.to_dict()}")
+    print(f"  原 JSON {legacy} tokens → {stats.total_tokens} tokens（预算 {stats.budget}）")
+    assert stats.total_tokens <= stats.budget and not stats.over_budget
+    assert 0 < stats.scenes_kept < 300 and 0 < stats.segments_kept < 300
+    assert f"抽样{stats.segments_kept}/300" in prompt.user
+
+    lines = prompt.user.splitlines()
+    kept = [line for line in lines if line.startswith("S")]
+    omitted = [line for line in lines if line.startswith("~S")]
+    assert len(kept) == stats.scenes_kept and omitted
+    assert sum(int(line.split("|")[1][2:-1]) for line in omitted) == 300 - stats.scenes_kept
+    print(f"  保留镜头 {len(kept)} 个，摘要行 {len(omitted)} 条，例如 {omitted[0]}")
+
+    # 保留的都是价值最高的镜头：质量分不低于被省略的镜头（同分时看是否与语音重叠）
+    kept_ids = {line.split("|")[0] for line in kept}
+    kept_q = [s.visual.quality_score for s in scenes.scenes if s.scene_id in kept_ids]
+    dropped_q = [s.visual.quality_score for s in scenes.scenes if s.scene_id not in kept_ids]
+    assert min(kept_q) + 3 >= max(dropped_q)
+    assert sum(kept_q) / len(kept_q) > sum(dropped_q) / len(dropped_q)
+
+    # 预算足够时不降级
+    roomy = PromptCompiler(token_budget=1_000_000).compile("系统", scenes, transcript, "快节奏")
+    assert roomy.stats.scenes_kept == 300 and "~S" not in roomy.user
+    print(f"  编码耗时 {stats.encode_ms:.1f}ms（不降级 {roomy.stats.encode_ms:.1f}ms）")
+
+    print("  ✅ 预算内保留高价值镜头")
+    return True
+
+
+def test_director_uses_compiler():
+    """测试 4: LLMDirector 使用编译后的消息"""
+    print("\n" + "=" * 70)
+    print("测试 4: LLMDirector 使用编译后的消息")
+    print("=" * 70)
+
+    director = _make_director()
+    completions = director.client.client.chat.completions
+    director.prompt_compiler = PromptCompiler(token_budget=5000)
+
+    dsl = director.generate_editing_dsl(_make_scenes(300), _make_transcript(100), "快节奏", hierarchical=False)
+    assert dsl["meta"]["schema"] == "editing_dsl.v1"
+
+    messages = completions.calls[0]["messages"]
+    stats = director.last_prompt_stats
+    assert messages[0]["content"] == director._build_system_prompt()
+    assert messages[1]["content"].startswith("【视觉素材 (Scenes)】\n#S fps=30")
+    assert stats.total_tokens <= 5000 and stats.encode_ms > 0
+    assert stats.total_tokens == count_tokens(messages[0]["content"]) + count_tokens(messages[1]["content"])
+    print(f"  {stats.total_tokens} tokens, 编码 {stats.encode_ms:.1f}ms, tokenizer={stats.tokenizer}")
+
+    print("  ✅ 请求使用紧凑消息并记录统计")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("Prompt 编译器测试")
+    print("=" * 70)
+
+    tests = [
+        ("紧凑编码", test_compact_encoding),
+        ("BGM 去重", test_bgm_dedup),
+        ("token 预算", test_token_budget),
+        ("LLMDirector 使用编译后的消息", test_director_uses_compiler),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
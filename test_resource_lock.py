@@ -0,0 +1,297 @@
+"""
+测试资源锁（计数信号量 + 公平等待）
+
+测试内容：
+1. 容量与 owner：多个持有者、按 owner 释放、兼容旧的布尔接口
+2. 阻塞获取：超时、释放后唤醒、同优先级先来先得、高优先级优先、不允许插队
+3. 异步获取与上下文管理器
+4. 等待 / 持有时间统计
+5. Orchestrator：Vision worker 上限，job 自身持有的资源不算冲突
+"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.orchestrator import JobState, Orchestrator, ResourceLock, ResourceTimeout
+
+
+CAPACITIES = {"GPU_HEAVY": 1, "RESOLVE_BUSY": 1, "VISION": 3, "AI": 2}
+
+
+def test_capacity_and_owner():
+    """测试 1: 容量与 owner"""
+    print("\n" + "=" * 70)
+    print("测试 1: 容量与 owner")
+    print("=" * 70)
+
+    lock = ResourceLock(CAPACITIES)
+
+    assert all(lock.acquire("VISION", f"job_{i}") for i in range(3))
+    assert not lock.acquire("VISION", "job_3")
+    assert lock.available("VISION") == 0
+
+    # 按 owner 释放；未持有的 owner 释放无效
+    lock.release("VISION", "job_1")
+    lock.release("VISION", "job_x")
+    assert lock.available("VISION") == 1
+    assert lock.held_by("VISION", "job_0") and not lock.held_by("VISION", "job_1")
+    assert lock.held_by_others("VISION", "job_0")
+
+    # 开关资源：acquire 打开、release 关闭（旧接口）
+    assert lock.is_locked("VISION_ALLOWED")
+    lock.release("VISION_ALLOWED")
+    assert lock.get_status()["VISION_ALLOWED"] is False
+    assert lock.acquire("VISION_ALLOWED") and not lock.acquire("VISION_ALLOWED")
+
+    # 紧急释放
+    lock.reset("VISION")
+    assert lock.available("VISION") == 3 and not lock.is_locked("VISION")
+
+    try:
+        lock.acquire("NPU")
+        assert False, "应拒绝未知资源"
+    except KeyError:
+        pass
+
+    print(f"  状态: {lock.get_status()}")
+    print("  ✅ 容量与 owner 正确")
+    return True
+
+
+def test_blocking_fairness():
+    """测试 2: 阻塞获取与公平性"""
+    print("\n" + "=" * 70)
+    print("测试 2: 阻塞获取与公平性")
+    print("=" * 70)
+
+    lock = ResourceLock(CAPACITIES)
+    assert lock.acquire("RESOLVE_BUSY", "render")
+
+    start = time.monotonic()
+    assert not lock.acquire("RESOLVE_BUSY", "late", blocking=True, timeout=0.1)
+    assert time.monotonic() - start >= 0.09
+    assert lock.get_stats()["RESOLVE_BUSY"]["timeouts"] == 1
+
+    order = []
+    order_lock = threading.Lock()
+
+    def worker(name: str, priority: int):
+        assert lock.acquire("RESOLVE_BUSY", name, blocking=True, timeout=5, priority=priority)
+        with order_lock:
+            order.append(name)
+        time.sleep(0.01)
+        lock.release("RESOLVE_BUSY", name)
+
+    threads = []
+    for name, priority in [("a", 0), ("b", 0), ("urgent", 5), ("c", 0)]:
+        thread = threading.Thread(target=worker, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.03)
+
+    # 有人排队时，非阻塞请求不能插队
+    assert lock.get_stats()["RESOLVE_BUSY"]["waiting"] == 4
+    lock.release("RESOLVE_BUSY", "render")
+    assert not lock.acquire("RESOLVE_BUSY", "sneaky")
+
+    for thread in threads:
+        thread.join()
+
+    print(f"  获得顺序: {order}")
+    assert order == ["urgent", "a", "b", "c"]
+    assert lock.available("RESOLVE_BUSY") == 1
+
+    print("  ✅ 优先级 + 先来先得")
+    return True
+
+
+def test_async_and_context_managers():
+    """测试 3: 异步获取与上下文管理器"""
+    print("\n" + "=" * 70)
+    print("测试 3: 异步获取与上下文管理器")
+    print("=" * 70)
+
+    lock = ResourceLock(CAPACITIES)
+
+    with lock.hold("GPU_HEAVY"):
+        assert lock.is_locked("GPU_HEAVY")
+        try:
+            with lock.hold("GPU_HEAVY", timeout=0.05):
+                assert False, "不应获得"
+        except ResourceTimeout:
+            pass
+    assert not lock.is_locked("GPU_HEAVY")
+
+    peak = 0
+    active = 0
+
+    async def vision_worker(i: int):
+        nonlocal peak, active
+        async with lock.hold_async("AI", owner=f"w{i}"):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        tick_task = asyncio.create_task(ticker())
+        await asyncio.gather(*(vision_worker(i) for i in range(6)))
+
+        # 超时返回 False，取消时不泄漏资源
+        assert await lock.acquire_async("AI", "holder_1")
+        assert await lock.acquire_async("AI", "holder_2")
+        assert not await lock.acquire_async("AI", "late", timeout=0.05)
+        waiting = asyncio.create_task(lock.acquire_async("AI", "cancelled"))
+        await asyncio.sleep(0.02)
+        waiting.cancel()
+        try:
+            await waiting
+        except asyncio.CancelledError:
+            pass
+        lock.release("AI", "holder_1")
+        assert not lock.held_by("AI", "cancelled")
+        assert lock.acquire("AI", "filler")
+
+        # 其它线程释放后唤醒事件循环中的等待者
+        threading.Timer(0.05, lock.release, args=("AI", "holder_2")).start()
+        assert await lock.acquire_async("AI", "from_thread", timeout=2)
+        assert lock.held_by("AI", "from_thread") and not lock.held_by("AI", "holder_2")
+        tick_task.cancel()
+        return ticks
+
+    ticks = asyncio.run(run())
+    print(f"  并发峰值: {peak} (容量 2), 事件循环 tick: {ticks}")
+    assert peak == 2
+    assert ticks > 10
+
+    print("  ✅ 异步获取不阻塞事件循环")
+    return True
+
+
+def test_stats():
+    """测试 4: 等待 / 持有时间统计"""
+    print("\n" + "=" * 70)
+    print("测试 4: 等待 / 持有时间统计")
+    print("=" * 70)
+
+    lock = ResourceLock(CAPACITIES)
+    assert lock.acquire("GPU_HEAVY", "first")
+    threading.Timer(0.1, lock.release, args=("GPU_HEAVY", "first")).start()
+    assert lock.acquire("GPU_HEAVY", "second", blocking=True, timeout=2)
+    time.sleep(0.05)
+
+    stats = lock.get_stats()["GPU_HEAVY"]
+    print(f"  GPU_HEAVY: {stats}")
+    assert stats["holders"] == ["second"]
+    assert stats["hold_ms"]["current_max"] >= 40
+    lock.release("GPU_HEAVY", "second")
+
+    stats = lock.get_stats()["GPU_HEAVY"]
+    assert stats["acquisitions"] == 2 and stats["in_use"] == 0
+    assert stats["wait_ms"]["max"] >= 80
+    assert stats["hold_ms"]["max"] >= 80
+    assert lock.get_stats()["VISION_ALLOWED"] == {"kind": "gate", "open": True}
+
+    print("  ✅ 统计正确")
+    return True
+
+
+def test_orchestrator_integration():
+    """测试 5: Orchestrator 集成"""
+    print("\n" + "=" * 70)
+    print("测试 5: Orchestrator 集成")
+    print("=" * 70)
+
+    orchestrator = Orchestrator()
+    orchestrator.resource_lock = ResourceLock(CAPACITIES)
+
+    # 最多 3 个 job 同时分析
+    for i in range(3):
+        orchestrator.current_jobs[f"job_{i}"] = JobState.INGESTED
+        can, reason = orchestrator.can_enter_state(f"job_{i}", JobState.ANALYZING)
+        assert can, reason
+        orchestrator.enter_state(f"job_{i}", JobState.ANALYZING)
+    orchestrator.current_jobs["job_3"] = JobState.INGESTED
+    can, reason = orchestrator.can_enter_state("job_3", JobState.ANALYZING)
+    print(f"  第 4 个分析任务: {reason}")
+    assert not can
+
+    # 分析结束不会关闭其它 job 的 Vision
+    orchestrator.exit_state("job_0", JobState.ANALYZING)
+    assert orchestrator.resource_lock.is_locked("VISION_ALLOWED")
+    assert orchestrator.can_enter_state("job_3", JobState.ANALYZING)[0]
+    for i in (1, 2):
+        orchestrator.exit_state(f"job_{i}", JobState.ANALYZING)
+
+    # EXECUTING → EXPORTING：自己持有的 GPU 不算冲突，其它 job 被挡住
+    orchestrator.current_jobs["job_r"] = JobState.PLANNED
+    orchestrator.enter_state("job_r", JobState.EXECUTING)
+    orchestrator.current_jobs["job_r"] = JobState.EXECUTING
+    assert orchestrator.can_enter_state("job_r", JobState.EXPORTING)[0]
+    orchestrator.current_jobs["job_s"] = JobState.PLANNED
+    assert not orchestrator.can_enter_state("job_s", JobState.EXECUTING)[0]
+    assert not orchestrator.can_enter_state("job_3", JobState.ANALYZING)[0]
+
+    orchestrator.exit_state("job_r", JobState.EXECUTING)
+    status = orchestrator.get_system_status()
+    assert status["resource_locks"]["GPU_HEAVY"] is False
+    assert status["resource_locks"]["VISION_ALLOWED"] is True
+    assert status["resource_stats"]["GPU_HEAVY"]["acquisitions"] == 1
+
+    print("  ✅ Vision 上限与独占资源正确")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("资源锁测试")
+    print("=" * 70)
+
+    tests = [
+        ("容量与 owner", test_capacity_and_owner),
+        ("阻塞获取与公平性", test_blocking_fairness),
+        ("异步与上下文管理器", test_async_and_context_managers),
+        ("等待 / 持有统计", test_stats),
+        ("Orchestrator 集成", test_orchestrator_integration),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+测试共享状态存储（项目 / 组装 / 导出状态）
+
+测试内容：
+1. memory / sqlite 后端：读写、原子更新、按前缀删除
+2. 终态条目按 TTL 过期，进行中的条目不过期
+3. 多进程并发 update 不丢更新（模拟 uvicorn --workers N）
+4. 路由：其它进程写入的项目状态在本进程 /status 与 SSE 流中可见
+"""
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.config import settings
+from app.core import status_store as status_store_module
+from app.core.progress_bus import get_progress_bus
+from app.core.status_store import MemoryBackend, SQLiteBackend, StatusStore
+
+ROOT = Path(__file__).parent
+
+
+def _run_worker(code: str, jobs_dir: Path):
+    """在独立进程中执行代码（JOBS_DIR 指向同一目录，相当于另一个 worker）"""
+    env = dict(os.environ, JOBS_DIR=str(jobs_dir), STATUS_STORE_BACKEND="sqlite")
+    return subprocess.Popen([sys.executable, "-c", code], cwd=str(ROOT), env=env)
+
+
+def test_backends():
+    """测试 1: 后端读写与原子更新"""
+    print("\n" + "=" * 70)
+    print("测试 1: 后端读写与原子更新")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        for backend in (MemoryBackend(), SQLiteBackend(tmp_dir / "status.sqlite3")):
+            store = StatusStore(backend, finished_ttl=3600)
+            store.put("project", "p1", {"status": "processing", "progress": 5, "steps": [{"name": "a"}]})
+            store.put("project", "p1_v2", {"status": "processing", "progress": 0})
+            store.put("project", "p2", {"status": "processing", "progress": 0})
+            store.put("export", "p1", {"status": "exporting"})
+
+            # 读到的是副本，修改不影响存储
+            status = store.get("project", "p1")
+            status["progress"] = 99
+            assert store.get("project", "p1")["progress"] == 5
+
+            updated = store.update("project", "p1", lambda s: s["steps"].append({"name": "b"}))
+            assert [s["name"] for s in updated["steps"]] == ["a", "b"]
+            assert store.update("project", "missing", lambda s: s.update(x=1)) is None
+            assert store.get("project", "missing") is None
+
+            assert sorted(store.keys("project")) == ["p1", "p1_v2", "p2"]
+            assert store.delete_prefix("project", "p1") == 2
+            assert store.keys("project") == ["p2"]
+            assert store.get("export", "p1") == {"status": "exporting"}
+            assert store.delete("export", "p1") and not store.delete("export", "p1")
+            print(f"  {type(backend).__name__}: ✓")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 读写 / 更新 / 删除正确")
+    return True
+
+
+def test_finished_ttl():
+    """测试 2: 终态条目过期"""
+    print("\n" + "=" * 70)
+    print("测试 2: 终态条目过期")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        for backend in (MemoryBackend(), SQLiteBackend(tmp_dir / "status.sqlite3")):
+            store = StatusStore(backend, finished_ttl=0.2)
+            store.put("export", "running", {"status": "exporting"})
+            store.put("export", "done", {"status": "exporting"})
+            store.put("export", "failed", {"status": "error"})
+            store.update("export", "done", lambda s: s.update(status="completed"))
+            # 队列重跑前的失败不是终态
+            store.put("export", "retry", {"status": "error"})
+            store.update("export", "retry", lambda s: s.update(status="retrying"))
+
+            assert store.get("export", "done")["status"] == "completed"
+            time.sleep(0.3)
+            purged = store.purge_expired()
+            print(f"  {type(backend).__name__}: 清理 {purged} 条")
+            assert purged == 2 and store.purge_expired() == 0
+            assert store.get("export", "done") is None and store.get("export", "failed") is None
+            assert store.get("export", "running") == {"status": "exporting"}
+            assert sorted(store.keys("export")) == ["retry", "running"]
+            store.delete("export", "retry")
+
+            # 未清理前读取也看不到过期条目
+            store.put("export", "late", {"status": "completed"})
+            time.sleep(0.3)
+            assert store.get("export", "late") is None and store.keys("export") == ["running"]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 完成 / 失败的条目过期，进行中的保留")
+    return True
+
+
+def test_multi_process_updates():
+    """测试 3: 多进程并发更新"""
+    print("\n" + "=" * 70)
+    print("测试 3: 多进程并发更新")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        jobs_dir = tmp_dir / "jobs"
+        store = StatusStore(SQLiteBackend(jobs_dir / settings.STATUS_STORE_FILE))
+        store.put("project", "shared", {"status": "processing", "count": 0, "workers": []})
+
+        code = (
+            "import os\n"
+            "from app.core.status_store import get_status_store\n"
+            "store = get_status_store()\n"
+            "def bump(s):\n"
+            "    s['count'] += 1\n"
+            "    if os.getpid() not in s['workers']:\n"
+            "        s['workers'].append(os.getpid())\n"
+            "for _ in range(50):\n"
+            "    store.update('project', 'shared', bump)\n"
+        )
+        t0 = time.perf_counter()
+        workers = [_run_worker(code, jobs_dir) for _ in range(4)]
+        assert all(worker.wait(timeout=60) == 0 for worker in workers)
+        elapsed = time.perf_counter() - t0
+
+        status = store.get("project", "shared")
+        print(f"  4 个进程 × 50 次更新: count={status['count']}, 耗时 {elapsed:.2f}s")
+        assert status["count"] == 200
+        assert len(status["workers"]) == 4
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 没有丢失更新")
+    return True
+
+
+def test_routes_across_workers():
+    """测试 4: 路由跨进程一致"""
+    print("\n" + "=" * 70)
+    print("测试 4: 路由跨进程一致")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    original_dir = settings.JOBS_DIR
+    original_backend = settings.STATUS_STORE_BACKEND
+    try:
+        settings.JOBS_DIR = tmp_dir / "jobs"
+        settings.STATUS_STORE_BACKEND = "sqlite"
+        status_store_module._status_store = None
+
+        from app.api import routes_exports, routes_projects
+
+        project_id = "job_test_status_store"
+        status_store_module.get_status_store().put("project", project_id, {
+            "status": "processing",
+            "progress": 5,
+            "current_step": "setup",
+            "steps": [
+                {"name": "setup", "status": "pending", "message": ""},
+                {"name": "director", "status": "pending", "message": ""}
+            ],
+            "estimated_remaining": 180
+        })
+
+        # 另一个 worker 推进项目状态
+        code = (
+            "from app.api.routes_projects import update_project_status\n"
+            f"update_project_status({project_id!r}, 'director', 60, '导演编排')\n"
+        )
+        assert _run_worker(code, settings.JOBS_DIR).wait(timeout=60) == 0
+
+        response = asyncio.run(routes_projects.get_project_status(project_id))
+        status = json.loads(response.body)
+        print(f"  /status: progress={status['progress']}, steps={[s['status'] for s in status['steps']]}")
+        assert status["progress"] == 60 and status["current_step"] == "director"
+        assert [s["status"] for s in status["steps"]] == ["completed", "active"]
+
+        # SSE：本进程没有收到任何本地事件，也能从共享存储同步到其它进程写入的终态
+        async def stream():
+            worker = None
+            chunks = []
+            response = await routes_projects.stream_project_events(project_id, None)
+            async for chunk in response.body_iterator:
+                chunks.append(chunk)
+                if worker is None:
+                    worker = _run_worker(
+                        "from app.api.routes_projects import update_project_status\n"
+                        f"update_project_status({project_id!r}, 'completed', 100, '完成')\n",
+                        settings.JOBS_DIR
+                    )
+            await asyncio.to_thread(worker.wait, 60)
+            return "".join(chunks)
+
+        body = asyncio.run(asyncio.wait_for(stream(), 30))
+        events = [line for line in body.splitlines() if line.startswith("data: ")]
+        print(f"  SSE 收到 {len(events)} 个状态事件")
+        assert '"progress": 60' in events[0]
+        assert '"status": "completed"' in events[-1]
+
+        # 任务队列重跑：retrying 期间保留失败原因，重跑开始后恢复 processing 并清除
+        status = {"status": "processing", "error": None, "steps": [{"name": "ingest", "status": "pending"}]}
+        routes_projects._apply_step(status, "retrying", 0, "处理失败，稍后重试: boom")
+        assert status["status"] == "retrying" and "boom" in status["error"]
+        routes_projects._apply_step(status, "ingest", 20, "正在处理素材...")
+        assert status["status"] == "processing" and status["error"] is None
+
+        # 导出状态
+        status_store_module.get_status_store().put("export", "export_x", {"export_id": "export_x", "status": "exporting"})
+        routes_exports.update_export_task("export_x", status="completed", progress=100)
+        response = asyncio.run(routes_exports.get_export_status("export_x"))
+        assert json.loads(response.body)["progress"] == 100
+        assert get_progress_bus().get_snapshot("export_x")["status"] == "completed"
+    finally:
+        settings.JOBS_DIR = original_dir
+        settings.STATUS_STORE_BACKEND = original_backend
+        status_store_module._status_store = None
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 多个 worker 看到同一份状态")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("共享状态存储测试")
+    print("=" * 70)
+
+    tests = [
+        ("后端读写与原子更新", test_backends),
+        ("终态条目过期", test_finished_ttl),
+        ("多进程并发更新", test_multi_process_updates),
+        ("路由跨进程一致", test_routes_across_workers),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
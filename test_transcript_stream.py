@@ -0,0 +1,293 @@
+"""
+测试流式转录输出
+
+测试内容：
+1. 增量拼接：按块顺序输出，结果与一次性拼接一致
+2. 流式写入：旁路 JSONL + transcript.json 快照，完成后为旧格式
+3. 部分读取：转录进行中按 until_sec 读取前 N 秒
+4. 进度上报：按已转录时长映射到进度区间，并节流
+5. 单模型路径逐段回调
+"""
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools import whisper_pool as whisper_pool_module
+from app.tools.asr_parallel import ChunkStitcher, plan_chunks, stitch_chunks
+from app.tools.asr_whisper import transcribe_audio
+from app.tools.transcript_stream import (
+    TranscriptStreamWriter,
+    partial_path_for,
+    read_partial_transcript
+)
+from app.tools.whisper_pool import WhisperModelPool
+
+
+def _chunk_segments(start: float, end: float):
+    """每秒一个词，4 个词一段"""
+    words = [
+        {"start": float(k), "end": k + 0.5, "word": f" w{k}"}
+        for k in range(int(start), int(end))
+    ]
+    return [
+        {
+            "start": group[0]["start"],
+            "end": group[-1]["end"],
+            "text": "".join(w["word"] for w in group).strip(),
+            "words": group
+        }
+        for group in (words[i:i + 4] for i in range(0, len(words), 4))
+    ]
+
+
+def test_incremental_stitch():
+    """测试 1: 增量拼接"""
+    print("\n" + "=" * 70)
+    print("测试 1: 增量拼接")
+    print("=" * 70)
+
+    chunks = plan_chunks(40, [], target_sec=10, min_sec=4, max_sec=16, overlap_sec=1.5)
+    results = [_chunk_segments(c.read_start, c.read_end) for c in chunks]
+
+    stitcher = ChunkStitcher(chunks)
+    emitted = []
+    for chunk, segments in zip(chunks, results):
+        new = stitcher.add(chunk, segments)
+        # 每块加入后立即输出，且只包含本块范围内的段落
+        assert new and all(seg["start"] >= chunk.start for seg in new)
+        emitted.extend(new)
+
+    assert emitted == stitch_chunks(chunks, results)
+    words = " ".join(seg["text"] for seg in emitted).split()
+    assert words == [f"w{k}" for k in range(40)], f"拼接结果错误: {words}"
+
+    print(f"  ✓ {len(chunks)} 块增量输出 {len(emitted)} 段，与一次性拼接一致")
+    print("  ✅ 增量拼接正确")
+    return True
+
+
+def test_stream_writer():
+    """测试 2: 流式写入"""
+    print("\n" + "=" * 70)
+    print("测试 2: 流式写入")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        transcript_path = tmp_dir / "transcript.json"
+        writer = TranscriptStreamWriter(transcript_path, source="audio.wav", flush_interval=0)
+        writer.on_info({"language": "zh", "duration": 30.0})
+        writer.on_segment({"start": 0.0, "end": 2.0, "text": "第一段"})
+        writer.on_segment({"start": 2.0, "end": 5.0, "text": "第二段"})
+
+        partial_path = partial_path_for(transcript_path)
+        assert partial_path.name == "transcript.partial.jsonl"
+        lines = partial_path.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 3 and json.loads(lines[0])["type"] == "info"
+
+        snapshot = json.loads(transcript_path.read_text(encoding="utf-8"))
+        assert snapshot["partial"] is True
+        assert snapshot["transcribed_until"] == 5.0
+        assert [s["text"] for s in snapshot["segments"]] == ["第一段", "第二段"]
+
+        final = writer.finish({
+            "segments": writer.segments,
+            "language": "zh",
+            "source": "audio.wav"
+        })
+        on_disk = json.loads(transcript_path.read_text(encoding="utf-8"))
+        assert on_disk == final
+        assert set(on_disk) == {"segments", "language", "source"}, "最终格式应与旧格式一致"
+        assert not partial_path.exists()
+        assert not list(tmp_dir.glob("*.tmp")), "不应残留临时文件"
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 旁路文件 / 快照 / 最终格式正确")
+    return True
+
+
+def test_read_partial():
+    """测试 3: 部分读取"""
+    print("\n" + "=" * 70)
+    print("测试 3: 转录进行中读取前 N 秒")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        transcript_path = tmp_dir / "transcript.json"
+        assert read_partial_transcript(transcript_path) is None
+
+        # 快照间隔很长：只有旁路文件是最新的
+        writer = TranscriptStreamWriter(transcript_path, source="audio.wav", flush_interval=3600)
+        writer.on_info({"language": "zh", "duration": 600.0})
+        for k in range(10):
+            writer.on_segment({"start": k * 60.0, "end": k * 60.0 + 50, "text": f"第{k}分钟"})
+
+        # 模拟写到一半的最后一行
+        with open(partial_path_for(transcript_path), "a", encoding="utf-8") as f:
+            f.write('{"type": "segment", "start": 6')
+
+        transcript = read_partial_transcript(transcript_path, until_sec=180)
+        print(f"  前 3 分钟: {[s['text'] for s in transcript['segments']]}")
+        assert transcript["partial"] is True
+        assert transcript["language"] == "zh"
+        assert transcript["transcribed_until"] == 590.0
+        assert [s["text"] for s in transcript["segments"]] == ["第0分钟", "第1分钟", "第2分钟"]
+
+        writer.finish()
+        transcript = read_partial_transcript(transcript_path)
+        assert transcript["partial"] is False
+        assert len(transcript["segments"]) == 10
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 部分读取正确（容忍未写完的最后一行）")
+    return True
+
+
+def test_progress_throttle():
+    """测试 4: 进度上报"""
+    print("\n" + "=" * 70)
+    print("测试 4: 进度上报节流")
+    print("=" * 70)
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        reported = []
+        writer = TranscriptStreamWriter(
+            tmp_dir / "transcript.json",
+            source="audio.wav",
+            flush_interval=3600,
+            on_progress=reported.append,
+            progress_range=(50, 80),
+            progress_interval=0
+        )
+        writer.on_info({"language": "zh", "duration": 100.0})
+        for k in range(100):
+            writer.on_segment({"start": float(k), "end": k + 1.0, "text": "x"})
+
+        print(f"  上报次数: {len(reported)}（段落数 100）")
+        assert reported == sorted(reported)
+        assert reported[-1] == 80
+        assert len(reported) == len(set(reported)), "相同进度不应重复上报"
+        assert len(reported) <= 31
+
+        # 时间节流：间隔内只上报一次
+        throttled = []
+        writer = TranscriptStreamWriter(
+            tmp_dir / "other.json",
+            source="audio.wav",
+            flush_interval=3600,
+            on_progress=throttled.append,
+            progress_interval=3600
+        )
+        writer.on_info({"language": "zh", "duration": 100.0})
+        for k in range(100):
+            writer.on_segment({"start": float(k), "end": k + 1.0, "text": "x"})
+        assert len(throttled) == 1
+        writer.finish()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 进度映射与节流正确")
+    return True
+
+
+class _Segment:
+    def __init__(self, start, end, text):
+        self.start, self.end, self.text = start, end, text
+
+
+class _Info:
+    language = "zh"
+    duration = 9.0
+
+
+class FakeWhisperModel:
+    def transcribe(self, audio, language=None, word_timestamps=True, vad_filter=True):
+        segments = (_Segment(k * 3.0, k * 3.0 + 2.5, f" 第{k}段") for k in range(3))
+        return segments, _Info()
+
+
+def test_single_model_callbacks():
+    """测试 5: 单模型路径逐段回调"""
+    print("\n" + "=" * 70)
+    print("测试 5: 单模型路径逐段回调")
+    print("=" * 70)
+
+    original_pool = whisper_pool_module._whisper_pool
+    try:
+        whisper_pool_module._whisper_pool = WhisperModelPool(
+            max_memory_gb=4,
+            idle_timeout=0,
+            loader=lambda *key: FakeWhisperModel()
+        )
+
+        events = []
+        result = transcribe_audio(
+            "audio.wav",
+            on_info=lambda info: events.append(("info", info["duration"])),
+            on_segment=lambda seg: events.append(("segment", seg["text"]))
+        )
+
+        assert events[0] == ("info", 9.0)
+        assert [e[1] for e in events[1:]] == ["第0段", "第1段", "第2段"]
+        assert result["language"] == "zh"
+        assert len(result["segments"]) == 3
+
+        stats = whisper_pool_module._whisper_pool.get_stats()
+        assert stats["models"]["base/cpu/int8"]["transcriptions"] == 1
+        assert stats["loaded"]["base/cpu/int8"]["in_use"] == 0, "转录结束后应归还模型"
+    finally:
+        whisper_pool_module._whisper_pool = original_pool
+
+    print("  ✅ 回调顺序正确，模型已归还")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("流式转录输出测试")
+    print("=" * 70)
+
+    tests = [
+        ("增量拼接", test_incremental_stitch),
+        ("流式写入", test_stream_writer),
+        ("部分读取", test_read_partial),
+        ("进度上报节流", test_progress_throttle),
+        ("单模型逐段回调", test_single_model_callbacks),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+测试视觉分析结果缓存
+
+测试内容：
+1. 键由 帧内容 + 模型 + prompt 版本 决定
+2. wrap：命中时不再调用模型
+3. 容量上限按最近访问淘汰
+4. 重启后（新实例）从磁盘恢复索引
+5. /api/visual/analyze-from-job 统计兼容 LM Studio 分析器写回的 dict 结果，分析器在 LLM 线程池中运行
+"""
+import base64
+import json
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes_visual
+from app.config import settings
+from app.models.schemas import VisualMetadata
+from app.tools.vision_cache import VisionResultCache
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _visual(summary: str) -> VisualMetadata:
+    return VisualMetadata(summary=summary, shot_type="中景", subjects=["人物"], quality_score=7)
+
+
+def test_cache_key():
+    """测试 1: 缓存键"""
+    print("\n" + "=" * 70)
+    print("测试 1: 缓存键")
+    print("=" * 70)
+
+    frame = VisionResultCache.frame_hash(_b64(b"frame-a"))
+    assert frame == VisionResultCache.frame_hash(_b64(b"frame-a"))
+    assert frame != VisionResultCache.frame_hash(_b64(b"frame-b"))
+
+    key = VisionResultCache.make_key(frame, "ollama/moondream", "v1")
+    assert key != VisionResultCache.make_key(frame, "ollama/llava-phi3", "v1")
+    assert key != VisionResultCache.make_key(frame, "ollama/moondream", "v2")
+
+    print("  ✅ 帧内容 / 模型 / prompt 版本 任一变化都会产生新键")
+    return True
+
+
+def test_wrap_hit_skips_model():
+    """测试 2: 命中时跳过模型调用"""
+    print("\n" + "=" * 70)
+    print("测试 2: 命中时跳过模型调用")
+    print("=" * 70)
+
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        cache = VisionResultCache(cache_dir, max_mb=1)
+        calls = []
+
+        def infer(img_b64):
+            calls.append(img_b64)
+            return _visual(f"画面{len(calls)}")
+
+        cached_infer = cache.wrap(
+            infer,
+            model="ollama/moondream",
+            prompt_version="v1",
+            encode=lambda visual: visual.model_dump(),
+            decode=lambda data: VisualMetadata(**data)
+        )
+
+        first = cached_infer(_b64(b"frame-a"))
+        second = cached_infer(_b64(b"frame-a"))
+        cached_infer(_b64(b"frame-b"))
+
+        assert len(calls) == 2, f"模型调用次数错误: {len(calls)}"
+        assert isinstance(second, VisualMetadata)
+        assert second == first
+
+        stats = cache.get_stats()
+        print(f"  统计: {stats}")
+        assert stats["hits"] == 1
+        assert stats["entries"] == 2
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("  ✅ 同一帧第二次分析直接命中")
+    return True
+
+
+def test_size_eviction():
+    """测试 3: 容量淘汰"""
+    print("\n" + "=" * 70)
+    print("测试 3: 容量淘汰")
+    print("=" * 70)
+
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        cache = VisionResultCache(cache_dir, max_mb=1)
+        cache.max_bytes = 3000  # 约 3 个条目
+
+        payload = "x" * 800
+        keys = [cache.make_key(f"frame{i}", "m", "v1") for i in range(5)]
+
+        for key in keys[:3]:
+            cache.put(key, payload)
+
+        # 访问最早的条目，使其成为最近使用
+        assert cache.get(keys[0]) == payload
+
+        for key in keys[3:]:
+            cache.put(key, payload)
+
+        stats = cache.get_stats()
+        print(f"  统计: {stats}")
+        assert stats["evictions"] >= 2
+        assert cache.get(keys[0]) == payload, "最近访问的条目不应被淘汰"
+        assert cache.get(keys[1]) is None, "最久未访问的条目应被淘汰"
+        assert stats["size_mb"] * 1024 * 1024 <= 3000 + 1
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("  ✅ 按最近访问时间淘汰")
+    return True
+
+
+def test_persistence():
+    """测试 4: 新实例从磁盘恢复"""
+    print("\n" + "=" * 70)
+    print("测试 4: 磁盘持久化")
+    print("=" * 70)
+
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        key = VisionResultCache.make_key("frame", "openai/gpt-4o", "cloud-v1")
+        VisionResultCache(cache_dir).put(key, _visual("海边").model_dump())
+
+        reopened = VisionResultCache(cache_dir)
+        data = reopened.get(key)
+        assert data is not None
+        assert VisualMetadata(**data).summary == "海边"
+        assert reopened.get_stats()["entries"] == 1
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("  ✅ 重启后缓存依然有效")
+    return True
+
+
+class _MixedAnalyzer:
+    """一半场景写回 VisualMetadata，一半写回 LM Studio 形态的 dict"""
+    threads = []
+
+    def analyze_scene_visuals(self, scenes_data, video_path, max_scenes=None):
+        _MixedAnalyzer.threads.append(threading.current_thread().name)
+        for i, scene in enumerate(scenes_data.scenes):
+            if i % 2 == 0:
+                scene.visual = _visual(f"画面{i}")
+            else:
+                scene.visual = {"summary": f"画面{i}", "analyzed_by": "lmstudio", "model": "qwen2-vl"}
+        return scenes_data
+
+
+def test_route_stats_with_dict_visuals():
+    """测试 5: 路由统计兼容 dict 结果"""
+    print("\n" + "=" * 70)
+    print("测试 5: 路由统计兼容 dict 结果")
+    print("=" * 70)
+
+    jobs_dir = Path(tempfile.mkdtemp())
+    saved = (settings.JOBS_DIR, routes_visual.get_visual_analyzer)
+    try:
+        settings.JOBS_DIR = jobs_dir
+        routes_visual.get_visual_analyzer = lambda **kwargs: _MixedAnalyzer()
+
+        job_dir = jobs_dir / "job_visual"
+        job_dir.mkdir()
+        (job_dir / "input.mp4").write_bytes(b"")
+        scenes = [
+            {"scene_id": f"S{i:04d}", "start_frame": i * 30, "end_frame": i * 30 + 29,
+             "start_tc": "00:00:00:00", "end_tc": "00:00:00:00"}
+            for i in range(4)
+        ]
+        (job_dir / "scenes.json").write_text(json.dumps({
+            "meta": {"schema": "scenes.v1", "fps": 30},
+            "media": {"primary_clip_path": str(job_dir / "input.mp4")},
+            "scenes": scenes
+        }), encoding="utf-8")
+
+        app = FastAPI()
+        app.include_router(routes_visual.router)
+        response = TestClient(app).post("/api/visual/analyze-from-job", data={"job_id": "job_visual"})
+    finally:
+        settings.JOBS_DIR, routes_visual.get_visual_analyzer = saved
+        shutil.rmtree(jobs_dir, ignore_errors=True)
+
+    print(f"  {response.status_code} {response.json()}")
+    assert response.status_code == 200
+    # dict 结果没有质量评分：计入已分析场景，不参与平均分
+    assert response.json()["stats"] == {"total_scenes": 4, "analyzed_scenes": 4, "avg_quality": 7.0}
+    # 分析器在 LLM 线程池中运行，不阻塞事件循环
+    assert _MixedAnalyzer.threads and _MixedAnalyzer.threads[-1].startswith("llm")
+
+    print("  ✅ 两种结果形态都能统计")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("视觉分析结果缓存测试")
+    print("=" * 70)
+
+    tests = [
+        ("缓存键", test_cache_key),
+        ("命中跳过模型", test_wrap_hit_skips_model),
+        ("容量淘汰", test_size_eviction),
+        ("磁盘持久化", test_persistence),
+        ("路由统计兼容 dict 结果", test_route_stats_with_dict_visuals),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+测试视觉推理流水线
+
+测试内容：
+1. 乱序完成的推理按场景顺序回写
+2. 并发度上限
+3. max_scenes 语义与串行循环一致（失败不计数、继续补位）
+4. 截帧失败走单帧回退
+"""
+import base64
+import sys
+import random
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.models.schemas import Scene
+from app.tools.vision_pipeline import VisionPipeline, FrameExtractionError, scene_mid_frame
+
+
+class FakeExtractor:
+    """模拟关键帧提取器：帧内容为帧号字符串"""
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.fallback_calls = []
+
+    def iter_frames(self, video_path, frame_numbers):
+        for n in sorted(set(frame_numbers)):
+            if n in self.missing:
+                continue
+            time.sleep(0.002)
+            yield n, str(n).encode()
+
+    def extract_frame_base64(self, video_path, frame_number, fps):
+        self.fallback_calls.append(frame_number)
+        if frame_number in self.missing:
+            return None
+        return base64.b64encode(str(frame_number).encode()).decode()
+
+
+def make_scenes(count):
+    return [
+        Scene(
+            scene_id=f"S{i:04d}",
+            start_frame=i * 100,
+            end_frame=i * 100 + 100,
+            start_tc="00:00:00:00",
+            end_tc="00:00:00:00"
+        )
+        for i in range(count)
+    ]
+
+
+def test_ordered_writeback():
+    """测试 1: 乱序完成，按顺序回写"""
+    print("\n" + "=" * 70)
+    print("测试 1: 乱序完成，按顺序回写")
+    print("=" * 70)
+
+    scenes = make_scenes(20)
+    emitted = []
+
+    def infer(img_b64):
+        time.sleep(random.uniform(0, 0.02))
+        return img_b64
+
+    pipeline = VisionPipeline("fake.mp4", 25.0, concurrency=4, extractor=FakeExtractor())
+    count = pipeline.run(scenes, infer, on_result=lambda s, r: emitted.append(s.scene_id))
+
+    assert count == 20
+    assert emitted == [s.scene_id for s in scenes], f"回写顺序错误: {emitted}"
+    print(f"  ✅ {count} 个场景按顺序回写")
+    return True
+
+
+def test_concurrency_bound():
+    """测试 2: 在途请求不超过并发度"""
+    print("\n" + "=" * 70)
+    print("测试 2: 并发度上限")
+    print("=" * 70)
+
+    for concurrency in (1, 3):
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def infer(img_b64):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return img_b64
+
+        pipeline = VisionPipeline("fake.mp4", 25.0, concurrency=concurrency, extractor=FakeExtractor())
+        pipeline.run(make_scenes(12), infer)
+
+        print(f"  concurrency={concurrency}, 峰值在途={state['peak']}")
+        assert state["peak"] <= concurrency
+
+    print("  ✅ 并发度上限生效")
+    return True
+
+
+def test_max_scenes_semantics():
+    """测试 3: max_scenes 只计成功数，失败的场景由后续场景补位"""
+    print("\n" + "=" * 70)
+    print("测试 3: max_scenes 语义")
+    print("=" * 70)
+
+    scenes = make_scenes(10)
+    failing = {"S0001", "S0003"}
+    frame_to_scene = {str(scene_mid_frame(s)): s.scene_id for s in scenes}
+
+    def infer(img_b64):
+        scene_id = frame_to_scene[base64.b64decode(img_b64).decode()]
+        if scene_id in failing:
+            raise ValueError("模拟推理失败")
+        return scene_id
+
+    for concurrency in (1, 4):
+        succeeded = []
+        failed = []
+        pipeline = VisionPipeline("fake.mp4", 25.0, concurrency=concurrency, extractor=FakeExtractor())
+        count = pipeline.run(
+            scenes,
+            infer,
+            max_scenes=4,
+            on_result=lambda s, r: succeeded.append(s.scene_id),
+            on_error=lambda s, e: failed.append(s.scene_id)
+        )
+
+        print(f"  concurrency={concurrency}: 成功 {succeeded}, 失败 {failed}")
+        assert count == 4
+        assert succeeded == ["S0000", "S0002", "S0004", "S0005"]
+        assert failed == ["S0001", "S0003"]
+
+    print("  ✅ 与串行循环结果一致")
+    return True
+
+
+def test_frame_fallback():
+    """测试 4: 批量截帧缺失的帧走单帧回退"""
+    print("\n" + "=" * 70)
+    print("测试 4: 截帧失败回退")
+    print("=" * 70)
+
+    scenes = make_scenes(5)
+    missing_frame = scene_mid_frame(scenes[2])
+    extractor = FakeExtractor(missing=[missing_frame])
+    errors = []
+
+    pipeline = VisionPipeline("fake.mp4", 25.0, concurrency=2, extractor=extractor)
+    count = pipeline.run(scenes, lambda b: b, on_error=lambda s, e: errors.append((s.scene_id, e)))
+
+    assert count == 4
+    assert extractor.fallback_calls == [missing_frame]
+    assert len(errors) == 1 and errors[0][0] == "S0002"
+    assert isinstance(errors[0][1], FrameExtractionError)
+    print("  ✅ 缺失帧回退到单帧截取，失败时报告截帧错误")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("视觉推理流水线测试")
+    print("=" * 70)
+
+    tests = [
+        ("按顺序回写", test_ordered_writeback),
+        ("并发度上限", test_concurrency_bound),
+        ("max_scenes 语义", test_max_scenes_semantics),
+        ("截帧失败回退", test_frame_fallback),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+测试波形互相关对齐
+
+测试内容：
+1. 起音包络：与增益无关
+2. FFT 互相关：正 / 负偏移、亚帧精度、无关音频置信度低
+3. ffmpeg 流式解码 + AudioMatcher 波形匹配（需要 ffmpeg）
+"""
+import shutil
+import sys
+import tempfile
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools.audio_matcher import AudioMatcher
+from app.tools.media_probe import MediaProbe
+from app.tools.waveform_sync import (
+    SYNC_SAMPLE_RATE,
+    cross_correlate,
+    frame_rms,
+    onset_envelope
+)
+
+
+def synth_scene(seconds: float, sample_rate: int = SYNC_SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    """合成现场声：随机起止的噪声爆发（类似说话 / 拍板），int16"""
+    rng = np.random.default_rng(seed)
+    signal = rng.normal(0, 30, int(seconds * sample_rate))
+    t = 0.0
+    while t < seconds:
+        t += rng.uniform(0.1, 0.6)
+        length = rng.uniform(0.05, 0.4)
+        first = int(t * sample_rate)
+        last = min(len(signal), int((t + length) * sample_rate))
+        signal[first:last] += rng.normal(0, rng.uniform(800, 6000), max(0, last - first))
+        t += length
+    return np.clip(signal, -32768, 32767).astype(np.int16)
+
+
+def take(scene: np.ndarray, start_sec: float, seconds: float, gain: float, seed: int,
+         sample_rate: int = SYNC_SAMPLE_RATE) -> np.ndarray:
+    """从现场声截取一段，模拟另一支麦克风（不同增益 + 底噪）"""
+    first = int(start_sec * sample_rate)
+    part = scene[first:first + int(seconds * sample_rate)].astype(np.float64) * gain
+    part += np.random.default_rng(seed).normal(0, 60, len(part))
+    return np.clip(part, -32768, 32767).astype(np.int16)
+
+
+def envelope(samples: np.ndarray) -> np.ndarray:
+    return onset_envelope(frame_rms(samples, int(SYNC_SAMPLE_RATE * 0.01)))
+
+
+def write_wav(path: Path, samples: np.ndarray, sample_rate: int = SYNC_SAMPLE_RATE):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+
+
+def test_onset_envelope_gain_invariant():
+    """测试 1: 起音包络与增益无关"""
+    print("\n" + "=" * 70)
+    print("测试 1: 起音包络")
+    print("=" * 70)
+
+    scene = synth_scene(10)
+    loud = envelope(scene)
+    quiet = envelope((scene * 0.2).astype(np.int16))
+    corr = float(np.corrcoef(loud, quiet)[0, 1])
+    print(f"  增益 1.0 vs 0.2 包络相关系数: {corr:.3f}")
+    assert corr > 0.9
+    assert abs(float(loud.mean())) < 1e-3
+
+    print("  ✅ 包络对增益不敏感")
+    return True
+
+
+def test_cross_correlate_offsets():
+    """测试 2: FFT 互相关"""
+    print("\n" + "=" * 70)
+    print("测试 2: FFT 互相关偏移")
+    print("=" * 70)
+
+    scene = synth_scene(120, seed=1)
+
+    # 视频从现场 10s 开始录，外录音频从 17.345s 开始录 → 音频晚开始 7.345s
+    video = take(scene, 10.0, 60, gain=1.0, seed=2)
+    audio = take(scene, 17.345, 60, gain=0.3, seed=3)
+    offset, confidence = cross_correlate(envelope(video), envelope(audio))
+    print(f"  音频晚开始: offset={offset:.3f}s (期望 7.345), 置信度 {confidence:.2f}")
+    assert abs(offset - 7.345) < 0.02
+    assert confidence > 0.5
+
+    # 音频先开始
+    audio_early = take(scene, 4.0, 80, gain=2.0, seed=4)
+    offset, confidence = cross_correlate(envelope(video), envelope(audio_early))
+    print(f"  音频先开始: offset={offset:.3f}s (期望 -6.0), 置信度 {confidence:.2f}")
+    assert abs(offset + 6.0) < 0.02
+
+    # 搜索范围限制
+    offset, _ = cross_correlate(envelope(video), envelope(audio), max_offset_sec=5)
+    assert abs(offset) <= 5
+
+    # 无关录音
+    unrelated = take(synth_scene(60, seed=9), 0, 60, gain=1.0, seed=5)
+    _, unrelated_conf = cross_correlate(envelope(video), envelope(unrelated))
+    print(f"  无关录音置信度: {unrelated_conf:.2f}")
+    assert unrelated_conf < 0.3
+
+    assert cross_correlate(np.zeros(0), envelope(audio)) == (0.0, 0.0)
+
+    print("  ✅ 偏移与置信度正确")
+    return True
+
+
+def test_matcher_waveform():
+    """测试 3: AudioMatcher 波形匹配（ffmpeg 流式解码）"""
+    print("\n" + "=" * 70)
+    print("测试 3: AudioMatcher 波形匹配")
+    print("=" * 70)
+
+    if not shutil.which("ffmpeg"):
+        print("  ⚠️  未找到 ffmpeg，跳过")
+        return True
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        scene = synth_scene(90, sample_rate=16000, seed=6)
+        video_path = tmp_dir / "cam" / "clip.wav"
+        right_path = tmp_dir / "rec" / "zoom_take2.wav"
+        wrong_path = tmp_dir / "rec" / "zoom_take1.wav"
+        for path in (video_path, right_path):
+            path.parent.mkdir(exist_ok=True)
+
+        write_wav(video_path, take(scene, 5.0, 60, 1.0, 7, sample_rate=16000), 16000)
+        write_wav(right_path, take(scene, 7.5, 70, 0.5, 8, sample_rate=16000), 16000)
+        write_wav(wrong_path, take(synth_scene(60, 16000, seed=11), 0, 60, 1.0, 9, sample_rate=16000), 16000)
+
+        # 文件名 / 时间戳都匹配不上（时间戳容差设为 0）
+        probe = MediaProbe(runner=lambda path, timeout: {
+            "format": {"duration": "60"},
+            "streams": [{"codec_type": "audio"}]
+        })
+        matcher = AudioMatcher(probe=probe)
+        matcher.timestamp_tolerance_minutes = -1
+
+        match = matcher._match_single_video(
+            {"asset_id": "V001", "path": str(video_path)},
+            [
+                {"asset_id": "A001", "path": str(wrong_path)},
+                {"asset_id": "A002", "path": str(right_path)},
+            ]
+        )
+        print(f"  结果: {match.to_dict()}")
+        assert match.match_method == "waveform"
+        assert match.audio_asset_id == "A002"
+        assert abs(match.audio_offset_sec - 2.5) < 0.02
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print("  ✅ 波形匹配找到正确音频与偏移")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("波形互相关对齐测试")
+    print("=" * 70)
+
+    tests = [
+        ("起音包络", test_onset_envelope_gain_invariant),
+        ("FFT 互相关", test_cross_correlate_offsets),
+        ("波形匹配", test_matcher_waveform),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+测试 Whisper 模型池
+
+测试内容：
+1. 同一键只加载一次，不同键分别加载
+2. 并发请求同一模型只加载一次
+3. 内存上限：按 LRU 淘汰空闲模型，不淘汰使用中的模型
+4. 空闲淘汰
+5. 加载耗时与转录耗时分开统计
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.tools.whisper_pool import WhisperModelPool
+
+
+class FakeLoader:
+    """模拟模型加载（记录加载次数）"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.loads = []
+        self._lock = threading.Lock()
+
+    def __call__(self, model_size, device, compute_type):
+        time.sleep(self.delay)
+        with self._lock:
+            self.loads.append((model_size, device, compute_type))
+        return object()
+
+
+def test_reuse():
+    """测试 1: 模型复用"""
+    print("\n" + "=" * 70)
+    print("测试 1: 模型复用")
+    print("=" * 70)
+
+    loader = FakeLoader()
+    pool = WhisperModelPool(max_memory_gb=8, idle_timeout=0, loader=loader)
+
+    with pool.acquire("base") as first:
+        pass
+    with pool.acquire("base") as second:
+        pass
+    with pool.acquire("base", "cpu", "float32"):
+        pass
+
+    assert first is second
+    assert loader.loads == [("base", "cpu", "int8"), ("base", "cpu", "float32")]
+    print(f"  ✅ 3 次借用，{len(loader.loads)} 次加载")
+    return True
+
+
+def test_concurrent_load_once():
+    """测试 2: 并发加载只加载一次"""
+    print("\n" + "=" * 70)
+    print("测试 2: 并发加载")
+    print("=" * 70)
+
+    loader = FakeLoader(delay=0.05)
+    pool = WhisperModelPool(max_memory_gb=8, idle_timeout=0, loader=loader)
+    models = []
+
+    def worker():
+        with pool.acquire("small") as model:
+            models.append(model)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(loader.loads) == 1, f"加载次数: {len(loader.loads)}"
+    assert len(set(id(m) for m in models)) == 1
+    print("  ✅ 8 个并发请求共享一次加载")
+    return True
+
+
+def test_memory_cap():
+    """测试 3: 内存上限"""
+    print("\n" + "=" * 70)
+    print("测试 3: 内存上限")
+    print("=" * 70)
+
+    loader = FakeLoader()
+    # medium 1.8GB + small 0.8GB 放不下第二个 medium 级别的组合
+    pool = WhisperModelPool(max_memory_gb=2.7, idle_timeout=0, loader=loader)
+
+    with pool.acquire("small"):
+        pass
+    with pool.acquire("base"):
+        pass
+
+    # small 在使用中，只能淘汰 base
+    with pool.acquire("small"):
+        with pool.acquire("medium"):
+            loaded = pool.get_stats()["loaded"]
+            print(f"  已加载: {list(loaded)}")
+            assert "small/cpu/int8" in loaded
+            assert "base/cpu/int8" not in loaded
+
+    stats = pool.get_stats()
+    assert stats["used_memory_gb"] <= 2.7
+    assert stats["models"]["base/cpu/int8"]["evictions"] == 1
+    print("  ✅ 超出上限时淘汰空闲模型，保留使用中的模型")
+    return True
+
+
+def test_idle_eviction():
+    """测试 4: 空闲淘汰"""
+    print("\n" + "=" * 70)
+    print("测试 4: 空闲淘汰")
+    print("=" * 70)
+
+    loader = FakeLoader()
+    pool = WhisperModelPool(max_memory_gb=8, idle_timeout=60, loader=loader)
+
+    with pool.acquire("base"):
+        # 使用中不淘汰
+        assert pool.evict_idle(now=time.time() + 3600) == []
+
+    assert pool.evict_idle(now=time.time() + 10) == []
+    assert pool.evict_idle(now=time.time() + 3600) == [("base", "cpu", "int8")]
+    assert pool.get_stats()["loaded"] == {}
+
+    with pool.acquire("base"):
+        pass
+    assert len(loader.loads) == 2
+
+    pool.shutdown()
+    print("  ✅ 空闲超时后释放，再次使用时重新加载")
+    return True
+
+
+def test_metrics():
+    """测试 5: 加载耗时与转录耗时分开统计"""
+    print("\n" + "=" * 70)
+    print("测试 5: 统计")
+    print("=" * 70)
+
+    loader = FakeLoader(delay=0.05)
+    pool = WhisperModelPool(max_memory_gb=8, idle_timeout=0, loader=loader)
+
+    for _ in range(3):
+        with pool.acquire("base"):
+            pool.record_transcription("base", "cpu", "int8", seconds=0.5, audio_seconds=10)
+
+    stats = pool.get_stats()
+    model = stats["models"]["base/cpu/int8"]
+    print(f"  统计: {model}")
+
+    assert model["loads"] == 1
+    assert model["load_seconds"] >= 0.05
+    assert model["transcriptions"] == 3
+    assert model["transcribe_seconds"] == 1.5
+    assert model["audio_seconds"] == 30
+    assert stats["total_transcribe_seconds"] == 1.5
+    print("  ✅ 加载 / 转录耗时分开统计")
+    return True
+
+
+def main():
+    """主测试流程"""
+    print("\n" + "=" * 70)
+    print("Whisper 模型池测试")
+    print("=" * 70)
+
+    tests = [
+        ("模型复用", test_reuse),
+        ("并发加载", test_concurrent_load_once),
+        ("内存上限", test_memory_cap),
+        ("空闲淘汰", test_idle_eviction),
+        ("统计", test_metrics),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            results.append((name, test_func()))
+        except AssertionError as e:
+            print(f"\n❌ 测试失败: {e}")
+            results.append((name, False))
+        except Exception as e:
+            print(f"\n❌ 测试异常: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append((name, False))
+
+    print("\n" + "=" * 70)
+    print("测试总结")
+    print("=" * 70)
+
+    passed = sum(1 for _, result in results if result)
+    for name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"{status}  {name}")
+
+    print(f"\n通过率: {passed}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()